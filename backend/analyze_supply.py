@@ -1,13 +1,15 @@
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from database import get_db_connection
+from supply_engine import listing_intervals, sweep_active
 import sys
 
 def analyze_supply():
     conn = get_db_connection()
     
     # query 1: All listings with start_date and price, filtered to BIN/Fixed Price
-    # active_listings represent "Survivor" data, so historical "active" counts are estimates.
+    # A listing is active from its start until refresh_listings marks it disappeared.
     query = """
     SELECT 
         item_id, 
@@ -26,7 +28,8 @@ def analyze_supply():
     SELECT 
         item_id, 
         price, 
-        start_date
+        start_date,
+        disappeared_at
     FROM active_listings 
     WHERE (buying_options LIKE '%FIXED_PRICE%' OR buying_options LIKE '%BIN%')
     AND start_date IS NOT NULL
@@ -40,7 +43,7 @@ def analyze_supply():
     
     # Convert dates
     df['start_date'] = pd.to_datetime(df['start_date'])
-    df['date'] = df['start_date'].dt.date
+    df['date'] = df['start_date'].dt.normalize()
     
     print(f"Loaded {len(df)} BIN listings.")
     
@@ -50,46 +53,29 @@ def analyze_supply():
     # 2. Daily Median Price (New Listings)
     daily_median_new = df.groupby('date')['price'].median()
     
-    # 3. Daily Median Price (Active Listings)
-    # This requires iterating through each day in the range
-    date_range = pd.date_range(start=df['date'].min(), end=df['date'].max())
-    
-    active_medians = []
-    active_counts = []
-    
+    # 3. Daily Count + Median Price (Active Listings)
+    # One sweep over the [start_date, disappeared_at) intervals for the whole range
+    date_range = pd.date_range(start=df['date'].min(), end=max(df['date'].max(), pd.Timestamp.now().normalize()))
+
     print("Calculating daily active stats...")
-    for d in date_range:
-        day_date = d.date()
-        # Active on day D means: start_date <= D 
-        # (Assuming they haven't ended? We don't have historical end dates for ended items reliably in this table alone)
-        # We will assume survivor bias: items in this table are "Currently Active". 
-        # So if start_date <= D, it was active on D (and is still active today).
-        # This underestimates historical supply (missing items that sold), but matches "active listings that we have".
-        
-        mask = (df['date'] <= day_date)
-        active_subset = df[mask]
-        
-        if not active_subset.empty:
-            active_medians.append(active_subset['price'].median())
-            active_counts.append(len(active_subset))
-        else:
-            active_medians.append(0)
-            active_counts.append(0)
-            
+    start, end = listing_intervals(df['start_date'], df['disappeared_at'])
+    active = sweep_active(start, end, df['price'].to_numpy(dtype=float), np.zeros(len(df), dtype=np.int64),
+                          date_range, n_groups=1, stats=('count', 'median'))
+
     # Combine into DataFrame
     stats = pd.DataFrame({
         'date': date_range,
         'new_listings_count': daily_new.reindex(date_range, fill_value=0).values,
         'new_median_price': daily_median_new.reindex(date_range).values,
-        'active_median_price_cuml': active_medians,
-        'active_count_cuml': active_counts
+        'active_median_price': active['median'][0],
+        'active_count': active['count'][0]
     })
     
     stats.set_index('date', inplace=True)
     
     # Print Summary (Last 10 Days)
     print("\n--- Last 10 Days of Supply Data ---")
-    print(stats.tail(10)[['new_listings_count', 'new_median_price', 'active_median_price_cuml']])
+    print(stats.tail(10)[['new_listings_count', 'new_median_price', 'active_count', 'active_median_price']])
 
     # Filter for Visualization (Last 14 Days)
     cutoff_date = pd.Timestamp.now().floor('D') - pd.Timedelta(days=14)
@@ -103,7 +89,7 @@ def analyze_supply():
         ax1.set_title('Daily Supply Volume (Last 14 Days)')
         
         # Primary Axis (Left): Total Active (Line)
-        ax1.plot(stats_plot.index, stats_plot['active_count_cuml'], label='Total Active (Cumulative)', color='orange', linewidth=2, linestyle='--')
+        ax1.plot(stats_plot.index, stats_plot['active_count'], label='Total Active', color='orange', linewidth=2, linestyle='--')
         ax1.set_ylabel('Total Active Count', color='orange')
         ax1.tick_params(axis='y', labelcolor='orange')
         ax1.grid(True, alpha=0.3)
@@ -121,7 +107,7 @@ def analyze_supply():
         
         # Plot 2: Price
         ax2.plot(stats_plot.index, stats_plot['new_median_price'], label='Median Price (New Only)', marker='.', linestyle='none', color='blue', alpha=0.5)
-        ax2.plot(stats_plot.index, stats_plot['active_median_price_cuml'], label='Median Price (All Active)', color='red', linewidth=2)
+        ax2.plot(stats_plot.index, stats_plot['active_median_price'], label='Median Price (All Active)', color='red', linewidth=2)
         ax2.set_title('Median Price Trends (BIN)')
         ax2.set_ylabel('Price ($)')
         ax2.legend()
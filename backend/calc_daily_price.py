@@ -1,147 +1,319 @@
-
-import os
 import argparse
 from datetime import date, timedelta
 import pandas as pd
 import numpy as np
-from database import get_db_connection
+from database import get_db_connection, copy_upsert
+from supply_engine import listing_intervals, sweep_active
+from partition_tables import listing_history
 
 # Configurable Parameters (can be overridden by args or env)
 DEFAULT_SUPPLY_SHOCK_MULTIPLIER = 1.5
 DEFAULT_SHOCK_DISCOUNT = 0.05       # 5% discount
 DEFAULT_BO_DISCOUNT = 0.85          # 15% discount for Best Offer Listings
 
+MODEL_VERSION = 'v1_supply_velocity'
+PRICE_HISTORY_COLUMNS = [
+    'date', 'product_id', 'estimated_market_value', 'model_version',
+    'used_implied_sales', 'supply_shock_multiplier', 'signal_strength', 'driving_factor'
+]
+SUPPLY_WINDOW_DAYS = 7  # V_avg trails the 7 days before the target date (and the day itself)
+BACKFILL_BLOCK_DAYS = 31  # days estimated and upserted together in a backfill
+
+QUERY_SUPPLY = """
+    SELECT date, product_id,
+           new_count_fixed_price_only + new_count_best_offer as new_count_bin,
+           median_new_price
+    FROM daily_supply_metrics
+    WHERE date >= %s AND date <= %s
+"""
+
+# Disappearing Listings: median implied sale price (calc_implied_sales) per card-day with a sale
+QUERY_IMPLIED_SALES = """
+    SELECT date, product_id, median_sold_price
+    FROM implied_sales
+    WHERE date >= %s AND date <= %s
+    AND sold_count > 0
+"""
+
+# Fixed price / BIN listing history: each day's floor is rebuilt from the listings live that day.
+# {listings} is partition_tables.listing_history(conn, "%(since)s"); see bin_listings
+QUERY_BIN_LISTINGS = """
+    SELECT product_id, price, start_date, disappeared_at
+    FROM {listings} l
+    WHERE (buying_options LIKE '%%FIXED_PRICE%%' OR buying_options LIKE '%%BIN%%')
+    AND is_ignored = FALSE
+    AND product_id IS NOT NULL
+    AND (disappeared_at IS NULL OR disappeared_at >= %(since)s)
+"""
+
+def apply_rules(p_floor, p_new, v_new, v_avg, shock_multiplier=DEFAULT_SUPPLY_SHOCK_MULTIPLIER, p_sold=None,
+                shock_discount=DEFAULT_SHOCK_DISCOUNT):
+    """
+    The supply-velocity rules on aligned arrays (one element per product, or per product-day).
+    p_sold is the day's median implied sale price (None: Disappearing Listings off).
+    Returns (mv_est, signal, driving_factor, shock); mv_est is NaN where there is no estimate.
+    """
+    mv_est, signal, driving_factor = base_value(p_floor, p_new, p_sold)
+
+    # Step B: Supply Shock
+    shock = supply_shock(mv_est, v_new, v_avg, shock_multiplier)
+    mv_est = np.where(shock, mv_est * (1.0 - shock_discount), mv_est)
+    driving_factor = np.where(shock, np.char.add(driving_factor.astype(str), ' + Shock'), driving_factor)
+    return mv_est, signal, driving_factor, shock
+
+def base_value(p_floor, p_new, p_sold=None):
+    """Step A: Base MV (a missing or zero price is no signal); an implied sale beats asking prices."""
+    has_floor = p_floor > 0
+    has_new = p_new > 0
+    has_sold = p_sold > 0 if p_sold is not None else np.zeros(len(p_floor), dtype=bool)
+    p_sold = p_sold if p_sold is not None else np.full(len(p_floor), np.nan)
+    cases = [has_sold, has_floor & has_new & (p_new < p_floor), has_floor & has_new, has_floor, has_new]
+    mv_est = np.select(cases, [p_sold, p_new, p_floor, p_floor, p_new], np.nan)
+    driving_factor = np.select(cases, ['Implied Sale', 'New Low', 'Floor', 'Floor (No New)', 'New Only (No Floor)'], 'None')
+    signal = np.select(cases, ['High', 'High', 'Medium', 'Medium', 'Low'], 'Low')
+    return mv_est, signal, driving_factor
+
+def supply_shock(mv_est, v_new, v_avg, shock_multiplier):
+    """Step B trigger: today's new supply above shock_multiplier x V_avg. Broadcasts, so a
+    (k x 1) column of multipliers against n product-days gives a (k x n) mask."""
+    return (mv_est > 0) & (v_avg > 0) & (v_new > shock_multiplier * v_avg)
+
+def estimate_prices(df_supply, df_floor, target_date, shock_multiplier=DEFAULT_SUPPLY_SHOCK_MULTIPLIER,
+                    df_implied=None, shock_discount=DEFAULT_SHOCK_DISCOUNT):
+    """
+    Market value estimate for every product with active inventory or new supply on target_date.
+
+    df_supply: daily_supply_metrics rows (date, product_id, new_count_bin, median_new_price)
+               for the 7 days before target_date through target_date.
+    df_floor:  current floor (product_id, floor_price) of fixed price / BIN listings.
+    df_implied: implied_sales rows (date, product_id, median_sold_price) for target_date;
+                None leaves the Disappearing Listings signal off.
+    Returns one price_history row per product (PRICE_HISTORY_COLUMNS).
+    """
+    supply = df_supply[['date', 'product_id', 'new_count_bin', 'median_new_price']].copy()
+    supply['date'] = pd.to_datetime(supply['date'])
+    supply['new_count_bin'] = supply['new_count_bin'].astype(float)
+    supply['median_new_price'] = supply['median_new_price'].astype(float)
+    floor = df_floor.groupby('product_id')['floor_price'].first().astype(float)
+
+    # V_avg is the mean over the supply rows in the window (days with a row, today included)
+    v_avg = supply.groupby('product_id')['new_count_bin'].mean()
+    today = supply[supply['date'] == pd.Timestamp(target_date)].drop_duplicates('product_id').set_index('product_id')
+
+    pids = floor.index.union(today.index)
+    p_sold = None
+    if df_implied is not None:
+        implied = df_implied[pd.to_datetime(df_implied['date']) == pd.Timestamp(target_date)]
+        sold = implied.groupby('product_id')['median_sold_price'].first().astype(float)
+        pids = pids.union(sold.index)
+        p_sold = sold.reindex(pids).to_numpy()
+    mv_est, signal, driving_factor, shock = apply_rules(
+        floor.reindex(pids).to_numpy(),
+        today['median_new_price'].reindex(pids).to_numpy(),
+        today['new_count_bin'].reindex(pids).fillna(0).to_numpy(),
+        v_avg.reindex(pids).fillna(0).to_numpy(),
+        shock_multiplier, p_sold, shock_discount
+    )
+
+    prices = _price_rows(target_date, pids.astype(int), mv_est, signal, driving_factor, shock, shock_multiplier)
+    return prices[mv_est > 0].reset_index(drop=True)
+
+def _price_rows(dates, pids, mv_est, signal, driving_factor, shock, shock_multiplier):
+    return pd.DataFrame({
+        'date': dates,
+        'product_id': pids,
+        'estimated_market_value': mv_est,
+        'model_version': MODEL_VERSION,
+        'used_implied_sales': np.char.startswith(driving_factor.astype(str), 'Implied Sale'),
+        'supply_shock_multiplier': np.where(shock, float(shock_multiplier), np.nan),
+        'signal_strength': signal,
+        'driving_factor': driving_factor,
+    })[PRICE_HISTORY_COLUMNS]
+
+def daily_floors(listings, days, pids):
+    """
+    (products x days) floor price: the MIN price of each product's fixed price /
+    BIN listings live on the day (started on or before it and not disappeared
+    by it). NaN where a product had no live listing.
+    """
+    start, end = listing_intervals(listings['start_date'], listings['disappeared_at'])
+    # An unknown start counts as live from the beginning, as in the current-floor query
+    start = np.where(np.isnat(start), np.datetime64('1970-01-01'), start)
+    pcode = np.searchsorted(pids, listings['product_id'].to_numpy())
+    return sweep_active(start, end, listings['price'].to_numpy(dtype=float), pcode, days,
+                        n_groups=len(pids), stats=('min',))['min']
+
+def rule_inputs(df_supply, listings, start, end, df_implied=None):
+    """
+    apply_rules inputs for every (day, product) from start through end, day-major
+    (days x products) like one single-day run after another.
+
+    df_supply: daily_supply_metrics rows covering start - SUPPLY_WINDOW_DAYS through end.
+    listings:  fixed price / BIN listings (product_id, price, start_date, disappeared_at);
+               each day's floor is rebuilt from the listings live that day.
+    df_implied: implied_sales rows (date, product_id, median_sold_price) from start through end, or None.
+    V_avg is a rolling mean over a (products x days) grid: window sums of the
+    supply values and of the days with a row, from one cumulative sum each.
+    Returns (days, pids, p_floor, p_new, v_new, v_avg, p_sold); p_sold is None without df_implied.
+    """
+    days = pd.date_range(start, end, freq='D')
+    all_days = pd.date_range(days[0] - pd.Timedelta(days=SUPPLY_WINDOW_DAYS), days[-1], freq='D')
+    supply = df_supply[['date', 'product_id', 'new_count_bin', 'median_new_price']].copy()
+    supply['date'] = pd.to_datetime(supply['date'])
+    supply = supply[(supply['date'] >= all_days[0]) & (supply['date'] <= all_days[-1])]
+
+    pids = np.union1d(supply['product_id'].to_numpy(), listings['product_id'].to_numpy())
+    if df_implied is not None:
+        implied = df_implied[(pd.to_datetime(df_implied['date']) >= days[0])
+                             & (pd.to_datetime(df_implied['date']) <= days[-1])]
+        pids = np.union1d(pids, implied['product_id'].to_numpy())
+    row = np.searchsorted(pids, supply['product_id'].to_numpy())
+    col = (supply['date'] - all_days[0]).dt.days.to_numpy()
+    count = supply['new_count_bin'].to_numpy(dtype=float)
+
+    has_row = np.zeros((len(pids), len(all_days)), dtype=bool)
+    v_day = np.full((len(pids), len(all_days)), np.nan)
+    p_day = np.full((len(pids), len(all_days)), np.nan)
+    has_row[row, col] = True
+    v_day[row, col] = count
+    p_day[row, col] = supply['median_new_price'].to_numpy(dtype=float)
+
+    # Rolling (window + today) sums via cumulative sums with a leading zero column
+    width = SUPPLY_WINDOW_DAYS + 1
+    zero = np.zeros((len(pids), 1))
+    value_cs = np.hstack([zero, np.nan_to_num(v_day).cumsum(axis=1)])
+    rows_cs = np.hstack([zero, (has_row & ~np.isnan(v_day)).cumsum(axis=1)])
+    window_sum = value_cs[:, width:] - value_cs[:, :-width]
+    window_rows = rows_cs[:, width:] - rows_cs[:, :-width]
+    v_avg = np.divide(window_sum, window_rows, out=np.zeros_like(window_sum), where=window_rows > 0)
+
+    p_sold = None
+    if df_implied is not None:
+        p_sold = np.full((len(pids), len(days)), np.nan)
+        p_sold[np.searchsorted(pids, implied['product_id'].to_numpy()),
+               (pd.to_datetime(implied['date']) - days[0]).dt.days.to_numpy()] = \
+            implied['median_sold_price'].to_numpy(dtype=float)
+        p_sold = p_sold.T.ravel()
+
+    today = slice(SUPPLY_WINDOW_DAYS, None)
+    floors = daily_floors(listings, days, pids)
+    return (days, pids, floors.T.ravel(), p_day[:, today].T.ravel(), np.nan_to_num(v_day[:, today]).T.ravel(),
+            v_avg.T.ravel(), p_sold)
+
+def estimate_prices_range(df_supply, listings, start, end, shock_multiplier=DEFAULT_SUPPLY_SHOCK_MULTIPLIER,
+                          df_implied=None, shock_discount=DEFAULT_SHOCK_DISCOUNT):
+    """
+    estimate_prices for every day from start through end in one pass (inputs as in rule_inputs).
+    """
+    days, pids, p_floor, p_new, v_new, v_avg, p_sold = rule_inputs(df_supply, listings, start, end, df_implied)
+    mv_est, signal, driving_factor, shock = apply_rules(
+        p_floor, p_new, v_new, v_avg, shock_multiplier, p_sold, shock_discount
+    )
+    prices = _price_rows(np.repeat(days.date, len(pids)), np.tile(pids.astype(int), len(days)),
+                         mv_est, signal, driving_factor, shock, shock_multiplier)
+    return prices[mv_est > 0].reset_index(drop=True)
+
+def bin_listings(conn, since):
+    """BIN listings live on any day from `since` on, archived ones included."""
+    query = QUERY_BIN_LISTINGS.format(listings=listing_history(conn, "%(since)s"))
+    return pd.read_sql(query, conn, params={'since': since})
+
+def upsert_price_history(conn, prices):
+    """Bulk upsert on (product_id, date): re-running a day replaces its rows."""
+    copy_upsert(conn, 'price_history', prices, PRICE_HISTORY_COLUMNS, key=('product_id', 'date'))
+
 def calc_daily_price(target_date=None, shock_multiplier=DEFAULT_SUPPLY_SHOCK_MULTIPLIER):
     if target_date is None:
         target_date = date.today()
-        
+
     print(f"Calculating Market Price for {target_date}...")
     print(f"  Shock Multiplier: {shock_multiplier}x")
-    
+
     conn = get_db_connection()
-    
+
     # 1. Fetch Daily Supply Metrics (Current + History for Moving Avg)
     print("Fetching supply metrics...")
-    start_history = target_date - timedelta(days=7)
-    
-    query_supply = """
-        SELECT date, product_id, 
-               new_count_fixed_price_only + new_count_best_offer as new_count_bin,
-               median_new_price
-        FROM daily_supply_metrics
-        WHERE date >= %s AND date <= %s
-    """
-    df_supply = pd.read_sql(query_supply, conn, params=(start_history, target_date))
-    
+    start_history = target_date - timedelta(days=SUPPLY_WINDOW_DAYS)
+    df_supply = pd.read_sql(QUERY_SUPPLY, conn, params=(start_history, target_date))
+
     # 2. Fetch Current Active Floor Prices
-    # We want the MIN price per product_id where types are Fixed/BIN
+    # MIN price of active Fixed/BIN listings per product_id, kept current by the ingest paths
     print("Fetching active inventory floors...")
     query_floor = """
-        SELECT product_id, MIN(price) as floor_price
-        FROM active_listings
-        WHERE (buying_options LIKE '%FIXED_PRICE%' OR buying_options LIKE '%BIN%')
-        AND is_ignored = FALSE
-        GROUP BY product_id
+        SELECT product_id, floor_price
+        FROM product_floor
+        WHERE floor_price IS NOT NULL
     """
     df_floor = pd.read_sql(query_floor, conn)
-    
+
+    # 3. Implied sales for the day (calc_implied_sales consumes the disappearances)
+    print("Fetching implied sales...")
+    df_implied = pd.read_sql(QUERY_IMPLIED_SALES, conn, params=(target_date, target_date))
+
     if df_supply.empty or df_floor.empty:
         print("No data found. Ensure calc_daily_supply has run and listings exist.")
+        conn.close()
         return
 
-    # Process per Product
-    # Get list of products involved today (either have new supply OR have active inventory)
-    today_supply = df_supply[df_supply['date'] == target_date]
-    active_pids = set(df_floor['product_id'].unique())
-    new_pids = set(today_supply['product_id'].unique())
-    all_pids = active_pids.union(new_pids)
-    
-    results = []
-    
-    for pid in all_pids:
-        # A. Inputs
-        try:
-            floor_row = df_floor[df_floor['product_id'] == pid]
-            p_floor = floor_row['floor_price'].iloc[0] if not floor_row.empty else None
-            
-            supply_rows = df_supply[df_supply['product_id'] == pid]
-            supply_today = supply_rows[supply_rows['date'] == target_date]
-            
-            p_new = supply_today['median_new_price'].iloc[0] if not supply_today.empty else None
-            v_new = supply_today['new_count_bin'].iloc[0] if not supply_today.empty else 0
-            
-            # Calc V_avg (7 day trail)
-            v_avg = supply_rows['new_count_bin'].mean() if not supply_rows.empty else 0
-            
-            # Logic
-            mv_est = None
-            driving_factor = 'None'
-            signal = 'Low'
-            
-            # Step A: Base MV
-            if p_floor and p_new:
-                if p_new < p_floor:
-                    mv_est = p_new
-                    driving_factor = 'New Low'
-                    signal = 'High'
-                else:
-                    mv_est = p_floor
-                    driving_factor = 'Floor'
-                    signal = 'Medium'
-            elif p_floor:
-                mv_est = p_floor
-                driving_factor = 'Floor (No New)'
-                signal = 'Medium'
-            elif p_new:
-                mv_est = p_new
-                driving_factor = 'New Only (No Floor)'
-                signal = 'Low' # Risky
-            
-            # Step B: Supply Shock
-            shock_active = False
-            if mv_est and v_avg > 0:
-                if v_new > (shock_multiplier * v_avg):
-                    shock_active = True
-                    mv_est = mv_est * (1.0 - DEFAULT_SHOCK_DISCOUNT)
-                    driving_factor += ' + Shock'
-                    
-            if mv_est:
-                results.append((
-                    target_date,
-                    int(pid),
-                    float(mv_est),
-                    'v1_supply_velocity',
-                    False, # used_implied_sales (Placeholder)
-                    float(shock_multiplier) if shock_active else None,
-                    signal,
-                    driving_factor
-                ))
-                
-        except Exception as e:
-            print(f"Error processing PID {pid}: {e}")
-            continue
-            
-    # Insert
-    print(f"Computed prices for {len(results)} products.")
-    if results:
-        cur = conn.cursor()
-        insert_sql = """
-            INSERT INTO price_history (
-                date, product_id, estimated_market_value, model_version, 
-                used_implied_sales, supply_shock_multiplier, signal_strength, driving_factor
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        try:
-            cur.executemany(insert_sql, results)
-            conn.commit()
+    prices = estimate_prices(df_supply, df_floor, target_date, shock_multiplier, df_implied)
+
+    # Upsert
+    print(f"Computed prices for {len(prices)} products ({int(prices['used_implied_sales'].sum())} from implied sales).")
+    try:
+        if len(prices):
+            upsert_price_history(conn, prices)
             print("Successfully saved price estimates.")
-        except Exception as e:
-            conn.rollback()
-            print(f"Error saving to DB: {e}")
-        finally:
-            cur.close()
-    
+    except Exception as e:
+        print(f"Error saving to DB: {e}")
+        raise
+    finally:
+        conn.close()
+
+def backfill_daily_price(start, end, shock_multiplier=DEFAULT_SUPPLY_SHOCK_MULTIPLIER):
+    """
+    Rebuild price_history from start through end: supply metrics and listing
+    history are loaded once, days are estimated and upserted in blocks of
+    BACKFILL_BLOCK_DAYS. Run calc_daily_supply.py --start/--end first if the
+    supply metrics themselves changed.
+    """
+    print(f"Backfilling Market Price for {start} through {end}...")
+    print(f"  Shock Multiplier: {shock_multiplier}x")
+
+    conn = get_db_connection()
+    print("Fetching supply metrics...")
+    df_supply = pd.read_sql(QUERY_SUPPLY, conn, params=(start - timedelta(days=SUPPLY_WINDOW_DAYS), end))
+
+    # Floors are rebuilt per day from the listings live that day
+    print("Fetching listing history...")
+    listings = bin_listings(conn, start)
+    df_implied = pd.read_sql(QUERY_IMPLIED_SALES, conn, params=(start, end))
+
+    total = 0
+    block_start = start
+    while block_start <= end:
+        block_end = min(end, block_start + timedelta(days=BACKFILL_BLOCK_DAYS - 1))
+        prices = estimate_prices_range(df_supply, listings, block_start, block_end, shock_multiplier,
+                                       df_implied)
+        if len(prices):
+            upsert_price_history(conn, prices)
+        print(f"  {block_start} .. {block_end}: {len(prices)} estimates")
+        total += len(prices)
+        block_start = block_end + timedelta(days=1)
+
     conn.close()
+    print(f"Successfully saved {total} price estimates.")
 
 if __name__ == "__main__":
-    calc_daily_price()
+    parser = argparse.ArgumentParser(description="Supply-velocity market price estimates")
+    parser.add_argument("--date", type=date.fromisoformat, default=None, help="Target date (default: today)")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="Backfill: first date")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="Backfill: last date (inclusive)")
+    parser.add_argument("--shock-multiplier", type=float, default=DEFAULT_SUPPLY_SHOCK_MULTIPLIER)
+    args = parser.parse_args()
+
+    if args.start or args.end:
+        if not (args.start and args.end) or args.start > args.end:
+            parser.error("--start and --end are both required for a backfill, start <= end")
+        backfill_daily_price(args.start, args.end, args.shock_multiplier)
+    else:
+        calc_daily_price(args.date, args.shock_multiplier)
@@ -1,127 +1,160 @@
 import argparse
-from datetime import datetime, date
+import time
+from datetime import date
 from database import get_db_connection
-import pandas as pd
+from partition_tables import listing_history
 
-def calculate_daily_supply(target_date=None):
+SUPPLY_COLUMNS = [
+    'date', 'product_id',
+    'new_count_fixed_price_only', 'new_count_best_offer', 'new_count_auction',
+    'total_active_fixed_price_only', 'total_active_best_offer', 'total_active_auction',
+    'median_new_price'
+]
+
+# Every (day, product) from %(start)s through %(end)s, aggregated server-side:
+#  - a listing is new on its start day and active over [start day, disappeared day)
+#    (refresh_listings sets disappeared_at; without one it is still active)
+#  - listing type: AUCTION, BEST_OFFER (Fixed Price + Best Offer), FIXED_PRICE_ONLY, else UNKNOWN
+#  - total_active_* is a sweep: listings active entering the range + running sum of
+#    starts minus disappearances per day (as supply_engine.sweep_active counts)
+#  - median_new_price over new Fixed Price Only + Best Offer listings, 0 when there were none
+#  - only products with a listing active on, or starting within, the range get rows
+#    (a card whose last listing disappears on the first day still gets that day's zeros)
+# {listings} is partition_tables.listing_history(conn, "%(start)s::date"): archived listings that
+# disappeared before the range are never active in it
+SUPPLY_METRICS_SQL = """
+    WITH listings AS (
+        SELECT product_id, price::float8 AS price, start_date::date AS start_day,
+               -- A disappearance recorded before the start leaves the listing never active
+               CASE WHEN disappeared_at IS NOT NULL
+                    THEN GREATEST(disappeared_at::date, start_date::date) END AS gone_day,
+               CASE WHEN UPPER(buying_options) LIKE '%%AUCTION%%' THEN 'AUCTION'
+                    WHEN UPPER(buying_options) LIKE '%%BEST_OFFER%%' THEN 'BEST_OFFER'
+                    WHEN UPPER(buying_options) LIKE '%%FIXED_PRICE%%' THEN 'FIXED_PRICE_ONLY'
+                    ELSE 'UNKNOWN' END AS listing_type
+        FROM {listings} l
+        WHERE product_id IS NOT NULL
+        AND is_ignored = FALSE
+    ),
+    days AS (
+        SELECT generate_series(%(start)s::date, %(end)s::date, interval '1 day')::date AS date
+    ),
+    products AS (
+        -- Only cards with a listing active in (or disappearing during) the range, or starting within it
+        SELECT DISTINCT product_id FROM listings
+        WHERE start_day <= %(end)s::date
+        AND (gone_day IS NULL OR gone_day >= %(start)s::date)
+    ),
+    active_before AS (
+        SELECT product_id,
+               COUNT(*) FILTER (WHERE listing_type = 'FIXED_PRICE_ONLY') AS fixed_price_only,
+               COUNT(*) FILTER (WHERE listing_type = 'BEST_OFFER') AS best_offer,
+               COUNT(*) FILTER (WHERE listing_type = 'AUCTION') AS auction
+        FROM listings
+        WHERE start_day < %(start)s::date
+        AND (gone_day IS NULL OR gone_day >= %(start)s::date)
+        GROUP BY product_id
+    ),
+    gone_by_day AS (
+        SELECT product_id, gone_day AS date,
+               COUNT(*) FILTER (WHERE listing_type = 'FIXED_PRICE_ONLY') AS fixed_price_only,
+               COUNT(*) FILTER (WHERE listing_type = 'BEST_OFFER') AS best_offer,
+               COUNT(*) FILTER (WHERE listing_type = 'AUCTION') AS auction
+        FROM listings
+        WHERE start_day IS NOT NULL
+        AND gone_day BETWEEN %(start)s::date AND %(end)s::date
+        GROUP BY product_id, gone_day
+    ),
+    new_by_day AS (
+        SELECT product_id, start_day AS date,
+               COUNT(*) FILTER (WHERE listing_type = 'FIXED_PRICE_ONLY') AS fixed_price_only,
+               COUNT(*) FILTER (WHERE listing_type = 'BEST_OFFER') AS best_offer,
+               COUNT(*) FILTER (WHERE listing_type = 'AUCTION') AS auction,
+               COUNT(*) FILTER (WHERE listing_type IN ('FIXED_PRICE_ONLY', 'BEST_OFFER')) AS bin_count,
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY price)
+                   FILTER (WHERE listing_type IN ('FIXED_PRICE_ONLY', 'BEST_OFFER')) AS median_bin_price
+        FROM listings
+        WHERE start_day BETWEEN %(start)s::date AND %(end)s::date
+        GROUP BY product_id, start_day
+    )
+    SELECT d.date, p.product_id,
+           COALESCE(n.fixed_price_only, 0),
+           COALESCE(n.best_offer, 0),
+           COALESCE(n.auction, 0),
+           COALESCE(b.fixed_price_only, 0)
+               + SUM(COALESCE(n.fixed_price_only, 0) - COALESCE(g.fixed_price_only, 0)) OVER running,
+           COALESCE(b.best_offer, 0)
+               + SUM(COALESCE(n.best_offer, 0) - COALESCE(g.best_offer, 0)) OVER running,
+           COALESCE(b.auction, 0)
+               + SUM(COALESCE(n.auction, 0) - COALESCE(g.auction, 0)) OVER running,
+           CASE WHEN COALESCE(n.bin_count, 0) = 0 THEN 0 ELSE n.median_bin_price END
+    FROM products p
+    CROSS JOIN days d
+    LEFT JOIN new_by_day n ON n.product_id = p.product_id AND n.date = d.date
+    LEFT JOIN gone_by_day g ON g.product_id = p.product_id AND g.date = d.date
+    LEFT JOIN active_before b ON b.product_id = p.product_id
+    WINDOW running AS (PARTITION BY p.product_id ORDER BY d.date)
+"""
+
+def supply_metrics_sql(conn):
+    """SUPPLY_METRICS_SQL over the listing history, archived listings included."""
+    return SUPPLY_METRICS_SQL.format(listings=listing_history(conn, "%(start)s::date"))
+
+def calculate_daily_supply(target_date=None, end_date=None):
     """
-    Calculates supply metrics for a given date and upserts them into daily_supply_metrics.
+    Calculates supply metrics for a given date (or every day from target_date
+    through end_date) and upserts them into daily_supply_metrics.
     Default date is today.
+
+    Aggregation and upsert run in one INSERT ... SELECT on the server, so no
+    listing rows travel to the client and memory here stays constant.
     """
     if target_date is None:
         target_date = date.today()
-    
-    print(f"Calculating supply metrics for {target_date}...")
-    
-    conn = get_db_connection()
-    
-    # We fetch ALL active listings to process in memory (pandas is efficient for this scale ~3k rows)
-    # Filter 1: Total Active Depth (Active on or before target_date)
-    # Note: Using survivor bias (current active_listings table)
-    query_active = """
-        SELECT product_id, price, buying_options, start_date 
-        FROM active_listings 
-        WHERE product_id IS NOT NULL 
-        AND is_ignored = FALSE
-    """
-    df = pd.read_sql(query_active, conn)
-    
-    # Ensure date handling
-    df['start_date'] = pd.to_datetime(df['start_date'])
-    df['start_date_only'] = df['start_date'].dt.date
-    
-    # --- logic ---
-    # 1. New Listings (start_date == target_date)
-    new_mask = (df['start_date_only'] == target_date)
-    df_new = df[new_mask].copy()
-    
-    # 2. Total Active (start_date <= target_date)
-    # (Assuming items active today provided they started before or on today)
-    active_mask = (df['start_date_only'] <= target_date)
-    df_active = df[active_mask].copy()
-    
-    # Helper to classify type
-    def get_type(options):
-        # normalize
-        opts = str(options).upper()
-        if 'AUCTION' in opts:
-            return 'AUCTION'
-        elif 'BEST_OFFER' in opts: # Fixed Price + Best Offer
-            return 'BEST_OFFER'
-        elif 'FIXED_PRICE' in opts: # Fixed Price Only (Strict)
-            return 'FIXED_PRICE_ONLY'
-        return 'UNKNOWN'
+    end_date = end_date or target_date
+
+    if end_date == target_date:
+        print(f"Calculating supply metrics for {target_date}...")
+    else:
+        print(f"Backfilling supply metrics for {target_date} through {end_date}...")
 
-    df_new['type'] = df_new['buying_options'].apply(get_type)
-    df_active['type'] = df_active['buying_options'].apply(get_type)
-    
-    # --- Aggregation ---
-    
-    # Get unique products
-    product_ids = df['product_id'].unique()
-    
-    metrics_list = []
-    
-    for pid in product_ids:
-        # Filter matches
-        new_subset = df_new[df_new['product_id'] == pid]
-        active_subset = df_active[df_active['product_id'] == pid]
-        
-        # Counts: New
-        new_counts = new_subset['type'].value_counts()
-        nc_fp = new_counts.get('FIXED_PRICE_ONLY', 0)
-        nc_bo = new_counts.get('BEST_OFFER', 0)
-        nc_au = new_counts.get('AUCTION', 0)
-        
-        # Counts: Active
-        active_counts = active_subset['type'].value_counts()
-        ta_fp = active_counts.get('FIXED_PRICE_ONLY', 0)
-        ta_bo = active_counts.get('BEST_OFFER', 0)
-        ta_au = active_counts.get('AUCTION', 0)
-        
-        # Median Price (New Fixed Price Only + Best Offer, Excluding Auctions)
-        # Filter for non-auction types
-        price_subset = new_subset[new_subset['type'].isin(['FIXED_PRICE_ONLY', 'BEST_OFFER'])]
-        median_price = 0
-        if not price_subset.empty:
-            median_price = price_subset['price'].median()
-            
-        metrics_list.append((
-            target_date, 
-            int(pid), 
-            int(nc_fp), int(nc_bo), int(nc_au),
-            int(ta_fp), int(ta_bo), int(ta_au),
-            float(median_price) if not pd.isna(median_price) else None
-        ))
-        
-    print(f"Computed metrics for {len(metrics_list)} products.")
-    
-    # --- Insert/Upsert ---
+    conn = get_db_connection()
     cur = conn.cursor()
-    
-    upsert_sql = """
-        INSERT INTO daily_supply_metrics (
-            date, product_id, 
-            new_count_fixed_price_only, new_count_best_offer, new_count_auction,
-            total_active_fixed_price_only, total_active_best_offer, total_active_auction,
-            median_new_price
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+
+    cols = ', '.join(SUPPLY_COLUMNS)
+    updates = ', '.join(f"{c} = EXCLUDED.{c}" for c in SUPPLY_COLUMNS if c not in ('date', 'product_id'))
+    upsert_sql = f"""
+        INSERT INTO daily_supply_metrics ({cols})
+        {supply_metrics_sql(conn)}
         ON CONFLICT (product_id, date) DO UPDATE SET
-            new_count_fixed_price_only = EXCLUDED.new_count_fixed_price_only,
-            new_count_best_offer = EXCLUDED.new_count_best_offer,
-            new_count_auction = EXCLUDED.new_count_auction,
-            total_active_fixed_price_only = EXCLUDED.total_active_fixed_price_only,
-            total_active_best_offer = EXCLUDED.total_active_best_offer,
-            total_active_auction = EXCLUDED.total_active_auction,
-            median_new_price = EXCLUDED.median_new_price,
+            {updates},
             updated_at = CURRENT_TIMESTAMP;
     """
-    
-    cur.executemany(upsert_sql, metrics_list)
-    conn.commit()
-    cur.close()
-    conn.close()
+
+    start = time.perf_counter()
+    try:
+        cur.execute(upsert_sql, {'start': target_date, 'end': end_date})
+        rowcount = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    print(f"Upserted {rowcount} product-day rows in {time.perf_counter() - start:.1f}s.")
     print("Database updated successfully.")
 
 if __name__ == "__main__":
-    calculate_daily_supply()
+    parser = argparse.ArgumentParser(description="Daily supply metrics from active listings")
+    parser.add_argument("--date", type=date.fromisoformat, default=None, help="Target date (default: today)")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="Backfill: first date")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="Backfill: last date (inclusive)")
+    args = parser.parse_args()
+
+    if args.start or args.end:
+        if not (args.start and args.end) or args.start > args.end:
+            parser.error("--start and --end are both required for a backfill, start <= end")
+        calculate_daily_supply(args.start, args.end)
+    else:
+        calculate_daily_supply(args.date)
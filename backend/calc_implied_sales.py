@@ -0,0 +1,163 @@
+"""
+Implied Sales
+
+refresh_listings marks a listing is_active = FALSE with disappeared_at when it
+stops showing up. This stage consumes only the disappearances since its
+watermark, classifies each as SOLD or ENDED, and upserts per-card daily
+counts and the median implied sale price into implied_sales, which
+calc_daily_price reads for its "Implied Sale" signal.
+
+Each run touches only the (product, day) keys with a new disappearance and
+recomputes them from all of that day's disappearances, so re-running (or
+rewinding with --since) is idempotent. A listing that reappears after being
+counted stays counted until its day is reprocessed.
+"""
+
+import argparse
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from database import get_db_connection, copy_upsert
+from calc_daily_price import DEFAULT_BO_DISCOUNT
+from partition_tables import listing_history
+
+STAGE = 'implied_sales'
+EPOCH = datetime(1970, 1, 1)
+
+IMPLIED_SALES_COLUMNS = ['date', 'product_id', 'sold_count', 'ended_count', 'median_sold_price']
+
+# Every listing that disappeared on a (product, day) with a disappearance in (since, until].
+# {listings} is partition_tables.listing_history(conn, ...) from the first changed day (rewinds
+# before the retention window read the archive)
+QUERY_CHANGED_DAYS = """
+    WITH changed AS (
+        SELECT DISTINCT product_id, disappeared_at::date AS day
+        FROM {listings} l
+        WHERE disappeared_at > %(since)s AND disappeared_at <= %(until)s
+        AND product_id IS NOT NULL
+    )
+    SELECT c.product_id, c.day AS date, a.disappeared_at, a.end_date, a.buying_options,
+           a.price, a.bid_count
+    FROM changed c
+    LEFT JOIN {listings} a
+      ON a.product_id = c.product_id
+     AND a.disappeared_at >= c.day AND a.disappeared_at < c.day + 1
+     AND a.is_ignored = FALSE
+"""
+
+def changed_days_sql(conn):
+    """QUERY_CHANGED_DAYS over the listing history, archived listings included."""
+    return QUERY_CHANGED_DAYS.format(listings=listing_history(conn, "%(since)s::date"))
+
+def classify_disappearances(df, bo_discount=DEFAULT_BO_DISCOUNT):
+    """
+    SOLD / ENDED per disappeared listing, plus its implied sale price.
+
+    - Auctions: sold if they had bids (the last seen price is the winning bid), else ended;
+      an auction with no recorded bid_count is neither.
+    - Fixed price / Best Offer: ended if they vanished at or after end_date (expired),
+      sold if they vanished before it (or have no end date).
+    The sale price is the last seen price, so price revisions are followed; an
+    accepted Best Offer is discounted by bo_discount from the asking
+    price. A listing with unknown buying options is neither.
+    Returns (outcome, implied_price) arrays.
+    """
+    opts = df['buying_options'].astype(str).str.upper()
+    auction = opts.str.contains('AUCTION').to_numpy()
+    best_offer = ~auction & opts.str.contains('BEST_OFFER').to_numpy()
+    fixed = ~auction & (best_offer | opts.str.contains('FIXED_PRICE').to_numpy())
+
+    gone = pd.to_datetime(df['disappeared_at'])
+    expired = (gone >= pd.to_datetime(df['end_date'])).to_numpy()  # False when end_date is missing
+    bid_count = df['bid_count'].to_numpy(dtype=float)
+    bids_known = ~np.isnan(bid_count)
+    bids = bids_known & (bid_count > 0)
+
+    outcome = np.select(
+        [auction & bids, auction & bids_known, fixed & expired, fixed],
+        ['SOLD', 'ENDED', 'ENDED', 'SOLD'], 'UNKNOWN'
+    )
+    price = df['price'].to_numpy(dtype=float)
+    implied_price = np.where(outcome == 'SOLD', np.where(best_offer, price * bo_discount, price), np.nan)
+    return outcome, implied_price
+
+def aggregate_implied_sales(df, bo_discount=DEFAULT_BO_DISCOUNT):
+    """implied_sales rows (IMPLIED_SALES_COLUMNS) per (product_id, date) of classified disappearances."""
+    listings = df[df['disappeared_at'].notna()]
+    outcome, implied_price = classify_disappearances(listings, bo_discount)
+    frame = pd.DataFrame({
+        'date': listings['date'].to_numpy(),
+        'product_id': listings['product_id'].to_numpy(dtype=int),
+        'sold': outcome == 'SOLD',
+        'ended': outcome == 'ENDED',
+        'implied_price': implied_price,
+    })
+    grouped = frame.groupby(['product_id', 'date'], sort=True)
+    rows = grouped.agg(sold_count=('sold', 'sum'), ended_count=('ended', 'sum'),
+                       median_sold_price=('implied_price', 'median')).reset_index()
+    return rows[IMPLIED_SALES_COLUMNS]
+
+def get_watermark(cur):
+    cur.execute("SELECT watermark FROM stage_watermarks WHERE stage = %s", (STAGE,))
+    row = cur.fetchone()
+    return row[0] if row else EPOCH
+
+def calc_implied_sales(since=None):
+    """
+    Classify disappearances after the stored watermark (or `since`) and upsert
+    the affected implied_sales days; then advance the watermark.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    since = since or get_watermark(cur)
+    # Fix the upper bound first so disappearances recorded during this run wait for the next one
+    cur.execute("SELECT MAX(disappeared_at) FROM active_listings WHERE disappeared_at > %s", (since,))
+    until = cur.fetchone()[0]
+    if until is None:
+        print(f"No disappearances since {since}.")
+        cur.close()
+        conn.close()
+        return
+
+    print(f"Classifying disappearances from {since} through {until}...")
+    start = time.perf_counter()
+    df = pd.read_sql(changed_days_sql(conn), conn, params={'since': since, 'until': until})
+    rows = aggregate_implied_sales(df)
+    keys = df[['product_id', 'date']].drop_duplicates()
+
+    try:
+        if len(rows):
+            copy_upsert(conn, 'implied_sales', rows, IMPLIED_SALES_COLUMNS,
+                        key=('product_id', 'date'), touch_column='updated_at')
+        # Days whose disappearances were all ignored or reappeared no longer have a row
+        empty = keys.merge(rows[['product_id', 'date']], how='left', indicator=True)
+        empty = empty[empty['_merge'] == 'left_only']
+        if len(empty):
+            cur.execute("""
+                DELETE FROM implied_sales s
+                USING unnest(%s::int[], %s::date[]) AS k(product_id, date)
+                WHERE s.product_id = k.product_id AND s.date = k.date
+            """, (empty['product_id'].astype(int).tolist(), list(empty['date'])))
+        cur.execute("""
+            INSERT INTO stage_watermarks (stage, watermark) VALUES (%s, %s)
+            ON CONFLICT (stage) DO UPDATE SET watermark = EXCLUDED.watermark, updated_at = CURRENT_TIMESTAMP
+        """, (STAGE, until))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+    print(f"  {int(rows['sold_count'].sum())} sold, {int(rows['ended_count'].sum())} ended "
+          f"over {len(keys)} card-days in {time.perf_counter() - start:.1f}s.")
+    print(f"Watermark advanced to {until}.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Implied sales from disappeared listings (incremental)")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None,
+                        help="Reprocess disappearances after this time instead of the stored watermark")
+    args = parser.parse_args()
+    calc_implied_sales(args.since)
@@ -1,54 +1,217 @@
+"""
+Daily Market Pipeline
 
-import subprocess
+Runs the daily stages in one process as a DAG. Each stage is the function its
+script's __main__ calls, imported the first time it runs, and every stage
+draws its connections from one shared pool (database.use_connection_pool).
+A stage starts as soon as the stages it runs after have finished, on a small
+thread pool: the sentinel scrape overlaps pricing and the forecast models
+update alongside the supply metrics.
+
+A checkpoint file per run date records each stage's status and wall time,
+and the run ledger (pipeline_ledger.py) keeps each stage's timing, row counts,
+API calls and peak RSS for the regression report;
+--resume skips the stages that already finished today, so a failure restarts
+from the failed stage instead of from the top. As in the sequential
+pipeline, a failed critical stage (supply metrics, price model) aborts the
+run: stages already running finish, nothing new starts. Any other failure is
+reported and its dependents still run.
+
+Usage:
+  python daily_pipeline.py
+  python daily_pipeline.py --resume
+"""
+
+import argparse
+import importlib
+import json
 import os
 import sys
-from datetime import datetime
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from datetime import date, datetime
 
 # Path helper
 BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
 SCRAPERS_DIR = os.path.join(BACKEND_DIR, '..', 'scrapers')
+sys.path.extend(p for p in (BACKEND_DIR, SCRAPERS_DIR) if p not in sys.path)
+
+from database import use_connection_pool, close_connection_pool
+from pipeline_ledger import start_run, finish_run, track_stage
+
+CHECKPOINT_DIR = os.path.join(BACKEND_DIR, 'pipeline_state')
+DEFAULT_WORKERS = 3
+CONNECTIONS_PER_WORKER = 2  # a stage may hold a second connection while it has one open
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    label: str
+    module: str
+    function: str
+    args: tuple = ()
+    after: tuple = ()
+    critical: bool = False
+
+STAGES = (
+    # 0. Partitions for the coming months (no-op until partition_tables.py migrate has run)
+    Stage('partitions', "Partition Maintenance", 'partition_tables', 'run', args=('maintain',)),
+    # 1. Daily Supply Metrics (inputs: active listings, updated by the 8am job)
+    Stage('supply', "Supply Metrics Calculation", 'calc_daily_supply', 'calculate_daily_supply',
+          after=('partitions',), critical=True),
+    # 1b. Implied Sales: classify listings that disappeared since the last run
+    Stage('implied_sales', "Implied Sales Detection", 'calc_implied_sales', 'calc_implied_sales',
+          after=('partitions',)),
+    # 2. Sentinel Assignment (reads today's supply metrics)
+    Stage('sentinels', "Sentinel Assignment", 'assign_sentinels', 'assign_sentinels', after=('supply',)),
+    # 3. Price Model
+    Stage('price', "Daily Price Model", 'calc_daily_price', 'calc_daily_price',
+          after=('supply', 'implied_sales'), critical=True),
+    # 4. Dual Forecast Models: warm-start on new sales (full retrain only on drift); reads sales only
+    Stage('model_update', "Model Update", 'train_model', 'run_update', after=('partitions',)),
+    # 5. Batch Dual Forecast (every variant -> forecasts)
+    Stage('forecasts', "Batch Forecast Scoring", 'score_forecasts', 'run_batch_scoring', after=('model_update',)),
+    # 6. Sentinel Sales (Ground Truth) for today's sentinels, alongside pricing
+    Stage('sentinel_sales', "Sentinel Sales Scraper", 'fetch_sentinel_sold', 'scrape_sentinel_sales',
+          after=('sentinels',)),
+    # 7. Validation & Reporting
+    Stage('validate', "Validation & Reporting", 'validate_model', 'validate_model',
+          after=('price', 'sentinel_sales')),
+)
+
+def _now():
+    return datetime.now().strftime('%H:%M:%S')
+
+def checkpoint_path(run_date):
+    return os.path.join(CHECKPOINT_DIR, f"daily_pipeline_{run_date}.json")
+
+def load_checkpoint(path):
+    """Stage name -> {status, started_at, seconds, error} of an earlier run, or {}."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)['stages']
 
-def run_script(script_path, label):
-    print(f"\n[{datetime.now().strftime('%H:%M:%S')}] >>> Starting {label}...")
+def save_checkpoint(path, run_date, stages):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'run_date': str(run_date), 'stages': stages}, f, indent=2)
+    os.replace(tmp, path)
+
+def check_dag(stages):
+    """Every dependency names an earlier stage, so the DAG has no cycles."""
+    seen = set()
+    for stage in stages:
+        missing = set(stage.after) - seen
+        if missing:
+            raise ValueError(f"Stage {stage.name} runs after unknown or later stages: {sorted(missing)}")
+        seen.add(stage.name)
+
+def run_stage(stage, run_id=None):
+    """Import and call one stage; returns its checkpoint record (pipeline_ledger.track_stage) instead of raising."""
+    print(f"\n[{_now()}] >>> Starting {stage.label}...")
+    with track_stage(run_id, stage.name) as record:
+        try:
+            func = getattr(importlib.import_module(stage.module), stage.function)
+            func(*stage.args)
+        except SystemExit as e:
+            # A stage that bails out like a script: non-zero is a failure, as for the subprocess it used to be
+            if e.code not in (None, 0):
+                record['error'] = f"exit status {e.code}"
+        except Exception as e:
+            traceback.print_exc()
+            record['error'] = f"{type(e).__name__}: {e}"
+
+    if record['error']:
+        print(f"[!] Error running {stage.label}: {record['error']}")
+    else:
+        print(f"[{_now()}] <<< {stage.label} Complete ({record['seconds']:.1f}s, "
+              f"{record['rows_read']} rows read, {record['rows_written']} written).")
+    return record
+
+def run_pipeline(stages=STAGES, resume=False, workers=DEFAULT_WORKERS, run_date=None):
+    """
+    Run `stages` as a DAG on `workers` threads and print each stage's wall time.
+    Returns the checkpoint records (stage name -> record); a stage that never
+    started has no record.
+    """
+    check_dag(stages)
+    run_date = run_date or date.today()
+    path = checkpoint_path(run_date)
+    records = {name: record for name, record in (load_checkpoint(path) if resume else {}).items()
+               if record['status'] == 'done'}
+    resumed = set(records)
+    if resumed:
+        print(f"Resuming: {', '.join(s.label for s in stages if s.name in resumed)} already done.")
+    finished = set(resumed)
+    pending = [s for s in stages if s.name not in finished]
+
+    start = time.perf_counter()
+    use_connection_pool(workers * CONNECTIONS_PER_WORKER)
+    run_id = start_run('daily_pipeline')
+    running = {}
+    aborted = None
     try:
-        # We use sys.executable to ensure we use the same python env
-        result = subprocess.run([sys.executable, script_path], check=True, capture_output=False)
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] <<< {label} Complete.")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"[!] Error running {label}: {e}")
-        return False
-
-def daily_pipeline():
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='stage') as executor:
+            while pending or running:
+                if aborted is None:
+                    ready = [s for s in pending if finished.issuperset(s.after)]
+                    for stage in ready:
+                        pending.remove(stage)
+                        running[executor.submit(run_stage, stage, run_id)] = stage
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    records[stage.name] = future.result()
+                    save_checkpoint(path, run_date, records)
+                    finished.add(stage.name)
+                    if records[stage.name]['status'] == 'failed' and stage.critical and aborted is None:
+                        aborted = stage
+        failed = aborted is not None or any(r['status'] == 'failed' for r in records.values())
+        finish_run(run_id, 'failed' if failed else 'done')
+    finally:
+        close_connection_pool()
+
+    if aborted is not None:
+        print(f"Pipeline Aborted at {aborted.label}. Fix it and rerun with --resume.")
+    print_timings(stages, records, resumed, time.perf_counter() - start)
+    return records
+
+def print_timings(stages, records, resumed, wall_seconds):
+    print("\nStage timings:")
+    ran = 0.0
+    for stage in stages:
+        record = records.get(stage.name)
+        if record is None:
+            print(f"  {stage.label:<30} not run")
+        elif stage.name in resumed:
+            print(f"  {stage.label:<30} done earlier ({record['seconds']:.1f}s)")
+        else:
+            ran += record['seconds']
+            print(f"  {stage.label:<30} {record['status']:<8} {record['seconds']:>8.1f}s")
+    print(f"  Wall time {wall_seconds:.1f}s (stages ran for {ran:.1f}s in total)")
+
+def daily_pipeline(resume=False, workers=DEFAULT_WORKERS):
     print("="*60)
     print(f"Starting Daily Market Pipeline at {datetime.now()}")
     print("="*60)
-    
-    # 1. Calculate Daily Supply Metrics
-    # (Inputs: Active Listings which should have been updated by 8am job)
-    if not run_script(os.path.join(BACKEND_DIR, 'calc_daily_supply.py'), "Supply Metrics Calculation"):
-        print("Pipeline Aborted at Supply Metrics.")
-        return
-
-    # 2. Run Sentinel Assignment (Refresh to ensure we track the right cards)
-    run_script(os.path.join(BACKEND_DIR, 'assign_sentinels.py'), "Sentinel Assignment")
-
-    # 3. Run Price Model
-    if not run_script(os.path.join(BACKEND_DIR, 'calc_daily_price.py'), "Daily Price Model"):
-        print("Pipeline Aborted at Price Model.")
-        return
-
-    # 4. Scrape Sentinel Sales (Ground Truth)
-    # Note: Scrapers dir needs to be in path or handled correctly
-    run_script(os.path.join(SCRAPERS_DIR, 'fetch_sentinel_sold.py'), "Sentinel Sales Scraper")
-
-    # 5. Validation & Reporting
-    # This will now generate the report artifact
-    run_script(os.path.join(BACKEND_DIR, 'validate_model.py'), "Validation & Reporting")
-    
+
+    records = run_pipeline(STAGES, resume, workers)
+
     print("\n" + "="*60)
     print("Pipeline Execution Finished.")
     print("="*60)
+    return records
 
 if __name__ == "__main__":
-    daily_pipeline()
+    parser = argparse.ArgumentParser(description="Daily market pipeline (in-process DAG)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip the stages today's checkpoint records as done")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Stages run concurrently")
+    args = parser.parse_args()
+    daily_pipeline(args.resume, args.workers)
@@ -1,23 +1,236 @@
+import io
 import os
+import threading
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+COPY_BATCH_ROWS = 100000
+POOL_TIMEOUT_S = 600  # a borrower waiting this long means a stage leaked its connection
+
+_pool = None
+_activity = threading.local()
+
+ACTIVITY_COUNTERS = ('rows_read', 'rows_written', 'api_calls')
+WRITE_VERBS = ('INSERT', 'UPDATE', 'DELETE', 'MERGE')
+
+def new_activity_counters():
+    return dict.fromkeys(ACTIVITY_COUNTERS, 0)
+
+def track_activity(counters):
+    """
+    Count this thread's database rows (CountingCursor) and API calls
+    (count_activity) into `counters` (new_activity_counters()), or stop
+    counting with None. Returns the counters that were active before.
+    """
+    previous = getattr(_activity, 'counters', None)
+    _activity.counters = counters
+    return previous
+
+def count_activity(name, n=1):
+    counters = getattr(_activity, 'counters', None)
+    if counters is not None:
+        counters[name] += n
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """
+    The cursor of every connection get_db_connection opens: rows fetched
+    count as rows_read, rows changed by INSERT / UPDATE / DELETE or loaded by
+    COPY FROM count as rows_written, toward the thread's activity counters
+    (if a pipeline stage set any). Set counting = False for staging work.
+    """
+    counting = True
+
+    def execute(self, query, vars=None):
+        super().execute(query, vars)
+        self._count_changes()
+
+    def executemany(self, query, vars_list):
+        super().executemany(query, vars_list)
+        self._count_changes()
+
+    def copy_expert(self, sql, file, size=8192):
+        super().copy_expert(sql, file, size)
+        if self.rowcount > 0:
+            self._count('rows_written' if 'FROM STDIN' in sql.upper() else 'rows_read', self.rowcount)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self._count('rows_read', 1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._count('rows_read', len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._count('rows_read', len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        self._count('rows_read', 1)
+        return row
+
+    def _count_changes(self):
+        verb = (self.statusmessage or '').split(' ', 1)[0]
+        if verb in WRITE_VERBS and self.rowcount > 0:
+            self._count('rows_written', self.rowcount)
+
+    def _count(self, name, n):
+        if self.counting:
+            count_activity(name, n)
+
+class PooledConnection:
+    """
+    A pool connection as get_db_connection hands it out: it behaves like the
+    psycopg2 connection, but close() gives it back to the pool (later close()
+    calls are no-ops) so stages written for their own connection share one.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already closed")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    @property
+    def closed(self):
+        return 1 if self._conn is None else self._conn.closed
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+class ConnectionPool:
+    """
+    Up to `size` connections shared across threads; get() blocks while they
+    are all out and raises psycopg2.pool.PoolError after `timeout` seconds.
+    """
+
+    def __init__(self, size, timeout=POOL_TIMEOUT_S):
+        self.size = size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []
+
+    def get(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise psycopg2.pool.PoolError(
+                f"no pooled connection free after {self.timeout}s ({self.size} in use)")
+        try:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None or conn.closed:
+                conn = _connect()
+            return PooledConnection(self, conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        """Roll back whatever the borrower left open and keep the connection for the next one."""
+        try:
+            if conn.closed:
+                return
+            if conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                conn.close()  # server connection lost
+                return
+            conn.reset()
+            with self._lock:
+                self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+def use_connection_pool(size, timeout=POOL_TIMEOUT_S):
+    """From now on get_db_connection() hands out connections from a shared pool of `size`."""
+    global _pool
+    _pool = ConnectionPool(size, timeout)
+    return _pool
+
+def close_connection_pool():
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.closeall()
 
 def get_db_connection():
+    if _pool is not None:
+        return _pool.get()
+    return _connect()
+
+def _connect():
     if not DATABASE_URL:
         # Fallback to local if no URL is set (safety net)
         print("Warning: DATABASE_URL not found, using local 'cardpulse'.")
-        return psycopg2.connect(database="cardpulse")
+        return psycopg2.connect(database="cardpulse", cursor_factory=CountingCursor)
     
     try:
-        return psycopg2.connect(DATABASE_URL)
+        return psycopg2.connect(DATABASE_URL, cursor_factory=CountingCursor)
     except Exception as e:
         print(f"Connection Error: {e}")
         raise e
 
+def copy_upsert(conn, table, frame, columns, key, touch_column=None):
+    """
+    COPY `frame[columns]` into a temp staging table and merge it into `table`
+    with ON CONFLICT (key) DO UPDATE, in one transaction. Re-running a load
+    replaces rows instead of duplicating them. touch_column (e.g. updated_at)
+    is set to CURRENT_TIMESTAMP on conflicting rows.
+    """
+    cols = ', '.join(columns)
+    updates = [f"{c} = EXCLUDED.{c}" for c in columns if c not in key]
+    if touch_column:
+        updates.append(f"{touch_column} = CURRENT_TIMESTAMP")
+    stage = f"{table}_stage"
+    cur = conn.cursor()
+    try:
+        cur.execute(f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT {cols} FROM {table} WITH NO DATA")
+        cur.counting = False  # the merge below counts the rows written
+        for start in range(0, len(frame), COPY_BATCH_ROWS):
+            buf = io.StringIO()
+            frame.iloc[start:start + COPY_BATCH_ROWS][columns].to_csv(
+                buf, index=False, header=False, float_format='%.4f'
+            )
+            buf.seek(0)
+            cur.copy_expert(f"COPY {stage} ({cols}) FROM STDIN WITH (FORMAT csv)", buf)
+        cur.counting = True
+        cur.execute(f"""
+            INSERT INTO {table} ({cols})
+            SELECT {cols} FROM {stage}
+            ON CONFLICT ({', '.join(key)}) DO UPDATE SET {', '.join(updates)}
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
 if __name__ == "__main__":
     try:
         conn = get_db_connection()
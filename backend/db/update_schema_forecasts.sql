@@ -0,0 +1,11 @@
+-- Batch scoring output (scrapers/score_forecasts.py): one row per variant per day
+ALTER TABLE forecasts ADD COLUMN IF NOT EXISTS grader VARCHAR(50);
+ALTER TABLE forecasts ADD COLUMN IF NOT EXISTS grade VARCHAR(20);
+ALTER TABLE forecasts ADD COLUMN IF NOT EXISTS prob_up DECIMAL(5, 4);        -- P(next sale > last sold price)
+ALTER TABLE forecasts ADD COLUMN IF NOT EXISTS last_sold_price DECIMAL(10, 2);
+ALTER TABLE forecasts ADD COLUMN IF NOT EXISTS confidence_interval_lower DECIMAL(10, 2);  -- P10 price band edge
+ALTER TABLE forecasts ADD COLUMN IF NOT EXISTS confidence_interval_upper DECIMAL(10, 2);  -- P90
+
+-- Nightly reruns delete by (forecast_date, model_version); readers look up by card
+CREATE INDEX IF NOT EXISTS idx_forecasts_date_version ON forecasts(forecast_date, model_version);
+CREATE INDEX IF NOT EXISTS idx_forecasts_pid_date ON forecasts(product_id, forecast_date);
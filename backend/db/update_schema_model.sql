@@ -27,8 +27,12 @@ CREATE TABLE IF NOT EXISTS price_history (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Index for fast retrieval of price history
-CREATE INDEX IF NOT EXISTS idx_price_hist_pid_date ON price_history(product_id, date);
+-- One estimate per card per day: calc_daily_price upserts on (product_id, date).
+-- Drop duplicates left by re-runs of the old plain INSERT (keep the latest) first.
+DELETE FROM price_history a USING price_history b
+WHERE a.product_id = b.product_id AND a.date = b.date AND a.id < b.id;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_price_hist_pid_date ON price_history(product_id, date);
+DROP INDEX IF EXISTS idx_price_hist_pid_date;  -- superseded by the unique index
 
 -- 3. Sentinel Validation Tables
 -- Flag for Sentinel Cards (Already done? Safe to run again)
@@ -18,3 +18,32 @@ CREATE TABLE IF NOT EXISTS daily_model_performance (
 ALTER TABLE price_history 
 ADD COLUMN IF NOT EXISTS actual_sold_price DECIMAL(10, 2), -- Ground Truth from Sentinel Sales
 ADD COLUMN IF NOT EXISTS error_pct DECIMAL(10, 2);         -- (Est - Actual) / Actual * 100
+
+-- 3. Pipeline Run Ledger: one row per run of daily_pipeline, daily_sync_listings, refresh_listings
+CREATE TABLE IF NOT EXISTS pipeline_runs (
+    run_id SERIAL PRIMARY KEY,
+    pipeline VARCHAR(50) NOT NULL,
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    duration_s DOUBLE PRECISION,
+    status VARCHAR(20) NOT NULL DEFAULT 'running',  -- 'running', 'done', 'failed'
+    peak_rss_mb DOUBLE PRECISION
+);
+CREATE INDEX IF NOT EXISTS idx_pipeline_runs_pipeline ON pipeline_runs(pipeline, started_at);
+
+-- 4. One row per stage of a run (pipeline_ledger.py report compares each stage with its trailing week)
+CREATE TABLE IF NOT EXISTS pipeline_stage_runs (
+    run_id INTEGER NOT NULL REFERENCES pipeline_runs(run_id) ON DELETE CASCADE,
+    stage VARCHAR(100) NOT NULL,
+    started_at TIMESTAMP NOT NULL,
+    finished_at TIMESTAMP NOT NULL,
+    duration_s DOUBLE PRECISION NOT NULL,
+    status VARCHAR(20) NOT NULL,     -- 'done', 'failed'
+    rows_read BIGINT DEFAULT 0,      -- rows fetched from the database
+    rows_written BIGINT DEFAULT 0,   -- rows inserted / updated / deleted / copied in
+    api_calls INTEGER DEFAULT 0,     -- eBay / SportsCardsPro requests
+    peak_rss_mb DOUBLE PRECISION,    -- process high-water mark when the stage ended
+    error TEXT,
+    PRIMARY KEY (run_id, stage)
+);
+CREATE INDEX IF NOT EXISTS idx_pipeline_stage_runs_stage ON pipeline_stage_runs(stage, started_at);
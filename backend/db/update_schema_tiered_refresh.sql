@@ -18,3 +18,42 @@ CREATE INDEX IF NOT EXISTS idx_listings_active ON active_listings(product_id, is
 
 -- 5. Create index for disappearance analysis
 CREATE INDEX IF NOT EXISTS idx_listings_disappeared ON active_listings(product_id, disappeared_at) WHERE disappeared_at IS NOT NULL;
+
+-- 6. Bids so far, tracked by refresh_listings for implied sales
+--    (price follows revisions and, for auctions, the current bid).
+--    No default: NULL means the API did not report a count, which
+--    calc_implied_sales classifies as UNKNOWN rather than an unsold auction.
+ALTER TABLE active_listings ADD COLUMN IF NOT EXISTS bid_count INTEGER;
+ALTER TABLE active_listings ALTER COLUMN bid_count DROP DEFAULT;
+
+-- 7. Implied sales: disappeared listings classified as sold / ended, per card per day
+--    (calc_implied_sales upserts on (product_id, date); calc_daily_price reads it)
+CREATE TABLE IF NOT EXISTS implied_sales (
+    date DATE NOT NULL,
+    product_id INTEGER NOT NULL REFERENCES cards(product_id),
+    sold_count INTEGER DEFAULT 0,
+    ended_count INTEGER DEFAULT 0,
+    median_sold_price DECIMAL(10, 2),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (product_id, date)
+);
+
+-- 8. Incremental stage watermarks (e.g. last disappeared_at consumed by calc_implied_sales)
+CREATE TABLE IF NOT EXISTS stage_watermarks (
+    stage VARCHAR(50) PRIMARY KEY,
+    watermark TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 9. Index for the watermark scan (disappearances since the last run, across cards)
+CREATE INDEX IF NOT EXISTS idx_listings_disappeared_at ON active_listings(disappeared_at) WHERE disappeared_at IS NOT NULL;
+
+-- 10. Current floor per card, kept by the listing ingest paths (product_floor.py):
+--     active, non-ignored fixed price / BIN listings only
+CREATE TABLE IF NOT EXISTS product_floor (
+    product_id INTEGER PRIMARY KEY REFERENCES cards(product_id),
+    floor_price DECIMAL(10, 2),      -- NULL when no listing is left
+    listing_count INTEGER DEFAULT 0,
+    second_price DECIMAL(10, 2),     -- next lowest price (how far the floor would move if it sold)
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
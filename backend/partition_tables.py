@@ -0,0 +1,505 @@
+"""
+Partitioned Storage & Retention
+
+    python partition_tables.py migrate   # one-off: convert the history tables to monthly partitions
+    python partition_tables.py maintain  # daily: create the coming months' partitions
+    python partition_tables.py retain    # archive old inactive listings, detach old archive partitions
+    python partition_tables.py status
+
+sales, price_history and daily_supply_metrics are range-partitioned by month on
+their date column. Indexes are created on the parent, so every partition gets
+its own (partition-local) copy, and queries bounded by date, including
+`date = (SELECT MAX(date) ...)`, only scan the matching partitions. A table
+partitioned on a column can only enforce uniqueness on keys that include that
+column. The migration adds the date column to serial primary keys (the
+sequence keeps the id unique) and to unique indexes that already include the
+date. A natural key without it, like sales' (transaction_id, source) dedupe
+key, must stay unique across all months, so it is listed in GLOBAL_KEYS and
+kept unique in a small unpartitioned key table instead (ensure_global_key);
+migrate refuses any other. A row whose month has no partition yet (or whose
+date is NULL) lands in the table's DEFAULT partition; maintain moves such rows
+into the month's partition when it creates it.
+
+active_listings keeps its global unique item_id (every ingest path upserts
+ON CONFLICT (item_id), and listing_price_changes references it), so it is not
+partitioned in place. Instead, retain moves listings that disappeared more than
+--days ago, together with their price changes, into active_listings_archive,
+which is partitioned by month of disappeared_at. Archive partitions older than
+--detach-months are detached and left as standalone tables to dump or drop.
+Supply and price backfills, the pricing sweep and implied sales rewinds read
+listings through listing_history(), which adds the archived listings that
+disappeared within the range (partition pruning keeps the archive out of daily
+runs). Detached partitions are no longer read.
+
+Every command runs in one transaction. The migration rebuilds tables and holds
+their locks until it commits, so run it during a quiet window. Grants and
+row-level security policies are not copied to the rebuilt tables.
+"""
+
+import argparse
+import re
+import time
+from datetime import date, timedelta
+from database import get_db_connection
+
+# table -> monthly range partition column
+PARTITIONED_TABLES = {
+    'sales': 'sale_date',
+    'price_history': 'date',
+    'daily_supply_metrics': 'date',
+}
+# table -> keys without the partition column that must stay unique across partitions
+GLOBAL_KEYS = {
+    'sales': [('transaction_id', 'source')],
+}
+ARCHIVE_TABLES = {
+    'active_listings': ('active_listings_archive', 'disappeared_at'),
+}
+# Listing columns the history readers use (supply, price, implied sales)
+LISTING_HISTORY_COLUMNS = [
+    'item_id', 'product_id', 'price', 'start_date', 'end_date', 'disappeared_at',
+    'buying_options', 'bid_count', 'is_ignored',
+]
+MONTHS_AHEAD = 3
+DEFAULT_RETENTION_DAYS = 180
+DEFAULT_DETACH_MONTHS = 24
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y_%m}"
+
+
+def is_partitioned(cur, table):
+    cur.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", (table,))
+    return cur.fetchone() is not None
+
+
+def table_exists(cur, table):
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+    return cur.fetchone()[0]
+
+
+def _columns(cur, table):
+    """[(name, type, not_null)] in column order."""
+    cur.execute("""
+        SELECT attname, format_type(atttypid, atttypmod), attnotnull
+        FROM pg_attribute
+        WHERE attrelid = to_regclass(%s) AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+    """, (table,))
+    return cur.fetchall()
+
+
+def _partitions(cur, parent):
+    """{partition name: its bound expression ('DEFAULT' for the default partition)}."""
+    cur.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, (parent,))
+    return dict(cur.fetchall())
+
+
+def ensure_month_partitions(cur, parent, column, first, last):
+    """
+    Monthly partitions of `parent` covering first..last (dates). Rows already in
+    the DEFAULT partition for a new month are moved into it before it is attached.
+    Returns the partitions created.
+    """
+    existing = _partitions(cur, parent)
+    default = f"{parent}_default" if f"{parent}_default" in existing else None
+    created = []
+    month = month_start(first)
+    while month <= last:
+        name = partition_name(parent, month)
+        if name not in existing:
+            upper = next_month(month)
+            cur.execute(f"CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+            if default:
+                cols = ', '.join(c[0] for c in _columns(cur, parent))
+                cur.execute(f"""
+                    WITH moved AS (
+                        DELETE FROM {default} WHERE {column} >= %s AND {column} < %s RETURNING *
+                    )
+                    INSERT INTO {name} ({cols}) SELECT {cols} FROM moved
+                """, (month, upper))
+            cur.execute(f"ALTER TABLE {parent} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                        (month, upper))
+            created.append(name)
+        month = next_month(month)
+    return created
+
+
+def _key_columns(columns_sql):
+    return tuple(c.strip() for c in columns_sql.split(','))
+
+
+def _key_with(cols, column):
+    """A PK / UNIQUE column list with the partition column appended when missing."""
+    return ', '.join(cols if column in cols else cols + (column,))
+
+
+def _serial_columns(cur, table):
+    """[(column, sequence)] for the table's serial / identity columns."""
+    cur.execute("""
+        SELECT a.attname, pg_get_serial_sequence(%s, a.attname)
+        FROM pg_attribute a
+        WHERE a.attrelid = to_regclass(%s) AND a.attnum > 0 AND NOT a.attisdropped
+        AND pg_get_serial_sequence(%s, a.attname) IS NOT NULL
+    """, (table, table, table))
+    return cur.fetchall()
+
+
+def ensure_global_key(cur, table, column, key):
+    """
+    Keep `key` (columns without the partition column) unique across every
+    partition of `table`, through the unpartitioned {table}_{key}_keys table.
+
+    A BEFORE INSERT / UPDATE trigger claims each row's key there together with
+    the row's serial id. A row whose key another row already claimed is
+    skipped, which is what the ingest paths' ON CONFLICT DO NOTHING relies on
+    (an UPDATE onto a claimed key raises unique_violation instead). A row that
+    moves to another partition keeps its claim. Keys of deleted rows stay
+    claimed, so a deleted sale is not scraped back in.
+
+    Also turns the (key, partition column) unique constraint an earlier
+    migration built into a plain lookup index.
+    """
+    serial = _serial_columns(cur, table)
+    if not serial:
+        raise ValueError(f"{table}: a global key needs a serial id column to record which row owns a key")
+    row_id = serial[0][0]
+    key_table = f"{table}_{'_'.join(key)}_keys"
+    cols = ', '.join(key)
+    types = {name: data_type for name, data_type, _ in _columns(cur, table)}
+
+    if not table_exists(cur, key_table):
+        cur.execute(f"""
+            CREATE TABLE {key_table} (
+                {', '.join(f'{c} {types[c]}' for c in key)},
+                {row_id} BIGINT NOT NULL,
+                UNIQUE ({cols})
+            )
+        """)
+        cur.execute(f"""
+            INSERT INTO {key_table} ({cols}, {row_id})
+            SELECT DISTINCT ON ({cols}) {cols}, {row_id} FROM {table}
+            WHERE {' AND '.join(f'{c} IS NOT NULL' for c in key)}
+            ORDER BY {cols}, {row_id}
+        """)
+        print(f"  {table}: {cur.rowcount} keys ({cols}) claimed in {key_table}")
+
+    new = ', '.join(f"NEW.{c}" for c in key)
+    matches = ' AND '.join(f"{c} = NEW.{c}" for c in key)
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION {key_table}_claim() RETURNS trigger AS $$
+        DECLARE
+            owner BIGINT;
+        BEGIN
+            IF TG_OP = 'UPDATE' THEN
+                IF ROW({new}) IS NOT DISTINCT FROM ROW({', '.join(f"OLD.{c}" for c in key)}) THEN
+                    RETURN NEW;
+                END IF;
+                DELETE FROM {key_table}
+                WHERE {' AND '.join(f"{c} = OLD.{c}" for c in key)} AND {row_id} = OLD.{row_id};
+            END IF;
+            INSERT INTO {key_table} ({cols}, {row_id}) VALUES ({new}, NEW.{row_id}) ON CONFLICT DO NOTHING;
+            IF FOUND THEN
+                RETURN NEW;
+            END IF;
+            SELECT {row_id} INTO owner FROM {key_table} WHERE {matches};
+            IF owner = NEW.{row_id} THEN
+                RETURN NEW;  -- the row itself, moving to another partition
+            END IF;
+            IF TG_OP = 'UPDATE' THEN
+                RAISE unique_violation USING MESSAGE = format('({cols}) already stored in {table}');
+            END IF;
+            RETURN NULL;  -- already stored: skip the row
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    cur.execute(f"DROP TRIGGER IF EXISTS {key_table}_claim ON {table}")
+    cur.execute(f"""
+        CREATE TRIGGER {key_table}_claim BEFORE INSERT OR UPDATE OF {cols} ON {table}
+        FOR EACH ROW EXECUTE FUNCTION {key_table}_claim()
+    """)
+
+    # The widened (key, column) unique constraint only ever deduped within one date
+    cur.execute("""
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u') AND pg_get_constraintdef(oid) = %s
+    """, (table, f"UNIQUE ({cols}, {column})"))
+    for (name,) in cur.fetchall():
+        cur.execute(f"ALTER TABLE {table} DROP CONSTRAINT {name}")
+        print(f"  {table}: dropped {name} UNIQUE ({cols}, {column}); {key_table} enforces ({cols})")
+    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{'_'.join(key)} ON {table} ({cols})")
+
+    cur.execute(f"""
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM {table} WHERE {' AND '.join(f'{c} IS NOT NULL' for c in key)}
+            GROUP BY {cols} HAVING COUNT(*) > 1
+        ) d
+    """)
+    duplicated = cur.fetchone()[0]
+    if duplicated:
+        print(f"  [!] {table}: {duplicated} ({cols}) keys are stored more than once; "
+              f"only the lowest {row_id} of each is claimed. Review and delete the others.")
+
+
+def migrate_table(cur, table, column, months_ahead=MONTHS_AHEAD):
+    """Rebuild `table` as a monthly range-partitioned table with the same rows, keys and indexes."""
+    if not table_exists(cur, table):
+        print(f"  {table}: not found, skipped")
+        return False
+    global_keys = GLOBAL_KEYS.get(table, [])
+    if is_partitioned(cur, table):
+        print(f"  {table}: already partitioned")
+        for key in global_keys:
+            ensure_global_key(cur, table, column, key)
+        return False
+    start = time.perf_counter()
+    columns = _columns(cur, table)
+    nullable = not dict((c[0], c[2]) for c in columns)[column]
+
+    # Keys, foreign keys and indexes to recreate on the partitioned table
+    cur.execute("""
+        SELECT conname, contype, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u', 'f')
+        ORDER BY contype DESC, conname
+    """, (table,))
+    constraints = cur.fetchall()
+    cur.execute("""
+        SELECT pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        WHERE i.indrelid = to_regclass(%s)
+        AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+    """, (table,))
+    indexes = [re.match(r'(CREATE (UNIQUE )?INDEX (\S+) ON )\S+( USING \w+ )\((.*?)\)(.*)$', row[0]).groups()
+               for row in cur.fetchall()]
+    sequences = _serial_columns(cur, table)
+    serial = {col for col, _ in sequences}
+
+    # A key without the partition column stays unique only if it is a serial id or a global key
+    keys = {name: _key_columns(re.search(r'\((.*)\)', definition).group(1))
+            for name, contype, definition in constraints if contype != 'f'}
+    keys.update((name, _key_columns(key)) for _, unique, name, _, key, _ in indexes if unique)
+    for name, key in keys.items():
+        if column not in key and not set(key) <= serial and key not in global_keys:
+            raise ValueError(f"{table}: key {name} {key} would only be unique per {column}; "
+                             f"add it to GLOBAL_KEYS")
+
+    cur.execute(f"SELECT MIN({column})::date, MAX({column})::date, COUNT(*) FROM {table}")
+    first, last, rows = cur.fetchone()
+    today = date.today()
+    first = min(first or today, today)
+    last = max(last or today, today)
+    for _ in range(months_ahead):
+        last = next_month(last)
+
+    staging = f"{table}_partitioned"
+    cur.execute(f"""
+        CREATE TABLE {staging} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+        PARTITION BY RANGE ({column})
+    """)
+    cur.execute(f"CREATE TABLE {staging}_default PARTITION OF {staging} DEFAULT")
+    month = month_start(first)
+    while month <= last:
+        cur.execute(f"CREATE TABLE {partition_name(table, month)} PARTITION OF {staging} "
+                    f"FOR VALUES FROM (%s) TO (%s)", (month, next_month(month)))
+        month = next_month(month)
+
+    cols = ', '.join(c[0] for c in columns)
+    cur.execute(f"INSERT INTO {staging} ({cols}) SELECT {cols} FROM {table}")
+    for col, sequence in sequences:
+        cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY {staging}.{col}")
+    cur.execute(f"DROP TABLE {table}")
+    cur.execute(f"ALTER TABLE {staging} RENAME TO {table}")
+    cur.execute(f"ALTER TABLE {staging}_default RENAME TO {table}_default")
+
+    # Keys on the parent (built once the rows are in, per partition)
+    for name, contype, definition in constraints:
+        if contype == 'f':
+            cur.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+            continue
+        if keys[name] in global_keys:
+            continue
+        key = _key_with(keys[name], column)
+        if contype == 'p' and not nullable:
+            cur.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} PRIMARY KEY ({key})")
+        else:
+            # A nullable partition column cannot be part of a primary key
+            cur.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE ({key})")
+    for prefix, unique, name, using, key, rest in indexes:
+        if unique and keys[name] in global_keys:
+            prefix = prefix.replace('UNIQUE ', '')  # ensure_global_key keeps it unique
+        elif unique:
+            key = _key_with(keys[name], column)
+        cur.execute(f"{prefix}{table}{using}({key}){rest}")
+    # Latest-day lookups (MAX(date) subqueries) read one partition's index
+    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table} ({column})")
+    for key in global_keys:
+        ensure_global_key(cur, table, column, key)
+
+    print(f"  {table}: {rows} rows into {len(_partitions(cur, table)) - 1} monthly partitions "
+          f"by {column} in {time.perf_counter() - start:.1f}s")
+    return True
+
+
+def maintain(cur, months_ahead=MONTHS_AHEAD):
+    """Partitions through `months_ahead` months from now for every partitioned table."""
+    today = date.today()
+    last = today
+    for _ in range(months_ahead):
+        last = next_month(last)
+    for table, column in PARTITIONED_TABLES.items():
+        if table_exists(cur, table) and is_partitioned(cur, table):
+            created = ensure_month_partitions(cur, table, column, today, last)
+            print(f"  {table}: {len(created)} partitions created" + (f" ({', '.join(created)})" if created else ""))
+
+
+def _ensure_archive(cur, source, archive, column):
+    """The partitioned archive of `source`, with any columns added to `source` since it was created."""
+    if not table_exists(cur, archive):
+        cur.execute(f"CREATE TABLE {archive} (LIKE {source} INCLUDING DEFAULTS) PARTITION BY RANGE ({column})")
+        cur.execute(f"CREATE INDEX idx_{archive}_item ON {archive} (item_id)")
+        cur.execute(f"CREATE INDEX idx_{archive}_product ON {archive} (product_id, {column})")
+    have = {c[0] for c in _columns(cur, archive)}
+    for name, data_type, _ in _columns(cur, source):
+        if name not in have:
+            cur.execute(f"ALTER TABLE {archive} ADD COLUMN {name} {data_type}")
+
+
+def listing_history(conn, since):
+    """
+    FROM-item for listing history from `since` (a SQL expression, e.g. a query
+    parameter) on: active_listings, plus the listings retain archived that
+    disappeared at or after it. Alias it in the query.
+    """
+    with conn.cursor() as cur:
+        archived = table_exists(cur, 'active_listings_archive')
+    if not archived:
+        return 'active_listings'
+    cols = ', '.join(LISTING_HISTORY_COLUMNS)
+    return f"""(
+        SELECT {cols} FROM active_listings
+        UNION ALL
+        SELECT {cols} FROM active_listings_archive WHERE disappeared_at >= {since}
+    )"""
+
+
+def retain(cur, days=DEFAULT_RETENTION_DAYS, detach_months=DEFAULT_DETACH_MONTHS):
+    """
+    Move listings inactive for more than `days` (and their logged price changes)
+    into the archive, then detach archive partitions older than `detach_months`.
+    """
+    cutoff = date.today() - timedelta(days=days)
+    for source, (archive, column) in ARCHIVE_TABLES.items():
+        if not table_exists(cur, source):
+            continue
+        cur.execute(f"SELECT MIN({column})::date, MAX({column})::date FROM {source} "
+                    f"WHERE is_active = FALSE AND {column} < %s", (cutoff,))
+        first, last = cur.fetchone()
+        _ensure_archive(cur, source, archive, column)
+        moved = 0
+        if first is not None:
+            ensure_month_partitions(cur, archive, column, first, last)
+            if table_exists(cur, 'listing_price_changes'):
+                # Price changes reference the listing, so they move first
+                if not table_exists(cur, 'listing_price_changes_archive'):
+                    cur.execute("CREATE TABLE listing_price_changes_archive (LIKE listing_price_changes)")
+                    cur.execute("CREATE INDEX idx_price_changes_archive_item ON listing_price_changes_archive (item_id)")
+                cols = ', '.join(c[0] for c in _columns(cur, 'listing_price_changes'))
+                cur.execute(f"""
+                    WITH moved AS (
+                        DELETE FROM listing_price_changes c
+                        USING {source} a
+                        WHERE c.item_id = a.item_id AND a.is_active = FALSE AND a.{column} < %s
+                        RETURNING c.*
+                    )
+                    INSERT INTO listing_price_changes_archive ({cols}) SELECT {cols} FROM moved
+                """, (cutoff,))
+            cols = ', '.join(c[0] for c in _columns(cur, source))
+            cur.execute(f"""
+                WITH moved AS (
+                    DELETE FROM {source} WHERE is_active = FALSE AND {column} < %s RETURNING *
+                )
+                INSERT INTO {archive} ({cols}) SELECT {cols} FROM moved
+            """, (cutoff,))
+            moved = cur.rowcount
+        print(f"  {source}: {moved} listings inactive since before {cutoff} archived to {archive}")
+
+        # Detach whole months older than the archive window
+        oldest_kept = month_start(date.today())
+        for _ in range(detach_months):
+            oldest_kept = month_start(oldest_kept - timedelta(days=1))
+        detached = []
+        for name in sorted(_partitions(cur, archive)):
+            month = re.search(r'_p(\d{4})_(\d{2})$', name)
+            if month and date(int(month.group(1)), int(month.group(2)), 1) < oldest_kept:
+                cur.execute(f"ALTER TABLE {archive} DETACH PARTITION {name}")
+                detached.append(name)
+        if detached:
+            print(f"  {archive}: detached {', '.join(detached)} (standalone tables; dump or drop them)")
+
+
+def status(cur):
+    for table in [*PARTITIONED_TABLES, *(a for a, _ in ARCHIVE_TABLES.values())]:
+        if not table_exists(cur, table):
+            print(f"  {table}: not found")
+        elif not is_partitioned(cur, table):
+            print(f"  {table}: not partitioned")
+        else:
+            parts = _partitions(cur, table)
+            months = sorted(n for n in parts if re.search(r'_p\d{4}_\d{2}$', n))
+            in_default = 0
+            if f"{table}_default" in parts:
+                cur.execute(f"SELECT COUNT(*) FROM {table}_default")
+                in_default = cur.fetchone()[0]
+            span = f"{months[0]} .. {months[-1]}" if months else "no monthly partitions"
+            print(f"  {table}: {len(months)} monthly partitions ({span}), {in_default} rows in DEFAULT")
+
+
+def run(command, **options):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        if command == 'migrate':
+            for table, column in PARTITIONED_TABLES.items():
+                migrate_table(cur, table, column, options.get('months_ahead', MONTHS_AHEAD))
+        elif command == 'maintain':
+            maintain(cur, options.get('months_ahead', MONTHS_AHEAD))
+        elif command == 'retain':
+            retain(cur, options.get('days', DEFAULT_RETENTION_DAYS),
+                   options.get('detach_months', DEFAULT_DETACH_MONTHS))
+        else:
+            status(cur)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monthly partitions for the history tables, listing retention")
+    parser.add_argument("command", nargs="?", default="status", choices=["migrate", "maintain", "retain", "status"])
+    parser.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD,
+                        help="Migrate/maintain: partitions created ahead of today")
+    parser.add_argument("--days", type=int, default=DEFAULT_RETENTION_DAYS,
+                        help="Retain: archive listings inactive for more than this many days")
+    parser.add_argument("--detach-months", type=int, default=DEFAULT_DETACH_MONTHS,
+                        help="Retain: detach archive partitions older than this many months")
+    args = parser.parse_args()
+    print(f"Partition tables: {args.command}")
+    run(args.command, months_ahead=args.months_ahead, days=args.days, detach_months=args.detach_months)
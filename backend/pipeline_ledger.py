@@ -0,0 +1,252 @@
+"""
+Pipeline Run Ledger
+
+Every run of daily_pipeline, daily_sync_listings and refresh_listings gets a
+pipeline_runs row, and every stage of a run a pipeline_stage_runs row:
+start / end, duration, rows read and written (counted by
+database.CountingCursor), API calls (count_api_calls at each request) and
+the process's peak RSS when the stage ended. Schema:
+db/update_schema_performance.sql (apply_performance_schema.py).
+
+The ledger never fails a job: if it cannot write (e.g. the tables do not
+exist yet) it warns once and the job carries on unrecorded.
+
+`report` compares the latest run of each stage with the median of its runs
+over the trailing week and flags it when it took more than --threshold
+longer, or moved rows more than --threshold slower. It exits 1 when a stage
+regressed or failed, so the cron wrapper can alert before the morning
+window is blown.
+
+Usage:
+  python pipeline_ledger.py report [--pipeline daily_pipeline] [--threshold 0.25]
+  python pipeline_ledger.py runs [--limit 10]
+"""
+
+import argparse
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from database import get_db_connection, new_activity_counters, track_activity, count_activity
+from stream_loader import peak_rss_mb
+
+DEFAULT_THRESHOLD = 0.25      # 25% slower than the trailing median
+TRAILING_DAYS = 7
+MIN_BASELINE_RUNS = 3         # fewer earlier runs than this: no verdict yet
+MIN_REGRESSION_SECONDS = 5.0  # a stage must also be this much slower (ignores jitter on quick stages)
+
+_unavailable = False
+
+# Latest run of every (pipeline, stage) and the medians of its successful runs in the trailing window
+QUERY_STAGE_BASELINES = """
+    WITH latest AS (
+        SELECT DISTINCT ON (r.pipeline, s.stage)
+               r.pipeline, s.stage, s.run_id, s.started_at, s.status, s.duration_s,
+               s.rows_read + s.rows_written AS rows, s.api_calls, s.peak_rss_mb
+        FROM pipeline_stage_runs s
+        JOIN pipeline_runs r USING (run_id)
+        WHERE s.started_at >= %(since)s
+        AND (%(pipeline)s IS NULL OR r.pipeline = %(pipeline)s)
+        ORDER BY r.pipeline, s.stage, s.started_at DESC
+    )
+    SELECT l.*, b.baseline_runs, b.median_duration_s, b.median_rows_per_s
+    FROM latest l
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*) AS baseline_runs,
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY s.duration_s) AS median_duration_s,
+               percentile_cont(0.5) WITHIN GROUP (
+                   ORDER BY (s.rows_read + s.rows_written) / NULLIF(s.duration_s, 0)
+               ) AS median_rows_per_s
+        FROM pipeline_stage_runs s
+        JOIN pipeline_runs r USING (run_id)
+        WHERE r.pipeline = l.pipeline AND s.stage = l.stage
+        AND s.status = 'done'
+        AND s.started_at >= l.started_at - %(days)s * INTERVAL '1 day'
+        AND s.started_at < l.started_at
+    ) b
+    ORDER BY l.pipeline, l.started_at
+"""
+
+def count_api_calls(n=1):
+    """Count n outbound API requests toward the running stage (no-op outside one)."""
+    count_activity('api_calls', n)
+
+def _write(sql, params, fetch=False):
+    """Run one ledger statement on its own connection; on any error warn once and disable the ledger."""
+    global _unavailable
+    if _unavailable:
+        return None
+    previous = track_activity(None)  # ledger bookkeeping is not stage work
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        row = cur.fetchone() if fetch else None
+        conn.commit()
+        cur.close()
+        return row
+    except Exception as e:
+        _unavailable = True
+        print(f"Warning: pipeline ledger unavailable ({e}); continuing without it.")
+        return None
+    finally:
+        if conn is not None:
+            conn.close()
+        track_activity(previous)
+
+def start_run(pipeline):
+    """New pipeline_runs row; returns its run_id (None when the ledger is unavailable)."""
+    row = _write("INSERT INTO pipeline_runs (pipeline, started_at) VALUES (%s, %s) RETURNING run_id",
+                 (pipeline, datetime.now()), fetch=True)
+    return row[0] if row else None
+
+def finish_run(run_id, status):
+    if run_id is None:
+        return
+    now = datetime.now()
+    _write("""
+        UPDATE pipeline_runs
+        SET finished_at = %s, duration_s = EXTRACT(EPOCH FROM %s - started_at), status = %s, peak_rss_mb = %s
+        WHERE run_id = %s
+    """, (now, now, status, round(peak_rss_mb(), 1), run_id))
+
+def record_stage(run_id, stage, record):
+    """Write a stage record (as track_stage fills it in) for run run_id."""
+    if run_id is None:
+        return
+    started_at = datetime.fromisoformat(record['started_at'])
+    _write("""
+        INSERT INTO pipeline_stage_runs (run_id, stage, started_at, finished_at, duration_s, status,
+                                         rows_read, rows_written, api_calls, peak_rss_mb, error)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (run_id, stage) DO UPDATE SET
+            started_at = EXCLUDED.started_at, finished_at = EXCLUDED.finished_at,
+            duration_s = EXCLUDED.duration_s, status = EXCLUDED.status,
+            rows_read = EXCLUDED.rows_read, rows_written = EXCLUDED.rows_written,
+            api_calls = EXCLUDED.api_calls, peak_rss_mb = EXCLUDED.peak_rss_mb, error = EXCLUDED.error
+    """, (run_id, stage, started_at, started_at + timedelta(seconds=record['seconds']), record['seconds'],
+          record['status'], record['rows_read'], record['rows_written'], record['api_calls'],
+          record['peak_rss_mb'], record['error']))
+
+@contextmanager
+def track_stage(run_id, stage):
+    """
+    Count the block's rows and API calls and record it as `stage` of run
+    run_id. Yields the stage record (status, started_at, seconds, error,
+    rows_read, rows_written, api_calls, peak_rss_mb), filled in when the block
+    ends; set record['error'] to mark a failure the block handled itself.
+    An exception escaping the block is recorded and re-raised.
+    """
+    record = {'error': None}
+    counters = new_activity_counters()
+    previous = track_activity(counters)
+    started_at = datetime.now()
+    start = time.perf_counter()
+    try:
+        yield record
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            record['error'] = f"exit status {e.code}"
+        raise
+    except BaseException as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        track_activity(previous)
+        record.update(counters, status='failed' if record['error'] else 'done',
+                      started_at=started_at.isoformat(timespec='seconds'),
+                      seconds=round(time.perf_counter() - start, 2), peak_rss_mb=round(peak_rss_mb(), 1))
+        record_stage(run_id, stage, record)
+
+def stage_regressions(threshold=DEFAULT_THRESHOLD, days=TRAILING_DAYS, pipeline=None, conn=None):
+    """
+    The latest run of every stage seen in the last `days` days with its
+    trailing medians and a flag: FAILED, SLOWER (duration), THROUGHPUT (rows/s),
+    or empty.
+    """
+    own = conn is None
+    conn = conn or get_db_connection()
+    try:
+        df = pd.read_sql(QUERY_STAGE_BASELINES, conn, params={
+            'since': datetime.now() - timedelta(days=days), 'days': days, 'pipeline': pipeline,
+        })
+    finally:
+        if own:
+            conn.close()
+
+    duration = df['duration_s'].astype(float)
+    rows_per_s = (df['rows'].astype(float) / duration.where(duration > 0)).fillna(0)
+    median_duration = df['median_duration_s'].astype(float)
+    median_rows_per_s = df['median_rows_per_s'].astype(float)
+    judged = (df['baseline_runs'] >= MIN_BASELINE_RUNS) & (df['status'] == 'done')
+
+    failed = (df['status'] == 'failed').to_numpy()
+    slower = (judged & (duration > median_duration * (1 + threshold))
+              & (duration - median_duration >= MIN_REGRESSION_SECONDS)).to_numpy()
+    throughput = (judged & (median_rows_per_s > 0)
+                  & (rows_per_s < median_rows_per_s * (1 - threshold))).to_numpy()
+    flags = np.char.add(np.char.add(np.where(failed, 'FAILED ', ''), np.where(slower, 'SLOWER ', '')),
+                        np.where(throughput, 'THROUGHPUT', ''))
+    df['rows_per_s'] = rows_per_s
+    df['flag'] = np.char.strip(flags)
+    return df
+
+def report(threshold=DEFAULT_THRESHOLD, days=TRAILING_DAYS, pipeline=None):
+    """Print every stage's latest run against its trailing week; returns the number flagged."""
+    df = stage_regressions(threshold, days, pipeline)
+    if df.empty:
+        print(f"No stage runs recorded in the last {days} days.")
+        return 0
+
+    print(f"Latest stage runs vs. trailing {days}-day medians (flag at {threshold:.0%}):")
+    for name, group in df.groupby('pipeline', sort=False):
+        print(f"\n{name}")
+        print(f"  {'Stage':<32} {'Status':<7} {'Secs':>8} {'Median':>8} {'Rows/s':>10} {'Median':>10} "
+              f"{'API':>5} {'RSS MB':>7}  Flag")
+        for _, row in group.iterrows():
+            median_s = f"{row['median_duration_s']:.1f}" if pd.notna(row['median_duration_s']) else '-'
+            median_tp = f"{row['median_rows_per_s']:.0f}" if pd.notna(row['median_rows_per_s']) else '-'
+            print(f"  {row['stage'][:32]:<32} {row['status']:<7} {row['duration_s']:>8.1f} {median_s:>8} "
+                  f"{row['rows_per_s']:>10.0f} {median_tp:>10} {int(row['api_calls']):>5} "
+                  f"{row['peak_rss_mb'] or 0:>7.0f}  {row['flag']}")
+
+    flagged = df[df['flag'] != '']
+    if flagged.empty:
+        print("\nNo regressions.")
+    else:
+        print(f"\n[!] {len(flagged)} stage(s) regressed or failed: "
+              f"{', '.join(flagged['pipeline'] + '/' + flagged['stage'])}")
+    return len(flagged)
+
+def recent_runs(limit=10, pipeline=None):
+    conn = get_db_connection()
+    runs = pd.read_sql("""
+        SELECT run_id, pipeline, started_at, duration_s, status, peak_rss_mb
+        FROM pipeline_runs
+        WHERE %(pipeline)s IS NULL OR pipeline = %(pipeline)s
+        ORDER BY started_at DESC
+        LIMIT %(limit)s
+    """, conn, params={'pipeline': pipeline, 'limit': limit})
+    conn.close()
+    if runs.empty:
+        print("No pipeline runs recorded.")
+        return
+    print(runs.round(1).to_string(index=False))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline run ledger: regression report and recent runs")
+    parser.add_argument("command", nargs="?", default="report", choices=["report", "runs"])
+    parser.add_argument("--pipeline", default=None, help="Only this pipeline (e.g. daily_pipeline)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Report: relative slowdown that counts as a regression")
+    parser.add_argument("--days", type=int, default=TRAILING_DAYS, help="Report: trailing window in days")
+    parser.add_argument("--limit", type=int, default=10, help="Runs: how many to list")
+    args = parser.parse_args()
+
+    if args.command == "runs":
+        recent_runs(args.limit, args.pipeline)
+    elif report(args.threshold, args.days, args.pipeline):
+        sys.exit(1)
@@ -0,0 +1,75 @@
+"""
+Product Floor
+
+product_floor holds the current floor of every card: the lowest price, the
+count and the second-lowest price of its active, non-ignored fixed price /
+BIN listings. The listing ingest paths (fetch_active_by_set,
+fetch_active_listings, refresh_listings) call refresh_product_floors() with
+the product_ids they touched before committing, so readers (calc_daily_price,
+show_estimates) get floors in O(products) instead of scanning active_listings
+with leading-wildcard LIKEs.
+
+Run this script directly to rebuild every card's floor (e.g. after the table
+is first created).
+"""
+
+import time
+from database import get_db_connection
+
+# One statement per batch: each affected product is recomputed from its active
+# listings (idx_listings_active), so a product whose listings all went away keeps
+# a row with listing_count 0 and no floor.
+REFRESH_FLOORS_SQL = """
+    INSERT INTO product_floor (product_id, floor_price, listing_count, second_price, updated_at)
+    SELECT p.product_id, f.prices[1], COALESCE(array_length(f.prices, 1), 0), f.prices[2], CURRENT_TIMESTAMP
+    FROM unnest(%s::int[]) AS p(product_id)
+    CROSS JOIN LATERAL (
+        SELECT array_agg(a.price ORDER BY a.price) AS prices
+        FROM active_listings a
+        WHERE a.product_id = p.product_id
+        AND a.is_active = TRUE
+        AND a.is_ignored = FALSE
+        AND a.price IS NOT NULL
+        AND (a.buying_options LIKE '%%FIXED_PRICE%%' OR a.buying_options LIKE '%%BIN%%')
+    ) f
+    ON CONFLICT (product_id) DO UPDATE SET
+        floor_price = EXCLUDED.floor_price,
+        listing_count = EXCLUDED.listing_count,
+        second_price = EXCLUDED.second_price,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+def affected_product_ids(cur, item_ids):
+    """product_ids the given listings currently belong to (their floors change if the listings move or reprice)."""
+    cur.execute("""
+        SELECT DISTINCT product_id FROM active_listings
+        WHERE item_id = ANY(%s) AND product_id IS NOT NULL
+    """, (list(item_ids),))
+    return {row[0] for row in cur.fetchall()}
+
+def refresh_product_floors(cur, product_ids):
+    """Recompute product_floor for product_ids in one statement; the caller commits."""
+    product_ids = sorted({int(pid) for pid in product_ids if pid is not None})
+    if product_ids:
+        cur.execute(REFRESH_FLOORS_SQL, (product_ids,))
+    return len(product_ids)
+
+def rebuild_product_floors():
+    """Recompute every card's floor."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    start = time.perf_counter()
+    try:
+        cur.execute("SELECT product_id FROM cards")
+        count = refresh_product_floors(cur, [row[0] for row in cur.fetchall()])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    print(f"Rebuilt floors for {count} cards in {time.perf_counter() - start:.1f}s.")
+
+if __name__ == "__main__":
+    rebuild_product_floors()
@@ -1,5 +1,27 @@
 from database import get_db_connection
 
+# Every listing whose price changed in the statement (NULL transitions included),
+# joined old-to-new on the primary key
+PRICE_CHANGE_TRIGGER_SQL = """
+    CREATE OR REPLACE FUNCTION log_price_changes_func() RETURNS TRIGGER AS $$
+    BEGIN
+        INSERT INTO listing_price_changes (item_id, old_price, new_price)
+        SELECT o.item_id, o.price, n.price
+        FROM old_listings o
+        JOIN new_listings n ON n.id = o.id
+        WHERE n.price IS DISTINCT FROM o.price;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS trigger_log_price_changes ON active_listings;
+    CREATE TRIGGER trigger_log_price_changes
+    AFTER UPDATE ON active_listings
+    REFERENCING OLD TABLE AS old_listings NEW TABLE AS new_listings
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION log_price_changes_func();
+"""
+
 def setup_price_history():
     conn = get_db_connection()
     cur = conn.cursor()
@@ -18,29 +40,15 @@ def setup_price_history():
     """)
     print("- listing_price_changes table created/verified.")
 
-    # 2. Create Trigger Function
-    cur.execute("""
-        CREATE OR REPLACE FUNCTION log_price_change_func() RETURNS TRIGGER AS $$
-        BEGIN
-            IF NEW.price <> OLD.price THEN
-                INSERT INTO listing_price_changes (item_id, old_price, new_price)
-                VALUES (OLD.item_id, OLD.price, NEW.price);
-            END IF;
-            RETURN NEW;
-        END;
-        $$ LANGUAGE plpgsql;
-    """)
-    print("- Trigger function 'log_price_change_func' created.")
+    # 2. Statement-level logging: one INSERT ... SELECT per UPDATE statement over its
+    #    transition tables, instead of a row-level trigger firing for every upserted listing
+    cur.execute(PRICE_CHANGE_TRIGGER_SQL)
+    print("- Statement-level trigger 'trigger_log_price_changes' attached to active_listings.")
 
-    # 3. Attach Trigger to Active Listings Table
+    # 3. Retire the row-level trigger it replaces
     cur.execute("DROP TRIGGER IF EXISTS trigger_log_price_change ON active_listings;")
-    cur.execute("""
-        CREATE TRIGGER trigger_log_price_change
-        BEFORE UPDATE ON active_listings
-        FOR EACH ROW
-        EXECUTE FUNCTION log_price_change_func();
-    """)
-    print("- Trigger 'trigger_log_price_change' attached to active_listings.")
+    cur.execute("DROP FUNCTION IF EXISTS log_price_change_func();")
+    print("- Row-level trigger 'trigger_log_price_change' removed.")
 
     conn.commit()
     cur.close()
@@ -12,10 +12,13 @@ def show_high_volume_estimates():
         c.grade, 
         ph.estimated_market_value, 
         ph.driving_factor,
-        dsm.total_active_fixed_price_only as volume
+        dsm.total_active_fixed_price_only as volume,
+        pf.floor_price,
+        pf.second_price
     FROM price_history ph
     JOIN cards c ON ph.product_id = c.product_id
     JOIN daily_supply_metrics dsm ON ph.product_id = dsm.product_id AND ph.date = dsm.date
+    LEFT JOIN product_floor pf ON ph.product_id = pf.product_id
     WHERE ph.date = (SELECT MAX(date) FROM price_history)
     ORDER BY dsm.total_active_fixed_price_only DESC
     LIMIT 5;
@@ -24,10 +27,11 @@ def show_high_volume_estimates():
     try:
         cur.execute(query)
         rows = cur.fetchall()
-        print("| Player | Grader | Grade | Est. Value | Driving Factor | Volume |")
-        print("|---|---|---|---|---|---|")
+        print("| Player | Grader | Grade | Est. Value | Driving Factor | Volume | Floor | Next Floor |")
+        print("|---|---|---|---|---|---|---|---|")
+        money = lambda v: f"${v:.2f}" if v is not None else "-"
         for r in rows:
-            print(f"| {r[0]} | {r[1]} | {r[2]} | ${r[3]:.2f} | {r[4]} | {r[5]} |")
+            print(f"| {r[0]} | {r[1]} | {r[2]} | ${r[3]:.2f} | {r[4]} | {r[5]} | {money(r[6])} | {money(r[7])} |")
     except Exception as e:
         print(f"Error: {e}")
     finally:
@@ -0,0 +1,129 @@
+"""
+Memory-lean query loading.
+
+pd.read_sql pulls the whole result set to the client as Python objects and
+then builds object / float64 columns. For the multi-year sales history that is
+several times the size of the data itself. Instead we:
+  - stream rows through a server-side (named) cursor, `chunk_size` at a time
+  - convert each chunk straight into compact typed arrays (category codes,
+    float32, int32, datetime64) and drop the Python rows
+so peak memory is roughly one chunk of Python objects plus the typed columns.
+"""
+
+import resource
+import sys
+import numpy as np
+import pandas as pd
+import psycopg2
+import psycopg2.extensions
+
+DEFAULT_CHUNK_SIZE = 50000
+
+# NUMERIC -> float at the driver level (skips building Decimal objects)
+DEC2FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values,
+    'DEC2FLOAT',
+    lambda value, cur: float(value) if value is not None else None
+)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def stream_query(conn, query, params=None, chunk_size=DEFAULT_CHUNK_SIZE, cursor_name='stream_loader'):
+    """Yield DataFrames of at most chunk_size rows from a server-side cursor."""
+    cur = conn.cursor(name=cursor_name)
+    psycopg2.extensions.register_type(DEC2FLOAT, cur)
+    cur.itersize = chunk_size
+    try:
+        cur.execute(query, params)
+        columns = None
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            if columns is None:
+                columns = [desc[0] for desc in cur.description]
+            yield pd.DataFrame.from_records(rows, columns=columns)
+    finally:
+        cur.close()
+
+
+def apply_dtypes(chunk, dtypes):
+    """Cast a raw chunk to compact dtypes ('category' columns are left as-is here)."""
+    for col, dtype in dtypes.items():
+        if dtype == 'category':
+            continue
+        if str(dtype).startswith('datetime64'):
+            chunk[col] = pd.to_datetime(chunk[col]).astype(dtype)
+        elif dtype in ('bool', 'boolean'):
+            chunk[col] = chunk[col].astype('boolean')
+        else:
+            chunk[col] = pd.to_numeric(chunk[col]).astype(dtype)
+    return chunk
+
+
+class _CategoryBuilder:
+    """Accumulates int32 category codes across chunks against a growing vocabulary."""
+
+    def __init__(self):
+        self.vocab = {}
+        self.codes = []
+
+    def add(self, values):
+        chunk_codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        mapping = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques):
+            mapping[i] = self.vocab.setdefault(value, len(self.vocab))
+        codes = np.full(len(chunk_codes), -1, dtype=np.int32)
+        present = chunk_codes >= 0
+        codes[present] = mapping[chunk_codes[present]]
+        self.codes.append(codes)
+
+    def build(self):
+        codes = np.concatenate(self.codes) if self.codes else np.empty(0, dtype=np.int32)
+        return pd.Categorical.from_codes(codes, categories=list(self.vocab))
+
+
+def read_sql_typed(conn, query, dtypes, params=None, chunk_size=DEFAULT_CHUNK_SIZE, label="query"):
+    """
+    Stream a query into a DataFrame with compact column types.
+
+    dtypes: {column: 'category' | 'float32' | 'float64' | 'int32' | 'Int32' | 'boolean' | 'datetime64[ns]'}
+            (keep money columns that are written back float64: float32 holds ~7 digits)
+            Columns not listed keep whatever pandas infers for the chunk.
+    """
+    builders = {col: _CategoryBuilder() for col, dtype in dtypes.items() if dtype == 'category'}
+    parts = {}
+    columns = None
+    n_rows = 0
+
+    for chunk in stream_query(conn, query, params, chunk_size):
+        columns = list(chunk.columns)
+        chunk = apply_dtypes(chunk, dtypes)
+        for col in columns:
+            if col in builders:
+                builders[col].add(chunk[col])
+            else:
+                parts.setdefault(col, []).append(chunk[col])
+        n_rows += len(chunk)
+
+    if columns is None:
+        print(f"  {label}: 0 rows (peak RSS {peak_rss_mb():.0f} MB)")
+        return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in dtypes.items()})
+
+    data = {}
+    for col in columns:
+        if col in builders:
+            data[col] = builders[col].build()
+        else:
+            data[col] = pd.concat(parts.pop(col), ignore_index=True)
+    df = pd.DataFrame(data, columns=columns)
+
+    mem_mb = df.memory_usage(deep=True).sum() / (1024 * 1024)
+    print(f"  {label}: {n_rows} rows, {mem_mb:.1f} MB in memory (peak RSS {peak_rss_mb():.0f} MB)")
+    return df
@@ -0,0 +1,149 @@
+"""Sweep-line reconstruction of historical supply from listing intervals.
+
+Each listing is active over [start day, disappeared day): refresh_listings
+sets disappeared_at when a listing stops showing up, so a listing that sold
+or ended no longer counts as supply from that day on. Listings that never
+disappeared are active through the last day.
+
+sweep_active() walks the days once. Daily counts come from +1 / -1 event
+histograms and a cumulative sum. Active-price order statistics (median,
+floor) come from a Fenwick tree over listings sorted by (group, price):
+each day's starts and ends are applied as one vectorized batch, and only the
+groups whose active set changed that day are re-queried; the others carry
+their values forward. Cost is O((listings + changed group-days) log listings)
+instead of re-masking every listing for every day.
+"""
+
+import numpy as np
+import pandas as pd
+
+OPEN_END = np.datetime64('9999-12-31', 'D')
+
+
+def listing_intervals(start_date, disappeared_at):
+    """[start, end) day arrays; an unknown start is NaT (never active), no disappearance is open-ended."""
+    start = pd.to_datetime(start_date).dt.normalize().to_numpy(dtype='datetime64[D]')
+    end = pd.to_datetime(disappeared_at).dt.normalize().to_numpy(dtype='datetime64[D]')
+    return start, np.where(np.isnat(end), OPEN_END, end)
+
+
+class _Fenwick:
+    """Counts over positions 1..n with vectorized batch updates and k-th element search."""
+
+    def __init__(self, n):
+        self.n = n
+        self.tree = np.zeros(n + 1, dtype=np.int64)
+        self.top = 1 << (n.bit_length() - 1) if n else 0
+
+    def add(self, pos, delta):
+        pos = np.asarray(pos, dtype=np.int64)
+        delta = np.broadcast_to(np.asarray(delta, dtype=np.int64), pos.shape)
+        while pos.size:
+            np.add.at(self.tree, pos, delta)
+            pos = pos + (pos & -pos)
+            keep = pos <= self.n
+            pos, delta = pos[keep], delta[keep]
+
+    def prefix(self, pos):
+        """Active count at positions 1..pos (pos may be 0)."""
+        pos = np.asarray(pos, dtype=np.int64).copy()
+        total = np.zeros(pos.shape, dtype=np.int64)
+        while (pos > 0).any():
+            total += np.where(pos > 0, self.tree[pos], 0)
+            pos -= pos & -pos
+        return total
+
+    def kth(self, k):
+        """Smallest position whose prefix count reaches k (k >= 1)."""
+        k = np.asarray(k, dtype=np.int64).copy()
+        pos = np.zeros(k.shape, dtype=np.int64)
+        step = self.top
+        while step:
+            nxt = pos + step
+            within = nxt <= self.n
+            value = self.tree[np.where(within, nxt, 0)]
+            go = within & (value < k)
+            pos = np.where(go, nxt, pos)
+            k = np.where(go, k - value, k)
+            step >>= 1
+        return pos + 1
+
+
+def sweep_active(start, end, price, group, days, n_groups=None, stats=('count', 'median')):
+    """
+    Per-group daily supply over `days` (a DatetimeIndex of consecutive days).
+
+    start, end: datetime64[D] interval bounds per listing (end exclusive; see listing_intervals).
+    group:      non-negative int code per listing (e.g. product index; all zeros for one series).
+    stats:      any of 'count' (active listings), 'median' (median active price, the
+                midpoint of the two middle prices for an even count) and 'min' (floor).
+    Returns {stat: (n_groups x days) array}; prices are NaN where nothing was active.
+    """
+    days = pd.DatetimeIndex(days).to_numpy(dtype='datetime64[D]')
+    n_days = len(days)
+    group = np.asarray(group, dtype=np.int64)
+    n_groups = n_groups if n_groups is not None else (int(group.max()) + 1 if len(group) else 0)
+    known = ~np.isnat(start) & (end > start)
+    # Day slot of each event: 0 = before the first day (already applied on day 0), n_days = after the last
+    start_slot = np.searchsorted(days, start, side='left')
+    end_slot = np.searchsorted(days, end, side='left')
+    live = known & (start_slot < n_days) & (end_slot > 0)
+
+    out = {}
+    if 'count' in stats:
+        flat = n_groups * (n_days + 1)
+        delta = (np.bincount(group[live] * (n_days + 1) + start_slot[live], minlength=flat)
+                 - np.bincount(group[live] * (n_days + 1) + end_slot[live], minlength=flat))
+        out['count'] = delta.reshape(n_groups, n_days + 1).cumsum(axis=1)[:, :n_days]
+
+    order_stats = [s for s in stats if s in ('median', 'min')]
+    if not order_stats:
+        return out
+
+    # Fenwick positions: listings sorted by (group, price); each group owns a contiguous block
+    price = np.asarray(price, dtype=float)
+    idx = np.flatnonzero(live & ~np.isnan(price))  # unpriced listings count as supply but have no price
+    idx = idx[np.lexsort((price[idx], group[idx]))]
+    sorted_price = price[idx]
+    sorted_group = group[idx]
+    position = np.arange(1, len(idx) + 1)
+    block_start = np.searchsorted(sorted_group, np.arange(n_groups), side='left')  # positions before the group
+    tree = _Fenwick(len(idx))
+
+    # Events per day: starts add, ends remove
+    starts_by_day = np.argsort(start_slot[idx], kind='stable')
+    start_bounds = np.searchsorted(start_slot[idx][starts_by_day], np.arange(n_days + 1), side='left')
+    ends_by_day = np.argsort(end_slot[idx], kind='stable')
+    end_bounds = np.searchsorted(end_slot[idx][ends_by_day], np.arange(n_days + 1), side='left')
+
+    for name in order_stats:
+        out[name] = np.full((n_groups, n_days), np.nan)
+    active = np.zeros(n_groups, dtype=np.int64)
+    current = {name: np.full(n_groups, np.nan) for name in order_stats}
+
+    for d in range(n_days):
+        # Slot 0 holds every start up to the first day
+        added = starts_by_day[start_bounds[d]:start_bounds[d + 1]]
+        removed = ends_by_day[end_bounds[d]:end_bounds[d + 1]]
+        if len(added):
+            tree.add(position[added], 1)
+            np.add.at(active, sorted_group[added], 1)
+        if len(removed):
+            tree.add(position[removed], -1)
+            np.add.at(active, sorted_group[removed], -1)
+
+        changed = np.unique(np.concatenate([sorted_group[added], sorted_group[removed]]))
+        if len(changed):
+            count = active[changed]
+            has = count > 0
+            base = tree.prefix(block_start[changed])
+            # k-th active price of each changed group (groups that emptied read a dummy slot)
+            kth_price = lambda k: sorted_price[np.minimum(tree.kth(base + k), len(idx)) - 1]
+            if 'min' in current:
+                current['min'][changed] = np.where(has, kth_price(1), np.nan)
+            if 'median' in current:
+                low, high = kth_price((count + 1) // 2), kth_price(count // 2 + 1)
+                current['median'][changed] = np.where(has, (low + high) / 2, np.nan)
+        for name in order_stats:
+            out[name][:, d] = current[name]
+    return out
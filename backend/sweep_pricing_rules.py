@@ -0,0 +1,250 @@
+"""
+Pricing Rule Sweep
+
+validate_model.py scores the estimates calc_daily_price already wrote; this
+script scores what the supply-velocity rules would have estimated under other
+parameters. Supply metrics, listing history, disappearances and
+sentinel_sales are loaded once and the rule inputs are built for every
+sentinel sale (rule_inputs). Then the whole shock multiplier x shock
+discount x Best Offer discount grid is evaluated with broadcasted NumPy
+operations: one (discounts x multipliers x sales) block per Best Offer
+discount, since that is the only parameter that changes the base value.
+
+Metrics match validate_model: each sale is compared with its card's estimate
+on the sale date. RMSE / MAE / bias are in dollars; MAPE and hit rate (error
+within HIT_RATE_THRESHOLD_PCT) are in percent.
+
+Usage:
+  python sweep_pricing_rules.py --start 2025-06-01 --end 2025-06-30
+  python sweep_pricing_rules.py --shock-multipliers 1.2,1.5,2 --bo-discounts 0.85 --output sweep.csv
+"""
+
+import argparse
+import time
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+from database import get_db_connection
+from calc_daily_price import (
+    QUERY_SUPPLY, SUPPLY_WINDOW_DAYS, bin_listings,
+    DEFAULT_SUPPLY_SHOCK_MULTIPLIER, DEFAULT_SHOCK_DISCOUNT, DEFAULT_BO_DISCOUNT,
+    rule_inputs, base_value, supply_shock,
+)
+from calc_implied_sales import changed_days_sql, aggregate_implied_sales
+from validate_model import HIT_RATE_THRESHOLD_PCT
+
+DEFAULT_SHOCK_MULTIPLIERS = '1.0:3.0:0.05'
+DEFAULT_SHOCK_DISCOUNTS = '0:0.30:0.01'
+DEFAULT_BO_DISCOUNTS = '0.70:1.0:0.025'
+DEFAULT_LOOKBACK_DAYS = 90
+BLOCK_CELLS = 1 << 22  # estimates per broadcast block (~32 MB per float64 temporary)
+
+METRIC_COLUMNS = ['matched', 'rmse', 'mae', 'bias', 'mape', 'hit_rate']
+GRID_COLUMNS = ['shock_multiplier', 'shock_discount', 'bo_discount']
+
+QUERY_SENTINEL_SALES = """
+    SELECT product_id, sold_date, price AS actual_price
+    FROM sentinel_sales
+    WHERE sold_date >= %s AND sold_date <= %s
+    AND price > 0
+"""
+
+def parse_grid(spec):
+    """'start:stop:step' (stop included) or 'a,b,c' -> sorted array of values."""
+    if ':' in spec:
+        lo, hi, step = (float(x) for x in spec.split(':'))
+        return np.round(np.arange(lo, hi + step / 2, step), 6)
+    return np.array(sorted(float(x) for x in spec.split(',')))
+
+def load_sweep_data(conn, start, end):
+    """Everything the sweep reads from the database, for sales from start through end."""
+    df_supply = pd.read_sql(QUERY_SUPPLY, conn, params=(start - timedelta(days=SUPPLY_WINDOW_DAYS), end))
+    listings = bin_listings(conn, start)
+    # A day either side so every disappearance dated start..end is read; the extra days never match a sale
+    disappearances = pd.read_sql(changed_days_sql(conn), conn, params={
+        'since': datetime.combine(start - timedelta(days=1), datetime.min.time()),
+        'until': datetime.combine(end + timedelta(days=1), datetime.min.time()),
+    })
+    sales = pd.read_sql(QUERY_SENTINEL_SALES, conn, params=(start, end))
+    return df_supply, listings, disappearances, sales
+
+def sale_points(df_supply, listings, disappearances, sales, start, end):
+    """
+    One row per sentinel sale with the rule inputs of its (card, sale date):
+    p_floor, p_new, v_new, v_avg. Sales of cards with no supply, listings or
+    implied sales in the range have no estimate and are dropped, as
+    validate_model's inner join drops them.
+    """
+    implied = aggregate_implied_sales(disappearances) if len(disappearances) else None
+    days, pids, p_floor, p_new, v_new, v_avg, _ = rule_inputs(df_supply, listings, start, end, implied)
+
+    sold = pd.to_datetime(sales['sold_date'])
+    pid = sales['product_id'].to_numpy()
+    day = (sold - days[0]).dt.days.to_numpy()
+    pos = np.searchsorted(pids, pid)
+    found = (pos < len(pids)) & (day >= 0) & (day < len(days))
+    if len(pids):
+        found &= pids[np.minimum(pos, len(pids) - 1)] == pid
+    idx = day[found] * len(pids) + pos[found]
+
+    points = pd.DataFrame({
+        'product_id': pid[found].astype(int),
+        'date': sold[found].dt.date.to_numpy(),
+        'actual_price': sales['actual_price'].to_numpy(dtype=float)[found],
+        'p_floor': p_floor[idx],
+        'p_new': p_new[idx],
+        'v_new': v_new[idx],
+        'v_avg': v_avg[idx],
+    })
+    return points
+
+def implied_prices(disappearances, points, bo_discounts):
+    """(len(bo_discounts) x sales) implied sale price on each sale's card-day; NaN without a sale."""
+    p_sold = np.full((len(bo_discounts), len(points)), np.nan)
+    if not len(disappearances):
+        return p_sold
+    keys = points[['product_id', 'date']]
+    for i, bo_discount in enumerate(bo_discounts):
+        rows = aggregate_implied_sales(disappearances, bo_discount)
+        rows = rows[rows['sold_count'] > 0]  # as QUERY_IMPLIED_SALES reads implied_sales
+        p_sold[i] = keys.merge(rows, on=['product_id', 'date'], how='left')['median_sold_price'].to_numpy(dtype=float)
+    return p_sold
+
+def error_sums(est, actual):
+    """Sums over the last axis of est behind validate_model's metrics; a NaN / zero estimate is not matched."""
+    matched = est > 0
+    err = np.where(matched, est - actual, 0.0)
+    pct = np.abs(err) / actual * 100
+    return {
+        'matched': matched.sum(axis=-1),
+        'sq_err': (err * err).sum(axis=-1),
+        'abs_err': np.abs(err).sum(axis=-1),
+        'err': err.sum(axis=-1),
+        'pct_err': pct.sum(axis=-1),
+        'hits': (matched & (pct <= HIT_RATE_THRESHOLD_PCT)).sum(axis=-1),
+    }
+
+def error_metrics(sums):
+    """validate_model's metrics (METRIC_COLUMNS) from error_sums."""
+    n = sums['matched']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'matched': n,
+            'rmse': np.sqrt(sums['sq_err'] / n),
+            'mae': sums['abs_err'] / n,
+            'bias': sums['err'] / n,
+            'mape': sums['pct_err'] / n,
+            'hit_rate': sums['hits'] / n * 100,
+        }
+
+def evaluate_grid(points, p_sold, shock_multipliers, shock_discounts, bo_discounts):
+    """
+    Metrics for every (shock_multiplier, shock_discount, bo_discount) combination.
+
+    p_sold is implied_prices(...) for bo_discounts. For each Best Offer
+    discount the base value is computed once. A sale that no multiplier in
+    the grid shocks keeps its base value in every combination, so it is
+    scored once. For the rest, supply_shock broadcasts a column of
+    multipliers against the sales and the discounts broadcast over that mask,
+    giving a (discounts x multipliers x sales) block of estimates. Multipliers
+    are chunked to keep a block under BLOCK_CELLS.
+    Returns one row per combination (GRID_COLUMNS + METRIC_COLUMNS).
+    """
+    multipliers = np.asarray(shock_multipliers, dtype=float)
+    discounts = np.asarray(shock_discounts, dtype=float)[:, None, None]
+    actual = points['actual_price'].to_numpy(dtype=float)
+    p_floor, p_new = points['p_floor'].to_numpy(), points['p_new'].to_numpy()
+    v_new, v_avg = points['v_new'].to_numpy(), points['v_avg'].to_numpy()
+
+    shape = (len(bo_discounts), len(multipliers), len(discounts))
+    sums = {}
+    for b, sold in enumerate(p_sold):
+        base, _, _ = base_value(p_floor, p_new, sold)
+        shockable = supply_shock(base, v_new, v_avg, multipliers.min())
+        fixed = error_sums(base[~shockable], actual[~shockable])
+        base, actual_s = base[shockable], actual[shockable]
+        v_new_s, v_avg_s = v_new[shockable], v_avg[shockable]
+        chunk = max(1, BLOCK_CELLS // max(1, len(discounts) * len(base)))
+        for m0 in range(0, len(multipliers), chunk):
+            m = multipliers[m0:m0 + chunk, None]
+            shock = supply_shock(base, v_new_s, v_avg_s, m)            # (multipliers x sales)
+            est = np.where(shock, base * (1.0 - discounts), base)     # (discounts x multipliers x sales)
+            for name, values in error_sums(est, actual_s).items():
+                sums.setdefault(name, np.zeros(shape))[b, m0:m0 + chunk, :] = values.T + fixed[name]
+
+    bo, mult, disc = np.meshgrid(bo_discounts, multipliers, discounts.ravel(), indexing='ij')
+    results = pd.DataFrame({'shock_multiplier': mult.ravel(), 'shock_discount': disc.ravel(),
+                            'bo_discount': bo.ravel()})
+    for name, values in error_metrics(sums).items():
+        results[name] = values.ravel()
+    results['matched'] = results['matched'].astype(int)
+    return results[GRID_COLUMNS + METRIC_COLUMNS]
+
+def sweep_pricing_rules(start, end, shock_multipliers, shock_discounts, bo_discounts,
+                        sort_by='rmse', top=15, output=None):
+    conn = get_db_connection()
+    print(f"Loading supply, listings, disappearances and sentinel sales for {start} through {end}...")
+    load_start = time.perf_counter()
+    df_supply, listings, disappearances, sales = load_sweep_data(conn, start, end)
+    conn.close()
+    if sales.empty:
+        print("No sentinel sales in range. Run fetch_sentinel_sold.py first.")
+        return None
+
+    points = sale_points(df_supply, listings, disappearances, sales, start, end)
+    bo_all = np.union1d(bo_discounts, [DEFAULT_BO_DISCOUNT])
+    p_sold_all = implied_prices(disappearances, points, bo_all)
+    print(f"  {len(sales)} sales, {len(points)} with rule inputs, loaded in {time.perf_counter() - load_start:.1f}s")
+    if points.empty:
+        print("No sentinel sale falls on a card-day with supply, listings or implied sales.")
+        return None
+
+    default_row = np.searchsorted(bo_all, DEFAULT_BO_DISCOUNT)
+    baseline = evaluate_grid(points, p_sold_all[[default_row]], [DEFAULT_SUPPLY_SHOCK_MULTIPLIER],
+                             [DEFAULT_SHOCK_DISCOUNT], [DEFAULT_BO_DISCOUNT])
+
+    n_combos = len(shock_multipliers) * len(shock_discounts) * len(bo_discounts)
+    print(f"Sweeping {n_combos} parameter combinations...")
+    sweep_start = time.perf_counter()
+    results = evaluate_grid(points, p_sold_all[np.searchsorted(bo_all, bo_discounts)],
+                            shock_multipliers, shock_discounts, bo_discounts)
+    elapsed = time.perf_counter() - sweep_start
+    print(f"  {elapsed:.2f}s ({n_combos / elapsed:,.0f} combinations/s, "
+          f"{n_combos * len(points) / elapsed:,.0f} estimates/s)")
+
+    ascending = sort_by not in ('hit_rate', 'matched')
+    key = results['bias'].abs() if sort_by == 'bias' else results[sort_by]
+    results = results.loc[key.sort_values(ascending=ascending, kind='stable').index].reset_index(drop=True)
+
+    pd.set_option('display.width', 160)
+    print("\nCurrent defaults:")
+    print(baseline.round(3).to_string(index=False))
+    print(f"\nTop {top} by {sort_by}:")
+    print(results.head(top).round(3).to_string(index=False))
+
+    if output:
+        results.to_csv(output, index=False)
+        print(f"\nSaved {len(results)} rows to {output}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score the supply-velocity rules over a parameter grid")
+    parser.add_argument("--start", type=date.fromisoformat, default=None,
+                        help=f"First sale date (default: {DEFAULT_LOOKBACK_DAYS} days before --end)")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="Last sale date (default: today)")
+    parser.add_argument("--shock-multipliers", type=parse_grid, default=DEFAULT_SHOCK_MULTIPLIERS,
+                        help="start:stop:step or a,b,c")
+    parser.add_argument("--shock-discounts", type=parse_grid, default=DEFAULT_SHOCK_DISCOUNTS)
+    parser.add_argument("--bo-discounts", type=parse_grid, default=DEFAULT_BO_DISCOUNTS)
+    parser.add_argument("--sort-by", choices=['rmse', 'mae', 'bias', 'mape', 'hit_rate'], default='rmse',
+                        help="bias sorts by its absolute value")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", default=None, help="Write every combination to this CSV")
+    args = parser.parse_args()
+
+    end = args.end or date.today()
+    start = args.start or end - timedelta(days=DEFAULT_LOOKBACK_DAYS)
+    if start > end:
+        parser.error("--start must be on or before --end")
+    sweep_pricing_rules(start, end, args.shock_multipliers, args.shock_discounts, args.bo_discounts,
+                        args.sort_by, args.top, args.output)
@@ -3,11 +3,19 @@ import pandas as pd
 import numpy as np
 from datetime import date
 from database import get_db_connection
+from stream_loader import read_sql_typed
+
+HIT_RATE_THRESHOLD_PCT = 15  # an estimate within 15% of the sale is a hit
 
 def validate_model():
     print("Validating Model Performance...")
     conn = get_db_connection()
-    
+    try:
+        _validate_model(conn)
+    finally:
+        conn.close()
+
+def _validate_model(conn):
     # 1. Fetch Sales (Ground Truth)
     # Filter to recent sales that might have overlapping estimates
     query_sales = """
@@ -15,18 +23,29 @@ def validate_model():
         FROM sentinel_sales
         ORDER BY sold_date DESC
     """
-    df_sales = pd.read_sql(query_sales, conn)
+    df_sales = read_sql_typed(conn, query_sales, {
+        'product_id': 'int32',
+        'sold_date': 'datetime64[ns]',
+        'actual_price': 'float64',  # money: written back to price_history, so no float32 rounding
+    }, label="sentinel_sales")
     
     if df_sales.empty:
         print("No sentinel sales found yet. Run fetch_sentinel_sold.py first.")
         return
 
-    # 2. Fetch Estimates (Model Output)
+    # 2. Fetch Estimates (Model Output) over the days with sales (prunes price_history partitions)
     query_est = """
         SELECT product_id, date, estimated_market_value as predicted_price, model_version
         FROM price_history
+        WHERE date BETWEEN %s AND %s
     """
-    df_est = pd.read_sql(query_est, conn)
+    sold_days = (df_sales['sold_date'].min().date(), df_sales['sold_date'].max().date())
+    df_est = read_sql_typed(conn, query_est, {
+        'product_id': 'int32',
+        'date': 'datetime64[ns]',
+        'predicted_price': 'float64',
+        'model_version': 'category',
+    }, params=sold_days, label="price_history")
     
     if df_est.empty:
         print("No price estimates found. Run calc_daily_price.py first.")
@@ -60,7 +79,7 @@ def validate_model():
     mape = merged['pct_error'].mean()
     
     # Hit Rate (within 15%)
-    hits = len(merged[merged['pct_error'] <= 15])
+    hits = len(merged[merged['pct_error'] <= HIT_RATE_THRESHOLD_PCT])
     hit_rate = (hits / len(merged)) * 100
     
     # Generate Report Content
@@ -80,6 +99,8 @@ def validate_model():
         report_lines.append("> [!WARNING] **High Positive Bias**: The model is consistently OVERESTIMATING prices. Consider increasing `SHOCK_DISCOUNT` or `STALENESS_DECAY`.")
     elif bias < -5:
         report_lines.append("> [!WARNING] **High Negative Bias**: The model is UNDERESTIMATING. Consider relaxing the auction exlusion or reducing Best Offer discount.")
+    if abs(bias) > 5:
+        report_lines.append("> Run `python sweep_pricing_rules.py` to score alternative shock / Best Offer settings against these sales.")
     
     if mape > 20:
         report_lines.append("> [!CAUTION] **High Error Rate**: Average error is >20%. The model may be unstable.")
@@ -141,9 +162,9 @@ def validate_model():
         update_data = []
         for _, row in merged.iterrows():
             update_data.append((
-                row['actual_price'], 
-                row['pct_error'], 
-                row['product_id'], 
+                float(row['actual_price']), 
+                float(row['pct_error']), 
+                int(row['product_id']), 
                 row['date']
             ))
             
@@ -162,10 +183,5 @@ def validate_model():
         conn.rollback()
         print(f"Error saving to DB: {e}")
 
-    conn.close()
-
-
-    conn.close()
-
 if __name__ == "__main__":
     validate_model()
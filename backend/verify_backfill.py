@@ -0,0 +1,123 @@
+import time
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+from calc_daily_price import estimate_prices, estimate_prices_range, SUPPLY_WINDOW_DAYS
+
+START, END = date(2025, 3, 1), date(2025, 5, 29)  # one quarter
+
+def make_listings(n_products, n_listings, seed=0):
+    """Synthetic active_listings rows with start dates before and through the quarter."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(START) - pd.Timedelta(days=60)
+    start_date = start + pd.to_timedelta(rng.integers(0, 160, n_listings), unit='D') \
+        + pd.to_timedelta(rng.integers(0, 86400, n_listings), unit='s')
+    gone = start_date + pd.to_timedelta(rng.integers(1, 90, n_listings), unit='D')
+    listings = pd.DataFrame({
+        'product_id': rng.integers(1, n_products + 1, n_listings),
+        'price': rng.uniform(5, 500, n_listings).round(2),
+        'buying_options': rng.choice(['FIXED_PRICE', 'FIXED_PRICE,BEST_OFFER', 'AUCTION', None], n_listings,
+                                     p=[0.5, 0.3, 0.15, 0.05]),
+        'start_date': start_date,
+        'disappeared_at': gone.where(rng.random(n_listings) < 0.5),
+    })
+    listings.loc[listings.index[::97], 'start_date'] = pd.NaT
+    return listings
+
+def classify_buying_options(options):
+    opts = options.astype(str).str.upper()
+    return np.select(
+        [opts.str.contains('AUCTION'), opts.str.contains('BEST_OFFER'), opts.str.contains('FIXED_PRICE')],
+        ['AUCTION', 'BEST_OFFER', 'FIXED_PRICE_ONLY'], 'UNKNOWN'
+    )
+
+def supply_metrics_range(df, start, end):
+    """daily_supply_metrics rows for every (day, product), as calc_daily_supply's SQL computes them."""
+    days = pd.date_range(start, end, freq='D')
+    # Products with a listing active on, or starting within, the range
+    start_day = pd.to_datetime(df['start_date']).dt.normalize()
+    gone_day = pd.to_datetime(df['disappeared_at']).dt.normalize()
+    live = (start_day <= days[-1]) & (gone_day.isna() | (gone_day >= days[0]) | (start_day >= days[0]))
+    df = df[df['product_id'].isin(df.loc[live, 'product_id'])]
+    pids, pcode = np.unique(df['product_id'].to_numpy(), return_inverse=True)
+    ltype = classify_buying_options(df['buying_options'])
+    tcode = pd.Index(['FIXED_PRICE_ONLY', 'BEST_OFFER', 'AUCTION']).get_indexer(ltype)
+    offset = (pd.to_datetime(df['start_date']).dt.normalize() - days[0]).dt.days.to_numpy()
+    slot = np.where(offset < 0, 0, offset + 1)  # 0: started before the range
+    valid = (tcode >= 0) & ~np.isnan(offset) & (slot <= len(days))
+    slot = np.where(valid, slot, 0).astype(np.int64)
+    counts = np.bincount((tcode[valid] * len(pids) + pcode[valid]) * (len(days) + 1) + slot[valid],
+                         minlength=3 * len(pids) * (len(days) + 1)).reshape(3, len(pids), len(days) + 1)
+    priced = valid & (slot > 0) & np.isin(ltype, ['FIXED_PRICE_ONLY', 'BEST_OFFER'])
+    medians = pd.Series(df['price'].to_numpy(dtype=float)[priced]).groupby([pcode[priced], slot[priced] - 1]).median()
+    median_price = np.zeros((len(pids), len(days)))
+    median_price[medians.index.get_level_values(0), medians.index.get_level_values(1)] = medians.to_numpy()
+    new = counts[:, :, 1:]
+    return pd.DataFrame({
+        'date': np.repeat(days.date, len(pids)),
+        'product_id': np.tile(pids.astype(int), len(days)),
+        'new_count_fixed_price_only': new[0].T.ravel(),
+        'new_count_best_offer': new[1].T.ravel(),
+        'median_new_price': median_price.T.ravel(),
+    })
+
+def _supply_rows(metrics):
+    """daily_supply_metrics as calc_daily_price reads it."""
+    return pd.DataFrame({
+        'date': metrics['date'],
+        'product_id': metrics['product_id'],
+        'new_count_bin': metrics['new_count_fixed_price_only'] + metrics['new_count_best_offer'],
+        'median_new_price': metrics['median_new_price'],
+    })
+
+def _bin_listings(listings):
+    return listings[np.isin(classify_buying_options(listings['buying_options']), ['FIXED_PRICE_ONLY', 'BEST_OFFER'])]
+
+def _floors_on(listings, day):
+    """Floor query as of `day`: MIN price of the listings live that day."""
+    start = pd.to_datetime(listings['start_date']).dt.normalize()
+    gone = pd.to_datetime(listings['disappeared_at']).dt.normalize()
+    live = (start.isna() | (start <= pd.Timestamp(day))) & (gone.isna() | (gone > pd.Timestamp(day)))
+    return listings[live].groupby('product_id', as_index=False)['price'].min().rename(columns={'price': 'floor_price'})
+
+def test_price_range(listings):
+    """One range pass equals a single-day estimate_prices run per day."""
+    print("TEST: Price backfill range...")
+    supply = _supply_rows(supply_metrics_range(listings, START - timedelta(days=SUPPLY_WINDOW_DAYS), END))
+    bin_listings = _bin_listings(listings)
+    prices = estimate_prices_range(supply, bin_listings, START, END)
+    assert not prices.duplicated(['product_id', 'date']).any()
+    for day in (START, START + timedelta(days=17), END):
+        window = supply[(supply['date'] >= day - timedelta(days=SUPPLY_WINDOW_DAYS)) & (supply['date'] <= day)]
+        expected = estimate_prices(window, _floors_on(bin_listings, day), day)
+        got = prices[prices['date'] == day].reset_index(drop=True)
+        pd.testing.assert_frame_equal(got, expected)
+    print(f"  {len(prices)} estimates over {prices['date'].nunique()} days")
+    print("PASS")
+
+def benchmark():
+    listings = make_listings(10000, 200000, seed=1)
+    days = pd.date_range(START, END).date
+    print(f"\nBENCHMARK: one quarter ({len(days)} days), 10k products, 200k listings")
+
+    supply = _supply_rows(supply_metrics_range(listings, START - timedelta(days=SUPPLY_WINDOW_DAYS), END))
+    bin_listings = _bin_listings(listings)
+
+    start = time.perf_counter()
+    prices = estimate_prices_range(supply, bin_listings, START, END)
+    price_s = time.perf_counter() - start
+    print(f"  backfill:   {price_s:.2f}s ({len(prices):,} estimates)")
+
+    # Day-by-day: what a loop of single-day runs computes (without the per-run DB round trips)
+    sample = days[::10]
+    start = time.perf_counter()
+    for day in sample:
+        window = supply[(supply['date'] >= day - timedelta(days=SUPPLY_WINDOW_DAYS)) & (supply['date'] <= day)]
+        estimate_prices(window, _floors_on(bin_listings, day), day)
+    per_day = (time.perf_counter() - start) / len(sample)
+    print(f"  day-by-day: {per_day:.2f}s/day -> {per_day * len(days):.1f}s for the quarter")
+
+if __name__ == "__main__":
+    test_price_range(make_listings(300, 6000))
+    benchmark()
@@ -0,0 +1,128 @@
+import io
+import time
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+from calc_daily_price import estimate_prices, upsert_price_history, PRICE_HISTORY_COLUMNS, DEFAULT_SHOCK_DISCOUNT
+
+TARGET = date(2025, 6, 1)
+
+def make_inputs(n_products, seed=0):
+    """Synthetic daily_supply_metrics window + floors shaped like calc_daily_price's queries."""
+    rng = np.random.default_rng(seed)
+    pids = np.arange(1, n_products + 1)
+    rows = []
+    for offset in range(8):
+        has_row = rng.random(n_products) < 0.6
+        n = has_row.sum()
+        rows.append(pd.DataFrame({
+            'date': TARGET - timedelta(days=7 - offset),
+            'product_id': pids[has_row],
+            'new_count_bin': rng.poisson(2 if offset < 7 else 3, n),
+            'median_new_price': np.where(rng.random(n) < 0.1, np.nan, rng.uniform(5, 500, n).round(2)),
+        }))
+    df_supply = pd.concat(rows, ignore_index=True)
+    has_floor = rng.random(n_products) < 0.8
+    df_floor = pd.DataFrame({
+        'product_id': pids[has_floor],
+        'floor_price': rng.uniform(5, 500, has_floor.sum()).round(2),
+    })
+    # Products that only ever had supply rows or only a floor
+    df_floor = pd.concat([df_floor, pd.DataFrame({'product_id': [n_products + 1], 'floor_price': [42.0]})])
+    return df_supply, df_floor
+
+def reference_loop(df_supply, df_floor, target_date, shock_multiplier=1.5):
+    """The original per-product loop (missing prices treated as no signal)."""
+    today_supply = df_supply[df_supply['date'] == target_date]
+    all_pids = set(df_floor['product_id'].unique()) | set(today_supply['product_id'].unique())
+    results = {}
+    for pid in all_pids:
+        floor_row = df_floor[df_floor['product_id'] == pid]
+        p_floor = floor_row['floor_price'].iloc[0] if not floor_row.empty else None
+        supply_rows = df_supply[df_supply['product_id'] == pid]
+        supply_today = supply_rows[supply_rows['date'] == target_date]
+        p_new = supply_today['median_new_price'].iloc[0] if not supply_today.empty else None
+        p_new = None if p_new is not None and np.isnan(p_new) else p_new
+        v_new = supply_today['new_count_bin'].iloc[0] if not supply_today.empty else 0
+        v_avg = supply_rows['new_count_bin'].mean() if not supply_rows.empty else 0
+
+        mv_est, driving_factor = None, 'None'
+        if p_floor and p_new:
+            mv_est, driving_factor = (p_new, 'New Low') if p_new < p_floor else (p_floor, 'Floor')
+        elif p_floor:
+            mv_est, driving_factor = p_floor, 'Floor (No New)'
+        elif p_new:
+            mv_est, driving_factor = p_new, 'New Only (No Floor)'
+        if mv_est and v_avg > 0 and v_new > shock_multiplier * v_avg:
+            mv_est = mv_est * (1.0 - DEFAULT_SHOCK_DISCOUNT)
+            driving_factor += ' + Shock'
+        if mv_est:
+            results[int(pid)] = (mv_est, driving_factor)
+    return results
+
+def test_matches_loop():
+    """Vectorized estimates equal the per-product loop, product for product."""
+    print("TEST: Vectorized vs loop parity...")
+    df_supply, df_floor = make_inputs(3000)
+    prices = estimate_prices(df_supply, df_floor, TARGET)
+    expected = reference_loop(df_supply, df_floor, TARGET)
+    assert set(prices['product_id']) == set(expected)
+    for pid, value, factor in prices[['product_id', 'estimated_market_value', 'driving_factor']].itertuples(index=False):
+        assert abs(value - expected[pid][0]) < 1e-9 and factor == expected[pid][1], (pid, value, factor, expected[pid])
+    assert not prices.duplicated(['product_id', 'date']).any()
+    print(f"  {len(prices)} estimates, {prices['driving_factor'].str.endswith('Shock').sum()} shocked")
+    print("PASS")
+
+class _RecordingCursor:
+    def __init__(self, log):
+        self.log = log
+    def execute(self, sql, params=None):
+        self.log.append(('execute', sql))
+    def copy_expert(self, sql, buf):
+        self.log.append(('copy', buf.read()))
+    def close(self):
+        pass
+
+class _RecordingConn:
+    def __init__(self):
+        self.log = []
+    def cursor(self):
+        return _RecordingCursor(self.log)
+    def commit(self):
+        self.log.append(('commit', None))
+    def rollback(self):
+        self.log.append(('rollback', None))
+
+def test_upsert_payload():
+    """One staged COPY merged with ON CONFLICT in a single transaction; NULLs survive the CSV."""
+    print("TEST: Upsert payload...")
+    df_supply, df_floor = make_inputs(500)
+    prices = estimate_prices(df_supply, df_floor, TARGET)
+    conn = _RecordingConn()
+    upsert_price_history(conn, prices)
+    kinds = [kind for kind, _ in conn.log]
+    assert kinds == ['execute', 'copy', 'execute', 'commit'], kinds
+    assert 'ON CONFLICT (product_id, date) DO UPDATE' in conn.log[2][1]
+    staged = pd.read_csv(io.StringIO(conn.log[1][1]), names=PRICE_HISTORY_COLUMNS)
+    assert len(staged) == len(prices)
+    assert staged['supply_shock_multiplier'].isna().sum() == prices['supply_shock_multiplier'].isna().sum()
+    print("PASS")
+
+def benchmark():
+    print("\nBENCHMARK:")
+    df_supply, df_floor = make_inputs(3000)
+    start = time.perf_counter()
+    reference_loop(df_supply, df_floor, TARGET)
+    loop_s = time.perf_counter() - start
+    print(f"  loop,       3k products: {loop_s:.2f}s")
+    for n in (3000, 100000):
+        df_supply, df_floor = make_inputs(n)
+        start = time.perf_counter()
+        prices = estimate_prices(df_supply, df_floor, TARGET)
+        print(f"  vectorized, {n // 1000}k products: {time.perf_counter() - start:.3f}s ({len(prices)} estimates)")
+
+if __name__ == "__main__":
+    test_matches_loop()
+    test_upsert_payload()
+    benchmark()
@@ -0,0 +1,130 @@
+import os
+import sys
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scrapers'))
+from database import get_db_connection
+from calc_implied_sales import classify_disappearances, aggregate_implied_sales, changed_days_sql
+from partition_tables import table_exists
+from calc_daily_price import estimate_prices, estimate_prices_range, DEFAULT_BO_DISCOUNT, SUPPLY_WINDOW_DAYS
+from verify_backfill import make_listings, supply_metrics_range, _supply_rows, _bin_listings, _floors_on
+
+def test_classification():
+    """Bids decide auctions; end_date decides fixed price / Best Offer."""
+    print("TEST: Classification rules...")
+    df = pd.DataFrame({
+        'buying_options': ['AUCTION', 'AUCTION', 'AUCTION', 'FIXED_PRICE', 'FIXED_PRICE',
+                           'FIXED_PRICE,BEST_OFFER', None],
+        'disappeared_at': pd.to_datetime(['2025-03-02 08:00'] * 7),
+        'end_date': pd.to_datetime(['2025-03-01', '2025-03-01', '2025-03-01', '2025-03-01', '2025-04-01', None, None]),
+        'price': [50.0, 40.0, 45.0, 30.0, 20.0, 100.0, 10.0],
+        'bid_count': [3, 0, np.nan, 0, np.nan, 0, 0],  # an auction without a bid count is not counted
+    })
+    outcome, implied_price = classify_disappearances(df)
+    assert list(outcome) == ['SOLD', 'ENDED', 'UNKNOWN', 'ENDED', 'SOLD', 'SOLD', 'UNKNOWN'], outcome
+    np.testing.assert_allclose(implied_price, [50.0, np.nan, np.nan, np.nan, 20.0, 100.0 * DEFAULT_BO_DISCOUNT, np.nan])
+    print("PASS")
+
+def test_aggregation():
+    """One row per (product, day); a day with only ended listings has no sale price."""
+    print("TEST: Aggregation...")
+    df = pd.DataFrame({
+        'product_id': [1, 1, 1, 2, 3],
+        'date': [date(2025, 3, 2)] * 3 + [date(2025, 3, 2), date(2025, 3, 3)],
+        'disappeared_at': pd.to_datetime(['2025-03-02 08:00'] * 4 + [None]),  # product 3: a day left with no rows
+        'end_date': pd.to_datetime([None, None, None, '2025-03-01', None]),
+        'buying_options': ['FIXED_PRICE', 'FIXED_PRICE', 'AUCTION', 'FIXED_PRICE', None],
+        'price': [10.0, 30.0, 25.0, 99.0, None],
+        'bid_count': [0, 0, 0, 0, None],
+    })
+    rows = aggregate_implied_sales(df).set_index('product_id')
+    assert list(rows.index) == [1, 2]
+    assert (rows.loc[1, 'sold_count'], rows.loc[1, 'ended_count'], rows.loc[1, 'median_sold_price']) == (2, 1, 20.0)
+    assert (rows.loc[2, 'sold_count'], rows.loc[2, 'ended_count']) == (0, 1)
+    assert np.isnan(rows.loc[2, 'median_sold_price'])
+    print("PASS")
+
+def test_prices_with_implied_sales():
+    """An implied sale drives the estimate; the range pass matches single-day runs."""
+    print("TEST: Implied Sale in calc_daily_price...")
+    start, end = date(2025, 3, 1), date(2025, 3, 20)
+    listings = make_listings(200, 4000)
+    supply = _supply_rows(supply_metrics_range(listings, start - timedelta(days=SUPPLY_WINDOW_DAYS), end))
+    bin_listings = _bin_listings(listings)
+    rng = np.random.default_rng(3)
+    implied = pd.DataFrame({
+        'date': [start + timedelta(days=int(d)) for d in rng.integers(0, 20, 300)],
+        'product_id': rng.integers(1, 260, 300),  # some products with no listings at all
+        'median_sold_price': rng.uniform(5, 500, 300).round(2),
+    }).drop_duplicates(['date', 'product_id'])
+
+    prices = estimate_prices_range(supply, bin_listings, start, end, df_implied=implied)
+    assert prices['used_implied_sales'].sum() == len(implied)
+    driven = prices[prices['used_implied_sales']].merge(implied, on=['date', 'product_id'])
+    assert len(driven) == len(implied)
+    shock = driven['driving_factor'].str.endswith('Shock')
+    assert driven['driving_factor'].str.startswith('Implied Sale').all()
+    assert (driven['signal_strength'] == 'High').all()
+    np.testing.assert_allclose(driven.loc[~shock, 'estimated_market_value'], driven.loc[~shock, 'median_sold_price'])
+
+    for day in (start, start + timedelta(days=9), end):
+        window = supply[(supply['date'] >= day - timedelta(days=SUPPLY_WINDOW_DAYS)) & (supply['date'] <= day)]
+        expected = estimate_prices(window, _floors_on(bin_listings, day), day, df_implied=implied)
+        got = prices[prices['date'] == day].reset_index(drop=True)
+        pd.testing.assert_frame_equal(got, expected)
+    print(f"  {int(prices['used_implied_sales'].sum())} of {len(prices)} estimates from implied sales")
+    print("PASS")
+
+def test_refresh_upsert_bid_counts():
+    """A bidCount the API leaves out is stored as NULL by refresh_listings and counted as neither."""
+    print("TEST: Missing bid counts through the refresh upsert...")
+    import refresh_listings
+
+    auction = {'buyingOptions': ['AUCTION'], 'price': {'value': '40.00'}, 'title': 'verify implied'}
+    listed = [
+        dict(auction, itemId='verify-implied-1', bidCount=0),
+        dict(auction, itemId='verify-implied-2'),  # no bidCount in the summary
+        dict(auction, itemId='verify-implied-3', bidCount=0),
+    ]
+    # Next refresh: 1 picked up bids, 2 still reports none, 3 is unchanged
+    seen = [dict(listed[0], bidCount=2, currentBidPrice={'value': '55.00'}), listed[1], listed[2]]
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("INSERT INTO cards (player_name, epid) VALUES ('Verify Implied', 'verify-implied') "
+                "RETURNING product_id")
+    product_id = cur.fetchone()[0]
+    conn.commit()
+    since = datetime.now()
+    try:
+        for batch in (listed, seen, []):  # insert, update, disappear
+            refresh_listings.fetch_ebay_listings_by_epid = lambda epid, batch=batch: batch
+            refresh_listings.process_card_refresh(conn, product_id, 'verify-implied', 4)
+
+        cur.execute("SELECT item_id, bid_count FROM active_listings WHERE product_id = %s ORDER BY item_id",
+                    (product_id,))
+        assert cur.fetchall() == [('verify-implied-1', 2), ('verify-implied-2', None), ('verify-implied-3', 0)]
+
+        df = pd.read_sql(changed_days_sql(conn), conn, params={'since': since, 'until': datetime.now()})
+        rows = aggregate_implied_sales(df[df['product_id'] == product_id])
+        assert len(rows) == 1
+        assert (rows.iloc[0]['sold_count'], rows.iloc[0]['ended_count']) == (1, 1)
+        assert rows.iloc[0]['median_sold_price'] == 55.0
+    finally:
+        conn.rollback()
+        if table_exists(cur, 'listing_price_changes'):  # the price trigger logged the bid
+            cur.execute("DELETE FROM listing_price_changes WHERE item_id LIKE 'verify-implied-%%'")
+        cur.execute("DELETE FROM active_listings WHERE product_id = %s", (product_id,))
+        cur.execute("DELETE FROM product_floor WHERE product_id = %s", (product_id,))
+        cur.execute("DELETE FROM cards WHERE product_id = %s", (product_id,))
+        conn.commit()
+        conn.close()
+    print("PASS")
+
+if __name__ == "__main__":
+    test_classification()
+    test_aggregation()
+    test_refresh_upsert_bid_counts()
+    test_prices_with_implied_sales()
@@ -0,0 +1,201 @@
+import re
+from datetime import date, datetime, timedelta
+import psycopg2
+import pandas as pd
+import partition_tables
+from database import get_db_connection
+from partition_tables import migrate_table, ensure_month_partitions, is_partitioned, next_month, retain
+from calc_daily_supply import supply_metrics_sql, SUPPLY_COLUMNS
+from calc_daily_price import bin_listings
+from calc_implied_sales import changed_days_sql
+
+def _plan(cur, query):
+    cur.execute("EXPLAIN (ANALYZE, COSTS OFF, TIMING OFF) " + query)
+    return '\n'.join(row[0] for row in cur.fetchall())
+
+def test_migrate(cur):
+    """Rows, keys, serial ids and ON CONFLICT survive the migration; date ranges prune."""
+    print("TEST: Migrate a history table...")
+    cur.execute("""
+        CREATE TABLE verify_history (
+            id SERIAL PRIMARY KEY,
+            product_id INTEGER NOT NULL,
+            date DATE NOT NULL,
+            value NUMERIC(10, 2)
+        );
+        CREATE UNIQUE INDEX uq_verify_history ON verify_history(product_id, date);
+        CREATE INDEX idx_verify_history_value ON verify_history(value) WHERE value > 0;
+        INSERT INTO verify_history (product_id, date, value)
+        SELECT g % 500, date '2024-01-01' + (g / 500), g % 97
+        FROM generate_series(0, 299999) g;
+    """)
+    assert migrate_table(cur, 'verify_history', 'date')
+    assert is_partitioned(cur, 'verify_history')
+    cur.execute("SELECT COUNT(*), COUNT(DISTINCT id), SUM(value) FROM verify_history")
+    assert cur.fetchone() == (300000, 300000, sum(g % 97 for g in range(300000)))
+
+    cur.execute("""
+        INSERT INTO verify_history (product_id, date, value) VALUES (1, '2024-01-01', 5)
+        ON CONFLICT (product_id, date) DO UPDATE SET value = EXCLUDED.value
+        RETURNING id
+    """)
+    assert cur.fetchone()[0] < 300000, "upsert should hit the existing row"
+    cur.execute("INSERT INTO verify_history (product_id, date) VALUES (1, '2026-01-01') RETURNING id")
+    assert cur.fetchone()[0] > 300000, "serial continues"
+
+    plan = _plan(cur, "SELECT * FROM verify_history WHERE date BETWEEN '2024-03-01' AND '2024-03-10'")
+    assert set(re.findall(r'verify_history_(p\d{4}_\d{2}|default)\b', plan)) == {'p2024_03'}, plan
+    plan = _plan(cur, "SELECT * FROM verify_history WHERE date = (SELECT MAX(date) FROM verify_history)")
+    assert 'never executed' in plan, plan
+    print("PASS")
+
+def test_default_rows_move(cur):
+    """A row written before its month's partition exists moves out of DEFAULT when it is created."""
+    print("TEST: Maintain moves DEFAULT rows...")
+    cur.execute("SELECT MAX(date) FROM verify_history")
+    far = next_month(next_month(cur.fetchone()[0]))
+    far = date(far.year + 1, far.month, 15)
+    cur.execute("INSERT INTO verify_history (product_id, date, value) VALUES (7, %s, 1)", (far,))
+    cur.execute("SELECT tableoid::regclass::text FROM verify_history WHERE date = %s", (far,))
+    assert cur.fetchone()[0] == 'verify_history_default'
+    created = ensure_month_partitions(cur, 'verify_history', 'date', far, far)
+    cur.execute("SELECT tableoid::regclass::text FROM verify_history WHERE date = %s", (far,))
+    assert cur.fetchone()[0] == created[0] == f"verify_history_p{far:%Y_%m}"
+    print("PASS")
+
+def _insert_sale(cur, txn, sale_date, source='eBay'):
+    cur.execute("""
+        INSERT INTO verify_sales (transaction_id, source, sale_date, price) VALUES (%s, %s, %s, 1)
+        ON CONFLICT DO NOTHING
+    """, (txn, source, sale_date))
+    return cur.rowcount
+
+def test_global_key(cur):
+    """A dedupe key without the date stays unique across months, NULL dates and partition moves."""
+    print("TEST: Global key across partitions...")
+    partition_tables.GLOBAL_KEYS['verify_sales'] = [('transaction_id', 'source')]
+    cur.execute("""
+        CREATE TABLE verify_sales (
+            sale_id SERIAL PRIMARY KEY,
+            transaction_id VARCHAR(100),
+            source VARCHAR(50),
+            sale_date TIMESTAMP,
+            price NUMERIC(10, 2),
+            UNIQUE (transaction_id, source)
+        );
+        INSERT INTO verify_sales (transaction_id, source, sale_date, price)
+        SELECT 'T' || g, 'eBay', timestamp '2024-01-01' + g * interval '1 hour', g
+        FROM generate_series(1, 5000) g;
+        INSERT INTO verify_sales (transaction_id, source, sale_date) VALUES ('NODATE', 'eBay', NULL);
+    """)
+    assert migrate_table(cur, 'verify_sales', 'sale_date')
+
+    assert _insert_sale(cur, 'T1', '2024-01-01 01:00') == 0, "same sale, same date"
+    assert _insert_sale(cur, 'T1', '2024-05-20') == 0, "same sale, date parsed differently"
+    assert _insert_sale(cur, 'NODATE', None) == 0, "same sale, still no date"
+    assert _insert_sale(cur, 'T1', '2024-05-20', source='SportsCardPro') == 1, "other source"
+    assert _insert_sale(cur, None, '2024-02-01') == _insert_sale(cur, None, '2024-02-01') == 1, "NULL keys never clash"
+
+    # Moving a sale to another month keeps it (and its claim)
+    cur.execute("UPDATE verify_sales SET sale_date = '2024-06-15' WHERE transaction_id = 'T2'")
+    cur.execute("SELECT COUNT(*), MIN(tableoid::regclass::text) FROM verify_sales WHERE transaction_id = 'T2'")
+    assert cur.fetchone() == (1, 'verify_sales_p2024_06')
+    assert _insert_sale(cur, 'T2', '2024-01-01 02:00') == 0
+
+    cur.execute("SAVEPOINT clash")
+    try:
+        cur.execute("UPDATE verify_sales SET transaction_id = 'T3' WHERE transaction_id = 'T4'")
+        raise AssertionError("an update onto a stored key should fail")
+    except psycopg2.errors.UniqueViolation:
+        cur.execute("ROLLBACK TO SAVEPOINT clash")
+    cur.execute("UPDATE verify_sales SET transaction_id = 'T4b' WHERE transaction_id = 'T4'")
+    assert _insert_sale(cur, 'T4', '2024-03-01') == 1, "a renamed key is released"
+    assert _insert_sale(cur, 'T4b', '2024-03-01') == 0
+    cur.execute("SELECT COUNT(*) FROM verify_sales")
+    assert cur.fetchone()[0] == 5001 + 4
+    print("PASS")
+
+def test_global_key_repair(cur):
+    """A table partitioned with the widened (key, date) constraint gets the global key on re-migrate."""
+    print("TEST: Repair a widened key...")
+    cur.execute("""
+        CREATE TABLE verify_sales_old (
+            sale_id SERIAL,
+            transaction_id VARCHAR(100),
+            source VARCHAR(50),
+            sale_date TIMESTAMP,
+            UNIQUE (transaction_id, source, sale_date)
+        ) PARTITION BY RANGE (sale_date);
+        CREATE TABLE verify_sales_old_default PARTITION OF verify_sales_old DEFAULT;
+        INSERT INTO verify_sales_old (transaction_id, source, sale_date)
+        VALUES ('A', 'eBay', '2024-01-01'), ('A', 'eBay', '2024-01-02'), ('B', 'eBay', NULL);
+    """)
+    partition_tables.GLOBAL_KEYS['verify_sales_old'] = [('transaction_id', 'source')]
+    assert not migrate_table(cur, 'verify_sales_old', 'sale_date')
+    cur.execute("SELECT COUNT(*) FROM pg_constraint WHERE conrelid = 'verify_sales_old'::regclass AND contype = 'u'")
+    assert cur.fetchone()[0] == 0
+    cur.execute("INSERT INTO verify_sales_old (transaction_id, source, sale_date) "
+                "VALUES ('A', 'eBay', '2024-01-03'), ('B', 'eBay', NULL), ('C', 'eBay', NULL) ON CONFLICT DO NOTHING")
+    assert cur.rowcount == 1
+    print("PASS")
+
+def test_local_key_refused(cur):
+    print("TEST: Natural key without the date is refused...")
+    cur.execute("CREATE TABLE verify_refused (code TEXT UNIQUE, day DATE)")
+    try:
+        migrate_table(cur, 'verify_refused', 'day')
+        raise AssertionError("migrate should refuse a key that is not in GLOBAL_KEYS")
+    except ValueError as e:
+        assert 'GLOBAL_KEYS' in str(e)
+    print("PASS")
+
+def _history_reads(conn, cur, start, end):
+    """What a supply backfill, a price backfill and an implied sales rewind from `start` read."""
+    cur.execute(supply_metrics_sql(conn), {'start': start, 'end': end})
+    supply = pd.DataFrame(cur.fetchall(), columns=SUPPLY_COLUMNS).sort_values(['date', 'product_id'])
+    listings = bin_listings(conn, start).sort_values(['product_id', 'start_date', 'price'])
+    changed = pd.read_sql(changed_days_sql(conn), conn, params={
+        'since': datetime.combine(start, datetime.min.time()), 'until': datetime.combine(end, datetime.min.time()),
+    }).sort_values(['product_id', 'date', 'disappeared_at', 'price'])
+    return [df.reset_index(drop=True) for df in (supply, listings, changed)]
+
+def test_backfill_reads_archive(conn, cur, days=90):
+    """Backfills that start before the retention cutoff read the archived listings too."""
+    print("TEST: Backfills read archived listings...")
+    # A range straddling the newest listings retain will archive
+    cur.execute("SELECT MAX(disappeared_at)::date FROM active_listings WHERE is_active = FALSE AND disappeared_at < %s",
+                (date.today() - timedelta(days=days),))
+    newest = cur.fetchone()[0]
+    if newest is None:
+        print("  SKIP: no listings old enough to archive")
+        return
+    start, end = newest - timedelta(days=10), newest + timedelta(days=10)
+    before = _history_reads(conn, cur, start, end)
+    retain(cur, days=days)
+    cur.execute("SELECT COUNT(*) FROM active_listings_archive WHERE disappeared_at >= %s", (start,))
+    archived = cur.fetchone()[0]
+    assert archived > 0
+    after = _history_reads(conn, cur, start, end)
+    for expected, actual in zip(before, after):
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    assert _plan(cur, f"SELECT * FROM {partition_tables.listing_history(conn, repr(str(date.today())))} l") \
+        .count('active_listings_archive_p') == 0, "a daily run should prune the archive"
+    print(f"  {archived} archived listings in range; {len(after[0])} supply rows, "
+          f"{len(after[1])} BIN listings, {len(after[2])} disappearances unchanged")
+    print("PASS")
+
+if __name__ == "__main__":
+    # Everything runs in one transaction that is rolled back
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        test_migrate(cur)
+        test_default_rows_move(cur)
+        test_global_key(cur)
+        test_global_key_repair(cur)
+        test_local_key_refused(cur)
+        test_backfill_reads_archive(conn, cur)
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
@@ -0,0 +1,151 @@
+import tempfile
+import threading
+import time
+from datetime import date
+
+import psycopg2.pool
+
+import daily_pipeline
+from daily_pipeline import Stage, run_pipeline, load_checkpoint, checkpoint_path
+from database import use_connection_pool, close_connection_pool, get_db_connection
+
+LOG = []
+FAIL = set()
+
+def work(name, seconds=0.2):
+    LOG.append(('start', name))
+    time.sleep(seconds)
+    if name in FAIL:
+        raise RuntimeError(f"{name} broke")
+    LOG.append(('end', name))
+
+def _stage(name, after=(), critical=False, seconds=0.2):
+    return Stage(name, name.title(), '__main__', 'work', args=(name, seconds), after=after, critical=critical)
+
+STAGES = (
+    _stage('a'),
+    _stage('b', after=('a',), critical=True, seconds=0.1),  # ends while c is still running
+    _stage('c', after=('a',)),
+    _stage('d', after=('b', 'c')),
+    _stage('e', after=('c',)),
+)
+
+def _order(event, name):
+    return LOG.index((event, name))
+
+def test_concurrency():
+    """Independent stages overlap; a stage starts only after everything it runs after has ended."""
+    print("TEST: DAG order and concurrency...")
+    LOG.clear()
+    FAIL.clear()
+    start = time.perf_counter()
+    records = run_pipeline(STAGES, workers=3)
+    wall = time.perf_counter() - start
+    assert all(r['status'] == 'done' for r in records.values()) and len(records) == 5
+    for stage in STAGES:
+        for dep in stage.after:
+            assert _order('end', dep) < _order('start', stage.name), (dep, stage.name, LOG)
+    assert _order('start', 'c') < _order('end', 'b'), "b and c should overlap"
+    assert wall < 0.9, f"{wall:.2f}s: stages ran one after another"
+    print(f"  {sum(s.args[1] for s in STAGES):.1f}s of stages in {wall:.2f}s")
+    print("PASS")
+
+def test_abort_and_resume():
+    """A critical failure stops new stages; --resume reruns only what did not finish."""
+    print("TEST: Abort and resume...")
+    LOG.clear()
+    FAIL.clear()
+    FAIL.add('b')
+    records = run_pipeline(STAGES, workers=3)
+    assert records['b']['status'] == 'failed' and 'b broke' in records['b']['error']
+    assert records['c']['status'] == 'done', "stages already running finish"
+    assert 'd' not in records and 'e' not in records, "nothing starts after a critical failure"
+    assert set(load_checkpoint(checkpoint_path(date.today()))) == {'a', 'b', 'c'}
+
+    LOG.clear()
+    FAIL.clear()
+    records = run_pipeline(STAGES, resume=True, workers=3)
+    assert sorted(name for event, name in LOG if event == 'start') == ['b', 'd', 'e'], LOG
+    assert all(r['status'] == 'done' for r in records.values()) and len(records) == 5
+    print("PASS")
+
+def test_non_critical_failure():
+    """A failed non-critical stage is reported and its dependents still run."""
+    print("TEST: Non-critical failure...")
+    LOG.clear()
+    FAIL.clear()
+    FAIL.add('c')
+    records = run_pipeline(STAGES, workers=3)
+    assert records['c']['status'] == 'failed'
+    assert records['d']['status'] == 'done' and records['e']['status'] == 'done'
+    print("PASS")
+
+def test_shared_pool():
+    """Threads share at most `size` connections; closing twice returns a connection once."""
+    print("TEST: Shared connection pool...")
+    pool = use_connection_pool(2)
+    active, peak, lock = [0], [0], threading.Lock()
+    backends, served, errors = set(), [], []
+
+    def borrow():
+        try:
+            conn = get_db_connection()
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            cur = conn.cursor()
+            cur.execute("SELECT pg_backend_pid(), pg_sleep(0.1)")
+            pid = cur.fetchone()[0]
+            cur.close()
+            with lock:
+                active[0] -= 1
+                backends.add(pid)
+                served.append(pid)
+            conn.close()
+            conn.close()
+        except Exception as e:
+            errors.append(e)
+
+    try:
+        threads = [threading.Thread(target=borrow) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors, errors
+        assert len(served) == 8 and 1 <= len(backends) <= 2, (served, backends)
+        assert peak[0] <= 2, peak
+        assert len(pool._idle) == len(backends)
+    finally:
+        close_connection_pool()
+    print(f"  8 borrowers served by {len(backends)} connections")
+    print("PASS")
+
+def test_pool_timeout():
+    """A borrower waiting longer than the pool timeout gets PoolError instead of hanging."""
+    print("TEST: Pool acquire timeout...")
+    use_connection_pool(1, timeout=0.2)
+    try:
+        held = get_db_connection()
+        try:
+            get_db_connection()
+        except psycopg2.pool.PoolError:
+            pass
+        else:
+            raise AssertionError("second borrow did not time out")
+        held.close()
+        conn = get_db_connection()  # the slot is free again
+        conn.close()
+    finally:
+        close_connection_pool()
+    print("PASS")
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as state_dir:
+        daily_pipeline.CHECKPOINT_DIR = state_dir
+        daily_pipeline.start_run = lambda pipeline: None  # keep the stub runs out of the run ledger
+        test_concurrency()
+        test_abort_and_resume()
+        test_non_critical_failure()
+    test_shared_pool()
+    test_pool_timeout()
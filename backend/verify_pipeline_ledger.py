@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+import pandas as pd
+
+from database import get_db_connection, copy_upsert
+from pipeline_ledger import (
+    start_run, finish_run, record_stage, track_stage, count_api_calls, stage_regressions,
+)
+
+PIPELINE = 'verify_ledger'
+
+def _cleanup():
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM pipeline_runs WHERE pipeline = %s", (PIPELINE,))
+    conn.commit()
+    conn.close()
+
+def _stage_row(run_id, stage):
+    conn = get_db_connection()
+    row = pd.read_sql("SELECT * FROM pipeline_stage_runs WHERE run_id = %s AND stage = %s",
+                      conn, params=(run_id, stage)).iloc[0]
+    conn.close()
+    return row
+
+def test_counts():
+    """track_stage records the rows a stage read and wrote and the API calls it made."""
+    print("TEST: Stage row and API call counts...")
+    run_id = start_run(PIPELINE)
+    assert run_id is not None, "ledger tables missing (run apply_performance_schema.py)"
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("CREATE TEMP TABLE verify_counts (id INTEGER PRIMARY KEY, price NUMERIC)")
+    with track_stage(run_id, 'counts') as record:
+        cur.execute("INSERT INTO verify_counts SELECT g, g FROM generate_series(1, 10) g")
+        cur.executemany("INSERT INTO verify_counts VALUES (%s, %s)", [(i, i) for i in range(11, 16)])
+        cur.execute("UPDATE verify_counts SET price = price * 2 WHERE id <= 3")
+        cur.execute("SELECT * FROM verify_counts")
+        cur.fetchone()
+        cur.fetchmany(4)
+        cur.fetchall()
+        # 20 rows through COPY + merge: 10 updates, 10 inserts, staging not counted twice
+        copy_upsert(conn, 'verify_counts', pd.DataFrame({'id': range(6, 26), 'price': 1.0}),
+                    ['id', 'price'], ['id'])
+        cur.execute("SELECT id FROM verify_counts WHERE id > 20")
+        assert sum(1 for _ in cur) == 5
+        count_api_calls()
+        count_api_calls(2)
+    conn.close()
+    assert record['status'] == 'done', record
+    assert record['rows_written'] == 10 + 5 + 3 + 20, record
+    assert record['rows_read'] == 15 + 5, record
+    assert record['api_calls'] == 3, record
+
+    row = _stage_row(run_id, 'counts')
+    assert (row['rows_read'], row['rows_written'], row['api_calls']) == (20, 38, 3), row
+    print(f"  {row['rows_read']} read, {row['rows_written']} written, {row['api_calls']} API calls")
+    print("PASS")
+
+def test_failure_recorded():
+    """An exception escaping a stage is recorded as its failure and re-raised."""
+    print("TEST: Failed stage...")
+    run_id = start_run(PIPELINE)
+    try:
+        with track_stage(run_id, 'broken'):
+            raise RuntimeError("no listings")
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("track_stage swallowed the exception")
+    finish_run(run_id, 'failed')
+    row = _stage_row(run_id, 'broken')
+    assert row['status'] == 'failed' and row['error'] == 'RuntimeError: no listings', row
+    print("PASS")
+
+def test_regressions():
+    """The latest run of each stage is flagged against the median of its trailing week."""
+    print("TEST: Regression flags...")
+    _cleanup()
+    now = datetime.now()
+
+    def stage_run(days_ago, stage, seconds, rows, status='done'):
+        run_id = start_run(PIPELINE)
+        record_stage(run_id, stage, {
+            'started_at': (now - timedelta(days=days_ago)).isoformat(timespec='seconds'),
+            'seconds': seconds, 'status': status, 'rows_read': rows, 'rows_written': 0,
+            'api_calls': 0, 'peak_rss_mb': 100.0, 'error': None if status == 'done' else 'boom',
+        })
+
+    for days_ago, seconds in ((6, 60), (5, 62), (4, 58), (3, 61), (2, 90), (12, 1)):
+        # one slow outlier in the week, one run outside it
+        for stage in ('steady', 'slow', 'thin', 'broken', 'new'):
+            if stage != 'new' or days_ago == 2:
+                stage_run(days_ago + 0.5, stage, seconds, seconds * 1000)
+    stage_run(0, 'steady', 66, 66000)     # 10% slower: within the threshold
+    stage_run(0, 'slow', 80, 80000)       # 33% slower
+    stage_run(0, 'thin', 60, 30000)       # same time, half the rows/s
+    stage_run(0, 'broken', 10, 0, 'failed')
+    stage_run(0, 'new', 500, 0)           # one earlier run: no verdict yet
+
+    df = stage_regressions(pipeline=PIPELINE).set_index('stage')
+    flags = df['flag'].to_dict()
+    assert flags == {'steady': '', 'slow': 'SLOWER', 'thin': 'THROUGHPUT', 'broken': 'FAILED', 'new': ''}, flags
+    assert df.loc['steady', 'baseline_runs'] == 5 and df.loc['steady', 'median_duration_s'] == 61, df
+    assert df.loc['new', 'baseline_runs'] == 1, df
+    assert (stage_regressions(threshold=0.5, pipeline=PIPELINE)['flag'] == 'FAILED').sum() == 1
+    print("PASS")
+
+if __name__ == "__main__":
+    _cleanup()
+    try:
+        test_counts()
+        test_failure_recorded()
+        test_regressions()
+    finally:
+        _cleanup()
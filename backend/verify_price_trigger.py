@@ -1,6 +1,46 @@
 from database import get_db_connection
+from setup_price_history import PRICE_CHANGE_TRIGGER_SQL
+import argparse
 import time
 
+# The row-level trigger the statement-level one replaced (benchmark baseline)
+ROW_TRIGGER_SQL = """
+    CREATE OR REPLACE FUNCTION log_price_change_func() RETURNS TRIGGER AS $$
+    BEGIN
+        IF NEW.price <> OLD.price THEN
+            INSERT INTO listing_price_changes (item_id, old_price, new_price)
+            VALUES (OLD.item_id, OLD.price, NEW.price);
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER trigger_log_price_change
+    BEFORE UPDATE ON active_listings
+    FOR EACH ROW
+    EXECUTE FUNCTION log_price_change_func();
+"""
+
+# A set sync's upsert of existing listings: every other one repriced
+BULK_UPSERT_SQL = """
+    INSERT INTO active_listings (item_id, price, updated_at)
+    SELECT item_id, CASE WHEN id %% 2 = 0 THEN price + 1 ELSE price END, CURRENT_TIMESTAMP
+    FROM active_listings
+    WHERE price IS NOT NULL
+    ORDER BY id
+    LIMIT %s
+    ON CONFLICT (item_id) DO UPDATE SET
+        price = EXCLUDED.price,
+        updated_at = CURRENT_TIMESTAMP
+"""
+ROW_UPSERT_SQL = """
+    INSERT INTO active_listings (item_id, price, updated_at)
+    VALUES (%s, %s, CURRENT_TIMESTAMP)
+    ON CONFLICT (item_id) DO UPDATE SET
+        price = EXCLUDED.price,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
 def verify_trigger():
     conn = get_db_connection()
     cur = conn.cursor()
@@ -48,5 +88,67 @@ def verify_trigger():
 
     conn.close()
 
+def _timed_upserts(cur, trigger_sql, n_bulk, rows):
+    """One variant in the current transaction: (bulk rows, bulk s, bulk logged, single-row s, single-row logged)."""
+    cur.execute("DROP TRIGGER IF EXISTS trigger_log_price_change ON active_listings;")
+    cur.execute("DROP TRIGGER IF EXISTS trigger_log_price_changes ON active_listings;")
+    if trigger_sql:
+        cur.execute(trigger_sql)
+    cur.execute("SELECT COALESCE(MAX(id), 0) FROM listing_price_changes")
+    last_id = cur.fetchone()[0]
+
+    start = time.perf_counter()
+    cur.execute(BULK_UPSERT_SQL, (n_bulk,))
+    bulk_s = time.perf_counter() - start
+    upserted = cur.rowcount
+    cur.execute("SELECT COUNT(*) FROM listing_price_changes WHERE id > %s", (last_id,))
+    bulk_logged = cur.fetchone()[0]
+
+    start = time.perf_counter()
+    cur.executemany(ROW_UPSERT_SQL, rows)
+    rows_s = time.perf_counter() - start
+    cur.execute("SELECT COUNT(*) FROM listing_price_changes WHERE id > %s", (last_id,))
+    return upserted, bulk_s, bulk_logged, rows_s, cur.fetchone()[0] - bulk_logged
+
+def benchmark_upserts(n_bulk, n_rows, repeats=5):
+    """
+    Listing upsert throughput with no logging, the old row-level trigger and the
+    statement-level trigger (best of `repeats`), checking that every repriced
+    listing is logged. Each run is rolled back (the trigger swap takes a lock on
+    active_listings, so point this at a dev database).
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT item_id, price FROM active_listings WHERE price IS NOT NULL ORDER BY id LIMIT %s", (n_rows,))
+    rows = [(item_id, float(price) + 0.5 * (i % 2)) for i, (item_id, price) in enumerate(cur.fetchall())]
+    conn.rollback()
+
+    print(f"\nBENCHMARK: bulk upsert of {n_bulk:,} listings, {len(rows):,} single-row upserts (best of {repeats})")
+    variants = (("no logging", None), ("row-level", ROW_TRIGGER_SQL), ("statement-level", PRICE_CHANGE_TRIGGER_SQL))
+    best = {}
+    for _ in range(repeats):
+        for label, trigger_sql in variants:
+            try:
+                run = _timed_upserts(cur, trigger_sql, n_bulk, rows)
+            finally:
+                conn.rollback()
+            if label not in best:
+                best[label] = run
+            else:
+                best[label] = (run[0], min(best[label][1], run[1]), run[2], min(best[label][3], run[3]), run[4])
+    for label, _ in variants:
+        upserted, bulk_s, bulk_logged, rows_s, rows_logged = best[label]
+        print(f"  {label:<16} bulk {upserted / bulk_s:>9,.0f} rows/s ({bulk_logged:,} changes logged), "
+              f"single-row {len(rows) / rows_s:>7,.0f} rows/s ({rows_logged:,} logged)")
+
+    cur.close()
+    conn.close()
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify and benchmark listing price-change logging")
+    parser.add_argument("--benchmark", type=int, nargs='?', const=50000, default=None,
+                        help="Also benchmark upserts of this many listings (dev database only)")
+    args = parser.parse_args()
     verify_trigger()
+    if args.benchmark:
+        benchmark_upserts(args.benchmark, min(args.benchmark, 5000))
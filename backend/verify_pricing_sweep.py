@@ -0,0 +1,101 @@
+import time
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+from calc_daily_price import estimate_prices_range, SUPPLY_WINDOW_DAYS
+from calc_implied_sales import aggregate_implied_sales
+from validate_model import HIT_RATE_THRESHOLD_PCT
+from sweep_pricing_rules import (
+    sale_points, implied_prices, evaluate_grid, parse_grid,
+    DEFAULT_SHOCK_MULTIPLIERS, DEFAULT_SHOCK_DISCOUNTS, DEFAULT_BO_DISCOUNTS,
+)
+from verify_backfill import make_listings, supply_metrics_range, _supply_rows, _bin_listings
+
+START, END = date(2025, 3, 1), date(2025, 3, 31)
+
+def make_data(n_products, n_listings, n_sales, seed=0):
+    """Synthetic supply, BIN listings, disappearances and sentinel sales for START..END."""
+    rng = np.random.default_rng(seed)
+    listings = make_listings(n_products, n_listings, seed)
+    supply = _supply_rows(supply_metrics_range(listings, START - timedelta(days=SUPPLY_WINDOW_DAYS), END))
+    gone = listings[listings['disappeared_at'].notna()].copy()
+    gone['date'] = gone['disappeared_at'].dt.date
+    gone['end_date'] = gone['disappeared_at'] + pd.to_timedelta(rng.integers(-5, 5, len(gone)), unit='D')
+    gone['bid_count'] = rng.integers(0, 3, len(gone))
+    sales = pd.DataFrame({
+        'product_id': rng.integers(1, n_products + 20, n_sales),  # some cards with no data at all
+        'sold_date': [START + timedelta(days=int(d)) for d in rng.integers(0, 31, n_sales)],
+        'actual_price': rng.uniform(5, 500, n_sales).round(2),
+    })
+    return supply, _bin_listings(listings), gone, sales
+
+def _validate(prices, sales):
+    """validate_model's metrics for one set of estimates."""
+    merged = sales.assign(date=sales['sold_date']).merge(prices, on=['product_id', 'date'])
+    error = merged['estimated_market_value'] - merged['actual_price']
+    pct = error.abs() / merged['actual_price'] * 100
+    return {
+        'matched': len(merged),
+        'rmse': np.sqrt((error ** 2).mean()),
+        'mae': error.abs().mean(),
+        'bias': error.mean(),
+        'mape': pct.mean(),
+        'hit_rate': (pct <= HIT_RATE_THRESHOLD_PCT).mean() * 100,
+    }
+
+def test_grid_matches_pipeline():
+    """Every grid cell scores exactly what estimate_prices_range + validate_model would."""
+    print("TEST: Sweep vs. pipeline rerun...")
+    supply, listings, gone, sales = make_data(150, 3000, 2000)
+    multipliers, shock_discounts, bo_discounts = [1.0, 1.5, 2.5], [0.0, 0.05, 0.2], [0.8, 1.0]
+
+    points = sale_points(supply, listings, gone, sales, START, END)
+    results = evaluate_grid(points, implied_prices(gone, points, bo_discounts),
+                            multipliers, shock_discounts, bo_discounts)
+    assert len(results) == 18
+
+    for _, row in results.iterrows():
+        implied = aggregate_implied_sales(gone, row['bo_discount'])
+        prices = estimate_prices_range(supply, listings, START, END, row['shock_multiplier'],
+                                       implied[implied['sold_count'] > 0], row['shock_discount'])
+        expected = _validate(prices, sales)
+        assert row['matched'] == expected['matched'], (row, expected)
+        for name in ('rmse', 'mae', 'bias', 'mape', 'hit_rate'):
+            assert np.isclose(row[name], expected[name]), (name, row, expected)
+    assert results['rmse'].nunique() > 1, "parameters should move the metrics"
+    print("PASS")
+
+def test_parse_grid():
+    print("TEST: Grid specs...")
+    assert list(parse_grid('1:2:0.5')) == [1.0, 1.5, 2.0]
+    assert list(parse_grid('0.9,0.8')) == [0.8, 0.9]
+    assert len(parse_grid(DEFAULT_SHOCK_MULTIPLIERS)) == 41
+    print("PASS")
+
+def benchmark():
+    supply, listings, gone, sales = make_data(5000, 100000, 20000)
+    multipliers, shock_discounts, bo_discounts = (parse_grid(DEFAULT_SHOCK_MULTIPLIERS),
+                                                  parse_grid(DEFAULT_SHOCK_DISCOUNTS),
+                                                  parse_grid(DEFAULT_BO_DISCOUNTS))
+    n_combos = len(multipliers) * len(shock_discounts) * len(bo_discounts)
+    print(f"\nBENCHMARK: {n_combos} combinations, {len(sales)} sales, 5k products, 100k listings")
+
+    start = time.perf_counter()
+    points = sale_points(supply, listings, gone, sales, START, END)
+    p_sold = implied_prices(gone, points, bo_discounts)
+    prep = time.perf_counter() - start
+    start = time.perf_counter()
+    evaluate_grid(points, p_sold, multipliers, shock_discounts, bo_discounts)
+    sweep = time.perf_counter() - start
+    print(f"  inputs: {prep:.2f}s, sweep: {sweep:.2f}s ({n_combos / sweep:,.0f} combinations/s)")
+
+    start = time.perf_counter()
+    estimate_prices_range(supply, listings, START, END, 1.5, aggregate_implied_sales(gone))
+    rerun = time.perf_counter() - start
+    print(f"  one pipeline rerun of the month: {rerun:.2f}s -> {rerun * n_combos / 60:,.0f} min for the grid")
+
+if __name__ == "__main__":
+    test_parse_grid()
+    test_grid_matches_pipeline()
+    benchmark()
@@ -0,0 +1,58 @@
+import time
+import pandas as pd
+from database import get_db_connection
+from product_floor import refresh_product_floors
+
+# What calc_daily_price scanned before product_floor (restricted to listings still active)
+SCAN_FLOORS_SQL = """
+    SELECT product_id, MIN(price) AS floor_price, COUNT(*) AS listing_count,
+           (array_agg(price ORDER BY price))[2] AS second_price
+    FROM active_listings
+    WHERE (buying_options LIKE '%FIXED_PRICE%' OR buying_options LIKE '%BIN%')
+    AND is_ignored = FALSE
+    AND is_active = TRUE
+    AND price IS NOT NULL
+    AND product_id IS NOT NULL
+    GROUP BY product_id
+"""
+
+def verify_product_floor():
+    """Read-only: product_floor matches a full scan of active_listings, and an incremental refresh is stable."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    print("Verifying product_floor against a listing scan...")
+
+    start = time.perf_counter()
+    table = pd.read_sql("SELECT product_id, floor_price, listing_count, second_price FROM product_floor "
+                        "WHERE listing_count > 0", conn)
+    table_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scan = pd.read_sql(SCAN_FLOORS_SQL, conn)
+    scan_s = time.perf_counter() - start
+
+    merged = scan.merge(table, on='product_id', how='outer', suffixes=('_scan', '_table'), indicator=True)
+    missing = (merged['_merge'] != 'both').sum()
+    both = merged[merged['_merge'] == 'both']
+    differ = ((both['floor_price_scan'] != both['floor_price_table'])
+              | (both['listing_count_scan'] != both['listing_count_table'])
+              | ~((both['second_price_scan'] == both['second_price_table'])
+                  | (both['second_price_scan'].isna() & both['second_price_table'].isna()))).sum()
+    print(f"  {len(scan)} products with floors, {missing} missing/extra, {differ} mismatches")
+    print(f"  product_floor read {table_s:.3f}s, listing scan {scan_s:.3f}s")
+
+    # Incremental refresh cost for a typical ingest batch (rolled back)
+    pids = scan['product_id'].head(200).tolist()
+    start = time.perf_counter()
+    refresh_product_floors(cur, pids)
+    print(f"  refresh of {len(pids)} products: {time.perf_counter() - start:.3f}s")
+    conn.rollback()
+    cur.close()
+    conn.close()
+
+    ok = missing == 0 and differ == 0
+    print("✅ PASS" if ok else "❌ FAIL")
+    return ok
+
+if __name__ == "__main__":
+    verify_product_floor()
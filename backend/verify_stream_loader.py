@@ -0,0 +1,148 @@
+from datetime import datetime
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+import psycopg2.extensions
+
+from stream_loader import read_sql_typed, stream_query, _CategoryBuilder, DEC2FLOAT
+
+COLUMNS = ['product_id', 'sold_date', 'price', 'player_name', 'volume']
+
+class FakeCursor:
+    """Named cursor over fixed rows; records how it was driven."""
+
+    def __init__(self, rows, name):
+        self.rows = rows
+        self.name = name
+        self.itersize = None
+        self.description = None
+        self.executed = None
+        self.fetch_sizes = []
+        self.closed = False
+        self.position = 0
+
+    def execute(self, query, params=None):
+        self.executed = (query, params)
+        self.description = [(col,) for col in COLUMNS]
+
+    def fetchmany(self, size):
+        self.fetch_sizes.append(size)
+        rows = self.rows[self.position:self.position + size]
+        self.position += len(rows)
+        return rows
+
+    def close(self):
+        self.closed = True
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.cursors = []
+
+    def cursor(self, name=None):
+        assert name is not None, "stream_query must use a named (server-side) cursor"
+        cur = FakeCursor(self.rows, name)
+        self.cursors.append(cur)
+        return cur
+
+def make_rows(n, seed=0):
+    """Sales rows as the driver returns them: NUMERIC already converted by DEC2FLOAT, some NULLs."""
+    rng = np.random.default_rng(seed)
+    players = ['Jayden Daniels', 'Caleb Williams', 'Drake Maye', None]
+    return [(
+        int(rng.integers(1, 500)),
+        datetime(2025, 1, 1 + int(rng.integers(0, 28))),
+        float(Decimal(f"{rng.integers(100, 10 ** 7)}") / 100),  # cents, up to 99,999.99
+        players[int(rng.integers(0, len(players)))],
+        None if i % 11 == 0 else int(rng.integers(0, 50)),
+    ) for i in range(n)]
+
+def with_register_type(test):
+    """Record register_type calls (a fake cursor cannot take a real typecaster)."""
+    def run():
+        calls = []
+        register_type = psycopg2.extensions.register_type
+        psycopg2.extensions.register_type = lambda caster, scope=None: calls.append((caster, scope))
+        try:
+            test(calls)
+        finally:
+            psycopg2.extensions.register_type = register_type
+    return run
+
+@with_register_type
+def test_chunking(calls):
+    """Rows come through one named cursor, chunk_size at a time, and the cursor is closed."""
+    print("TEST: Named cursor chunking...")
+    rows = make_rows(10)
+    conn = FakeConnection(rows)
+    chunks = list(stream_query(conn, "SELECT 1", params=(1,), chunk_size=4, cursor_name='verify'))
+    cur, = conn.cursors
+    assert cur.name == 'verify' and cur.itersize == 4 and cur.executed == ("SELECT 1", (1,))
+    assert calls == [(DEC2FLOAT, cur)]
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert cur.fetch_sizes == [4, 4, 4, 4] and cur.closed
+    assert list(chunks[0].columns) == COLUMNS
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True),
+                                  pd.DataFrame.from_records(rows, columns=COLUMNS))
+
+    # A consumer that stops early still closes the cursor
+    conn = FakeConnection(rows)
+    stream = stream_query(conn, "SELECT 1", chunk_size=3)
+    next(stream)
+    stream.close()
+    assert conn.cursors[0].closed
+    print("PASS")
+
+def test_category_builder():
+    """Codes stay stable across chunks as the vocabulary grows; missing values get -1."""
+    print("TEST: Category codes across chunks...")
+    builder = _CategoryBuilder()
+    builder.add(pd.Series(['b', 'a', None, 'b']))
+    builder.add(pd.Series(['c', 'a', 'c']))
+    builder.add(pd.Series([], dtype=object))
+    result = builder.build()
+    assert list(result.categories) == ['b', 'a', 'c']
+    assert list(result.codes) == [0, 1, -1, 0, 2, 1, 2]
+    assert len(_CategoryBuilder().build()) == 0
+    print("PASS")
+
+@with_register_type
+def test_read_sql_typed(calls):
+    """Chunked typed load equals a one-shot DataFrame of the same rows; money stays exact in float64."""
+    print("TEST: read_sql_typed across chunks...")
+    rows = make_rows(1000, seed=1)
+    dtypes = {'product_id': 'int32', 'sold_date': 'datetime64[ns]', 'price': 'float64',
+              'player_name': 'category', 'volume': 'Int32'}
+    df = read_sql_typed(FakeConnection(rows), "SELECT 1", dtypes, chunk_size=128, label="verify")
+
+    expected = pd.DataFrame.from_records(rows, columns=COLUMNS)
+    assert list(df.columns) == COLUMNS
+    assert {col: str(df[col].dtype) for col in COLUMNS if col != 'player_name'} == \
+        {col: dtype for col, dtype in dtypes.items() if col != 'player_name'}
+    np.testing.assert_array_equal(df['product_id'], expected['product_id'])
+    assert (df['sold_date'] == pd.to_datetime(expected['sold_date'])).all()
+    assert df['price'].tolist() == expected['price'].tolist()  # float(value) written back is the stored value
+    assert [f"{p:.2f}" for p in df['price']] == [f"{p:.2f}" for p in expected['price']]
+    assert df['player_name'].isna().tolist() == expected['player_name'].isna().tolist()
+    assert df['player_name'].dropna().astype(str).tolist() == expected['player_name'].dropna().tolist()
+    assert df['volume'].isna().tolist() == expected['volume'].isna().tolist()
+
+    # float32 prices would be written back as e.g. 19.989999771118164
+    as_float32 = read_sql_typed(FakeConnection(rows), "SELECT 1", dict(dtypes, price='float32'), chunk_size=128)
+    assert (as_float32['price'].astype(float) != expected['price']).mean() > 0.9
+    print("PASS")
+
+@with_register_type
+def test_empty_result(calls):
+    """No rows: an empty frame with the requested dtypes."""
+    print("TEST: Empty result...")
+    df = read_sql_typed(FakeConnection([]), "SELECT 1", {'product_id': 'int32', 'price': 'float64'})
+    assert df.empty and list(df.columns) == ['product_id', 'price']
+    assert str(df['product_id'].dtype) == 'int32' and str(df['price'].dtype) == 'float64'
+    print("PASS")
+
+if __name__ == "__main__":
+    test_chunking()
+    test_category_builder()
+    test_read_sql_typed()
+    test_empty_result()
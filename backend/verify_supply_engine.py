@@ -0,0 +1,70 @@
+import time
+import numpy as np
+import pandas as pd
+
+from supply_engine import listing_intervals, sweep_active
+
+def make_listings(n_listings, n_products, days=150, seed=0):
+    """Synthetic listings: start over `days`, 40% disappear within 60 days, a few unknown starts."""
+    rng = np.random.default_rng(seed)
+    start = pd.Series(pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, days, n_listings), unit='D')
+                      + pd.to_timedelta(rng.integers(0, 86400, n_listings), unit='s'))
+    start[::53] = pd.NaT
+    gone = (start + pd.to_timedelta(rng.integers(0, 60, n_listings), unit='D')).where(rng.random(n_listings) < 0.4)
+    price = rng.uniform(1, 500, n_listings).round(2)
+    price[::211] = np.nan
+    return start, gone, price, rng.integers(0, n_products, n_listings)
+
+def brute_force(start, end, price, group, day, n_groups):
+    """Mask every listing for one day (the old analyze_supply approach)."""
+    live = ~np.isnat(start) & (start <= day) & (end > day)
+    counts = np.bincount(group[live], minlength=n_groups)
+    by_group = pd.Series(price[live]).groupby(group[live])
+    return (counts, by_group.median().reindex(range(n_groups)).to_numpy(),
+            by_group.min().reindex(range(n_groups)).to_numpy())
+
+def test_matches_brute_force():
+    """Counts, medians and floors equal per-day masking for every group and day."""
+    print("TEST: Sweep vs per-day masks...")
+    start_date, gone, price, group = make_listings(8000, 50)
+    start, end = listing_intervals(start_date, gone)
+    days = pd.date_range('2024-12-20', '2025-07-01')
+    out = sweep_active(start, end, price, group, days, n_groups=50, stats=('count', 'median', 'min'))
+    for i, day in enumerate(days.to_numpy(dtype='datetime64[D]')):
+        counts, medians, floors = brute_force(start, end, price, group, day, 50)
+        assert (out['count'][:, i] == counts).all(), day
+        np.testing.assert_allclose(out['median'][:, i], medians, equal_nan=True)
+        np.testing.assert_allclose(out['min'][:, i], floors, equal_nan=True)
+    print("PASS")
+
+def test_disappeared_leave_supply():
+    """A listing stops counting on its disappeared day; no disappearance means still active."""
+    print("TEST: Interval bounds...")
+    start, end = listing_intervals(pd.Series(pd.to_datetime(['2025-01-01 10:00', '2025-01-02 09:00'])),
+                                   pd.Series(pd.to_datetime(['2025-01-03 08:00', None])))
+    out = sweep_active(start, end, [10.0, 30.0], [0, 0], pd.date_range('2025-01-01', '2025-01-04'), n_groups=1,
+                       stats=('count', 'median', 'min'))
+    assert list(out['count'][0]) == [1, 2, 1, 1]
+    assert list(out['median'][0]) == [10.0, 20.0, 30.0, 30.0]
+    assert list(out['min'][0]) == [10.0, 10.0, 30.0, 30.0]
+    print("PASS")
+
+def benchmark():
+    print("\nBENCHMARK: 150 days")
+    for n_listings, n_products in ((200000, 5000), (2000000, 20000)):
+        start_date, gone, price, group = make_listings(n_listings, n_products, seed=1)
+        start, end = listing_intervals(start_date, gone)
+        days = pd.date_range('2025-01-01', periods=150)
+        t = time.perf_counter()
+        sweep_active(start, end, price, group, days, n_groups=n_products, stats=('count', 'median', 'min'))
+        sweep_s = time.perf_counter() - t
+        t = time.perf_counter()
+        for day in days.to_numpy(dtype='datetime64[D]')[::15]:
+            brute_force(start, end, price, group, day, n_products)
+        mask_s = (time.perf_counter() - t) * 15
+        print(f"  {n_listings:>9,} listings x {n_products:,} products: sweep {sweep_s:.1f}s, per-day masks {mask_s:.1f}s")
+
+if __name__ == "__main__":
+    test_matches_brute_force()
+    test_disappeared_leave_supply()
+    benchmark()
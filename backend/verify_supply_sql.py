@@ -0,0 +1,82 @@
+import argparse
+import time
+from datetime import date
+import pandas as pd
+from database import get_db_connection
+from calc_daily_supply import supply_metrics_sql, SUPPLY_COLUMNS
+from partition_tables import listing_history
+
+def reference_supply_day(df, target_date):
+    """
+    The former pandas implementation (classify with apply, then one value_counts
+    per product), with "active" meaning started by the day and not yet disappeared.
+    """
+    df = df.copy()
+    df['start_date_only'] = pd.to_datetime(df['start_date']).dt.date
+    gone = pd.to_datetime(df['disappeared_at']).dt.date
+
+    def get_type(options):
+        opts = str(options).upper()
+        if 'AUCTION' in opts:
+            return 'AUCTION'
+        elif 'BEST_OFFER' in opts:
+            return 'BEST_OFFER'
+        elif 'FIXED_PRICE' in opts:
+            return 'FIXED_PRICE_ONLY'
+        return 'UNKNOWN'
+
+    df['type'] = df['buying_options'].apply(get_type)
+    df_new = df[df['start_date_only'] == target_date]
+    df_active = df[(df['start_date_only'] <= target_date) & (gone.isna() | (gone > target_date))]
+    # Products with a listing new on the day or active entering it (calc_daily_supply skips dead cards)
+    live = (df['start_date_only'] <= target_date) & (gone.isna() | (gone >= target_date))
+    rows = {}
+    for pid in pd.concat([df_new, df[live]])['product_id'].unique():
+        new_subset = df_new[df_new['product_id'] == pid]
+        new_counts = new_subset['type'].value_counts()
+        active_counts = df_active[df_active['product_id'] == pid]['type'].value_counts()
+        price_subset = new_subset[new_subset['type'].isin(['FIXED_PRICE_ONLY', 'BEST_OFFER'])]
+        median_price = price_subset['price'].astype(float).median() if not price_subset.empty else 0
+        rows[int(pid)] = tuple(int(c.get(t, 0)) for c in (new_counts, active_counts)
+                               for t in ('FIXED_PRICE_ONLY', 'BEST_OFFER', 'AUCTION')) + (float(median_price),)
+    return rows
+
+def verify_supply_sql(target_date):
+    """Read-only: the server-side aggregation matches the old pandas loop for one day."""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    print(f"Verifying supply SQL for {target_date}...")
+
+    start = time.perf_counter()
+    cur.execute(supply_metrics_sql(conn), {'start': target_date, 'end': target_date})
+    got = pd.DataFrame(cur.fetchall(), columns=SUPPLY_COLUMNS).set_index('product_id')
+    sql_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    listings = pd.read_sql(f"""
+        SELECT product_id, price, buying_options, start_date, disappeared_at
+        FROM {listing_history(conn, "%(start)s::date")} l
+        WHERE product_id IS NOT NULL AND is_ignored = FALSE
+    """, conn, params={'start': target_date})
+    expected = reference_supply_day(listings, target_date)
+    loop_s = time.perf_counter() - start
+    cur.close()
+    conn.close()
+
+    mismatches = 0
+    for pid, values in expected.items():
+        row = got.loc[pid]
+        counts = tuple(int(v) for v in row.iloc[1:-1])
+        if counts != values[:-1] or abs(float(row['median_new_price']) - values[-1]) > 1e-6:
+            mismatches += 1
+    assert set(got.index) == set(expected), "product sets differ"
+    print(f"  {len(expected)} products, {mismatches} mismatches")
+    print(f"  SQL {sql_s:.2f}s, pandas loop {loop_s:.2f}s ({len(listings)} listings pulled)")
+    print("✅ PASS" if mismatches == 0 else "❌ FAIL")
+    return mismatches == 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare calc_daily_supply's SQL with the old pandas loop")
+    parser.add_argument("--date", type=date.fromisoformat, default=date.today())
+    args = parser.parse_args()
+    verify_supply_sql(args.date)
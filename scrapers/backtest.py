@@ -0,0 +1,154 @@
+"""Walk-forward (expanding window) backtest for the dual forecast models.
+
+A single 80/20 split judges the models on one stretch of market. Here the
+date-sorted feature matrix is cut into N consecutive test windows; fold k
+trains on everything before its window (minus an optional gap) and tests on
+the next `horizon_days`.
+
+The matrix is written to disk once and memory-mapped by every worker; each
+fold runs in its own process so folds train in parallel and the peak RSS
+reported per fold is that fold's own.
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error, r2_score, accuracy_score
+from threadpoolctl import threadpool_limits
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from stream_loader import peak_rss_mb
+from feature_matrix import save_feature_matrix, load_feature_matrix
+from model_backends import DEFAULT_BACKEND, build_price_model, build_direction_model, categorical_mask
+
+MIN_TRAIN_ROWS = 50
+
+
+def walk_forward_splits(dates, n_folds=5, gap_days=0, horizon_days=None):
+    """
+    Row ranges for an expanding-window backtest over date-sorted `dates`.
+
+    Test windows are `horizon_days` long and end at the last date; by default
+    they cover the last 20% of the timeline (the old single split, cut into
+    n_folds). Training rows must be older than test_start - gap_days.
+    Returns a list of (train_end, test_start, test_end) row indices (empty
+    when there are no dates).
+    """
+    dates = np.asarray(dates).astype('datetime64[D]')
+    if len(dates) == 0:
+        return []
+    first, last = dates[0], dates[-1] + np.timedelta64(1, 'D')
+
+    if horizon_days is None:
+        span_days = int((last - first) / np.timedelta64(1, 'D'))
+        horizon_days = max(1, int(span_days * 0.2 / n_folds))
+    horizon = np.timedelta64(horizon_days, 'D')
+    gap = np.timedelta64(gap_days, 'D')
+
+    splits = []
+    for k in range(n_folds):
+        test_start_date = last - (n_folds - k) * horizon
+        test_end_date = test_start_date + horizon
+        train_end = int(np.searchsorted(dates, test_start_date - gap, side='left'))
+        test_start = int(np.searchsorted(dates, test_start_date, side='left'))
+        test_end = int(np.searchsorted(dates, test_end_date, side='left'))
+        if train_end < MIN_TRAIN_ROWS or test_end <= test_start:
+            print(f"  Skipping fold {k + 1}: {train_end} train rows, {test_end - test_start} test rows")
+            continue
+        splits.append((train_end, test_start, test_end))
+    return splits
+
+
+def _run_fold(task):
+    """Fit and score both heads on one fold (runs in a worker process)."""
+    start = time.perf_counter()
+    matrix = load_feature_matrix(task['matrix_path'])
+    X, y_price, y_direction = matrix['X'], matrix['y_price'], matrix['y_direction']
+    train = slice(0, task['train_end'])
+    test = slice(task['test_start'], task['test_end'])
+
+    categorical = None
+    if task['backend'] == 'hist':
+        categorical = categorical_mask(matrix['columns'], X, task['cardinalities'])
+
+    # Share the cores between concurrently running folds (hist is OpenMP-parallel)
+    with threadpool_limits(limits=task['threads']):
+        regressor = build_price_model(task['backend'], task['price_params'], categorical)
+        regressor.fit(X[train], y_price[train])
+        yp_pred = regressor.predict(X[test])
+
+        accuracy = np.nan
+        if len(np.unique(y_direction[train])) > 1:
+            classifier = build_direction_model(task['backend'], task['direction_params'], categorical)
+            classifier.fit(X[train], y_direction[train])
+            accuracy = accuracy_score(y_direction[test], classifier.predict(X[test]))
+
+    dates = matrix['dates']
+    return {
+        'fold': task['fold'],
+        'train_rows': task['train_end'],
+        'test_rows': task['test_end'] - task['test_start'],
+        'train_through': str(dates[task['train_end'] - 1]),
+        'test_from': str(dates[task['test_start']]),
+        'test_to': str(dates[task['test_end'] - 1]),
+        'mae': mean_absolute_error(y_price[test], yp_pred),
+        'r2': r2_score(y_price[test], yp_pred) if task['test_end'] - task['test_start'] > 1 else np.nan,
+        'accuracy': accuracy,
+        'wall_s': time.perf_counter() - start,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def walk_forward_backtest(X, y_price, y_direction, dates, price_params=None, direction_params=None,
+                          n_folds=5, gap_days=0, horizon_days=None, workers=None,
+                          backend=DEFAULT_BACKEND, cardinalities=None):
+    """
+    Run all folds on a process pool and print a per-fold report.
+
+    price_params / direction_params override the backend's MODEL_PARAMS.
+    """
+    splits = walk_forward_splits(dates, n_folds, gap_days, horizon_days)
+    if not splits:
+        print("No usable folds (not enough history).")
+        return pd.DataFrame()
+
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="backtest_matrix_") as matrix_path:
+        save_feature_matrix(matrix_path, X, y_price, y_direction, dates)
+        tasks = [{
+            'fold': i + 1,
+            'matrix_path': matrix_path,
+            'train_end': train_end,
+            'test_start': test_start,
+            'test_end': test_end,
+            'price_params': price_params,
+            'direction_params': direction_params,
+            'backend': backend,
+            'cardinalities': cardinalities or {},
+        } for i, (train_end, test_start, test_end) in enumerate(splits)]
+
+        workers = workers or min(len(tasks), os.cpu_count() or 1)
+        for task in tasks:
+            task['threads'] = max(1, (os.cpu_count() or 1) // workers)
+        print(f"  Running {len(tasks)} folds on {workers} workers...")
+        # One task per process: fresh interpreter per fold, so peak RSS is per fold
+        # (multiprocessing.Pool: ProcessPoolExecutor only recycles workers from Python 3.11)
+        with multiprocessing.Pool(workers, maxtasksperchild=1) as pool:
+            results = pd.DataFrame(pool.map(_run_fold, tasks, chunksize=1))
+    total_s = time.perf_counter() - started
+
+    print(f"\n{'Fold':<5} {'Train':>8} {'Test':>6} {'Test Window':<25} {'MAE':>9} {'R²':>7} {'Acc':>7} {'Wall':>7} {'Peak':>8}")
+    print("-" * 92)
+    for _, r in results.iterrows():
+        window = f"{r['test_from']} -> {r['test_to']}"
+        print(f"{r['fold']:<5} {r['train_rows']:>8} {r['test_rows']:>6} {window:<25} "
+              f"${r['mae']:>8.2f} {r['r2']:>7.3f} {r['accuracy']:>6.1%} {r['wall_s']:>6.1f}s {r['peak_rss_mb']:>6.0f}MB")
+    print("-" * 92)
+    print(f"{'Mean':<5} {'':>8} {'':>6} {'':<25} ${results['mae'].mean():>8.2f} "
+          f"{results['r2'].mean():>7.3f} {results['accuracy'].mean():>6.1%}")
+    print(f"Total wall time: {total_s:.1f}s (sum of folds {results['wall_s'].sum():.1f}s)")
+    return results
@@ -0,0 +1,159 @@
+"""
+Continuous (card x day) fair-value curves.
+
+build_feature_grid() lays out every variant (product + grader + grade) on a
+daily grid and fills in, for each day D, the features a sale on D would get in
+training: closes as of D-1..D-3 (as-of joins = forward fill), days since the
+previous sale, the player's trailing 7-day volume / average price (grouped
+time rolling over the grid days) and the static encodings. No per-card or
+per-day Python loop; a whole catalog is one frame and one predict call.
+
+A single-day grid is exactly the nightly scoring matrix (score_forecasts.py).
+"""
+
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from model_backends import predict_band
+from train_model import (
+    prepare_ml_data, player_daily_stats, player_spillover_features, map_grade, encode_labels, _fill_label
+)
+
+STATIC_COLUMNS = ['product_id', 'grader', 'grade', 'player_name', 'parallel_type', 'is_rookie_card', 'set_name']
+
+
+def _asof(grid_codes, lookup_dates, daily_close):
+    """Latest (close, close date) per grid row with sale_date <= lookup date, same variant."""
+    left = pd.DataFrame({
+        'variant_code': grid_codes,
+        'asof_date': lookup_dates,
+        'row': np.arange(len(grid_codes)),
+    }).sort_values('asof_date', kind='stable')
+    right = daily_close[['variant_code', 'sale_date', 'price']].sort_values('sale_date', kind='stable')
+    matched = pd.merge_asof(
+        left, right, left_on='asof_date', right_on='sale_date', by='variant_code', direction='backward'
+    ).sort_values('row')
+    return matched['price'].to_numpy(dtype=float), matched['sale_date'].to_numpy()
+
+
+def build_feature_grid(df, le_player, le_parallel, start=None, end=None, product_ids=None):
+    """
+    Feature rows for every (variant, day) from max(start, day after the variant's
+    first sale) through `end` (default: the day after the last sale).
+
+    df: raw sales (price, sale_date, grade, grader, product_id, player_name,
+        parallel_type, is_rookie_card, set_name). Player spillover always uses every
+        player's sales; `product_ids` only limits which variants get a curve.
+    Returns one row per (variant, day) with the training feature columns plus
+    variant_id, sale_date (the grid day) and price (that day's close, NaN if no sale).
+    """
+    sales = df[['price', 'sale_date'] + STATIC_COLUMNS].copy()
+    sales['sale_date'] = pd.to_datetime(sales['sale_date'])
+    sales['grader'] = _fill_label(sales['grader'], "Unk").astype(str)
+    sales['grade'] = _fill_label(sales['grade'], "Unk").astype(str)
+    sales['player_name'] = sales['player_name'].astype(str)
+    sales['variant_id'] = sales['product_id'].astype(str) + "_" + sales['grader'] + "_" + sales['grade']
+    sales = sales.sort_values(['variant_id', 'sale_date'])
+
+    # Daily closes, same ordering as engineer_features
+    daily_close = sales.groupby(['variant_id', 'sale_date'], sort=False)['price'].last().reset_index()
+    daily_close['variant_code'] = pd.factorize(daily_close['variant_id'])[0]
+    first_day = daily_close.groupby('variant_code', sort=False)['sale_date'].transform('min')
+
+    # Training rows start at each variant's second sale day: that is the
+    # origin of days_since_start and the population of the player stats
+    origin = daily_close.loc[daily_close['sale_date'] > first_day, 'sale_date'].min()
+
+    variants = sales.groupby('variant_id', sort=False)[STATIC_COLUMNS].last()
+    variants['first_day'] = daily_close.groupby('variant_id', sort=False)['sale_date'].min()
+    variants['variant_code'] = daily_close.groupby('variant_id', sort=False)['variant_code'].first()
+    if product_ids is not None:
+        variants = variants[variants['product_id'].isin(product_ids)]
+
+    # --- Grid layout: one block of consecutive days per variant ---
+    day = pd.Timedelta(days=1)
+    end = pd.Timestamp(end).normalize() if end is not None else daily_close['sale_date'].max() + day
+    grid_start = variants['first_day'] + day
+    if start is not None:
+        grid_start = grid_start.clip(lower=pd.Timestamp(start).normalize())
+    n_days = ((end - grid_start).dt.days + 1).clip(lower=0).to_numpy()
+    variants = variants[n_days > 0]
+    grid_start, n_days = grid_start[n_days > 0], n_days[n_days > 0]
+
+    total = int(n_days.sum())
+    block_offsets = np.repeat(np.cumsum(n_days) - n_days, n_days)
+    day_index = np.arange(total) - block_offsets
+    grid = pd.DataFrame({
+        'variant_id': np.repeat(variants.index.to_numpy(), n_days),
+        'sale_date': np.repeat(grid_start.to_numpy(), n_days) + day_index.astype('timedelta64[D]'),
+    })
+    codes = np.repeat(variants['variant_code'].to_numpy(), n_days)
+
+    # --- Lags: forward-filled closes as of D-1, D-2, D-3 ---
+    dates = grid['sale_date'].to_numpy()
+    lags, close_dates = zip(*[_asof(codes, dates - np.timedelta64(k, 'D'), daily_close) for k in (1, 2, 3)])
+    lag_matrix = np.column_stack(lags)
+    counts = (~np.isnan(lag_matrix)).sum(axis=1)
+    grid['last_sold_price'] = lags[0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        grid['rolling_avg_3'] = np.where(counts > 0, np.nansum(lag_matrix, axis=1) / counts, np.nan)
+    grid['days_since_last_sale'] = (grid['sale_date'] - pd.to_datetime(close_dates[0])).dt.days
+
+    # That day's close, if the variant sold (the actual to plot against)
+    same_close, same_date = _asof(codes, dates, daily_close)
+    grid['price'] = np.where(same_date == dates, same_close, np.nan)
+
+    # --- Static attributes ---
+    grid = grid.join(variants[STATIC_COLUMNS], on='variant_id')
+
+    # --- Player spillover over the grid days (zero-volume rows fill quiet days) ---
+    sale_first = sales['variant_id'].map(daily_close.groupby('variant_id', sort=False)['sale_date'].min())
+    stats = player_daily_stats(sales[sales['sale_date'] > sale_first])
+    grid_days = grid[['player_name', 'sale_date']].drop_duplicates()
+    quiet = grid_days.merge(stats[['player_name', 'sale_date']], how='left', indicator=True)
+    quiet = quiet.loc[quiet['_merge'] == 'left_only', ['player_name', 'sale_date']]
+    quiet['daily_vol'] = 0
+    quiet['daily_rev'] = 0.0
+    market = player_spillover_features(pd.concat([stats, quiet], ignore_index=True))
+    grid = grid.merge(market, on=['sale_date', 'player_name'], how='left')
+    grid['player_7d_vol'] = grid['player_7d_vol'].fillna(0)
+    grid['player_7d_avg_price'] = grid['player_7d_avg_price'].fillna(0)
+
+    # --- Static encodings (the fitted training encoders, not refitted) ---
+    parallel = _fill_label(grid['parallel_type'], "Base").astype(str)
+    grid['grade_num'] = map_grade(grid['grade'])
+    grid['player_encoded'] = encode_labels(grid['player_name'], le_player)
+    grid['parallel_encoded'] = encode_labels(parallel, le_parallel)
+    grid['is_gold'] = (parallel == 'Gold').astype(int)
+    grid['is_black'] = (parallel == 'Black').astype(int)
+    grid['is_rookie_num'] = grid['is_rookie_card'].fillna(False).astype(bool).astype(int)
+    grid['days_since_start'] = (grid['sale_date'] - origin).dt.days
+
+    known = (grid['player_encoded'] >= 0) & (grid['parallel_encoded'] >= 0)
+    if (~known).any():
+        print(f"  Skipping {grid.loc[~known, 'variant_id'].nunique()} variants "
+              f"with players/parallels unseen at training time")
+    return grid[known].reset_index(drop=True)
+
+
+def predict_grid(grid, regressor, classifier=None, bands=None):
+    """One predict (and predict_proba, and one per band edge) call over the whole grid."""
+    X, _, _, _ = prepare_ml_data(grid)
+    curve = grid.loc[X.index, ['variant_id', 'product_id', 'grader', 'grade', 'sale_date', 'price']].copy()
+    curve = curve.rename(columns={'sale_date': 'date', 'price': 'actual_price'})
+    curve['predicted_price'] = regressor.predict(X)
+    if classifier is not None:
+        curve['prob_up'] = classifier.predict_proba(X)[:, 1]
+    if bands:
+        curve['price_low'], curve['price_high'] = predict_band(bands, X)
+    return curve.reset_index(drop=True)
+
+
+def continuous_forecast(df, regressor, le_player, le_parallel, product_ids=None, start=None, end=None,
+                        classifier=None, bands=None):
+    """Daily fair-value curve (and band) for every variant of `product_ids` (all products if None)."""
+    grid = build_feature_grid(df, le_player, le_parallel, start, end, product_ids)
+    return predict_grid(grid, regressor, classifier, bands)
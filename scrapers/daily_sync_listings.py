@@ -2,6 +2,8 @@
 """
 Daily Sync Script for Active Listings
 Run via cron: 0 6 * * * cd /path/to/project && python3 scrapers/daily_sync_listings.py >> logs/sync.log 2>&1
+
+Each run and step is recorded in the pipeline run ledger (backend/pipeline_ledger.py).
 """
 import sys
 import os
@@ -12,6 +14,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 sys.path.append(os.path.dirname(__file__))
 
 from fetch_active_by_set import save_listings_for_set
+from pipeline_ledger import start_run, finish_run, track_stage
 
 # Define monitored sets (add more as needed)
 MONITORED_SETS = [
@@ -24,21 +27,26 @@ def main():
     print(f"Daily Sync Started: {datetime.now().isoformat()}")
     print(f"{'='*50}\n")
     
+    run_id = start_run('daily_sync_listings')
     try:
         # 1. Fetch Active Listings by SET (Efficient)
         print("[Step 1] Fetching Active Listings (Set-Level)...")
         for set_config in MONITORED_SETS:
-            save_listings_for_set(set_config["set_name"], set_config["query"])
+            with track_stage(run_id, f"fetch_set: {set_config['set_name']}"):
+                save_listings_for_set(set_config["set_name"], set_config["query"])
         
         # 2. Calculate Daily Supply Metrics
         print(f"\n[Step 2] Calculating Daily Supply Metrics...")
-        from backend.calc_daily_supply import calculate_daily_supply
-        calculate_daily_supply()
+        from calc_daily_supply import calculate_daily_supply
+        with track_stage(run_id, 'supply'):
+            calculate_daily_supply()
+        finish_run(run_id, 'done')
 
         print(f"\n{'='*50}")
         print(f"Daily Sync Completed: {datetime.now().isoformat()}")
         print(f"{'='*50}\n")
     except Exception as e:
+        finish_run(run_id, 'failed')
         print(f"[ERROR] Sync failed: {e}")
         import traceback
         traceback.print_exc()
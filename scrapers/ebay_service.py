@@ -1,8 +1,12 @@
 import os
+import sys
 import base64
 import httpx
 import time
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from pipeline_ledger import count_api_calls
+
 class EbayService:
     PROD_AUTH_URL = "https://api.ebay.com/identity/v1/oauth2/token"
     PROD_BROWSE_URL = "https://api.ebay.com/buy/browse/v1"
@@ -22,6 +26,7 @@ class EbayService:
         
         try:
             with httpx.Client(timeout=30.0) as client:
+                count_api_calls()
                 response = client.post(
                     self.PROD_AUTH_URL,
                     headers={
@@ -56,6 +61,7 @@ class EbayService:
 
         try:
             with httpx.Client(timeout=30.0) as client:
+                count_api_calls()
                 response = client.get(
                     f"{self.PROD_BROWSE_URL}/item_summary/search",
                     headers=headers,
@@ -0,0 +1,34 @@
+"""On-disk feature matrix shared between worker processes.
+
+prepare_ml_data() is computed once and written as plain .npy files. Workers
+open them with mmap_mode='r', so a process pool sees one copy of the matrix
+in the page cache instead of pickling a DataFrame into every task.
+"""
+
+import json
+import os
+import numpy as np
+
+MATRIX_FILES = ('X', 'y_price', 'y_direction', 'dates')
+
+
+def save_feature_matrix(path, X, y_price, y_direction, dates):
+    """Write a date-sorted (X, y_price, y_direction, dates) matrix under `path`."""
+    os.makedirs(path, exist_ok=True)
+    # float32 is what the sklearn tree models work in; storing it avoids a copy per worker
+    np.save(os.path.join(path, 'X.npy'), np.ascontiguousarray(X.to_numpy(dtype=np.float32)))
+    np.save(os.path.join(path, 'y_price.npy'), y_price.to_numpy(dtype=np.float64))
+    np.save(os.path.join(path, 'y_direction.npy'), y_direction.to_numpy(dtype=np.int8))
+    np.save(os.path.join(path, 'dates.npy'), dates.to_numpy().astype('datetime64[D]'))
+    with open(os.path.join(path, 'columns.json'), 'w') as f:
+        json.dump(list(X.columns), f)
+    return path
+
+
+def load_feature_matrix(path, mmap=True):
+    """Return a dict of arrays (memory-mapped read-only by default) plus 'columns'."""
+    mode = 'r' if mmap else None
+    matrix = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mode) for name in MATRIX_FILES}
+    with open(os.path.join(path, 'columns.json')) as f:
+        matrix['columns'] = json.load(f)
+    return matrix
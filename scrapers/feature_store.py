@@ -0,0 +1,259 @@
+"""Persisted feature state for incremental feature engineering.
+
+A full rebuild of the lag / spillover features walks the entire sales history.
+The only history those features actually look at is small:
+  - per variant, the last 3 daily closes (yesterday's close, rolling-3 window
+    and the strict previous sale date)
+  - per player, the last 7 days of volume / revenue (spillover ring buffer)
+
+FeatureState keeps that tail, the fitted player / parallel encoders and the
+time origin, so train_model.engineer_features(new_sales, state=state) only
+processes (and encodes) the sales past the watermark. The engineered rows are
+not part of the pickled state: they go to an append-only store of uncompressed
+Arrow IPC parts next to it (like sales_snapshot), one part per run, which
+read_rows() memory-maps for training. A daily run therefore costs O(new sales)
+plus the size of the tail.
+
+New sales are found by ingestion (sale_id past max_sale_id, as in
+sales_snapshot), not by sale_date: a scrape routinely brings in sales dated
+days or weeks back. Those late sales change the lag / spillover windows of
+every day from their date on, so the state keeps REPLAY_DAYS of closes and
+player days and can rewind() to the earliest late date; the sales from that
+day on are then featurized again together with the late ones. Parts never
+straddle replay_start when written, so a rewind only rewrites parts inside
+the replay window. A sale older than the replay window forces a full rebuild.
+
+Part files are immutable and uniquely named; save_feature_state() writes the
+state (which lists the live parts) and only then deletes unreferenced parts,
+so a crash mid-run leaves the previous state and its parts intact.
+"""
+
+import os
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+FEATURE_STORE_DIR = "backend/feature_store"
+STATE_NAME = "state.pkl"
+STORE_VERSION = 2  # bump when the state or row layout changes; forces a full build
+
+VARIANT_LAG_DEPTH = 3    # daily closes needed for last_sold_price / rolling_avg_3
+PLAYER_WINDOW_DAYS = 7   # width of the player spillover window
+REPLAY_DAYS = 90         # late sales this far back are re-merged incrementally (eBay sold history)
+MAX_PARTS = 32           # compact the parts before the replay window beyond this
+
+
+def _empty_variant_closes():
+    return pd.DataFrame({
+        'variant_id': pd.Series(dtype=object),
+        'sale_date': pd.Series(dtype='datetime64[ns]'),
+        'price': pd.Series(dtype=float),
+    })
+
+
+def _empty_player_daily():
+    return pd.DataFrame({
+        'player_name': pd.Series(dtype=object),
+        'sale_date': pd.Series(dtype='datetime64[ns]'),
+        'daily_vol': pd.Series(dtype='int64'),
+        'daily_rev': pd.Series(dtype=float),
+    })
+
+
+def _to_table(df):
+    """Engineered rows as an Arrow table; categories are stored as plain strings."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    fields = [pa.field(f.name, f.type.value_type) if pa.types.is_dictionary(f.type) else f
+              for f in table.schema]
+    return table.cast(pa.schema(fields))
+
+
+@dataclass
+class FeatureState:
+    """Tail state needed to extend the lag features past `watermark`."""
+    store_dir: str = FEATURE_STORE_DIR
+    watermark: Optional[pd.Timestamp] = None  # last sale_date folded into the state
+    max_sale_id: int = 0                       # last sale_id folded in (ingestion watermark)
+    variant_closes: pd.DataFrame = field(default_factory=_empty_variant_closes)
+    player_daily: pd.DataFrame = field(default_factory=_empty_player_daily)
+    le_player: object = None                   # encoders fitted by the full build, extended since
+    le_parallel: object = None
+    min_date: Optional[pd.Timestamp] = None    # origin of days_since_start
+    parts: list = field(default_factory=list)  # [{'name', 'min_date', 'max_date', 'rows'}] in date order
+    version: int = STORE_VERSION
+
+    @property
+    def is_empty(self):
+        return self.watermark is None
+
+    @property
+    def rows(self):
+        return sum(part['rows'] for part in self.parts)
+
+    def update(self, daily_close, player_daily):
+        """
+        Fold a processed batch into the tail.
+
+        daily_close / player_daily must already include the previous tail, so the
+        trimmed result stays correct across batches.
+        """
+        if daily_close.empty:
+            return
+
+        self.watermark = daily_close['sale_date'].max()
+
+        # Every close in the replay window, plus the lag depth before it
+        replay_start = self.replay_start
+        closes = daily_close[['variant_id', 'sale_date', 'price']]
+        closes = closes.sort_values(['variant_id', 'sale_date'], kind='stable')
+        recent = closes['sale_date'] >= replay_start
+        seed = closes[~recent].groupby('variant_id', sort=False).tail(VARIANT_LAG_DEPTH)
+        self.variant_closes = (
+            pd.concat([seed, closes[recent]])
+            .sort_values(['variant_id', 'sale_date'], kind='stable')
+            .reset_index(drop=True)
+        )
+
+        # Ring buffer: day D >= replay_start needs D-7 .. D-1
+        window_start = replay_start - pd.Timedelta(days=PLAYER_WINDOW_DAYS)
+        self.player_daily = player_daily[player_daily['sale_date'] >= window_start].reset_index(drop=True)
+
+    def append_rows(self, rows):
+        """Store newly engineered rows (all dated after the previous parts) as new part(s)."""
+        if rows.empty:
+            return
+        if 'sale_id' in rows and rows['sale_id'].notna().any():
+            self.max_sale_id = max(self.max_sale_id, int(rows['sale_id'].max()))
+        rows = rows.sort_values('sale_date', kind='stable')
+        # Split at replay_start so a later rewind never rewrites rows before the window
+        recent = (rows['sale_date'] >= self.replay_start).to_numpy()
+        for chunk in (rows[~recent], rows[recent]):
+            if len(chunk):
+                self._write_part(_to_table(chunk), chunk['sale_date'].min(), chunk['sale_date'].max())
+
+    def _write_part(self, table, min_date, max_date):
+        os.makedirs(self.store_dir, exist_ok=True)
+        name = f"rows-{pd.Timestamp(min_date):%Y%m%d}-{uuid.uuid4().hex[:12]}.arrow"
+        with pa.OSFile(os.path.join(self.store_dir, name), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        self.parts.append({'name': name, 'min_date': pd.Timestamp(min_date),
+                           'max_date': pd.Timestamp(max_date), 'rows': table.num_rows})
+
+    def _read_table(self, parts):
+        tables = []
+        for part in parts:
+            source = pa.memory_map(os.path.join(self.store_dir, part['name']), 'r')
+            tables.append(pa.ipc.open_file(source).read_all())
+        return pa.concat_tables(tables, promote_options='permissive') if tables else None
+
+    def read_rows(self, since=None):
+        """
+        Engineered rows (sale_date >= since, or all) ordered by sale_date. Only
+        parts overlapping that range are mapped; strings come back as categories.
+        """
+        parts = [p for p in self.parts if since is None or p['max_date'] >= pd.Timestamp(since)]
+        table = self._read_table(parts)
+        if table is None:
+            return pd.DataFrame()
+        if since is not None:
+            table = table.filter(pc.greater_equal(
+                table['sale_date'], pa.scalar(pd.Timestamp(since), table.schema.field('sale_date').type)))
+        df = table.to_pandas(strings_to_categorical=True)
+        return df.sort_values('sale_date', kind='stable').reset_index(drop=True)
+
+    @property
+    def replay_start(self):
+        """Earliest sale_date rewind() can go back to."""
+        return self.watermark - pd.Timedelta(days=REPLAY_DAYS)
+
+    def rewind(self, sale_date):
+        """
+        Drop everything folded in from `sale_date` on, so the sales of those days
+        can be featurized again with late arrivals. Returns False (state left
+        untouched) when sale_date is before the replay window.
+        """
+        if self.is_empty or sale_date > self.watermark:
+            return True
+        if sale_date < self.replay_start:
+            return False
+
+        self.variant_closes = self.variant_closes[self.variant_closes['sale_date'] < sale_date].reset_index(drop=True)
+        self.player_daily = self.player_daily[self.player_daily['sale_date'] < sale_date].reset_index(drop=True)
+
+        # Parts from sale_date on go; one straddling it is rewritten with its earlier rows
+        kept = [p for p in self.parts if p['max_date'] < sale_date]
+        straddling = [p for p in self.parts if p['min_date'] < sale_date <= p['max_date']]
+        self.parts = kept
+        for part in straddling:
+            table = self._read_table([part])
+            table = table.filter(pc.less(
+                table['sale_date'], pa.scalar(pd.Timestamp(sale_date), table.schema.field('sale_date').type)))
+            dates = table['sale_date'].to_pandas()
+            self._write_part(table, dates.min(), dates.max())
+        self.parts.sort(key=lambda p: p['min_date'])
+
+        self.watermark = self.variant_closes['sale_date'].max() if not self.variant_closes.empty else None
+        return True
+
+    def compact(self):
+        """Merge the parts that lie entirely before the replay window into one."""
+        old = [p for p in self.parts if p['max_date'] < self.replay_start]
+        if len(self.parts) <= MAX_PARTS or len(old) < 2:
+            return
+        table = self._read_table(old)
+        self.parts = [p for p in self.parts if p not in old]
+        self._write_part(table, old[0]['min_date'], max(p['max_date'] for p in old))
+        self.parts.sort(key=lambda p: p['min_date'])
+
+
+def _state_path(store_dir):
+    return os.path.join(store_dir, STATE_NAME)
+
+
+def load_feature_state(store_dir=FEATURE_STORE_DIR):
+    """Load the persisted state, or an empty one (forces a full build)."""
+    path = _state_path(store_dir)
+    if not os.path.exists(path):
+        print(f"  No feature store at {store_dir}; starting from full history.")
+        return FeatureState(store_dir)
+
+    state = joblib.load(path)
+    if getattr(state, 'version', None) != STORE_VERSION:
+        print(f"  Feature store at {store_dir} has an older layout; starting from full history.")
+        return FeatureState(store_dir)
+    state.store_dir = store_dir
+    print(f"  Feature store watermark: {state.watermark.date()}, sale_id {state.max_sale_id} "
+          f"({len(state.variant_closes)} variant closes, {state.rows} rows in {len(state.parts)} parts)")
+    return state
+
+
+def save_feature_state(state):
+    """Persist the state, then drop row parts it no longer references."""
+    if state.is_empty:
+        return
+    state.compact()
+    os.makedirs(state.store_dir, exist_ok=True)
+    tmp_path = _state_path(state.store_dir) + ".tmp"
+    joblib.dump(state, tmp_path)
+    os.replace(tmp_path, _state_path(state.store_dir))
+
+    live = {part['name'] for part in state.parts}
+    for name in os.listdir(state.store_dir):
+        if name.startswith("rows-") and name not in live:
+            os.remove(os.path.join(state.store_dir, name))
+    print(f"  Feature store saved to {state.store_dir} (watermark {state.watermark.date()}, "
+          f"sale_id {state.max_sale_id}, {state.rows} rows)")
+
+
+def extend_encoder(encoder, labels):
+    """Append labels the encoder has not seen yet; existing codes keep their values."""
+    unseen = pd.Index(pd.unique(np.asarray(labels, dtype=object))).difference(encoder.classes_, sort=False)
+    if len(unseen):
+        encoder.classes_ = np.concatenate([encoder.classes_, np.sort(unseen.to_numpy(dtype=object))])
+    return encoder
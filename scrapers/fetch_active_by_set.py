@@ -11,6 +11,8 @@ from datetime import datetime
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 from database import get_db_connection
+from product_floor import affected_product_ids, refresh_product_floors
+from pipeline_ledger import count_api_calls
 from ebay_service import EbayService
 from dotenv import load_dotenv
 
@@ -140,6 +142,7 @@ def fetch_set_listings(set_query, max_pages=100, stop_on_duplicate=True):
                 }
                 
                 print(f"Fetching page {page + 1} (offset={offset})...")
+                count_api_calls()
                 resp = client.get(BROWSE_URL, headers=headers, params=params)
                 resp.raise_for_status()
                 data = resp.json()
@@ -171,6 +174,7 @@ def fetch_set_listings(set_query, max_pages=100, stop_on_duplicate=True):
                         'price': float(item.get('price', {}).get('value', 0)),
                         'currency': item.get('price', {}).get('currency'),
                         'buyingOptions': item.get('buyingOptions', []),
+                        'bidCount': item.get('bidCount'),
                         'priorityListing': item.get('priorityListing', False),
                         'imageUrl': item.get('image', {}).get('imageUrl'),
                         'itemLocation': location,
@@ -229,6 +233,8 @@ def save_listings_for_set(set_name, set_query):
         
         matched = 0
         unmatched = 0
+        # Floors to refresh: the products these listings belonged to and the ones they map to now
+        touched = affected_product_ids(cur, [item['itemId'] for item in listings])
         
         for item in listings:
             title = item['title']
@@ -242,6 +248,7 @@ def save_listings_for_set(set_name, set_query):
             
             if product_id:
                 matched += 1
+                touched.add(product_id)
             else:
                 unmatched += 1
             
@@ -251,33 +258,47 @@ def save_listings_for_set(set_name, set_query):
             if any(x in title_lower for x in ['chase', 'razz', 'break', 'digital', 'lot of']):
                 is_ignored = True
             
+            cur.execute("SAVEPOINT listing")
             try:
                 cur.execute("""
                     INSERT INTO active_listings (
                         item_id, legacy_item_id, title, price, currency, 
                         buying_options, listing_url, image_url, item_location, 
                         priority_listing, start_date, end_date, origin_date, search_query, 
-                        updated_at, grader, grade, product_id, is_ignored
+                        updated_at, grader, grade, product_id, is_ignored, bid_count
                     )
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, %s, %s, %s, %s)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, %s, %s, %s, %s, %s)
                     ON CONFLICT (item_id) DO UPDATE SET
                         price = EXCLUDED.price,
                         updated_at = CURRENT_TIMESTAMP,
                         grader = EXCLUDED.grader,
                         grade = EXCLUDED.grade,
                         product_id = EXCLUDED.product_id,
-                        is_ignored = EXCLUDED.is_ignored;
+                        is_ignored = EXCLUDED.is_ignored,
+                        bid_count = EXCLUDED.bid_count;
                 """, (
                     item['itemId'], item['legacyItemId'], title, item['price'], item['currency'],
                     ",".join(item['buyingOptions']), item['itemWebUrl'], item['imageUrl'], 
                     json.dumps(item['itemLocation']),
                     item['priorityListing'], item['itemCreationDate'], item['itemEndDate'], 
                     item['itemOriginDate'], query,
-                    grader, grade, product_id, is_ignored
+                    grader, grade, product_id, is_ignored, item['bidCount']
                 ))
             except Exception as e:
+                cur.execute("ROLLBACK TO SAVEPOINT listing")
                 print(f"Error inserting {item['itemId']}: {e}")
+            else:
+                cur.execute("RELEASE SAVEPOINT listing")
         
+        # Savepoints keep one failed statement from aborting the transaction, which would make the
+        # commit below silently roll the whole batch back (rebuild_product_floors catches floors up)
+        cur.execute("SAVEPOINT floors")
+        try:
+            refresh_product_floors(cur, touched)
+            cur.execute("RELEASE SAVEPOINT floors")
+        except Exception as e:
+            cur.execute("ROLLBACK TO SAVEPOINT floors")
+            print(f"Error refreshing floors: {e}")
         conn.commit()
         print(f"  Matched: {matched}, Unmatched: {unmatched}")
         total_matched += matched
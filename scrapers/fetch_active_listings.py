@@ -11,6 +11,8 @@ import statistics
 from datetime import datetime
 from ebay_service import EbayService
 from database import get_db_connection
+from product_floor import affected_product_ids, refresh_product_floors
+from pipeline_ledger import count_api_calls
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -129,6 +131,7 @@ def fetch_active_for_card(query, max_pages=1):
                     "filter": "priceCurrency:USD"
                 }
                 
+                count_api_calls()
                 resp = client.get(BROWSE_URL, headers=headers, params=params)
                 resp.raise_for_status()
                 data = resp.json()
@@ -152,6 +155,7 @@ def fetch_active_for_card(query, max_pages=1):
                         'price': float(item.get('price', {}).get('value', 0)),
                         'currency': item.get('price', {}).get('currency'),
                         'buyingOptions': item.get('buyingOptions', []),
+                        'bidCount': item.get('bidCount'),
                         'priorityListing': item.get('priorityListing', False),
                         'imageUrl': item.get('image', {}).get('imageUrl'),
                         'itemLocation': location,
@@ -204,6 +208,8 @@ def save_active_listings():
                     break
         
         inserted_cnt = 0
+        # Floors to refresh: the products these listings belonged to and the ones they map to now
+        touched = affected_product_ids(cur, [item['itemId'] for item in listings])
         
         for item in listings:
             # 1. Parse Variant
@@ -213,6 +219,7 @@ def save_active_listings():
             # Look up: (player, year, set, subset, grader, grade)
             key = (player, year, set_name, subset, grader, grade)
             product_id = variant_map.get(key)
+            touched.add(product_id)
             
             # If "Chase" keyword in title -> Ignore
             is_ignored = False
@@ -226,15 +233,16 @@ def save_active_listings():
                 is_ignored = True
                 
             # DB Insert
+            cur.execute("SAVEPOINT listing")
             try:
                 cur.execute("""
                     INSERT INTO active_listings (
                         item_id, legacy_item_id, title, price, currency, 
                         buying_options, listing_url, image_url, item_location, 
                         priority_listing, start_date, end_date, origin_date, search_query, 
-                        updated_at, grader, grade, product_id, is_ignored
+                        updated_at, grader, grade, product_id, is_ignored, bid_count
                     )
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, %s, %s, %s, %s)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, %s, %s, %s, %s, %s)
                     ON CONFLICT (item_id) 
                     DO UPDATE SET
                         price = EXCLUDED.price,
@@ -242,17 +250,30 @@ def save_active_listings():
                         grader = EXCLUDED.grader,
                         grade = EXCLUDED.grade,
                         product_id = EXCLUDED.product_id,
-                        is_ignored = EXCLUDED.is_ignored;
+                        is_ignored = EXCLUDED.is_ignored,
+                        bid_count = EXCLUDED.bid_count;
                 """, (
                     item['itemId'], item['legacyItemId'], item['title'], item['price'], item['currency'],
                     ",".join(item['buyingOptions']), item['itemWebUrl'], item['imageUrl'], json.dumps(item['itemLocation']),
                     item['priorityListing'], item['itemCreationDate'], item['itemEndDate'], item['itemOriginDate'], query,
-                    grader, grade, product_id, is_ignored
+                    grader, grade, product_id, is_ignored, item['bidCount']
                 ))
                 inserted_cnt += 1
             except Exception as e:
+                cur.execute("ROLLBACK TO SAVEPOINT listing")
                 print(f"    Error inserting {item['itemId']}: {e}")
+            else:
+                cur.execute("RELEASE SAVEPOINT listing")
 
+        # Savepoints keep one failed statement from aborting the transaction, which would make the
+        # commit below silently roll the whole batch back (rebuild_product_floors catches floors up)
+        cur.execute("SAVEPOINT floors")
+        try:
+            refresh_product_floors(cur, touched)
+            cur.execute("RELEASE SAVEPOINT floors")
+        except Exception as e:
+            cur.execute("ROLLBACK TO SAVEPOINT floors")
+            print(f"    Error refreshing floors: {e}")
         conn.commit()
     
     cur.close()
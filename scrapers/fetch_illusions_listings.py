@@ -86,19 +86,20 @@ def sync_illusions():
                         item_id, legacy_item_id, title, price, currency, 
                         buying_options, listing_url, image_url, item_location, 
                         priority_listing, start_date, end_date, origin_date, search_query, 
-                        updated_at, grader, grade, product_id, is_ignored
+                        updated_at, grader, grade, product_id, is_ignored, bid_count
                     )
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, %s, %s, %s, %s)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, %s, %s, %s, %s, %s)
                     ON CONFLICT (item_id) DO UPDATE SET
                         price = EXCLUDED.price,
                         updated_at = CURRENT_TIMESTAMP,
                         product_id = EXCLUDED.product_id,
-                        is_ignored = EXCLUDED.is_ignored;
+                        is_ignored = EXCLUDED.is_ignored,
+                        bid_count = EXCLUDED.bid_count;
                 """, (
                     item['itemId'], item['legacyItemId'], item['title'], item['price'], item['currency'],
                     ",".join(item['buyingOptions']), item['itemWebUrl'], item['imageUrl'], json.dumps(item['itemLocation']),
                     item['priorityListing'], item['itemCreationDate'], item['itemEndDate'], item['itemOriginDate'], query,
-                    grader, grade, product_id, is_ignored
+                    grader, grade, product_id, is_ignored, item['bidCount']
                 ))
                 inserted_cnt += 1
             except Exception as e:
@@ -165,7 +165,7 @@ def update_sales():
                 cur.execute("""
                     INSERT INTO sales (transaction_id, product_id, price, sale_date, grader, grade, source, title)
                     VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (transaction_id, source) DO NOTHING
+                    ON CONFLICT DO NOTHING  -- (transaction_id, source): the unique key, or sales_transaction_id_source_keys once partitioned
                 """, (txn_id, product_id, price, sale_date, grader, grade, 'eBay', title))
                 count_inserted += 1
             except Exception as e:
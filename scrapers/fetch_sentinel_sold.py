@@ -6,6 +6,7 @@ import time
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 from database import get_db_connection
+from pipeline_ledger import count_api_calls
 from datetime import datetime
 
 # Set Map (Expand as needed)
@@ -36,6 +37,7 @@ def backfill_urls(conn):
             continue
             
         print(f"Backfilling URLs for set: {set_name} from {url}")
+        count_api_calls()
         resp = requests.get(url, headers=get_headers())
         if resp.status_code != 200:
             print(f"Failed to load set page: {resp.status_code}")
@@ -88,6 +90,7 @@ def scrape_sentinel_sales():
         print(f"Checking {player} [{variant_str}]: {url}")
 
         try:
+            count_api_calls()
             resp = requests.get(url, headers=get_headers())
             if resp.status_code != 200:
                 continue
@@ -0,0 +1,237 @@
+"""Flattened-array evaluator for the trained boosting ensembles.
+
+compile_ensemble() turns a fitted GradientBoosting* or HistGradientBoosting*
+model (regressor, or binary classifier) into one set of NumPy node arrays for
+all trees: feature, threshold, left, right, value (shrinkage already applied),
+plus the missing-value direction and, for native categorical splits, a
+go-left lookup table indexed by the raw label-encoded category.
+
+Leaves point to themselves, so a batch is evaluated by stepping every
+(row, tree) cursor down one level at a time for max_depth levels with no
+per-row Python work. predict_one() does the same over the trees of a single
+row on plain 1-D arrays, skipping sklearn's per-call validation; that is the
+path for one-off "what is this card worth" lookups. Large batches (the nightly
+scorer) are still faster through sklearn's multi-threaded Cython predictors;
+the flat evaluator wins below a few hundred rows (score_forecasts.FLAT_MAX_ROWS).
+
+Comparisons follow sklearn exactly: GradientBoosting trees compare float32
+inputs, HistGradientBoosting float64, so outputs match up to summation order.
+"""
+
+import numpy as np
+from scipy.special import expit
+from sklearn.ensemble import (
+    GradientBoostingRegressor, GradientBoostingClassifier,
+    HistGradientBoostingRegressor, HistGradientBoostingClassifier,
+)
+
+BATCH_ROWS = 4096  # rows stepped together; keeps the (rows x trees) cursors cache-sized
+
+
+class FlatEnsemble:
+    """
+    All trees of one model in flat arrays.
+
+    Exposes predict (and predict_proba for classifiers) so it can stand in for
+    the sklearn model in score_variants / predict_grid.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, missing_left, cat_row, cat_table,
+                 roots, max_depth, base, link, x_dtype, feature_names=None, classes=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.missing_left = missing_left
+        self.cat_row = cat_row          # -1 for numeric splits and leaves
+        self.cat_table = cat_table      # (categorical nodes, category width) go-left flags
+        self.roots = roots
+        self.max_depth = max_depth
+        self.base = base
+        self.link = link                # 'identity' or 'logistic'
+        self.x_dtype = x_dtype
+        self.feature_names = feature_names
+        self.classes_ = classes
+        self._has_categorical = bool((cat_row >= 0).any())
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def _as_array(self, X):
+        if hasattr(X, 'columns') and self.feature_names is not None and list(X.columns) != self.feature_names:
+            raise ValueError(f"Feature columns {list(X.columns)} do not match training order {self.feature_names}")
+        X = np.asarray(X)
+        # Round through the dtype sklearn compares in, then compare in float64
+        return X.astype(self.x_dtype).astype(np.float64, copy=False)
+
+    def _step(self, node, x):
+        """One level down for cursors `node` holding feature values `x` (same shape)."""
+        go_left = x <= self.threshold[node]
+        missing = np.isnan(x)
+        if missing.any():
+            go_left = np.where(missing, self.missing_left[node], go_left)
+        if self._has_categorical:
+            rows = self.cat_row[node]
+            categorical = rows >= 0
+            if categorical.any():
+                code = x[categorical]
+                width = self.cat_table.shape[1]
+                valid = (code >= 0) & (code < width) & (code == np.floor(code))
+                looked_up = self.cat_table[rows[categorical], np.where(valid, code, 0).astype(np.intp)]
+                go_left[categorical] = np.where(valid, looked_up, self.missing_left[node[categorical]])
+        return np.where(go_left, self.left[node], self.right[node])
+
+    def raw_predict(self, X):
+        """Sum of leaf values plus the baseline, before the link function."""
+        X = self._as_array(X)
+        out = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), BATCH_ROWS):
+            block = X[start:start + BATCH_ROWS]
+            row_index = np.arange(len(block))[:, None]
+            node = np.broadcast_to(self.roots, (len(block), self.n_trees))
+            for _ in range(self.max_depth):
+                node = self._step(node, block[row_index, self.feature[node]])
+            out[start:start + len(block)] = self.base + self.value[node].sum(axis=1)
+        return out
+
+    def _output(self, raw):
+        return expit(raw) if self.link == 'logistic' else raw
+
+    def predict_value(self, X):
+        """Price for a regressor, P(class 1) for a classifier."""
+        return self._output(self.raw_predict(X))
+
+    def predict(self, X):
+        value = self.predict_value(X)
+        if self.classes_ is None:
+            return value
+        return self.classes_[(value > 0.5).astype(np.intp)]
+
+    def predict_proba(self, X):
+        if self.classes_ is None:
+            raise AttributeError("predict_proba is only available for classifiers")
+        p = self.predict_value(X)
+        return np.column_stack([1 - p, p])
+
+    def predict_one(self, row):
+        """Single-row fast path: `row` is a 1-D sequence in training column order."""
+        x = np.asarray(row).astype(self.x_dtype).astype(np.float64, copy=False)
+        node = self.roots
+        for _ in range(self.max_depth):
+            node = self._step(node, x[self.feature[node]])
+        return float(self._output(self.base + self.value[node].sum()))
+
+
+def _flatten(trees):
+    """Concatenate per-tree node dicts (tree-local child indices) into global arrays."""
+    sizes = np.array([len(t['feature']) for t in trees])
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int32)
+    arrays = {}
+    for name in ('feature', 'threshold', 'value', 'missing_left', 'cat_row'):
+        arrays[name] = np.concatenate([t[name] for t in trees])
+    for name in ('left', 'right'):
+        arrays[name] = np.concatenate([t[name] + off for t, off in zip(trees, offsets)]).astype(np.int32)
+    arrays['roots'] = offsets
+    return arrays
+
+
+def _compile_gbm(model):
+    if isinstance(model, GradientBoostingClassifier) and model.loss != 'log_loss':
+        raise ValueError(f"Classifier loss {model.loss!r} has no logistic link")
+    if model.estimators_.shape[1] != 1:
+        raise ValueError("Only regressors and binary classifiers can be compiled")
+    trees, max_depth = [], 0
+    for estimator in model.estimators_[:, 0]:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == -1
+        node_ids = np.arange(tree.node_count, dtype=np.int32)
+        trees.append({
+            'feature': np.where(is_leaf, 0, tree.feature).astype(np.int32),
+            'threshold': tree.threshold.astype(np.float64),
+            'left': np.where(is_leaf, node_ids, tree.children_left).astype(np.int32),
+            'right': np.where(is_leaf, node_ids, tree.children_right).astype(np.int32),
+            'value': tree.value[:, 0, 0] * model.learning_rate,
+            'missing_left': tree.missing_go_to_left.astype(bool),
+            'cat_row': np.full(tree.node_count, -1, dtype=np.int32),
+        })
+        max_depth = max(max_depth, tree.max_depth)
+    # The init estimator is a constant (mean / prior log-odds) for the default init
+    base = float(model._raw_predict_init(np.zeros((1, model.n_features_in_), dtype=np.float32))[0, 0])
+    return _flatten(trees), max_depth, base, np.empty((0, 0), dtype=bool), np.float32
+
+
+def _in_bitset(bitset, code):
+    return bool((bitset[code >> 5] >> np.uint32(code & 31)) & 1)
+
+
+def _compile_hist(model):
+    if model.n_trees_per_iteration_ != 1:
+        raise ValueError("Only regressors and binary classifiers can be compiled")
+
+    # With categorical features sklearn ordinal-encodes them and moves them first
+    n_features = model.n_features_in_
+    is_categorical = model.is_categorical_ if model.is_categorical_ is not None else np.zeros(n_features, bool)
+    remapped = np.concatenate([np.flatnonzero(is_categorical), np.flatnonzero(~is_categorical)])
+    categories = {}
+    if is_categorical.any():
+        encoder = model._preprocessor.named_transformers_['encoder']
+        for f, cats in zip(np.flatnonzero(is_categorical), encoder.categories_):
+            cats = np.asarray(cats, dtype=np.float64)
+            cats = cats[~np.isnan(cats)]
+            if ((cats < 0) | (cats != np.floor(cats))).any():
+                raise ValueError("Categorical features must be non-negative integer codes")
+            categories[f] = cats.astype(np.int64)
+    width = max((int(c.max()) + 1 for c in categories.values() if len(c)), default=0)
+
+    trees, cat_rows, max_depth = [], [], 0
+    for (predictor,) in model._predictors:
+        nodes = predictor.nodes
+        node_ids = np.arange(len(nodes), dtype=np.int32)
+        is_leaf = nodes['is_leaf'].astype(bool)
+        feature = remapped[nodes['feature_idx']]
+        cat_row = np.full(len(nodes), -1, dtype=np.int32)
+        for i in np.flatnonzero(nodes['is_categorical'].astype(bool) & ~is_leaf):
+            go_left = np.full(width, bool(nodes['missing_go_to_left'][i]))  # unknown -> missing
+            bitset = predictor.raw_left_cat_bitsets[nodes['bitset_idx'][i]]
+            for code, raw in enumerate(categories[feature[i]]):
+                go_left[raw] = _in_bitset(bitset, code)
+            cat_row[i] = len(cat_rows)
+            cat_rows.append(go_left)
+        trees.append({
+            'feature': np.where(is_leaf, 0, feature).astype(np.int32),
+            'threshold': nodes['num_threshold'].astype(np.float64),
+            'left': np.where(is_leaf, node_ids, nodes['left']).astype(np.int32),
+            'right': np.where(is_leaf, node_ids, nodes['right']).astype(np.int32),
+            'value': nodes['value'].astype(np.float64),
+            'missing_left': nodes['missing_go_to_left'].astype(bool),
+            'cat_row': cat_row,
+        })
+        max_depth = max(max_depth, int(nodes['depth'].max()))
+    cat_table = np.array(cat_rows, dtype=bool).reshape(len(cat_rows), width)
+    return _flatten(trees), max_depth, float(model._baseline_prediction[0, 0]), cat_table, np.float64
+
+
+def compile_ensemble(model):
+    """Flatten a fitted (Hist)GradientBoosting regressor or binary classifier."""
+    if isinstance(model, (GradientBoostingRegressor, GradientBoostingClassifier)):
+        arrays, max_depth, base, cat_table, x_dtype = _compile_gbm(model)
+    elif isinstance(model, (HistGradientBoostingRegressor, HistGradientBoostingClassifier)):
+        arrays, max_depth, base, cat_table, x_dtype = _compile_hist(model)
+    else:
+        raise TypeError(f"Cannot compile {type(model).__name__}")
+
+    is_classifier = isinstance(model, (GradientBoostingClassifier, HistGradientBoostingClassifier))
+    feature_names = getattr(model, 'feature_names_in_', None)
+    return FlatEnsemble(
+        arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'], arrays['value'],
+        arrays['missing_left'], arrays['cat_row'], cat_table, arrays['roots'], max_depth, base,
+        link='logistic' if is_classifier else 'identity', x_dtype=x_dtype,
+        feature_names=list(feature_names) if feature_names is not None else None,
+        classes=model.classes_ if is_classifier else None,
+    )
@@ -0,0 +1,169 @@
+"""Estimator backends for the dual forecast (price regressor + direction classifier).
+
+- gbm:  sklearn GradientBoosting* (the original models; single-threaded)
+- hist: sklearn HistGradientBoosting* (binned, multi-core via OpenMP, native
+        categorical splits on the player / parallel encodings, early stopping)
+
+Besides the two heads, fit_heads() can fit quantile regressors for a price
+band (P10 / P90 by default). Every model is independent, so each is fitted on
+its own thread. That is real concurrency for the hist backend only: its
+OpenMP-parallel histogram fits run without the GIL, while gbm's per-stage
+Python loop holds it, so gbm heads largely take turns. Each fit's OpenMP pool
+is capped at its share of the cores (cpu_count // models), as sharded_model
+does per shard, so concurrent hist heads do not oversubscribe the machine.
+The band models are smaller than the price head (they only have to place the
+band edges), which keeps a full train under 2x the dual cost.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from threadpoolctl import threadpool_limits
+from sklearn.ensemble import (
+    GradientBoostingRegressor, GradientBoostingClassifier,
+    HistGradientBoostingRegressor, HistGradientBoostingClassifier,
+)
+
+BACKENDS = ('gbm', 'hist')
+DEFAULT_BACKEND = 'gbm'
+
+MODEL_PARAMS = {
+    'gbm': {
+        'price': dict(n_estimators=100, max_depth=5, random_state=42),
+        'direction': dict(n_estimators=100, max_depth=3, random_state=42),
+        'band': dict(n_estimators=60, max_depth=3, random_state=42),
+    },
+    'hist': {
+        'price': dict(max_iter=500, max_depth=5, learning_rate=0.1, early_stopping=True,
+                      validation_fraction=0.1, n_iter_no_change=20, random_state=42),
+        'direction': dict(max_iter=500, max_depth=3, learning_rate=0.1, early_stopping=True,
+                          validation_fraction=0.1, n_iter_no_change=20, random_state=42),
+        'band': dict(max_iter=300, max_depth=3, learning_rate=0.1, early_stopping=True,
+                     validation_fraction=0.1, n_iter_no_change=20, random_state=42),
+    },
+}
+
+BAND_QUANTILES = (0.1, 0.9)
+
+# Label-encoded features that are categories, not magnitudes
+CATEGORICAL_FEATURES = ['player_encoded', 'parallel_encoded']
+MAX_NATIVE_CATEGORIES = 255  # HistGradientBoosting bins categories into at most 255 values
+
+
+def categorical_mask(columns, X=None, cardinalities=None):
+    """
+    Boolean mask of features to treat as native categoricals.
+
+    A label encoding with more categories than HistGradientBoosting can bin
+    falls back to being split on numerically (as the gbm backend does).
+    """
+    mask = np.zeros(len(columns), dtype=bool)
+    for i, col in enumerate(columns):
+        if col not in CATEGORICAL_FEATURES:
+            continue
+        if cardinalities and col in cardinalities:
+            n = cardinalities[col]
+        elif X is not None:
+            n = int(np.max(X[:, i])) + 1 if len(X) else 0
+        else:
+            continue
+        mask[i] = n <= MAX_NATIVE_CATEGORIES
+    return mask
+
+
+def build_price_model(backend=DEFAULT_BACKEND, params=None, categorical=None):
+    params = {**MODEL_PARAMS[backend]['price'], **(params or {})}
+    if backend == 'hist':
+        return HistGradientBoostingRegressor(categorical_features=categorical, **params)
+    return GradientBoostingRegressor(**params)
+
+
+def build_direction_model(backend=DEFAULT_BACKEND, params=None, categorical=None):
+    params = {**MODEL_PARAMS[backend]['direction'], **(params or {})}
+    if backend == 'hist':
+        return HistGradientBoostingClassifier(categorical_features=categorical, **params)
+    return GradientBoostingClassifier(**params)
+
+
+def build_band_model(quantile, backend=DEFAULT_BACKEND, params=None, categorical=None):
+    params = {**MODEL_PARAMS[backend]['band'], **(params or {})}
+    if backend == 'hist':
+        return HistGradientBoostingRegressor(loss='quantile', quantile=quantile,
+                                             categorical_features=categorical, **params)
+    return GradientBoostingRegressor(loss='quantile', alpha=quantile, **params)
+
+
+def band_head(quantile):
+    """Model name of a band edge: 0.1 -> 'p10'."""
+    return f"p{round(quantile * 100)}"
+
+
+def predict_band(bands, X):
+    """
+    (low, high) band edges from {quantile: model}. Edges are sorted per row,
+    so independently fitted quantiles that cross cannot invert the band.
+    """
+    edges = np.column_stack([bands[q].predict(X) for q in sorted(bands)])
+    edges.sort(axis=1)
+    return edges[:, 0], edges[:, -1]
+
+
+def _timed_fit(model, X, y, threads=None):
+    start = time.perf_counter()
+    if threads is None:
+        model.fit(X, y)
+    else:
+        # OpenMP thread counts are per calling thread, so concurrent fits each get their own cap
+        with threadpool_limits(limits=threads, user_api='openmp'):
+            model.fit(X, y)
+    return model, time.perf_counter() - start
+
+
+def fit_heads(X, y_price, y_direction, backend=DEFAULT_BACKEND, columns=None, cardinalities=None,
+              price_params=None, direction_params=None, quantiles=(), concurrent=True):
+    """
+    Build and fit both heads plus one quantile regressor per entry of
+    `quantiles`. Returns (models, timings): models maps 'price', 'direction'
+    and band_head(q) to fitted estimators; timings holds '<name>_s' per model
+    and total wall seconds.
+    """
+    categorical = None
+    if backend == 'hist':
+        columns = list(columns if columns is not None else X.columns)
+        X_values = X.to_numpy() if hasattr(X, 'to_numpy') else X
+        categorical = categorical_mask(columns, X_values, cardinalities)
+        if not categorical.any():
+            categorical = None
+
+    jobs = {
+        'price': (build_price_model(backend, price_params, categorical), y_price),
+        'direction': (build_direction_model(backend, direction_params, categorical), y_direction),
+    }
+    for quantile in quantiles:
+        jobs[band_head(quantile)] = (build_band_model(quantile, backend, categorical=categorical), y_price)
+
+    start = time.perf_counter()
+    if concurrent:
+        threads = max(1, (os.cpu_count() or 1) // len(jobs))
+        with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+            futures = {name: pool.submit(_timed_fit, model, X, y, threads) for name, (model, y) in jobs.items()}
+            results = {name: future.result() for name, future in futures.items()}
+    else:
+        results = {name: _timed_fit(model, X, y) for name, (model, y) in jobs.items()}
+
+    models = {name: model for name, (model, _) in results.items()}
+    timings = {f"{name}_s": seconds for name, (_, seconds) in results.items()}
+    timings['total_s'] = time.perf_counter() - start
+    return models, timings
+
+
+def fit_dual(X, y_price, y_direction, backend=DEFAULT_BACKEND, columns=None, cardinalities=None,
+             price_params=None, direction_params=None, concurrent=True):
+    """
+    Build and fit both heads. Returns (regressor, classifier, timings) where
+    timings holds per-head and total wall seconds.
+    """
+    models, timings = fit_heads(X, y_price, y_direction, backend, columns, cardinalities,
+                                price_params, direction_params, concurrent=concurrent)
+    return models['price'], models['direction'], timings
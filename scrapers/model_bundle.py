@@ -0,0 +1,230 @@
+"""Versioned model bundle: both heads, the encoders and the feature schema.
+
+Training used to write four loose pickles (model.pkl, model_direction.pkl,
+le_player.pkl, le_parallel.pkl) that every consumer unpickled at startup with
+nothing tying them together. A bundle is one directory:
+
+  manifest.json             format version, model version, feature column
+                            order, training metadata, estimators file name
+  estimators_<version>.joblib
+                            {'price', 'direction', 'le_player', 'le_parallel'}
+                            plus the price band models ('p10', 'p90'),
+                            dumped uncompressed so numpy arrays inside the
+                            estimators can be memory-mapped at load time
+
+Opening a bundle only reads the manifest (and checks the caller's feature
+columns against it); the estimators are loaded on first use and the opened
+bundle is cached per process. joblib maps every array separately, which costs
+more than it saves on small models, so only estimator files of at least
+MMAP_MIN_BYTES are memory-mapped. Saving writes a new estimators file and then
+swaps the manifest in atomically, so a reader never sees a half-written bundle.
+The previous version's estimators file is kept until the save after that, so a
+bundle opened just before a retrain can still load its estimators.
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime
+import joblib
+import sklearn
+from flat_ensemble import compile_ensemble
+from model_backends import band_head
+
+MODEL_BUNDLE_PATH = "backend/model_bundle"
+MANIFEST_NAME = "manifest.json"
+BUNDLE_FORMAT = 1  # bump when the bundle layout changes
+MMAP_MIN_BYTES = 64 * 1024 * 1024
+
+LEGACY_PATHS = {
+    'price': "backend/model.pkl",
+    'direction': "backend/model_direction.pkl",
+    'le_player': "backend/le_player.pkl",
+    'le_parallel': "backend/le_parallel.pkl",
+}
+
+_bundles = {}
+
+
+class BundleError(ValueError):
+    """The bundle is missing, of another format, or was trained on other features."""
+
+
+class ModelBundle:
+    """
+    An opened bundle. Estimators are loaded lazily on first attribute access.
+
+    mmap: memory-map the estimator arrays (None: only if the file is at least
+          MMAP_MIN_BYTES).
+    """
+
+    def __init__(self, path=MODEL_BUNDLE_PATH, mmap=None):
+        self.path = path
+        self.mmap = mmap
+        manifest_path = os.path.join(path, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            raise BundleError(f"No model bundle at {path}; run train_model.py "
+                              f"(or `python model_bundle.py --from-legacy`)")
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != BUNDLE_FORMAT:
+            raise BundleError(f"Model bundle at {path} has format {self.manifest.get('format')}, "
+                              f"expected {BUNDLE_FORMAT}; retrain the models")
+        self._estimators = None
+        self._flat = {}
+
+    @property
+    def version(self):
+        return self.manifest['model_version']
+
+    @property
+    def feature_columns(self):
+        return self.manifest['feature_columns']
+
+    @property
+    def metadata(self):
+        return self.manifest['metadata']
+
+    @property
+    def band_quantiles(self):
+        return self.manifest.get('band_quantiles', [])
+
+    def check_features(self, columns):
+        """Raise BundleError unless `columns` is exactly the training column order."""
+        columns = list(columns)
+        if columns == self.feature_columns:
+            return
+        missing = [c for c in self.feature_columns if c not in columns]
+        extra = [c for c in columns if c not in self.feature_columns]
+        detail = f"missing {missing}, unexpected {extra}" if missing or extra else "same columns, different order"
+        raise BundleError(f"Model {self.version} was trained on other features ({detail})")
+
+    def _load(self):
+        if self._estimators is None:
+            path = os.path.join(self.path, self.manifest['estimators'])
+            mmap = self.mmap if self.mmap is not None else os.path.getsize(path) >= MMAP_MIN_BYTES
+            self._estimators = joblib.load(path, mmap_mode='r' if mmap else None)
+        return self._estimators
+
+    @property
+    def regressor(self):
+        return self._load()['price']
+
+    @property
+    def classifier(self):
+        return self._load()['direction']
+
+    @property
+    def bands(self):
+        """{quantile: regressor} for the price band; empty for bundles trained without one."""
+        estimators = self._load()
+        return {q: estimators[band_head(q)] for q in self.band_quantiles}
+
+    def flat(self, head):
+        """A head ('price', 'direction', 'p10', ...) compiled for low-latency scoring (cached)."""
+        if head not in self._flat:
+            self._flat[head] = compile_ensemble(self._load()[head])
+        return self._flat[head]
+
+    @property
+    def le_player(self):
+        return self._load()['le_player']
+
+    @property
+    def le_parallel(self):
+        return self._load()['le_parallel']
+
+
+def load_model_bundle(path=MODEL_BUNDLE_PATH, feature_columns=None):
+    """
+    Open (once per process) the bundle at `path`.
+
+    feature_columns: the columns the caller will score with; a mismatch with
+                     the training order raises BundleError before anything
+                     is unpickled.
+    """
+    key = os.path.abspath(path)
+    manifest_path = os.path.join(path, MANIFEST_NAME)
+    # Keyed on the manifest's mtime so a long-lived process picks up a retrain
+    manifest_mtime = os.path.getmtime(manifest_path) if os.path.exists(manifest_path) else None
+    cached = _bundles.get(key)
+    if cached is None or cached[0] != manifest_mtime:
+        cached = (manifest_mtime, ModelBundle(path))
+        _bundles[key] = cached
+    bundle = cached[1]
+    if feature_columns is not None:
+        bundle.check_features(feature_columns)
+    return bundle
+
+
+def save_model_bundle(regressor, classifier, le_player, le_parallel, feature_columns,
+                      metadata=None, path=MODEL_BUNDLE_PATH, bands=None):
+    """
+    Write a new bundle version under `path` and return its model version.
+    Raises FileExistsError rather than overwrite an existing version.
+
+    bands: optional {quantile: regressor} price band models.
+    """
+    os.makedirs(path, exist_ok=True)
+    version = datetime.now().strftime("dual_%Y%m%d_%H%M%S_%f")
+    estimators_name = f"estimators_{version}.joblib"
+    bands = bands or {}
+    estimators = {'price': regressor, 'direction': classifier, 'le_player': le_player, 'le_parallel': le_parallel}
+    estimators.update({band_head(q): model for q, model in bands.items()})
+    # Exclusive create: an existing version (another save in the same microsecond) is never overwritten
+    with open(os.path.join(path, estimators_name), 'xb') as f:
+        joblib.dump(estimators, f)
+
+    previous = _manifest_estimators(path)
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'model_version': version,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'estimators': estimators_name,
+        'feature_columns': list(feature_columns),
+        'band_quantiles': sorted(bands),
+        'sklearn_version': sklearn.__version__,
+        'metadata': metadata or {},
+    }
+    tmp_path = os.path.join(path, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, default=str)
+    os.replace(tmp_path, os.path.join(path, MANIFEST_NAME))
+
+    # Older estimator files, except the one readers of the previous manifest may still load;
+    # open memory maps of them stay valid after unlink
+    for name in os.listdir(path):
+        if name.startswith("estimators_") and name not in (estimators_name, previous):
+            os.remove(os.path.join(path, name))
+    return version
+
+
+def _manifest_estimators(path):
+    """The estimators file the current manifest at `path` points to, if any."""
+    manifest_path = os.path.join(path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f).get('estimators')
+
+
+def bundle_from_legacy(feature_columns, path=MODEL_BUNDLE_PATH):
+    """Package the four loose pickles from older training runs as a bundle."""
+    loaded = {name: joblib.load(legacy) for name, legacy in LEGACY_PATHS.items()}
+    metadata = {'source': 'legacy pickles',
+                'legacy_saved_at': datetime.fromtimestamp(os.path.getmtime(LEGACY_PATHS['price'])).isoformat()}
+    return save_model_bundle(loaded['price'], loaded['direction'], loaded['le_player'], loaded['le_parallel'],
+                             feature_columns, metadata, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or create the model bundle")
+    parser.add_argument("--from-legacy", action="store_true",
+                        help="Build the bundle from backend/model.pkl, model_direction.pkl and the encoders")
+    args = parser.parse_args()
+
+    if args.from_legacy:
+        from train_model import FEATURE_COLUMNS
+        print(f"Bundled legacy models as {bundle_from_legacy(FEATURE_COLUMNS)}")
+    bundle = load_model_bundle()
+    print(json.dumps(bundle.manifest, indent=2))
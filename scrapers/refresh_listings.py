@@ -6,9 +6,12 @@ Orchestrates the tiered refresh of eBay listings:
 2. For each card, fetches current listings from eBay API
 3. Compares with stored active_listings:
    - New listings: INSERT
-   - Existing listings: UPDATE last_seen_at
+   - Existing listings: UPDATE last_seen_at, price and bid_count
    - Disappeared listings: Mark is_active=FALSE, set disappeared_at
+   - Recomputes the card's product_floor row
 4. Updates last_refreshed_at and calculates next_refresh_due
+
+Disappearances are classified as implied sales by backend/calc_implied_sales.py.
 """
 
 import os
@@ -20,7 +23,10 @@ from dotenv import load_dotenv
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from backend.database import get_db_connection
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+from database import get_db_connection
+from product_floor import refresh_product_floors
+from pipeline_ledger import start_run, finish_run, track_stage, count_api_calls
 
 load_dotenv()
 
@@ -69,6 +75,7 @@ def fetch_ebay_listings_by_epid(epid):
     }
     
     try:
+        count_api_calls()
         resp = requests.get(url, headers=headers, params=params, timeout=30)
         if resp.status_code == 200:
             data = resp.json()
@@ -80,6 +87,11 @@ def fetch_ebay_listings_by_epid(epid):
         print(f"  eBay API exception: {e}")
         return []
 
+def listing_price(item):
+    """Current price: the current bid for auctions, else the (possibly revised) list price."""
+    current_bid = item.get('currentBidPrice') or {}
+    return float(current_bid.get('value', 0)) or float(item.get('price', {}).get('value', 0))
+
 def process_card_refresh(conn, product_id, epid, tier):
     """Process refresh for a single card"""
     cur = conn.cursor()
@@ -102,27 +114,32 @@ def process_card_refresh(conn, product_id, epid, tier):
     existing_ids = ebay_item_ids & db_item_ids
     disappeared_ids = db_item_ids - ebay_item_ids
     
-    # 4. Insert new listings
+    # 4. Insert new listings (a listing that reappears is active again)
     for item in ebay_listings:
         item_id = item.get('itemId')
         if item_id in new_ids:
-            price_val = item.get('price', {}).get('value', 0)
+            price_val = listing_price(item)
             title = item.get('title', '')[:255]
-            listing_type = 'FIXED_PRICE' if item.get('buyingOptions') and 'FIXED_PRICE' in item.get('buyingOptions', []) else 'AUCTION'
             
             cur.execute("""
-                INSERT INTO active_listings (product_id, item_id, price, title, listing_type, last_seen_at, is_active)
-                VALUES (%s, %s, %s, %s, %s, %s, TRUE)
-                ON CONFLICT (item_id) DO UPDATE SET last_seen_at = %s, is_active = TRUE
-            """, (product_id, item_id, price_val, title, listing_type, now, now))
-    
-    # 5. Update last_seen_at for existing
+                INSERT INTO active_listings (product_id, item_id, price, bid_count, title, buying_options, last_seen_at, is_active)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, TRUE)
+                ON CONFLICT (item_id) DO UPDATE SET
+                    last_seen_at = EXCLUDED.last_seen_at, is_active = TRUE, disappeared_at = NULL,
+                    price = EXCLUDED.price, bid_count = EXCLUDED.bid_count
+            """, (product_id, item_id, price_val, item.get('bidCount'), title,
+                  ",".join(item.get('buyingOptions', [])), now))
+    
+    # 5. Update last_seen_at, price (revisions, current bid) and bids for existing, in one statement
     if existing_ids:
+        seen = [item for item in ebay_listings if item.get('itemId') in existing_ids]
         cur.execute("""
-            UPDATE active_listings 
-            SET last_seen_at = %s 
-            WHERE item_id = ANY(%s)
-        """, (now, list(existing_ids)))
+            UPDATE active_listings a
+            SET last_seen_at = %s, price = u.price, bid_count = u.bid_count
+            FROM unnest(%s::varchar[], %s::numeric[], %s::int[]) AS u(item_id, price, bid_count)
+            WHERE a.item_id = u.item_id
+        """, (now, [item['itemId'] for item in seen], [listing_price(item) for item in seen],
+              [item.get('bidCount') for item in seen]))
     
     # 6. Mark disappeared listings
     if disappeared_ids:
@@ -132,7 +149,10 @@ def process_card_refresh(conn, product_id, epid, tier):
             WHERE item_id = ANY(%s) AND is_active = TRUE
         """, (now, list(disappeared_ids)))
     
-    # 7. Update card refresh timestamps
+    # 7. Recompute the card's floor from its active listings
+    refresh_product_floors(cur, [product_id])
+    
+    # 8. Update card refresh timestamps
     next_refresh = today + timedelta(days=TIER_INTERVALS.get(tier, 7))
     cur.execute("""
         UPDATE cards 
@@ -146,47 +166,54 @@ def process_card_refresh(conn, product_id, epid, tier):
     return len(new_ids), len(disappeared_ids)
 
 def refresh_listings():
-    """Main refresh orchestration"""
+    """Main refresh orchestration (recorded in the pipeline run ledger)"""
     print(f"Starting tiered refresh at {datetime.now()}")
+    run_id = start_run('refresh_listings')
     conn = get_db_connection()
-    
-    cards = get_cards_due_for_refresh(conn)
-    print(f"Found {len(cards)} cards due for refresh.")
-    
-    if not cards:
-        print("No cards due for refresh today.")
+    try:
+        with track_stage(run_id, 'due_cards'):
+            cards = get_cards_due_for_refresh(conn)
+        print(f"Found {len(cards)} cards due for refresh.")
+
+        if not cards:
+            print("No cards due for refresh today.")
+            finish_run(run_id, 'done')
+            return
+
+        total_new = 0
+        total_disappeared = 0
+        api_calls = 0
+
+        with track_stage(run_id, 'refresh_cards'):
+            for product_id, epid, tier in cards:
+                if not epid:
+                    continue
+
+                print(f"Refreshing product {product_id} (Tier {tier}, EPID: {epid[:20]}...)")
+                new_count, disappeared_count = process_card_refresh(conn, product_id, epid, tier)
+
+                total_new += new_count
+                total_disappeared += disappeared_count
+                api_calls += 1
+
+                # Rate limiting
+                time.sleep(0.5)
+
+                # Safety limit
+                if api_calls >= 500:
+                    print("Reached daily API call safety limit (500)")
+                    break
+        finish_run(run_id, 'done')
+    except Exception:
+        finish_run(run_id, 'failed')
+        raise
+    finally:
         conn.close()
-        return
-    
-    total_new = 0
-    total_disappeared = 0
-    api_calls = 0
-    
-    for product_id, epid, tier in cards:
-        if not epid:
-            continue
-            
-        print(f"Refreshing product {product_id} (Tier {tier}, EPID: {epid[:20]}...)")
-        new_count, disappeared_count = process_card_refresh(conn, product_id, epid, tier)
-        
-        total_new += new_count
-        total_disappeared += disappeared_count
-        api_calls += 1
-        
-        # Rate limiting
-        time.sleep(0.5)
-        
-        # Safety limit
-        if api_calls >= 500:
-            print("Reached daily API call safety limit (500)")
-            break
-    
+
     print(f"\nRefresh Complete:")
     print(f"  Cards processed: {api_calls}")
     print(f"  New listings: {total_new}")
     print(f"  Disappeared listings: {total_disappeared}")
-    
-    conn.close()
 
 if __name__ == "__main__":
     refresh_listings()
@@ -0,0 +1,259 @@
+"""Local columnar snapshot of the joined sales frame.
+
+train_model.load_data() used to run the full `sales JOIN cards` query on every
+training / verification run. The snapshot keeps that frame on disk as
+uncompressed Arrow IPC part files (so reads are memory-mapped, zero-copy and
+column-selective) plus a manifest with the sale_id / created_at watermark.
+A refresh only pulls sales with sale_id past the watermark and appends them
+as a new part.
+
+New sales are streamed from a server-side cursor in chunks and written batch by
+batch, and columns are stored compactly (float32 price, int32 ids, strings
+that come back as pandas categories), so even a full rebuild of the
+multi-year history runs in bounded memory.
+
+The snapshot is append-only: edits to existing sales or card attributes are
+not picked up until `python sales_snapshot.py --rebuild`.
+"""
+
+import argparse
+import json
+import os
+import sys
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from database import get_db_connection
+from stream_loader import stream_query, apply_dtypes, peak_rss_mb
+
+SNAPSHOT_DIR = "backend/sales_snapshot"
+SNAPSHOT_VERSION = 2  # bump when SNAPSHOT_SCHEMA changes; forces a rebuild
+MANIFEST_NAME = "manifest.json"
+MAX_PARTS = 32  # compact into a single part beyond this
+
+# Columns train_model.load_data() has always returned
+SALES_COLUMNS = [
+    'price', 'sale_date', 'grade', 'grader', 'product_id', 'player_name',
+    'year', 'set_name', 'parallel_type', 'is_rookie_card'
+]
+
+SNAPSHOT_SCHEMA = pa.schema([
+    ('sale_id', pa.int64()),
+    ('created_at', pa.timestamp('us')),
+    ('price', pa.float32()),
+    ('sale_date', pa.timestamp('us')),
+    ('grade', pa.string()),
+    ('grader', pa.string()),
+    ('product_id', pa.int32()),
+    ('player_name', pa.string()),
+    ('year', pa.int32()),
+    ('set_name', pa.string()),
+    ('parallel_type', pa.string()),
+    ('is_rookie_card', pa.bool_()),
+])
+
+# Per-chunk casts applied before a chunk is written
+SNAPSHOT_DTYPES = {
+    'sale_id': 'int64',
+    'created_at': 'datetime64[us]',
+    'price': 'float32',
+    'sale_date': 'datetime64[us]',
+    'product_id': 'int32',
+    'year': 'Int32',
+    'is_rookie_card': 'boolean',
+}
+
+SALES_QUERY = """
+    SELECT
+        s.sale_id,
+        s.created_at,
+        s.price,
+        s.sale_date,
+        s.grade,
+        s.grader,
+        c.product_id,
+        c.player_name,
+        c.year,
+        c.set_name,
+        c.parallel_type,
+        c.is_rookie_card
+    FROM sales s
+    JOIN cards c ON s.product_id = c.product_id
+    WHERE s.price IS NOT NULL
+    AND s.sale_id > %s
+    ORDER BY s.sale_id ASC
+"""
+
+
+def _manifest_path(snapshot_dir):
+    return os.path.join(snapshot_dir, MANIFEST_NAME)
+
+
+def load_manifest(snapshot_dir=SNAPSHOT_DIR):
+    path = _manifest_path(snapshot_dir)
+    if not os.path.exists(path):
+        return {'version': SNAPSHOT_VERSION, 'max_sale_id': 0, 'max_created_at': None, 'rows': 0, 'parts': []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest, snapshot_dir):
+    # Write-then-rename so a crash never leaves a half-written manifest
+    tmp_path = _manifest_path(snapshot_dir) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, _manifest_path(snapshot_dir))
+
+
+def _write_part(chunks, snapshot_dir, part_name):
+    """Write an iterable of DataFrame chunks into one Arrow IPC file, batch by batch."""
+    path = os.path.join(snapshot_dir, part_name)
+    stats = {'rows': 0, 'max_sale_id': None, 'max_created_at': None}
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, SNAPSHOT_SCHEMA) as writer:
+            for chunk in chunks:
+                if isinstance(chunk, pa.Table):
+                    writer.write_table(chunk)
+                    continue
+                chunk = apply_dtypes(chunk.copy(), SNAPSHOT_DTYPES)
+                writer.write_batch(pa.RecordBatch.from_pandas(
+                    chunk[SNAPSHOT_SCHEMA.names], schema=SNAPSHOT_SCHEMA, preserve_index=False
+                ))
+                stats['rows'] += len(chunk)
+                stats['max_sale_id'] = max(int(chunk['sale_id'].max()), stats['max_sale_id'] or 0)
+                created = chunk['created_at'].max()
+                if pd.notna(created) and (stats['max_created_at'] is None or created > stats['max_created_at']):
+                    stats['max_created_at'] = created
+    return stats
+
+
+def _read_parts(manifest, snapshot_dir, columns=None):
+    tables = []
+    for part in manifest['parts']:
+        source = pa.memory_map(os.path.join(snapshot_dir, part), 'r')
+        table = pa.ipc.open_file(source).read_all()
+        tables.append(table.select(columns) if columns else table)
+    if not tables:
+        return SNAPSHOT_SCHEMA.empty_table().select(columns) if columns else SNAPSHOT_SCHEMA.empty_table()
+    return pa.concat_tables(tables)
+
+
+def _new_sales(chunks, max_sale_id):
+    """
+    Drop sales already in the snapshot (sale_id at or below the watermark) and
+    repeats within the batch. Chunks arrive in sale_id order, as SALES_QUERY
+    streams them; rows inside a chunk may be in any order.
+    """
+    for chunk in chunks:
+        chunk = chunk[chunk['sale_id'] > max_sale_id].drop_duplicates('sale_id')
+        if len(chunk):
+            max_sale_id = int(chunk['sale_id'].max())
+            yield chunk
+
+
+def append_sales(chunks, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Append sales (a DataFrame or an iterable of DataFrame chunks) as a new part
+    and advance the watermark. Sales already in the snapshot are skipped.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    manifest = load_manifest(snapshot_dir)
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+
+    tmp_name = "part-incoming.arrow.tmp"
+    stats = _write_part(_new_sales(chunks, manifest['max_sale_id']), snapshot_dir, tmp_name)
+    if stats['rows'] == 0:
+        os.remove(os.path.join(snapshot_dir, tmp_name))
+        return manifest
+
+    part_name = f"part-{manifest['max_sale_id'] + 1:012d}-{stats['max_sale_id']:012d}.arrow"
+    os.replace(os.path.join(snapshot_dir, tmp_name), os.path.join(snapshot_dir, part_name))
+    manifest['parts'].append(part_name)
+    manifest['max_sale_id'] = stats['max_sale_id']
+    if stats['max_created_at'] is not None:
+        manifest['max_created_at'] = stats['max_created_at'].isoformat()
+    manifest['rows'] += stats['rows']
+
+    if len(manifest['parts']) > MAX_PARTS:
+        manifest = compact_snapshot(manifest, snapshot_dir)
+
+    _save_manifest(manifest, snapshot_dir)
+    return manifest
+
+
+def compact_snapshot(manifest, snapshot_dir=SNAPSHOT_DIR):
+    """Merge all parts into one (keeps the number of mmapped files bounded)."""
+    table = _read_parts(manifest, snapshot_dir)
+    old_parts = manifest['parts']
+    part_name = f"part-{1:012d}-{manifest['max_sale_id']:012d}.arrow"
+    _write_part([table], snapshot_dir, part_name + ".tmp")
+    del table
+    os.replace(os.path.join(snapshot_dir, part_name + ".tmp"), os.path.join(snapshot_dir, part_name))
+    for part in old_parts:
+        if part != part_name:
+            os.remove(os.path.join(snapshot_dir, part))
+    manifest['parts'] = [part_name]
+    return manifest
+
+
+def refresh_snapshot(snapshot_dir=SNAPSHOT_DIR, rebuild=False, chunk_size=50000):
+    """Stream sales past the sale_id watermark from Postgres into the snapshot."""
+    manifest = load_manifest(snapshot_dir)
+    if manifest.get('version') != SNAPSHOT_VERSION and manifest['parts']:
+        print(f"  Snapshot format changed (v{manifest.get('version', 1)} -> v{SNAPSHOT_VERSION}); rebuilding.")
+        rebuild = True
+    if rebuild and os.path.exists(snapshot_dir):
+        for name in os.listdir(snapshot_dir):
+            os.remove(os.path.join(snapshot_dir, name))
+        manifest = load_manifest(snapshot_dir)
+
+    conn = get_db_connection()
+    try:
+        chunks = stream_query(conn, SALES_QUERY, (manifest['max_sale_id'],), chunk_size, cursor_name='sales_snapshot')
+        previous_rows = manifest['rows']
+        manifest = append_sales(chunks, snapshot_dir)
+    finally:
+        conn.close()
+
+    print(f"  Snapshot: +{manifest['rows'] - previous_rows} new sales ({manifest['rows']} total, "
+          f"watermark sale_id={manifest['max_sale_id']}, peak RSS {peak_rss_mb():.0f} MB)")
+    return manifest
+
+
+def read_sales(columns=None, since=None, after_sale_id=None, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Read the snapshot as a DataFrame ordered by sale_date.
+
+    columns:       subset to load (defaults to SALES_COLUMNS); other columns are
+                   never materialised.
+    since:         only sales with sale_date strictly after this date.
+    after_sale_id: only sales ingested after this sale_id, whatever their date.
+    """
+    columns = list(columns or SALES_COLUMNS)
+    needed = list(dict.fromkeys(columns + ['sale_date'] + (['sale_id'] if after_sale_id is not None else [])))
+
+    manifest = load_manifest(snapshot_dir)
+    table = _read_parts(manifest, snapshot_dir, needed)
+
+    if since is not None:
+        table = table.filter(pc.greater(table['sale_date'], pa.scalar(pd.Timestamp(since), pa.timestamp('us'))))
+    if after_sale_id is not None:
+        table = table.filter(pc.greater(table['sale_id'], pa.scalar(after_sale_id, pa.int64())))
+    table = table.sort_by([('sale_date', 'ascending')]).select(columns)
+
+    # Strings come back as categories: no per-row Python str objects
+    df = table.to_pandas(strings_to_categorical=True)
+    print(f"  Read {len(df)} sales from snapshot "
+          f"({df.memory_usage(deep=True).sum() / (1024 * 1024):.1f} MB, peak RSS {peak_rss_mb():.0f} MB)")
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the local sales snapshot")
+    parser.add_argument("--rebuild", action="store_true", help="Drop the snapshot and reload all sales")
+    args = parser.parse_args()
+
+    refresh_snapshot(rebuild=args.rebuild)
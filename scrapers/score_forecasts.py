@@ -0,0 +1,175 @@
+"""
+Nightly batch scoring: one dual forecast per variant into `forecasts`.
+
+For the forecast date T every variant (product + grader + grade) with at least
+one earlier sale gets the same feature vector a sale on T would get in
+training (closes as of T-1..T-3, staleness, the player's trailing 7 days, the
+static encodings) -- a one-day grid from continuous_forecast. It is scored
+with a single predict / predict_proba call per head, plus one predict per
+price band edge on the same matrix, and bulk-loaded with COPY (replacing any
+earlier run for the same date and model version). Grids under FLAT_MAX_ROWS
+variants (a handful of cards) go through the bundle's flat_ensemble heads,
+which beat sklearn's per-call overhead at that size.
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+from datetime import date
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from database import get_db_connection
+from stream_loader import peak_rss_mb
+from train_model import load_data, prepare_ml_data, FEATURE_COLUMNS
+from continuous_forecast import build_feature_grid
+from model_bundle import load_model_bundle
+from model_backends import predict_band, band_head
+from sharded_model import ShardRouter, load_shard_router, SEGMENTS
+
+SCORING_COLUMNS = [
+    'price', 'sale_date', 'grade', 'grader', 'product_id', 'player_name',
+    'parallel_type', 'is_rookie_card', 'set_name'
+]
+
+FORECAST_COLUMNS = [
+    'product_id', 'grader', 'grade', 'forecast_date', 'forecast_price', 'prob_up',
+    'confidence_interval_lower', 'confidence_interval_upper', 'last_sold_price', 'model_version'
+]
+COPY_BATCH_ROWS = 100000
+FLAT_MAX_ROWS = 200  # below this the flat evaluator is faster than sklearn's predictors (both backends)
+
+
+def build_scoring_features(df, as_of, le_player, le_parallel):
+    """
+    One feature row per variant as of `as_of` (the forecast date): a one-day
+    continuous-forecast grid, so only sales strictly before `as_of` feed the
+    features. Variants whose player / parallel were not seen at training time
+    are dropped.
+    """
+    return build_feature_grid(df, le_player, le_parallel, start=as_of, end=as_of)
+
+
+def score_variants(features, regressor, classifier, bands=None):
+    """
+    Single batched predict / predict_proba over the whole feature matrix.
+    regressor: the price model, or a ShardRouter dispatching rows by segment.
+    bands: {quantile: regressor} price band models (band columns are NULL without).
+    """
+    X, _, _, _ = prepare_ml_data(features)
+    forecasts = features.loc[X.index, ['product_id', 'grader', 'grade', 'last_sold_price']].copy()
+    if isinstance(regressor, ShardRouter):
+        forecasts['forecast_price'] = regressor.predict(X, features.loc[X.index])
+    else:
+        forecasts['forecast_price'] = regressor.predict(X)
+    forecasts['prob_up'] = classifier.predict_proba(X)[:, 1]
+    if bands:
+        forecasts['confidence_interval_lower'], forecasts['confidence_interval_upper'] = predict_band(bands, X)
+    else:
+        forecasts['confidence_interval_lower'] = forecasts['confidence_interval_upper'] = float('nan')
+    return forecasts
+
+
+def scoring_models(bundle, n_rows):
+    """(regressor, classifier, bands) for scoring n_rows: flat-compiled heads for small grids."""
+    if n_rows < FLAT_MAX_ROWS:
+        try:
+            bands = {q: bundle.flat(band_head(q)) for q in bundle.band_quantiles}
+            return bundle.flat('price'), bundle.flat('direction'), bands
+        except (TypeError, ValueError) as e:
+            print(f"  Flat evaluator unavailable ({e}); scoring with the sklearn models")
+    return bundle.regressor, bundle.classifier, bundle.bands
+
+
+def copy_forecasts(conn, forecasts):
+    """Replace this date/version's forecasts and COPY the new rows in, in one transaction."""
+    forecast_dates = forecasts['forecast_date'].unique().tolist()
+    versions = forecasts['model_version'].unique().tolist()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "DELETE FROM forecasts WHERE forecast_date = ANY(%s) AND model_version = ANY(%s)",
+            (forecast_dates, versions)
+        )
+        for start in range(0, len(forecasts), COPY_BATCH_ROWS):
+            buf = io.StringIO()
+            forecasts.iloc[start:start + COPY_BATCH_ROWS][FORECAST_COLUMNS].to_csv(
+                buf, index=False, header=False, float_format='%.4f'
+            )
+            buf.seek(0)
+            cur.copy_expert(
+                f"COPY forecasts ({', '.join(FORECAST_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def run_batch_scoring(forecast_date=None, dry_run=False, shards=None):
+    """shards: segment ('set', 'grade', 'liquidity') whose shard models price the variants."""
+    forecast_date = forecast_date or date.today()
+    print(f"Scoring all variants for {forecast_date}...")
+    timings = {}
+
+    # Fails here, before any data is loaded, if the model expects other columns
+    bundle = load_model_bundle(feature_columns=FEATURE_COLUMNS)
+    print(f"  Model {bundle.version} ({bundle.metadata.get('backend', '?')})")
+    model_version, router = bundle.version, None
+    if shards:
+        router = load_shard_router(shards, bundle.regressor, FEATURE_COLUMNS)
+        model_version = f"{bundle.version}+{shards}"
+        print(f"  Price from {len(router.shards)} {shards} shards")
+
+    start = time.perf_counter()
+    df = load_data(columns=SCORING_COLUMNS)
+    timings['load'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    features = build_scoring_features(df, forecast_date, bundle.le_player, bundle.le_parallel)
+    del df
+    timings['features'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    price_model, classifier, bands = scoring_models(bundle, len(features))
+    forecasts = score_variants(features, router or price_model, classifier, bands)
+    forecasts['forecast_date'] = forecast_date
+    forecasts['model_version'] = model_version
+    timings['predict'] = time.perf_counter() - start
+
+    if not dry_run and len(forecasts):
+        start = time.perf_counter()
+        conn = get_db_connection()
+        try:
+            copy_forecasts(conn, forecasts)
+        finally:
+            conn.close()
+        timings['copy'] = time.perf_counter() - start
+
+    n = len(forecasts)
+    total = sum(timings.values())
+    print(f"\n  Variants scored: {n}")
+    for stage, seconds in timings.items():
+        rate = f"{n / seconds:,.0f} variants/s" if seconds > 0 else "-"
+        print(f"  {stage:<9} {seconds:>7.2f}s  {rate}")
+    print(f"  {'total':<9} {total:>7.2f}s  {n / total if total else 0:,.0f} variants/s")
+    print(f"  Peak RSS: {peak_rss_mb():.0f} MB")
+    if dry_run:
+        print("  Dry run: nothing written.")
+    return forecasts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write today's dual forecast for every variant")
+    parser.add_argument("--date", type=date.fromisoformat, default=None, help="Forecast date (default: today)")
+    parser.add_argument("--dry-run", action="store_true", help="Score but do not write to the database")
+    parser.add_argument("--shards", choices=SEGMENTS, default=None,
+                        help="Price with the per-segment shard models (train_model.py shard --by ...)")
+    args = parser.parse_args()
+
+    run_batch_scoring(args.date, args.dry_run, args.shards)
@@ -384,7 +384,7 @@ def save_to_db(cards_data):
                             grader, grade, source, title
                         )
                         VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                        ON CONFLICT (transaction_id, source) DO NOTHING
+                        ON CONFLICT DO NOTHING  -- (transaction_id, source): the unique key, or sales_transaction_id_source_keys once partitioned
                     """, (
                         txn_id, product_id, sale['price'], sale_date,
                         grader_str, grade_str, 'SportsCardPro', sale['title']
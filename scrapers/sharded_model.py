@@ -0,0 +1,222 @@
+"""Segment-sharded price models with a routing predictor.
+
+The bundle's price regressor covers every player, set and grade with one
+model. Sharding trains one price model per segment:
+
+  set        set_name
+  grade      grade bucket (raw, 7, 8, 9, 10)
+  liquidity  tier of the player's trailing 7-day sales volume
+
+Shards are fitted in parallel worker processes on the memory-mapped feature
+matrix (as backtest and tune do); segments with fewer than MIN_SHARD_ROWS
+training rows get no shard. Each shard is its own file under
+SHARD_DIR/<by>/, listed in a manifest, so retraining one hot set rewrites
+that shard only.
+
+ShardRouter dispatches a batch by segment: rows are grouped once and every
+shard (or the global fallback, the bundle's price regressor, for segments
+without one) gets a single predict call on its rows.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error
+from threadpoolctl import threadpool_limits
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from feature_matrix import save_feature_matrix, load_feature_matrix
+from model_backends import DEFAULT_BACKEND, build_price_model, categorical_mask
+
+SHARD_DIR = "backend/shards"
+SEGMENTS = ('set', 'grade', 'liquidity')
+MIN_SHARD_ROWS = 500
+
+GRADE_BUCKETS = {0: 'raw', 7: '7', 8: '8', 9: '9', 10: '10'}
+LIQUIDITY_EDGES = [1, 5, 20]  # player_7d_vol: 0 | 1-4 | 5-19 | 20+
+LIQUIDITY_TIERS = np.array(['none', 'low', 'mid', 'high'], dtype=object)
+
+
+def segment_keys(frame, by):
+    """Segment label per row of `frame` (needs set_name, grade_num or player_7d_vol)."""
+    if by == 'set':
+        return frame['set_name'].astype(object).fillna('Unknown').astype(str).to_numpy(dtype=object)
+    if by == 'grade':
+        return pd.Series(frame['grade_num']).map(GRADE_BUCKETS).fillna('raw').to_numpy(dtype=object)
+    if by == 'liquidity':
+        return LIQUIDITY_TIERS[np.searchsorted(LIQUIDITY_EDGES, frame['player_7d_vol'].to_numpy(), side='right')]
+    raise ValueError(f"Unknown segment {by!r}; expected one of {SEGMENTS}")
+
+
+def _shard_file(key):
+    """Filesystem-safe, collision-free file name for a segment label."""
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', key).strip('_')[:40] or 'segment'
+    return f"{slug}_{hashlib.sha1(key.encode()).hexdigest()[:8]}.joblib"
+
+
+class ShardRouter:
+    """Routes each row to its segment's shard, or to `fallback` (the global model)."""
+
+    def __init__(self, by, shards, fallback, feature_columns):
+        self.by = by
+        self.shards = shards
+        self.fallback = fallback
+        self.feature_columns = feature_columns
+
+    def predict(self, X, frame):
+        """
+        X: feature matrix (DataFrame in feature_columns order).
+        frame: rows aligned with X holding the segment column.
+        """
+        keys = segment_keys(frame, self.by)
+        codes, labels = pd.factorize(keys)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(labels)))])
+        out = np.empty(len(X), dtype=np.float64)
+        for i, label in enumerate(labels):
+            rows = order[bounds[i]:bounds[i + 1]]
+            model = self.shards.get(label, self.fallback)
+            out[rows] = model.predict(X.iloc[rows])
+        return out
+
+    def coverage(self, frame):
+        """Share of rows that have a dedicated shard."""
+        return float(np.isin(segment_keys(frame, self.by), list(self.shards)).mean())
+
+
+def _fit_shard(task):
+    """Fit one segment's price model on its training rows (worker process)."""
+    start = time.perf_counter()
+    matrix = load_feature_matrix(task['matrix_path'])
+    segment = np.load(os.path.join(task['matrix_path'], 'segment.npy'), mmap_mode='r')
+    columns = matrix['columns']
+    split_idx = task['split_idx']
+    rows = np.flatnonzero(segment[:split_idx] == task['code'])
+    test_rows = split_idx + np.flatnonzero(segment[split_idx:] == task['code'])
+
+    categorical = None
+    if task['backend'] == 'hist':
+        categorical = categorical_mask(columns, matrix['X'], task['cardinalities'])
+
+    with threadpool_limits(limits=task['threads']):
+        model = build_price_model(task['backend'], task['params'], categorical)
+        model.fit(pd.DataFrame(matrix['X'][rows], columns=columns), matrix['y_price'][rows])
+        mae = np.nan
+        if len(test_rows):
+            X_test = pd.DataFrame(matrix['X'][test_rows], columns=columns)
+            mae = mean_absolute_error(matrix['y_price'][test_rows], model.predict(X_test))
+    return task['key'], model, {
+        'train_rows': int(len(rows)),
+        'test_rows': int(len(test_rows)),
+        'mae': float(mae),
+        'fit_s': time.perf_counter() - start,
+    }
+
+
+def train_shards(X, y_price, y_direction, dates, keys, by, fallback, backend=DEFAULT_BACKEND,
+                 only=None, workers=None, cardinalities=None, params=None, fallback_version=None,
+                 path=SHARD_DIR):
+    """
+    Fit one price model per segment on the oldest 80% of the date-sorted
+    matrix and compare each against the fallback on the segment's newest 20%.
+    Shards are written to <path>/<by>/ as they finish.
+
+    only: retrain just these segment labels; other shards on disk are kept.
+    Returns a per-segment report DataFrame.
+    """
+    split_idx = int(len(X) * 0.8)
+    codes, labels = pd.factorize(keys)
+    train_counts = np.bincount(codes[:split_idx], minlength=len(labels))
+    wanted = set(only) if only else set(labels)
+    unknown = wanted - set(labels)
+    if unknown:
+        print(f"  No rows for segments {sorted(unknown)}")
+
+    targets = [(code, label) for code, label in enumerate(labels)
+               if label in wanted and train_counts[code] >= MIN_SHARD_ROWS]
+    skipped = sorted(label for code, label in enumerate(labels)
+                     if label in wanted and train_counts[code] < MIN_SHARD_ROWS)
+    if skipped:
+        print(f"  {len(skipped)} segments under {MIN_SHARD_ROWS} training rows use the global model")
+
+    shard_path = os.path.join(path, by)
+    manifest = _load_manifest(shard_path) if only else None
+    if manifest is None or manifest['feature_columns'] != list(X.columns):
+        manifest = {'by': by, 'backend': backend, 'feature_columns': list(X.columns), 'shards': {}}
+    manifest['fallback_version'] = fallback_version
+    os.makedirs(shard_path, exist_ok=True)
+
+    results = []
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="shard_matrix_") as matrix_path:
+        save_feature_matrix(matrix_path, X, y_price, y_direction, dates)
+        np.save(os.path.join(matrix_path, 'segment.npy'), codes.astype(np.int32))
+        workers = max(1, workers or min(len(targets), os.cpu_count() or 1))
+        tasks = [{
+            'matrix_path': matrix_path, 'key': label, 'code': code, 'split_idx': split_idx,
+            'backend': backend, 'params': params, 'cardinalities': cardinalities or {},
+            'threads': max(1, (os.cpu_count() or 1) // workers),
+        } for code, label in targets]
+
+        print(f"  Fitting {len(tasks)} shards on {workers} workers...")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_fit_shard, task) for task in tasks]
+            for future in as_completed(futures):
+                key, model, stats = future.result()
+                file_name = _shard_file(key)
+                joblib.dump(model, os.path.join(shard_path, file_name))
+                manifest['shards'][key] = {**stats, 'file': file_name,
+                                           'trained_at': datetime.now().isoformat(timespec='seconds')}
+                results.append({'segment': key, **stats})
+
+    # Fallback error on the same holdout rows, for comparison
+    test_codes = codes[split_idx:]
+    X_test, y_test = X.iloc[split_idx:], np.asarray(y_price)[split_idx:]
+    fallback_pred = fallback.predict(X_test) if len(X_test) else np.array([])
+    label_codes = {label: code for code, label in enumerate(labels)}
+    for row in results:
+        mask = test_codes == label_codes[row['segment']]
+        row['fallback_mae'] = float(mean_absolute_error(y_test[mask], fallback_pred[mask])) if mask.any() else np.nan
+    print(f"  Done in {time.perf_counter() - started:.1f}s")
+
+    # Swap the manifest in last so a reader never lists a shard that is not on disk
+    tmp_path = os.path.join(shard_path, "manifest.json.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(shard_path, "manifest.json"))
+    listed = {entry['file'] for entry in manifest['shards'].values()}
+    for name in os.listdir(shard_path):
+        if name.endswith(".joblib") and name not in listed:
+            os.remove(os.path.join(shard_path, name))
+
+    report = pd.DataFrame(results, columns=['segment', 'train_rows', 'test_rows', 'mae', 'fallback_mae', 'fit_s'])
+    return report.sort_values('train_rows', ascending=False).reset_index(drop=True)
+
+
+def _load_manifest(shard_path):
+    path = os.path.join(shard_path, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_shard_router(by, fallback, feature_columns=None, path=SHARD_DIR):
+    """Router over the shards saved for `by`, falling back to `fallback`."""
+    manifest = _load_manifest(os.path.join(path, by))
+    if manifest is None:
+        raise FileNotFoundError(f"No {by} shards under {path}; run `train_model.py shard --by {by}`")
+    if feature_columns is not None and manifest['feature_columns'] != list(feature_columns):
+        raise ValueError(f"{by} shards were trained on other features; retrain them")
+    shards = {key: joblib.load(os.path.join(path, by, entry['file']))
+              for key, entry in manifest['shards'].items()}
+    return ShardRouter(by, shards, fallback, manifest['feature_columns'])
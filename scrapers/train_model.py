@@ -1,58 +1,237 @@
-import psycopg2
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, GradientBoostingClassifier
+from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score, accuracy_score, precision_score, recall_score
 from sklearn.preprocessing import LabelEncoder
-import joblib
+import argparse
 import os
+from feature_store import FeatureState, load_feature_state, save_feature_state, extend_encoder
+import sales_snapshot
+from backtest import walk_forward_backtest
+from model_backends import BACKENDS, DEFAULT_BACKEND, BAND_QUANTILES, band_head, fit_dual, fit_heads, predict_band
+from model_bundle import ModelBundle, BundleError, load_model_bundle, save_model_bundle, MODEL_BUNDLE_PATH
+import sharded_model
+import tune
+import warm_update
 
-DB_NAME = "cardpulse"
-MODEL_PATH_PRICE = "backend/model.pkl"
-MODEL_PATH_DIRECTION = "backend/model_direction.pkl"
+# Model input order; saved in the model bundle and checked by every scorer
+FEATURE_COLUMNS = [
+    'last_sold_price',     
+    'rolling_avg_3',
+    'days_since_last_sale',  
+    'player_7d_vol',       
+    'player_7d_avg_price', 
+    'grade_num', 
+    'player_encoded', 
+    'parallel_encoded',
+    'is_gold', 'is_black',
+    'is_rookie_num',
+    'days_since_start'
+]
 
-def load_data():
-    """Load transaction data from PostgreSQL V2 Schema."""
-    db_url = os.getenv("DATABASE_URL")
-    if db_url:
-        conn = psycopg2.connect(db_url)
-    else:
-        conn = psycopg2.connect(database=DB_NAME)
-        
-    # Join sales and cards. We want granular sales data.
-    query = """
-        SELECT 
-            s.price,
-            s.sale_date,
-            s.grade,
-            s.grader,
-            c.product_id,
-            c.player_name,
-            c.year,
-            c.set_name,
-            c.parallel_type,
-            c.is_rookie_card
-        FROM sales s
-        JOIN cards c ON s.product_id = c.product_id
-        WHERE s.price IS NOT NULL
-        ORDER BY s.sale_date ASC
+
+def load_data(since=None, columns=None, refresh=True, after_sale_id=None):
+    """
+    Load transaction data (sales JOIN cards) from the local sales snapshot.
+    
+    since:         only sales with sale_date strictly after this date.
+    columns:       subset of columns to read (memory-mapped, nothing else is loaded).
+    refresh:       first pull sales past the snapshot's sale_id watermark from PostgreSQL.
+                   Pass False to work offline from the last snapshot.
+    after_sale_id: only sales ingested after this sale_id (feature store watermark).
+    """
+    if refresh:
+        sales_snapshot.refresh_snapshot()
+    return sales_snapshot.read_sales(columns=columns, since=since, after_sale_id=after_sale_id)
+
+def load_feature_input(incremental=False):
+    """
+    (state, sales to featurize) for engineer_features(sales, state=state).
+    
+    Incrementally, the new sales are the ones ingested past the state's sale_id
+    watermark. Any of them dated at or before the state's sale_date watermark
+    rewinds the state to the earliest such day, and every sale from that day on
+    is returned, so the lag / spillover windows of the affected days are
+    re-merged. Late sales older than the replay window force a full build.
+    """
+    state = load_feature_state() if incremental else FeatureState()
+    columns = sales_snapshot.SALES_COLUMNS + ['sale_id']
+    if state.is_empty:
+        return state, load_data(columns=columns)
+    
+    new = load_data(columns=['sale_date'], after_sale_id=state.max_sale_id)
+    late = new['sale_date'] <= state.watermark
+    if late.any():
+        earliest = new['sale_date'].min()
+        if state.rewind(earliest) and not state.is_empty:
+            print(f"  {late.sum()} late sales back to {earliest.date()}: re-merging the days since")
+        else:
+            print(f"  {late.sum()} late sales back to {earliest.date()}, before the replay window; full rebuild")
+            return FeatureState(state.store_dir), load_data(columns=columns, refresh=False)
+    return state, load_data(since=state.watermark, columns=columns, refresh=False)
+
+def featurize_history(state, df):
+    """
+    Featurize `df` into the state's store and return (every engineered row,
+    le_player, le_parallel): the new rows are computed, the history is only
+    memory-mapped from the store.
+    """
+    _, le_player, le_parallel = engineer_features(df, state=state)
+    save_feature_state(state)
+    return state.read_rows(), le_player, le_parallel
+
+def _fill_label(series, value):
+    """fillna that also works on the category columns from the sales snapshot."""
+    if isinstance(series.dtype, pd.CategoricalDtype) and value not in series.cat.categories:
+        series = series.cat.add_categories([value])
+    return series.fillna(value)
+
+def _asof_close(daily_close, lookup_dates):
+    """Variant close as of each lookup date (latest daily close on or before it)."""
+    left = pd.DataFrame({
+        'variant_code': daily_close['variant_code'].values,
+        'asof_date': lookup_dates.values,
+        'row': np.arange(len(daily_close)),
+    }).sort_values('asof_date', kind='stable')
+    right = daily_close[['variant_code', 'sale_date', 'price']].sort_values('sale_date', kind='stable')
+    
+    matched = pd.merge_asof(
+        left, right,
+        left_on='asof_date', right_on='sale_date',
+        by='variant_code', direction='backward'
+    )
+    return matched.sort_values('row')['price'].to_numpy()
+
+def variant_lag_features(daily_close):
+    """
+    Strict T-1 lag features for a (variant_id, sale_date, price) daily close frame.
+    
+    Equivalent to resampling every variant to a daily grid and shifting, but
+    computed with grouped shifts and as-of joins so there is no per-variant loop:
+      - prev_day_close: close as of yesterday
+      - rolling_avg_3: mean of the closes as of D-1, D-2 and D-3 (days before the
+        variant's first sale are skipped, like the daily-grid rolling window)
+      - strict_prev_date: date of the previous real sale (for staleness)
+    """
+    daily_close = daily_close.sort_values(['variant_id', 'sale_date'], kind='stable').reset_index(drop=True)
+    daily_close['variant_code'] = pd.factorize(daily_close['variant_id'])[0]
+    
+    day = pd.Timedelta(days=1)
+    lags = [_asof_close(daily_close, daily_close['sale_date'] - k * day) for k in (1, 2, 3)]
+    
+    features = daily_close[['variant_id', 'sale_date']].copy()
+    features['prev_day_close'] = lags[0]
+    features['strict_prev_date'] = daily_close.groupby('variant_code', sort=False)['sale_date'].shift(1)
+    
+    # NaN-aware mean over the 3 trailing closes (min_periods=1)
+    lag_matrix = np.column_stack(lags)
+    counts = (~np.isnan(lag_matrix)).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        features['rolling_avg_3'] = np.where(counts > 0, np.nansum(lag_matrix, axis=1) / counts, np.nan)
+    
+    return features
+
+def player_daily_stats(df):
+    """Per (player, day) sale count and revenue."""
+    return df.groupby(['player_name', 'sale_date'], observed=True).agg(
+        daily_vol=('price', 'count'),
+        daily_rev=('price', 'sum')
+    ).reset_index()
+
+def player_spillover_features(daily_player_stats):
+    """
+    Trailing 7-day player volume / average price, excluding the current day.
+    
+    A time-based grouped rolling window over each player's daily stats, closed on
+    the left so day D only sees sales from D-7 .. D-1.
+    """
+    daily_player_stats = daily_player_stats.sort_values(['player_name', 'sale_date'], kind='stable')
+    rolling_7d = (
+        daily_player_stats
+        .groupby('player_name', sort=False, observed=True)
+        .rolling('7D', on='sale_date', closed='left', min_periods=1)[['daily_vol', 'daily_rev']]
+        .sum()
+        .reset_index()
+    )
+    
+    vol = rolling_7d['daily_vol']
+    rolling_7d['player_7d_vol'] = vol
+    rolling_7d['player_7d_avg_price'] = (rolling_7d['daily_rev'] / vol.replace(0, np.nan)).fillna(0)
+    
+    return rolling_7d[['sale_date', 'player_name', 'player_7d_vol', 'player_7d_avg_price']]
+
+def map_grade(grades):
+    """Vectorised grade bucket: RAW -> 0, then 10/9/8/7 by substring, else 0."""
+    g = grades.astype(str).str.upper()
+    conditions = [g.str.contains(token, regex=False, na=False) for token in ('RAW', '10', '9', '8', '7')]
+    return np.select(conditions, [0, 10, 9, 8, 7], default=0)
+
+def encode_labels(values, encoder):
+    """LabelEncoder codes without raising on unseen labels (those become -1)."""
+    return pd.Categorical(values, categories=encoder.classes_).codes.astype(np.int64)
+
+def encode_static_features(df, state=None):
+    """
+    Grade bucket, label encodings, parallel/rookie flags and the time index.
+    
+    Encoders and the time origin are fitted on `df`, unless the state already
+    holds them: then labels it has not seen are appended to its encoders, so
+    the codes of earlier rows never change.
     """
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
+    df['grade_num'] = map_grade(df['grade'])
+    parallel = _fill_label(df['parallel_type'], "Base")
+    
+    if state is not None and state.le_player is not None:
+        le_parallel = extend_encoder(state.le_parallel, parallel)
+        le_player = extend_encoder(state.le_player, df['player_name'])
+        min_date = state.min_date
+    else:
+        le_parallel = LabelEncoder().fit(parallel)
+        le_player = LabelEncoder().fit(df['player_name'])
+        min_date = df['sale_date'].min()
+        if state is not None:
+            state.le_player, state.le_parallel, state.min_date = le_player, le_parallel, min_date
+    
+    df['parallel_encoded'] = encode_labels(parallel, le_parallel)
+    
+    df['is_gold'] = (df['parallel_type'] == 'Gold').astype(int)
+    df['is_black'] = (df['parallel_type'] == 'Black').astype(int)
+    
+    df['player_encoded'] = encode_labels(df['player_name'], le_player)
+    
+    df['is_rookie_num'] = df['is_rookie_card'].fillna(False).astype(bool).astype(int)
+    
+    df['days_since_start'] = (df['sale_date'] - min_date).dt.days
+    
+    return df, le_player, le_parallel
 
-def engineer_features(df):
-    """Create features for ML model including Lag Features and Spillover."""
+def engineer_features(df, state=None):
+    """
+    Create features for ML model including Lag Features and Spillover.
+    
+    With a FeatureState, `df` only needs the sales past state.watermark (see
+    load_feature_input for late sales): the lag and spillover windows are
+    seeded from the stored tail, the new rows are encoded with the stored
+    encoders and appended to the row store, and the state is advanced in place.
+    Only the new rows are returned (state.read_rows() has the history). An
+    empty state is seeded from a full build.
+    """
     df = df.copy()
     df['sale_date'] = pd.to_datetime(df['sale_date'])
     
+    if state is not None and not state.is_empty:
+        late = df['sale_date'] <= state.watermark
+        if late.any():
+            print(f"  Skipping {late.sum()} sales at or before watermark {state.watermark.date()}")
+            df = df[~late]
+    
     # 1. Define Variant (Product + Grade + Grader)
     df['variant_id'] = (
         df['product_id'].astype(str) + "_" + 
-        df['grader'].fillna("Unk") + "_" + 
-        df['grade'].fillna("Unk")
+        _fill_label(df['grader'], "Unk").astype(str) + "_" + 
+        _fill_label(df['grade'], "Unk").astype(str)
     )
     
     # 2. Sort by Variant and Date
@@ -62,105 +241,24 @@ def engineer_features(df):
     # Goal: Try to predict TODAY'S price using ONLY data from YESTERDAY (and prior).
     # No intraday leakage allowed.
     
-    # A. Get Daily Closing Price for each variant
+    # A. Get Daily Closing Price for each variant (prefixed by the stored tail)
     daily_close = df.groupby(['variant_id', 'sale_date'])['price'].last().reset_index()
+    if state is not None and not state.is_empty:
+        daily_close = pd.concat([state.variant_closes, daily_close], ignore_index=True)
     
-    feature_chunks = []
-    
-    for vid, group in daily_close.groupby('variant_id'):
-        group = group.set_index('sale_date').sort_index()
-        
-        # 1. Calculate "True Strict Previous Date" (For Staleness)
-        # Shift the raw dates BEFORE resampling to capture the last *actual* sale
-        # This gives us: On Dec 12, prev strict date is Dec 5.
-        group['strict_prev_date'] = group.index.to_series().shift(1)
-        
-        # 2. Resample to Daily (fill gaps)
-        # We need this to exist for every target day in df
-        daily = group.resample('D').ffill()
-        
-        # 3. Shift Prices (The "Close" of Today becomes "Prev Close" for Tomorrow)
-        daily['prev_day_close'] = daily['price'].shift(1)
-        
-        # 4. Rolling Average of strict daily closes (using shifted values)
-        daily['rolling_avg_3'] = daily['prev_day_close'].rolling(window=3, min_periods=1).mean()
-        
-        daily['variant_id'] = vid
-        feature_chunks.append(daily[['variant_id', 'prev_day_close', 'strict_prev_date', 'rolling_avg_3']])
-        
-    daily_features = pd.concat(feature_chunks).reset_index()
+    # B. Lags, rolling window and strict previous sale date (all variants at once)
+    daily_features = variant_lag_features(daily_close)
     
-    # D. Merge back to main DF
-    # We merge on (variant_id, sale_date). 
+    # C. Merge back to main DF
     df = pd.merge(df, daily_features, on=['variant_id', 'sale_date'], how='left')
     
     # Rename for compatibility
     df['last_sold_price'] = df['prev_day_close']
+    # Staleness: days since the last REAL transaction strictly before today
     df['days_since_last_sale'] = (df['sale_date'] - df['strict_prev_date']).dt.days
     
     # Cleanup
-    df = df.drop(columns=['prev_day_close', 'strict_prev_date'], errors='ignore')
-    
-    # Let's clean up staleness:
-    # We'll use the 'last_sale_date' from the ORIGINAL shift logic (which found the previous transaction), 
-    # BUT we must enforce that if last_sale_date == sale_date, we look back further.
-    # Actually, easier: Just define 'last_sale_date' as the date of the 'last_sold_price' we just found. 
-    # Since we ffilled, we don't know the exact date it originated. 
-    # Let's stick to the user's core request: "Price forecast... incorporating only Dec 11 and prior".
-    # Using 'prev_day_close' satisfies this perfectly.
-    # For staleness: `(sale_date - last_REAL_transaction_prior_to_today)`.
-    
-    # Let's re-do staleness strictly:
-    # 1. Group by Variant
-    # 2. Iterate and find 'max(date) WHERE date < current_row.date'
-    # This is efficiently done by: `shift()` on daily_aggregated data.
-    
-    # We already have `daily_close` (Daily transactions).
-    # If we shift THAT, we get the real last transaction date.
-    
-    real_last_date = []
-    for vid, group in daily_close.groupby('variant_id'):
-        group = group.set_index('sale_date').sort_index()
-        # Don't resample yet, just shift the available dates
-        # If dates are [Dec 1, Dec 5, Dec 12]
-        # Shift 1 -> [NaN, Dec 1, Dec 5]
-        # So on Dec 12, the "strict prev date" is Dec 5.
-        group['strict_prev_date'] = group.index.to_series().shift(1)
-        
-        # Now we need to broadcast this to the "filled" days?
-        # Or just merge this "True Last Date" to the transaction dates.
-        # But wait, if we have gaps, we need ffill for the gaps.
-        
-        # Resample to Daily to fill the gap days (Dec 6, Dec 7...) with "Dec 5".
-        group = group.resample('D').ffill() 
-        # ffill propagates "Dec 5" to Dec 6...Dec 11.
-        
-        # On Dec 12, the row exists in daily_close? Yes.
-        # So on Dec 12, `strict_prev_date` is Dec 5. Correct.
-        
-        group['variant_id'] = vid
-        real_last_date.append(group[['variant_id', 'strict_prev_date']])
-        
-    dates_df = pd.concat(real_last_date).reset_index()
-    df = pd.merge(df, dates_df, on=['variant_id', 'sale_date'], how='left')
-    
-    df['days_since_last_sale'] = (df['sale_date'] - df['strict_prev_date']).dt.days
-    
-    # Cleanup
-    df = df.drop(columns=['prev_day_close', 'strict_prev_date', 'last_sale_date'], errors='ignore')
-    
-    # Rolling Average (Strict)
-    # We can just take the rolling of the DAILY CLOSE (shifted)
-    # Since we already have daily_close_resampled with `prev_day_close`
-    # We can perform rolling on that.
-    
-    # Re-using the first loop is cleaner... but let's just make `rolling_avg_3` off the `last_sold_price`.
-    # `last_sold_price` is a daily series (merged).
-    # BUT `last_sold_price` in `df` has duplicates for same day.
-    # We should calculate rolling on the `daily_lags` DF before merging.
-    
-    # Let's refine step B above.
-    pass # Placeholder for replace logic context
+    df = df.drop(columns=['prev_day_close', 'strict_prev_date'])
     
     # Drop rows where we don't have history
     df = df.dropna(subset=['last_sold_price'])
@@ -168,81 +266,31 @@ def engineer_features(df):
     print(f"  Data after dropping first sales (Lag setup): {len(df)} rows")
     
     # --- Player Market Features (Cross-Variant Spillover) ---
-    daily_player_stats = df.groupby(['player_name', 'sale_date']).agg(
-        daily_vol=('price', 'count'),
-        daily_rev=('price', 'sum')
-    ).reset_index()
+    daily_player_stats = player_daily_stats(df)
+    if state is not None and not state.is_empty:
+        daily_player_stats = pd.concat([state.player_daily, daily_player_stats], ignore_index=True)
+    market_features = player_spillover_features(daily_player_stats)
     
-    player_dfs = []
-    for player, p_data in daily_player_stats.groupby('player_name'):
-        p_data = p_data.drop(columns=['player_name'], errors='ignore').set_index('sale_date').sort_index()
-        p_data = p_data.resample('D').sum().fillna(0)
-        shifted = p_data.shift(1)
-        rolling_7d = shifted.rolling('7D', min_periods=1).sum()
-        
-        rolling_7d['player_7d_vol'] = rolling_7d['daily_vol']
-        rolling_7d['player_7d_avg_price'] = rolling_7d['daily_rev'] / rolling_7d['daily_vol'].replace(0, np.nan)
-        rolling_7d['player_7d_avg_price'] = rolling_7d['player_7d_avg_price'].fillna(0)
-        
-        rolling_7d['player_name'] = player
-        player_dfs.append(rolling_7d.reset_index())
-        
-    market_features = pd.concat(player_dfs)
-    
-    df = pd.merge(df, market_features[['sale_date', 'player_name', 'player_7d_vol', 'player_7d_avg_price']], 
-                  on=['sale_date', 'player_name'], how='left')
+    df = pd.merge(df, market_features, on=['sale_date', 'player_name'], how='left')
                   
     df['player_7d_vol'] = df['player_7d_vol'].fillna(0)
     df['player_7d_avg_price'] = df['player_7d_avg_price'].fillna(0)
     
-    # --- Standard Features ---
-    def map_grade(row):
-        g = str(row['grade']).upper()
-        if 'RAW' in g: return 0
-        if '10' in g: return 10
-        if '9' in g: return 9
-        if '8' in g: return 8
-        if '7' in g: return 7
-        return 0 
-        
-    df['grade_num'] = df.apply(map_grade, axis=1)
-    
-    le_parallel = LabelEncoder()
-    df['parallel_encoded'] = le_parallel.fit_transform(df['parallel_type'].fillna("Base"))
-    
-    df['is_gold'] = df['parallel_type'].apply(lambda x: 1 if x == 'Gold' else 0)
-    df['is_black'] = df['parallel_type'].apply(lambda x: 1 if x == 'Black' else 0)
-    
-    le_player = LabelEncoder()
-    df['player_encoded'] = le_player.fit_transform(df['player_name'])
-    
-    df['is_rookie_num'] = df['is_rookie_card'].apply(lambda x: 1 if x else 0)
-    
-    min_date = df['sale_date'].min()
-    df['days_since_start'] = (df['sale_date'] - min_date).dt.days
+    if state is not None:
+        state.update(daily_close, daily_player_stats)
     
+    # --- Standard Features ---
+    df, le_player, le_parallel = encode_static_features(df, state)
+    if state is not None:
+        state.append_rows(df)
     return df, le_player, le_parallel
 
 def prepare_ml_data(df):
     """Prepare X and targets for training."""
-    feature_cols = [
-        'last_sold_price',     
-        'rolling_avg_3',
-        'days_since_last_sale',  
-        'player_7d_vol',       
-        'player_7d_avg_price', 
-        'grade_num', 
-        'player_encoded', 
-        'parallel_encoded',
-        'is_gold', 'is_black',
-        'is_rookie_num',
-        'days_since_start'
-    ]
-    
     # Ensure strict time sorting before returning features
     df = df.sort_values('sale_date')
     
-    X = df[feature_cols].fillna(0)
+    X = df[FEATURE_COLUMNS].fillna(0)
     y_price = df['price']
     
     # Directional Target: 1 if Next Price > Last Sold Price, else 0
@@ -250,20 +298,26 @@ def prepare_ml_data(df):
     
     return X, y_price, y_direction, df['sale_date']
 
-def train_and_evaluate():
-    """Train Regressor and Classifier models using Time Series Validation."""
+def train_and_evaluate(incremental=False, backend=DEFAULT_BACKEND, tuned=False):
+    """
+    Train Regressor and Classifier models using Time Series Validation.
+    
+    incremental: only load and featurize sales past the feature store watermark.
+    backend:     estimator family from model_backends ('gbm' or 'hist').
+    tuned:       use the best parameters found by `train_model.py tune`.
+    """
     print("=" * 60)
     print("CARD PRICE & DIRECTION MODEL TRAINING (TIME SERIES)")
     print("=" * 60)
     
     print("\n[1/4] Loading data...")
-    df = load_data()
+    state, df = load_feature_input(incremental)
     print(f"  Loaded {len(df)} transactions")
     
-    if len(df) < 10: return
+    if state.is_empty and len(df) < 10: return
 
     print("\n[2/4] Engineering features...")
-    df, le_player, le_parallel = engineer_features(df)
+    df, le_player, le_parallel = featurize_history(state, df)
     
     # Sort strictly by date before splitting
     df = df.sort_values('sale_date')
@@ -283,23 +337,31 @@ def train_and_evaluate():
     yp_train, yp_test = y_price.iloc[:split_idx], y_price.iloc[split_idx:]
     yd_train, yd_test = y_direction.iloc[:split_idx], y_direction.iloc[split_idx:]
     
-    # --- 1. PRICE REGRESSOR ---
-    print("\n[4/4] Training Models...")
-    print("\n  A. Price Regressor (Gradient Boosting)...")
-    regressor = GradientBoostingRegressor(n_estimators=100, max_depth=5, random_state=42)
-    regressor.fit(X_train, yp_train)
+    # Both heads and the price band train at the same time
+    print(f"\n[4/4] Training Models (backend: {backend})...")
+    tuned_params = tune.load_tuned_params().get(backend, {}) if tuned else {}
+    if tuned_params:
+        print(f"  Tuned params: {tuned_params}")
+    models, timings = fit_heads(
+        X_train, yp_train, yd_train, backend=backend,
+        cardinalities=_encoder_cardinalities(le_player, le_parallel),
+        price_params=tuned_params.get('price'), direction_params=tuned_params.get('direction'),
+        quantiles=BAND_QUANTILES
+    )
+    regressor, classifier = models['price'], models['direction']
+    bands = {q: models[band_head(q)] for q in BAND_QUANTILES}
     
+    # --- 1. PRICE REGRESSOR ---
+    print("\n  A. Price Regressor...")
     yp_pred = regressor.predict(X_test)
     mae = mean_absolute_error(yp_test, yp_pred)
     r2 = r2_score(yp_test, yp_pred)
     print(f"    MAE: ${mae:.2f}")
     print(f"    R²:  {r2:.3f}")
+    print(f"    Fit: {timings['price_s']:.1f}s")
     
     # --- 2. DIRECTION CLASSIFIER ---
-    print("\n  B. Direction Classifier (Gradient Boosting)...")
-    classifier = GradientBoostingClassifier(n_estimators=100, max_depth=3, random_state=42)
-    classifier.fit(X_train, yd_train)
-    
+    print("\n  B. Direction Classifier...")
     yd_pred = classifier.predict(X_test)
     acc = accuracy_score(yd_test, yd_pred)
     prec = precision_score(yd_test, yd_pred)
@@ -308,17 +370,302 @@ def train_and_evaluate():
     print(f"    Accuracy:  {acc:.1%}")
     print(f"    Precision: {prec:.1%} (Correctly predicted 'Up')")
     print(f"    Recall:    {rec:.1%} (Caught actual 'Ups')")
+    print(f"    Fit: {timings['direction_s']:.1f}s")
+    
+    # --- 3. PRICE BAND ---
+    low_q, high_q = min(BAND_QUANTILES), max(BAND_QUANTILES)
+    print(f"\n  C. Price Band (P{low_q * 100:.0f}-P{high_q * 100:.0f})...")
+    low, high = predict_band(bands, X_test)
+    coverage = float(((yp_test >= low) & (yp_test <= high)).mean())
+    print(f"    Coverage:     {coverage:.1%} (target {high_q - low_q:.0%})")
+    print(f"    Median width: ${np.median(high - low):.2f}")
+    print(f"    Fit: {max(timings[band_head(q) + '_s'] for q in BAND_QUANTILES):.1f}s")
+    print(f"\n  Training wall time: {timings['total_s']:.1f}s")
     
     # Save Models
-    print("\nSaving models...")
-    os.makedirs(os.path.dirname(MODEL_PATH_PRICE), exist_ok=True)
+    print("\nSaving model bundle...")
+    version = save_model_bundle(
+        regressor, classifier, le_player, le_parallel, list(X.columns), bands=bands,
+        metadata={
+            'backend': backend,
+            'tuned_params': tuned_params,
+            'train_rows': len(X_train),
+            'train_watermark': str(dates.iloc[split_idx-1].date()),
+            'train_max_sale_id': _max_sale_id(df),
+            'base_trees': warm_update.ensemble_size(regressor),
+            'n_updates': 0,
+            'train_range': [str(dates.iloc[0].date()), str(dates.iloc[split_idx-1].date())],
+            'test_range': [str(split_date.date()), str(dates.iloc[-1].date())],
+            'mae': mae, 'r2': r2, 'accuracy': acc, 'precision': prec, 'recall': rec,
+            'band_coverage': coverage,
+        }
+    )
+    print(f"  {version} -> {MODEL_BUNDLE_PATH}")
+    print("Done!")
+
+def _max_sale_id(df):
+    """Ingestion watermark of a featurized frame: sales past it arrived after the models saw them."""
+    return int(df['sale_id'].max()) if 'sale_id' in df and df['sale_id'].notna().any() else 0
+
+def _encode_like_bundle(df, bundle):
+    """
+    Re-encode player / parallel with the bundle's encoders (the codes the saved
+    models were trained on, not today's refit). Returns (df, known) where
+    known marks rows whose labels those encoders have seen.
+    """
+    df = df.copy()
+    df['player_encoded'] = encode_labels(df['player_name'].astype(str), bundle.le_player)
+    df['parallel_encoded'] = encode_labels(_fill_label(df['parallel_type'], "Base").astype(str), bundle.le_parallel)
+    return df, (df['player_encoded'] >= 0) & (df['parallel_encoded'] >= 0)
+
+def run_update():
+    """
+    Warm-start the saved models on the sales past their training watermark
+    (see warm_update); falls back to a full retrain when they cannot be updated.
+    """
+    print("=" * 60)
+    print("WARM-START MODEL UPDATE")
+    print("=" * 60)
     
-    joblib.dump(regressor, MODEL_PATH_PRICE)
-    joblib.dump(classifier, MODEL_PATH_DIRECTION)
+    # Not memory-mapped: fitting more stages writes into the estimators
+    try:
+        bundle = ModelBundle(MODEL_BUNDLE_PATH, mmap=False)
+        bundle.check_features(FEATURE_COLUMNS)
+    except BundleError as reason:
+        print(f"  Full retrain required: {reason}")
+        return train_and_evaluate(incremental=True)
+    metadata = bundle.metadata
+    backend = metadata.get('backend', DEFAULT_BACKEND)
+    print(f"  Model {bundle.version} ({backend}, {metadata.get('n_updates', 0)} updates)")
+    
+    try:
+        warm_update.check_updatable(backend, metadata)
+        
+        print("\n[1/3] Featurizing new sales...")
+        state, df = load_feature_input(incremental=True)
+        engineer_features(df, state=state)
+        save_feature_state(state)
+        
+        # Past the date the models were fitted to, or ingested since (late sales); ingestion
+        # past the replay window forced a feature rebuild, so nothing unseen is older than it
+        train_watermark = pd.Timestamp(metadata['train_watermark'])
+        df = state.read_rows(since=min(train_watermark, state.replay_start))
+        unseen = df['sale_date'] > train_watermark
+        if 'train_max_sale_id' in metadata:
+            unseen |= df['sale_id'] > metadata['train_max_sale_id']
+        new, known = _encode_like_bundle(df[unseen], bundle)
+        warm_update.check_new_rows(metadata, warm_update.ensemble_size(bundle.regressor),
+                                   int((~known).sum()), len(new))
+        new = new[known]
+        print(f"  {len(new)} rows since {metadata['train_watermark']} "
+              f"(or ingested past sale_id {metadata.get('train_max_sale_id', '-')})")
+        if len(new) < warm_update.MIN_UPDATE_ROWS:
+            print("  Too few new rows; model left as is.")
+            return None
+        
+        print("\n[2/3] Appending trees...")
+        X, y_price, y_direction, dates = prepare_ml_data(new)
+        bands = bundle.bands
+        report = warm_update.update_dual(
+            bundle.regressor, bundle.classifier, X, y_price, y_direction, dates, metadata, bands
+        )
+        print(f"  +{report['trees_added']} trees per head on {report['fit_rows']} rows "
+              f"({report['price_s'] + report['direction_s'] + report['band_s']:.1f}s)")
+    except warm_update.FullRetrainRequired as reason:
+        print(f"\n  Full retrain required: {reason}")
+        return train_and_evaluate(incremental=True, backend=backend, tuned=bool(metadata.get('tuned_params')))
+    
+    print("\n[3/3] Saving model bundle...")
+    watermark = report.pop('watermark')
+    version = save_model_bundle(
+        bundle.regressor, bundle.classifier, bundle.le_player, bundle.le_parallel, FEATURE_COLUMNS,
+        bands=bands,
+        metadata={
+            **metadata,
+            'train_watermark': str(watermark.date()),
+            'train_max_sale_id': state.max_sale_id,
+            'n_updates': metadata.get('n_updates', 0) + 1,
+            'last_update': report,
+        }
+    )
+    print(f"  {version} -> {MODEL_BUNDLE_PATH}")
+    return report
+
+def run_shards(by, only=None, workers=None, incremental=False):
+    """
+    Train per-segment price models (see sharded_model) next to the bundle's
+    global price model, which serves segments without a shard.
     
-    joblib.dump(le_player, "backend/le_player.pkl")
-    joblib.dump(le_parallel, "backend/le_parallel.pkl")
-    print("Done!")
+    only: segment labels to retrain; shards of other segments are kept.
+    """
+    print("=" * 60)
+    print(f"SEGMENT SHARDS (by {by})")
+    print("=" * 60)
+    
+    bundle = load_model_bundle(feature_columns=FEATURE_COLUMNS)
+    backend = bundle.metadata.get('backend', DEFAULT_BACKEND)
+    print(f"  Fallback: {bundle.version} ({backend})")
+    
+    state, df = load_feature_input(incremental)
+    df, _, _ = featurize_history(state, df)
+    
+    df, known = _encode_like_bundle(df, bundle)
+    if (~known).any():
+        print(f"  Skipping {(~known).sum()} rows with players/parallels unseen by the bundle")
+    X, y_price, y_direction, dates = prepare_ml_data(df[known])
+    keys = sharded_model.segment_keys(df.loc[X.index], by)
+    
+    tuned_params = bundle.metadata.get('tuned_params') or {}
+    report = sharded_model.train_shards(
+        X, y_price, y_direction, dates, keys, by, bundle.regressor, backend=backend, only=only,
+        workers=workers, cardinalities=_encoder_cardinalities(bundle.le_player, bundle.le_parallel),
+        params=tuned_params.get('price'), fallback_version=bundle.version
+    )
+    
+    print(f"\n{'Segment':<28} {'Train':>8} {'Test':>7} {'MAE':>9} {'Global':>9} {'Fit':>7}")
+    print("-" * 72)
+    for _, r in report.iterrows():
+        print(f"{str(r['segment'])[:28]:<28} {r['train_rows']:>8} {r['test_rows']:>7} "
+              f"${r['mae']:>8.2f} ${r['fallback_mae']:>8.2f} {r['fit_s']:>6.1f}s")
+    return report
+
+def _encoder_cardinalities(le_player, le_parallel):
+    return {'player_encoded': len(le_player.classes_), 'parallel_encoded': len(le_parallel.classes_)}
+
+def build_training_matrix(incremental=False):
+    """Load, featurize and return (X, y_price, y_direction, dates, cardinalities)."""
+    state, df = load_feature_input(incremental)
+    df, le_player, le_parallel = featurize_history(state, df)
+    
+    X, y_price, y_direction, dates = prepare_ml_data(df)
+    print(f"  Feature matrix: {X.shape[0]} rows x {X.shape[1]} features")
+    return X, y_price, y_direction, dates, _encoder_cardinalities(le_player, le_parallel)
+
+def compare_backends(X, y_price, y_direction, cardinalities=None, backends=BACKENDS):
+    """
+    Fit every backend on the same 80/20 time split and report accuracy and
+    wall time side by side (no models are saved).
+    """
+    split_idx = int(len(X) * 0.8)
+    X_train, X_test = X.iloc[:split_idx], X.iloc[split_idx:]
+    yp_train, yp_test = y_price.iloc[:split_idx], y_price.iloc[split_idx:]
+    yd_train, yd_test = y_direction.iloc[:split_idx], y_direction.iloc[split_idx:]
+    
+    rows = []
+    for backend in backends:
+        print(f"  Fitting {backend}...")
+        regressor, classifier, timings = fit_dual(
+            X_train, yp_train, yd_train, backend=backend, cardinalities=cardinalities
+        )
+        yp_pred = regressor.predict(X_test)
+        rows.append({
+            'backend': backend,
+            'mae': mean_absolute_error(yp_test, yp_pred),
+            'r2': r2_score(yp_test, yp_pred),
+            'accuracy': accuracy_score(yd_test, classifier.predict(X_test)),
+            'price_s': timings['price_s'],
+            'direction_s': timings['direction_s'],
+            'total_s': timings['total_s'],
+        })
+    results = pd.DataFrame(rows)
+    
+    print(f"\n{'Backend':<8} {'MAE':>9} {'R²':>7} {'Acc':>7} {'Price':>8} {'Dir':>8} {'Wall':>8}")
+    print("-" * 60)
+    for _, r in results.iterrows():
+        print(f"{r['backend']:<8} ${r['mae']:>8.2f} {r['r2']:>7.3f} {r['accuracy']:>6.1%} "
+              f"{r['price_s']:>7.1f}s {r['direction_s']:>7.1f}s {r['total_s']:>7.1f}s")
+    return results
+
+def run_compare(incremental=False):
+    print("=" * 60)
+    print("BACKEND COMPARISON (80/20 time split)")
+    print("=" * 60)
+    
+    X, y_price, y_direction, dates, cardinalities = build_training_matrix(incremental)
+    return compare_backends(X, y_price, y_direction, cardinalities)
+
+def run_tune(backend=DEFAULT_BACKEND, heads=tune.HEADS, n_candidates=27, eta=3, workers=None,
+             resume=False, incremental=False):
+    """Successive-halving search per head; best params go to tuned_params.json."""
+    print("=" * 60)
+    print(f"HYPERPARAMETER SEARCH (backend: {backend})")
+    print("=" * 60)
+    
+    matrix_path = tune.MATRIX_DIR
+    if resume and os.path.exists(os.path.join(matrix_path, 'columns.json')):
+        print(f"  Resuming on cached matrix in {matrix_path}")
+        cardinalities = tune.load_search_cardinalities(matrix_path)
+    else:
+        X, y_price, y_direction, dates, cardinalities = build_training_matrix(incremental)
+        tune.prepare_search_matrix(X, y_price, y_direction, dates, cardinalities, matrix_path)
+        del X, y_price, y_direction, dates
+    
+    best = {}
+    for head in heads:
+        results = tune.successive_halving(
+            head, backend, matrix_path, n_candidates=n_candidates, eta=eta,
+            workers=workers, cardinalities=cardinalities
+        )
+        best[head] = results[0]['params']
+        print(f"  Best {head}: {results[0]['score']:.4f} {best[head]}")
+    
+    tune.save_tuned_params({backend: best})
+    print(f"Saved to {tune.TUNED_PARAMS_PATH} (train with --tuned)")
+    return best
+
+def run_backtest(n_folds=5, gap_days=0, horizon_days=None, workers=None, incremental=False,
+                 backend=DEFAULT_BACKEND):
+    """Walk-forward backtest of the current model settings (no models are saved)."""
+    print("=" * 60)
+    print(f"WALK-FORWARD BACKTEST ({n_folds} folds, backend: {backend})")
+    print("=" * 60)
+    
+    X, y_price, y_direction, dates, cardinalities = build_training_matrix(incremental)
+    
+    return walk_forward_backtest(
+        X, y_price, y_direction, dates,
+        n_folds=n_folds, gap_days=gap_days, horizon_days=horizon_days, workers=workers,
+        backend=backend, cardinalities=cardinalities
+    )
 
 if __name__ == "__main__":
-    train_and_evaluate()
+    parser = argparse.ArgumentParser(description="Train the dual forecast models")
+    parser.add_argument("mode", nargs="?", default="train",
+                        choices=["train", "update", "shard", "backtest", "compare", "tune"],
+                        help="train: fit and save models (default); update: warm-start the saved models "
+                             "on new sales; shard: per-segment price models; backtest: walk-forward evaluation; "
+                             "compare: fit every backend on the same split; tune: hyperparameter search")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only featurize sales past the feature store watermark")
+    parser.add_argument("--folds", type=int, default=5, help="Backtest folds")
+    parser.add_argument("--gap-days", type=int, default=0,
+                        help="Days left out between each fold's training data and its test window")
+    parser.add_argument("--horizon-days", type=int, default=None,
+                        help="Length of each test window (default: last 20%% of history / folds)")
+    parser.add_argument("--workers", type=int, default=None, help="Backtest / tune / shard worker processes")
+    parser.add_argument("--by", choices=sharded_model.SEGMENTS, default="set", help="Shard: segment to split on")
+    parser.add_argument("--only", nargs="+", default=None, metavar="SEGMENT",
+                        help="Shard: retrain only these segments (e.g. one hot set)")
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help="gbm: GradientBoosting (default); hist: multi-core HistGradientBoosting")
+    parser.add_argument("--tuned", action="store_true", help="Train with the params saved by tune")
+    parser.add_argument("--candidates", type=int, default=27, help="Tune: configurations sampled")
+    parser.add_argument("--eta", type=int, default=3, help="Tune: keep 1/eta of configs per rung")
+    parser.add_argument("--head", choices=tune.HEADS, default=None, help="Tune: only this head")
+    parser.add_argument("--resume", action="store_true",
+                        help="Tune: reuse the cached matrix and skip evaluations already in the ledger")
+    args = parser.parse_args()
+    
+    if args.mode == "update":
+        run_update()
+    elif args.mode == "shard":
+        run_shards(args.by, args.only, args.workers, args.incremental)
+    elif args.mode == "backtest":
+        run_backtest(args.folds, args.gap_days, args.horizon_days, args.workers, args.incremental, args.backend)
+    elif args.mode == "compare":
+        run_compare(incremental=args.incremental)
+    elif args.mode == "tune":
+        heads = (args.head,) if args.head else tune.HEADS
+        run_tune(args.backend, heads, args.candidates, args.eta, args.workers, args.resume, args.incremental)
+    else:
+        train_and_evaluate(incremental=args.incremental, backend=args.backend, tuned=args.tuned)
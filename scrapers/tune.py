@@ -0,0 +1,245 @@
+"""Hyperparameter search for the dual forecast models.
+
+Randomly sampled configurations are run through successive halving: every
+candidate is fitted on the most recent slice of the training window, the best
+1/eta go on to a slice eta times larger, and so on until the survivors see the
+full window. Each head (price / direction) is tuned on its own. The last 20%
+of the timeline is train_and_evaluate's holdout and is never looked at here:
+candidates train on the start of the remaining window and are scored on its
+last VALIDATION_FRACTION.
+
+The feature matrix is built once and saved as memory-mapped .npy files under
+TUNE_DIR; workers only receive row counts and parameter dicts. Every finished
+evaluation is appended to a JSONL ledger, so re-running the same search skips
+what is already done. `--resume` also reuses the cached matrix so resumed
+results stay comparable.
+"""
+
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from sklearn.metrics import mean_absolute_error, log_loss
+from threadpoolctl import threadpool_limits
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from feature_matrix import MATRIX_FILES, save_feature_matrix, load_feature_matrix
+from model_backends import build_price_model, build_direction_model, categorical_mask
+
+TUNE_DIR = "backend/tune"
+MATRIX_DIR = os.path.join(TUNE_DIR, "matrix")
+LEDGER_PATH = os.path.join(TUNE_DIR, "ledger.jsonl")
+TUNED_PARAMS_PATH = "backend/tuned_params.json"
+
+HEADS = ('price', 'direction')
+HOLDOUT_FRACTION = 0.2     # train_and_evaluate's test split
+VALIDATION_FRACTION = 0.2  # of the rows before the holdout
+
+SEARCH_SPACES = {
+    'gbm': {
+        'n_estimators': [50, 100, 200, 400],
+        'max_depth': [2, 3, 4, 5, 6],
+        'learning_rate': [0.03, 0.05, 0.1, 0.2],
+        'subsample': [0.6, 0.8, 1.0],
+        'min_samples_leaf': [1, 5, 20, 50],
+    },
+    'hist': {
+        'learning_rate': [0.03, 0.05, 0.1, 0.2],
+        'max_depth': [3, 4, 5, 6, 8, None],
+        'max_leaf_nodes': [15, 31, 63, 127],
+        'min_samples_leaf': [5, 20, 50, 100],
+        'l2_regularization': [0.0, 0.1, 1.0, 10.0],
+    },
+}
+
+_worker_matrix = {}
+
+
+def sample_candidates(backend, n_candidates, seed=42):
+    """Draw n distinct parameter dicts from SEARCH_SPACES[backend]."""
+    space = SEARCH_SPACES[backend]
+    rng = random.Random(seed)
+    total = math.prod(len(values) for values in space.values())
+    candidates, seen = [], set()
+    while len(candidates) < min(n_candidates, total):
+        params = {name: rng.choice(values) for name, values in space.items()}
+        key = params_key(params)
+        if key not in seen:
+            seen.add(key)
+            candidates.append(params)
+    return candidates
+
+
+def params_key(params):
+    return json.dumps(params, sort_keys=True)
+
+
+def matrix_fingerprint(matrix):
+    """Identifies the data a ledger entry was scored on (a hash of every array's contents)."""
+    digest = hashlib.sha1(json.dumps(matrix['columns']).encode())
+    for name in MATRIX_FILES:
+        array = matrix[name]
+        digest.update(f"{name}|{array.dtype}|{array.shape}".encode())
+        digest.update(np.ascontiguousarray(array).view(np.uint8))
+    return digest.hexdigest()[:12]
+
+
+def validation_split(n_rows):
+    """(train_end, valid_end): candidates fit before train_end and score on [train_end, valid_end)."""
+    valid_end = int(n_rows * (1 - HOLDOUT_FRACTION))
+    return int(valid_end * (1 - VALIDATION_FRACTION)), valid_end
+
+
+def load_ledger(path=LEDGER_PATH):
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+    return entries
+
+
+def _append_ledger(entry, path=LEDGER_PATH):
+    with open(path, 'a') as f:
+        f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _ledger_key(fingerprint, head, backend, params, n_rows):
+    return (fingerprint, head, backend, params_key(params), n_rows)
+
+
+def _evaluate(task):
+    """Fit one head on the last n_rows before split_idx and score it on the validation slice (worker process)."""
+    path = task['matrix_path']
+    if path not in _worker_matrix:
+        _worker_matrix.clear()
+        _worker_matrix[path] = load_feature_matrix(path)
+    matrix = _worker_matrix[path]
+    X = matrix['X']
+    split_idx = task['split_idx']
+    train = slice(split_idx - task['n_rows'], split_idx)
+    test = slice(split_idx, task['valid_end'])
+
+    categorical = None
+    if task['backend'] == 'hist':
+        categorical = categorical_mask(matrix['columns'], X[:split_idx], task['cardinalities'])
+
+    start = time.perf_counter()
+    with threadpool_limits(limits=task['threads']):
+        if task['head'] == 'price':
+            y = matrix['y_price']
+            model = build_price_model(task['backend'], task['params'], categorical)
+            model.fit(X[train], y[train])
+            score = mean_absolute_error(y[test], model.predict(X[test]))
+        else:
+            y = matrix['y_direction']
+            if len(np.unique(y[train])) < 2:
+                score = float('inf')
+            else:
+                model = build_direction_model(task['backend'], task['params'], categorical)
+                model.fit(X[train], y[train])
+                score = log_loss(y[test], model.predict_proba(X[test]), labels=[0, 1])
+    return {**task, 'score': float(score), 'fit_s': time.perf_counter() - start}
+
+
+def successive_halving(head, backend, matrix_path, n_candidates=27, eta=3, min_rows=2000,
+                       workers=None, seed=42, cardinalities=None, ledger_path=LEDGER_PATH):
+    """
+    Run one successive-halving search; returns the final rung's results
+    sorted best first. Lower score is better (price: MAE, direction: log loss).
+    """
+    matrix = load_feature_matrix(matrix_path)
+    fingerprint = matrix_fingerprint(matrix)
+    split_idx, valid_end = validation_split(len(matrix['X']))
+
+    # Row budgets: full training window at the last rung, / eta per rung before it
+    n_rungs = max(1, 1 + int(math.log(max(1, split_idx // min_rows), eta)))
+    n_rungs = min(n_rungs, 1 + int(math.log(max(1, n_candidates), eta)))
+    budgets = [max(1, split_idx // eta ** (n_rungs - 1 - r)) for r in range(n_rungs)]
+
+    done = {}
+    for entry in load_ledger(ledger_path):
+        key = _ledger_key(entry['fingerprint'], entry['head'], entry['backend'], entry['params'], entry['n_rows'])
+        done[key] = entry
+
+    workers = workers or os.cpu_count() or 1
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    candidates = sample_candidates(backend, n_candidates, seed)
+    print(f"  {head}/{backend}: {len(candidates)} candidates, rungs {budgets} rows, eta={eta}, {workers} workers")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for rung, n_rows in enumerate(budgets):
+            results, pending = [], []
+            for params in candidates:
+                key = _ledger_key(fingerprint, head, backend, params, n_rows)
+                if key in done:
+                    results.append(done[key])
+                    continue
+                pending.append(pool.submit(_evaluate, {
+                    'matrix_path': matrix_path, 'split_idx': split_idx, 'valid_end': valid_end, 'n_rows': n_rows,
+                    'head': head, 'backend': backend, 'params': params,
+                    'cardinalities': cardinalities or {}, 'threads': threads,
+                }))
+
+            cached = len(results)
+            for future in as_completed(pending):
+                r = future.result()
+                entry = {
+                    'fingerprint': fingerprint, 'head': head, 'backend': backend, 'params': r['params'],
+                    'rung': rung, 'n_rows': n_rows, 'score': r['score'], 'fit_s': r['fit_s'],
+                }
+                _append_ledger(entry, ledger_path)
+                done[_ledger_key(fingerprint, head, backend, r['params'], n_rows)] = entry
+                results.append(entry)
+
+            results.sort(key=lambda e: e['score'])
+            print(f"    Rung {rung}: {len(candidates)} configs on {n_rows} rows "
+                  f"({cached} from ledger), best {results[0]['score']:.4f}")
+            keep = max(1, len(candidates) // eta)
+            candidates = [e['params'] for e in results[:keep]]
+    return results
+
+
+def prepare_search_matrix(X, y_price, y_direction, dates, cardinalities=None, path=MATRIX_DIR):
+    """Write the search matrix once; workers memory-map it."""
+    save_feature_matrix(path, X, y_price, y_direction, dates)
+    with open(os.path.join(path, 'cardinalities.json'), 'w') as f:
+        json.dump(cardinalities or {}, f)
+    return path
+
+
+def load_search_cardinalities(path=MATRIX_DIR):
+    cardinality_path = os.path.join(path, 'cardinalities.json')
+    if not os.path.exists(cardinality_path):
+        return {}
+    with open(cardinality_path) as f:
+        return json.load(f)
+
+
+def save_tuned_params(best, path=TUNED_PARAMS_PATH):
+    """Merge {backend: {head: params}} into the tuned params file."""
+    tuned = load_tuned_params(path)
+    for backend, heads in best.items():
+        tuned.setdefault(backend, {}).update(heads)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(tuned, f, indent=2)
+    return tuned
+
+
+def load_tuned_params(path=TUNED_PARAMS_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,73 @@
+import sys
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from train_model import engineer_features, prepare_ml_data, _encoder_cardinalities
+from feature_matrix import save_feature_matrix
+from backtest import walk_forward_splits, walk_forward_backtest, _run_fold, MIN_TRAIN_ROWS
+from verify_feature_engine import make_synthetic_sales
+
+METRICS = ['fold', 'train_rows', 'test_rows', 'train_through', 'test_from', 'test_to', 'mae', 'r2', 'accuracy']
+
+def _dates(n=20000, days=730, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.sort(np.datetime64('2024-01-01') + rng.integers(0, days, n).astype('timedelta64[D]'))
+
+def test_empty():
+    """No dates, no folds (walk_forward_backtest then reports no usable folds)."""
+    print("TEST: Empty input...")
+    assert walk_forward_splits([]) == []
+    assert walk_forward_splits(np.array([], dtype='datetime64[ns]'), n_folds=3, gap_days=7) == []
+    print("PASS")
+
+def test_fold_boundaries():
+    """Expanding train windows end gap_days before their test window; test windows are horizon_days long."""
+    print("TEST: Fold boundaries...")
+    dates = _dates()
+    for n_folds, gap_days, horizon_days in ((5, 0, None), (4, 7, None), (6, 14, 30), (3, 0, 1)):
+        splits = walk_forward_splits(dates, n_folds, gap_days, horizon_days)
+        assert len(splits) == n_folds, (n_folds, gap_days, horizon_days)
+        gap = np.timedelta64(gap_days, 'D')
+        horizon = np.timedelta64(horizon_days or max(1, int(730 * 0.2 / n_folds)), 'D')
+        for k, (train_end, test_start, test_end) in enumerate(splits):
+            assert MIN_TRAIN_ROWS <= train_end <= test_start < test_end
+            # No train/test overlap: every training date is more than the gap before the window
+            assert dates[train_end - 1] < dates[test_start] - gap
+            assert dates[test_end - 1] - dates[test_start] < horizon
+            if k:
+                prev_train_end, _, prev_test_end = splits[k - 1]
+                assert prev_test_end == test_start  # consecutive windows
+                assert prev_train_end <= train_end   # expanding
+        assert splits[-1][2] == len(dates)  # the last window ends at the last date
+    print("PASS")
+
+def test_pool_matches_serial():
+    """Fold metrics from the process pool equal the same folds run one by one in this process."""
+    print("TEST: Pool vs serial folds...")
+    raw = make_synthetic_sales(12000)
+    engineered, le_player, le_parallel = engineer_features(raw)
+    X, y_price, y_direction, dates = prepare_ml_data(engineered)
+    cardinalities = _encoder_cardinalities(le_player, le_parallel)
+    kwargs = dict(n_folds=3, gap_days=3, backend='hist', cardinalities=cardinalities)
+
+    pooled = walk_forward_backtest(X, y_price, y_direction, dates, workers=2, **kwargs)
+
+    with tempfile.TemporaryDirectory() as path:
+        save_feature_matrix(path, X, y_price, y_direction, dates)
+        serial = pd.DataFrame([_run_fold({
+            'fold': i + 1, 'matrix_path': path, 'train_end': train_end, 'test_start': test_start,
+            'test_end': test_end, 'price_params': None, 'direction_params': None, 'backend': 'hist',
+            'cardinalities': cardinalities, 'threads': 1,
+        }) for i, (train_end, test_start, test_end) in enumerate(walk_forward_splits(dates, 3, 3))])
+
+    assert len(pooled) == 3
+    pd.testing.assert_frame_equal(pooled[METRICS], serial[METRICS])
+    print("PASS")
+
+if __name__ == "__main__":
+    test_empty()
+    test_fold_boundaries()
+    test_pool_matches_serial()
@@ -0,0 +1,92 @@
+import argparse
+import sys
+import os
+import time
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor, HistGradientBoostingClassifier
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from train_model import engineer_features, prepare_ml_data
+from score_forecasts import build_scoring_features, score_variants
+from continuous_forecast import build_feature_grid
+from verify_feature_engine import make_synthetic_sales, FEATURE_COLS
+
+def test_scoring_matches_training(n_sales=20000, n_days=5):
+    """Scoring as of day T must reproduce the training features of the sales made on T."""
+    print(f"TEST: Batch scoring features vs training features ({n_days} dates)...")
+    raw = make_synthetic_sales(n_sales)
+    engineered, le_player, le_parallel = engineer_features(raw)
+    engineered['variant_id'] = (
+        engineered['product_id'].astype(str) + "_" +
+        engineered['grader'].fillna("Unk") + "_" + engineered['grade'].fillna("Unk")
+    )
+
+    dates = engineered['sale_date'].drop_duplicates().sort_values().iloc[::97][:n_days]
+    for as_of in dates:
+        expected = (
+            engineered[engineered['sale_date'] == as_of]
+            .groupby('variant_id').head(1).set_index('variant_id')[FEATURE_COLS].sort_index()
+        )
+        scored = build_scoring_features(raw, as_of, le_player, le_parallel).set_index('variant_id')
+        actual = scored.loc[expected.index, FEATURE_COLS]
+        pd.testing.assert_frame_equal(
+            actual.astype(float), expected.astype(float), check_exact=False, rtol=1e-9, check_names=False
+        )
+    print("PASS")
+
+def test_grid_matches_training(n_sales=20000, n_products=40):
+    """Every (variant, day) of a continuous grid that had a sale must match that sale's training row."""
+    print(f"TEST: Continuous feature grid vs training features ({n_products} products)...")
+    raw = make_synthetic_sales(n_sales, n_products=400)
+    engineered, le_player, le_parallel = engineer_features(raw)
+    product_ids = list(range(n_products))
+    grid = build_feature_grid(raw, le_player, le_parallel, product_ids=product_ids)
+
+    engineered = engineered[engineered['product_id'].isin(product_ids)].copy()
+    engineered['variant_id'] = (
+        engineered['product_id'].astype(str) + "_" +
+        engineered['grader'].fillna("Unk") + "_" + engineered['grade'].fillna("Unk")
+    )
+    expected = (
+        engineered.groupby(['variant_id', 'sale_date']).head(1)
+        .set_index(['variant_id', 'sale_date'])[FEATURE_COLS].sort_index()
+    )
+    actual = grid.set_index(['variant_id', 'sale_date']).loc[expected.index, FEATURE_COLS]
+    pd.testing.assert_frame_equal(
+        actual.astype(float), expected.astype(float), check_exact=False, rtol=1e-9, check_names=False
+    )
+    # One row per variant per day, no gaps
+    spans = grid.groupby('variant_id')['sale_date'].agg(['min', 'max', 'count'])
+    assert ((spans['max'] - spans['min']).dt.days + 1 == spans['count']).all()
+    print("PASS")
+
+def benchmark(n_sales=1000000):
+    print(f"\nBENCHMARK: batch scoring, {n_sales:,} sales of history")
+    raw = make_synthetic_sales(n_sales)
+    engineered, le_player, le_parallel = engineer_features(raw)
+    X, y_price, y_direction, _ = prepare_ml_data(engineered)
+    regressor = HistGradientBoostingRegressor(max_iter=100).fit(X, y_price)
+    classifier = HistGradientBoostingClassifier(max_iter=100).fit(X, y_direction)
+
+    as_of = raw['sale_date'].max() + pd.Timedelta(days=1)
+    start = time.perf_counter()
+    features = build_scoring_features(raw, as_of, le_player, le_parallel)
+    feature_s = time.perf_counter() - start
+    start = time.perf_counter()
+    forecasts = score_variants(features, regressor, classifier)
+    predict_s = time.perf_counter() - start
+
+    n = len(forecasts)
+    print(f"  {n:,} variants: features {feature_s:.2f}s, predict {predict_s:.2f}s "
+          f"({n / (feature_s + predict_s):,.0f} variants/s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch scoring equivalence test and benchmark")
+    parser.add_argument("--bench", type=int, default=None, metavar="N_SALES", help="Run the throughput benchmark")
+    args = parser.parse_args()
+
+    test_scoring_matches_training()
+    test_grid_matches_training()
+    if args.bench:
+        benchmark(args.bench)
@@ -0,0 +1,264 @@
+import argparse
+import sys
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from train_model import engineer_features
+from feature_store import FeatureState, REPLAY_DAYS, STATE_NAME, load_feature_state, save_feature_state
+
+FEATURE_COLS = [
+    'last_sold_price', 'rolling_avg_3', 'days_since_last_sale',
+    'player_7d_vol', 'player_7d_avg_price', 'grade_num',
+    'player_encoded', 'parallel_encoded', 'is_gold', 'is_black',
+    'is_rookie_num', 'days_since_start'
+]
+
+def make_synthetic_sales(n_sales, n_products=None, n_players=None, days=730, seed=42):
+    """Random sales frame shaped like train_model.load_data() output."""
+    rng = np.random.default_rng(seed)
+    n_products = n_products or max(10, n_sales // 50)
+    n_players = n_players or max(3, n_products // 20)
+
+    parallels = np.array(['Base', 'Gold', 'Black', 'Silver', None], dtype=object)
+    graders = np.array(['Raw', 'PSA', 'PSA', 'BGS', None], dtype=object)
+    grades = np.array(['Raw', '10', '9', '8', '7', '9.5', None], dtype=object)
+
+    product_player = rng.integers(0, n_players, n_products)
+    product_parallel = parallels[rng.integers(0, len(parallels), n_products)]
+    product_rookie = rng.random(n_products) < 0.5
+
+    product_id = rng.integers(0, n_products, n_sales)
+    start = np.datetime64(datetime(2024, 1, 1))
+    sale_date = start + rng.integers(0, days, n_sales).astype('timedelta64[D]')
+
+    df = pd.DataFrame({
+        'price': np.round(rng.lognormal(4, 1, n_sales), 2),
+        'sale_date': sale_date,
+        'grade': grades[rng.integers(0, len(grades), n_sales)],
+        'grader': graders[rng.integers(0, len(graders), n_sales)],
+        'product_id': product_id,
+        'player_name': np.char.add('Player ', product_player[product_id].astype(str)).astype(object),
+        'year': 2024,
+        'set_name': 'Synthetic Set',
+        'parallel_type': product_parallel[product_id],
+        'is_rookie_card': product_rookie[product_id],
+    })
+    return df.sort_values('sale_date', kind='stable').reset_index(drop=True)
+
+def reference_engineer_features(df):
+    """Original per-variant / per-player loop implementation, kept as the equivalence oracle."""
+    df = df.copy()
+    df['sale_date'] = pd.to_datetime(df['sale_date'])
+    df['variant_id'] = (
+        df['product_id'].astype(str) + "_" +
+        df['grader'].fillna("Unk") + "_" +
+        df['grade'].fillna("Unk")
+    )
+    df = df.sort_values(['variant_id', 'sale_date'])
+    daily_close = df.groupby(['variant_id', 'sale_date'])['price'].last().reset_index()
+
+    feature_chunks = []
+    for vid, group in daily_close.groupby('variant_id'):
+        group = group.set_index('sale_date').sort_index()
+        group['strict_prev_date'] = group.index.to_series().shift(1)
+        daily = group.resample('D').ffill()
+        daily['prev_day_close'] = daily['price'].shift(1)
+        daily['rolling_avg_3'] = daily['prev_day_close'].rolling(window=3, min_periods=1).mean()
+        daily['variant_id'] = vid
+        feature_chunks.append(daily[['variant_id', 'prev_day_close', 'strict_prev_date', 'rolling_avg_3']])
+    daily_features = pd.concat(feature_chunks).reset_index()
+
+    df = pd.merge(df, daily_features, on=['variant_id', 'sale_date'], how='left')
+    df['last_sold_price'] = df['prev_day_close']
+    df['days_since_last_sale'] = (df['sale_date'] - df['strict_prev_date']).dt.days
+    df = df.drop(columns=['prev_day_close', 'strict_prev_date'], errors='ignore')
+    df = df.dropna(subset=['last_sold_price'])
+
+    daily_player_stats = df.groupby(['player_name', 'sale_date']).agg(
+        daily_vol=('price', 'count'),
+        daily_rev=('price', 'sum')
+    ).reset_index()
+
+    player_dfs = []
+    for player, p_data in daily_player_stats.groupby('player_name'):
+        p_data = p_data.drop(columns=['player_name'], errors='ignore').set_index('sale_date').sort_index()
+        p_data = p_data.resample('D').sum().fillna(0)
+        shifted = p_data.shift(1)
+        rolling_7d = shifted.rolling('7D', min_periods=1).sum()
+        rolling_7d['player_7d_vol'] = rolling_7d['daily_vol']
+        rolling_7d['player_7d_avg_price'] = rolling_7d['daily_rev'] / rolling_7d['daily_vol'].replace(0, np.nan)
+        rolling_7d['player_7d_avg_price'] = rolling_7d['player_7d_avg_price'].fillna(0)
+        rolling_7d['player_name'] = player
+        player_dfs.append(rolling_7d.reset_index())
+    market_features = pd.concat(player_dfs)
+
+    df = pd.merge(df, market_features[['sale_date', 'player_name', 'player_7d_vol', 'player_7d_avg_price']],
+                  on=['sale_date', 'player_name'], how='left')
+    df['player_7d_vol'] = df['player_7d_vol'].fillna(0)
+    df['player_7d_avg_price'] = df['player_7d_avg_price'].fillna(0)
+
+    def map_grade(row):
+        g = str(row['grade']).upper()
+        if 'RAW' in g: return 0
+        if '10' in g: return 10
+        if '9' in g: return 9
+        if '8' in g: return 8
+        if '7' in g: return 7
+        return 0
+    df['grade_num'] = df.apply(map_grade, axis=1)
+
+    from sklearn.preprocessing import LabelEncoder
+    df['parallel_encoded'] = LabelEncoder().fit_transform(df['parallel_type'].fillna("Base"))
+    df['is_gold'] = df['parallel_type'].apply(lambda x: 1 if x == 'Gold' else 0)
+    df['is_black'] = df['parallel_type'].apply(lambda x: 1 if x == 'Black' else 0)
+    df['player_encoded'] = LabelEncoder().fit_transform(df['player_name'])
+    df['is_rookie_num'] = df['is_rookie_card'].apply(lambda x: 1 if x else 0)
+    df['days_since_start'] = (df['sale_date'] - df['sale_date'].min()).dt.days
+    return df
+
+def test_feature_equivalence(n_sales=5000):
+    print(f"TEST: Vectorized engineer_features vs reference loops ({n_sales:,} sales)...")
+    raw = make_synthetic_sales(n_sales)
+
+    expected = reference_engineer_features(raw)
+    actual, _, _ = engineer_features(raw)
+
+    assert list(actual.columns) == list(expected.columns), \
+        f"FAIL: column mismatch\n  expected {list(expected.columns)}\n  actual   {list(actual.columns)}"
+    print("PASS: Identical output columns.")
+
+    pd.testing.assert_frame_equal(
+        actual.reset_index(drop=True), expected.reset_index(drop=True),
+        check_dtype=False, rtol=1e-9
+    )
+    print(f"PASS: Identical rows and values ({len(actual):,} rows, {len(FEATURE_COLS)} features).")
+
+# Codes and time origin depend on the order sales arrived in; checked against the state instead
+ORDER_DEPENDENT = ['player_encoded', 'parallel_encoded', 'days_since_start']
+
+def _assert_matches_rebuild(actual, expected, state, key):
+    actual = actual.assign(variant_id=actual['variant_id'].astype(str))  # the store reads strings as categories
+    expected = expected.sort_values(key, kind='stable').reset_index(drop=True)
+    actual = actual.sort_values(key, kind='stable').reset_index(drop=True)
+    columns = [c for c in expected.columns if c not in ORDER_DEPENDENT]
+    pd.testing.assert_frame_equal(actual[columns].astype(object), expected[columns].astype(object),
+                                  check_dtype=False, rtol=1e-9)
+    players = state.le_player.classes_[actual['player_encoded'].to_numpy()]
+    assert (players == actual['player_name'].astype(str).to_numpy()).all()
+    parallels = state.le_parallel.classes_[actual['parallel_encoded'].to_numpy()]
+    assert (parallels == actual['parallel_type'].astype(object).fillna("Base").to_numpy()).all()
+    assert ((actual['sale_date'] - state.min_date).dt.days == actual['days_since_start']).all()
+
+def test_incremental_equivalence(n_sales=5000, n_batches=4):
+    print(f"TEST: Incremental feature store vs full rebuild ({n_batches} batches)...")
+    raw = make_synthetic_sales(n_sales)
+    expected, _, _ = engineer_features(raw)
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        # Replay history in date-ordered batches, carrying the state across runs
+        state = FeatureState(store_dir)
+        cut_dates = raw['sale_date'].quantile([i / n_batches for i in range(1, n_batches)]).dt.normalize()
+        previous_cut, codes = None, None
+        for cut in list(cut_dates) + [raw['sale_date'].max()]:
+            mask = raw['sale_date'] <= cut
+            if previous_cut is not None:
+                mask &= raw['sale_date'] > previous_cut
+            parts_before = len(state.parts)
+            new, _, _ = engineer_features(raw[mask], state=state)
+            save_feature_state(state)
+            state = load_feature_state(store_dir)
+            assert len(state.parts) > parts_before, "FAIL: new rows were not appended as a part"
+            if codes is not None:
+                assert list(state.le_player.classes_[:len(codes)]) == codes, "FAIL: player codes changed"
+            codes = list(state.le_player.classes_)
+            previous_cut = cut
+        watermark = state.watermark
+        actual = state.read_rows()
+        assert len(new) < len(actual), "FAIL: an incremental run returned more than its new rows"
+
+        _assert_matches_rebuild(actual, expected, state, ['variant_id', 'sale_date'])
+        print(f"PASS: Incremental state reproduces full rebuild ({len(actual):,} rows).")
+
+        state_bytes = os.path.getsize(os.path.join(store_dir, STATE_NAME))
+        rows_bytes = sum(os.path.getsize(os.path.join(store_dir, p['name'])) for p in state.parts)
+        assert state_bytes < rows_bytes / 2, (state_bytes, rows_bytes)
+        print(f"PASS: Pickled state holds only the tail ({state_bytes:,} bytes; rows {rows_bytes:,} bytes in parts).")
+
+        before = state.rows
+        engineer_features(raw[raw['sale_date'] <= watermark].head(50), state=state)
+        assert state.rows == before, "FAIL: sales at or before the watermark were re-processed"
+        print("PASS: Sales at or before the watermark are skipped.")
+
+def test_late_sales(n_sales=5000, n_batches=6):
+    print(f"TEST: Late-arriving sales re-merged by ingestion order ({n_batches} batches)...")
+    raw = make_synthetic_sales(n_sales, days=365)
+    # Ingested roughly in date order, but a fifth of the sales show up 1-30 days late
+    rng = np.random.default_rng(7)
+    delay = np.where(rng.random(n_sales) < 0.2, rng.integers(1, 31, n_sales), 0)
+    ingested = raw['sale_date'] + pd.to_timedelta(delay, unit='D')
+    raw['sale_id'] = ingested.rank(method='first').astype('int64').to_numpy()
+    expected, _, _ = engineer_features(raw)
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        # load_feature_input's protocol: rewind to the earliest late sale, replay from there
+        state = FeatureState(store_dir)
+        rewinds = 0
+        for batch_end in np.linspace(0, n_sales, n_batches + 1)[1:].astype(int):
+            ingested_so_far = raw[raw['sale_id'] <= batch_end]
+            new = ingested_so_far[ingested_so_far['sale_id'] > state.max_sale_id]
+            if not state.is_empty and (new['sale_date'] <= state.watermark).any():
+                assert state.rewind(new['sale_date'].min())
+                rewinds += 1
+            since = state.watermark if not state.is_empty else pd.Timestamp.min
+            engineer_features(ingested_so_far[ingested_so_far['sale_date'] > since], state=state)
+            save_feature_state(state)
+        assert rewinds > 0 and state.max_sale_id == n_sales
+        on_disk = {name for name in os.listdir(store_dir) if name.startswith("rows-")}
+        assert on_disk == {p['name'] for p in state.parts}, "FAIL: rewound parts left behind"
+
+        _assert_matches_rebuild(state.read_rows(), expected, state, ['variant_id', 'sale_date', 'sale_id'])
+        print(f"PASS: {rewinds} rewinds reproduce the full rebuild ({state.rows:,} rows).")
+
+        assert not state.rewind(state.watermark - pd.Timedelta(days=REPLAY_DAYS + 1))
+        print("PASS: Sales older than the replay window ask for a full rebuild.")
+
+def benchmark(sizes, reference_limit=20000):
+    print("\nBENCHMARK: engineer_features on synthetic sales")
+    print(f"{'Sales':>12} {'Variants':>10} {'Vectorized':>12} {'Reference':>12} {'Speedup':>8}")
+    print("-" * 58)
+    for n in sizes:
+        raw = make_synthetic_sales(n)
+        n_variants = raw.groupby(['product_id', 'grader', 'grade'], dropna=False).ngroups
+
+        start = time.perf_counter()
+        engineer_features(raw)
+        vec_s = time.perf_counter() - start
+
+        ref_s = None
+        if n <= reference_limit:
+            start = time.perf_counter()
+            reference_engineer_features(raw)
+            ref_s = time.perf_counter() - start
+
+        ref_str = f"{ref_s:>11.2f}s" if ref_s else f"{'skipped':>12}"
+        speedup = f"{ref_s / vec_s:>7.1f}x" if ref_s else f"{'-':>8}"
+        print(f"{n:>12,} {n_variants:>10,} {vec_s:>11.2f}s {ref_str} {speedup}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Equivalence test and benchmark for engineer_features")
+    parser.add_argument("--bench", type=int, nargs="*", metavar="N_SALES",
+                        help="Benchmark sizes, e.g. --bench 1000000 10000000")
+    parser.add_argument("--reference-limit", type=int, default=20000,
+                        help="Largest size the (slow) reference loops are timed at")
+    args = parser.parse_args()
+
+    test_feature_equivalence()
+    test_incremental_equivalence()
+    test_late_sales()
+    if args.bench is not None:
+        benchmark(args.bench or [1_000_000, 10_000_000], args.reference_limit)
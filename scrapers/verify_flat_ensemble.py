@@ -0,0 +1,96 @@
+import argparse
+import sys
+import os
+import tempfile
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from train_model import engineer_features, prepare_ml_data, _encoder_cardinalities
+from model_backends import fit_dual
+from flat_ensemble import FlatEnsemble, compile_ensemble
+from model_bundle import ModelBundle, save_model_bundle
+from score_forecasts import FLAT_MAX_ROWS, scoring_models
+from verify_feature_engine import make_synthetic_sales
+
+def _training_matrix(n_sales=20000, n_players=None):
+    raw = make_synthetic_sales(n_sales, n_players=n_players)
+    engineered, le_player, le_parallel = engineer_features(raw)
+    X, y_price, y_direction, _ = prepare_ml_data(engineered)
+    return X, y_price, y_direction, _encoder_cardinalities(le_player, le_parallel)
+
+def test_parity(backend, X, y_price, y_direction, cardinalities):
+    """Compiled ensembles reproduce sklearn's predictions, batch and single row."""
+    print(f"TEST: Flat ensemble parity ({backend})...")
+    regressor, classifier, _ = fit_dual(X, y_price, y_direction, backend=backend, cardinalities=cardinalities)
+    flat_price, flat_direction = compile_ensemble(regressor), compile_ensemble(classifier)
+
+    np.testing.assert_allclose(flat_price.predict(X), regressor.predict(X), rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(flat_direction.predict_proba(X), classifier.predict_proba(X), rtol=1e-9, atol=1e-12)
+    np.testing.assert_array_equal(flat_direction.predict(X), classifier.predict(X))
+
+    rows = X.iloc[::max(1, len(X) // 50)]
+    expected = regressor.predict(rows)
+    for i, row in enumerate(rows.to_numpy()):
+        assert abs(flat_price.predict_one(row) - expected[i]) <= 1e-9 * max(1.0, abs(expected[i]))
+
+    # Missing values and categories never seen in training follow sklearn's routing
+    odd = X.iloc[:200].copy()
+    odd.iloc[::3, 0] = np.nan
+    odd.iloc[1::3, X.columns.get_loc('player_encoded')] = 10 ** 6
+    if backend == 'hist':
+        np.testing.assert_allclose(flat_price.predict(odd), regressor.predict(odd), rtol=1e-9, atol=1e-9)
+    print("PASS")
+    return regressor, flat_price
+
+def test_scoring_models(backend, X, y_price, y_direction, cardinalities):
+    """Small scoring grids get the bundle's flat heads, which predict what the sklearn ones do."""
+    print(f"TEST: Flat heads for small grids ({backend})...")
+    regressor, classifier, _ = fit_dual(X, y_price, y_direction, backend=backend, cardinalities=cardinalities)
+    with tempfile.TemporaryDirectory() as path:
+        save_model_bundle(regressor, classifier, None, None, X.columns, path=path,
+                          bands={0.1: regressor, 0.9: regressor})
+        bundle = ModelBundle(path)
+        price, direction, bands = scoring_models(bundle, FLAT_MAX_ROWS - 1)
+        assert all(isinstance(m, FlatEnsemble) for m in (price, direction, *bands.values()))
+        rows = X.iloc[:FLAT_MAX_ROWS - 1]
+        np.testing.assert_allclose(price.predict(rows), regressor.predict(rows), rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(direction.predict_proba(rows), classifier.predict_proba(rows), atol=1e-12)
+        price, direction, bands = scoring_models(bundle, FLAT_MAX_ROWS)
+        assert not isinstance(price, FlatEnsemble) and sorted(bands) == [0.1, 0.9]
+    print("PASS")
+
+def benchmark(regressor, flat_price, X, label):
+    print(f"\nBENCHMARK ({label}, {flat_price.n_trees} trees, {flat_price.n_nodes:,} nodes): us/row")
+    print(f"  {'rows':>7} {'sklearn':>10} {'flat':>10}")
+    for n in (1, 100, 100000):
+        batch = X.iloc[np.arange(n) % len(X)]
+        repeats = max(1, 2000 // n)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            regressor.predict(batch)
+        sklearn_us = (time.perf_counter() - start) / repeats / n * 1e6
+        if n == 1:
+            row = batch.to_numpy()[0]
+            start = time.perf_counter()
+            for _ in range(repeats):
+                flat_price.predict_one(row)
+        else:
+            start = time.perf_counter()
+            for _ in range(repeats):
+                flat_price.predict(batch)
+        flat_us = (time.perf_counter() - start) / repeats / n * 1e6
+        print(f"  {n:>7,} {sklearn_us:>10.2f} {flat_us:>10.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flat ensemble parity test and microbenchmark")
+    parser.add_argument("--bench", action="store_true", help="Run the us/row microbenchmark")
+    args = parser.parse_args()
+
+    matrix = _training_matrix(n_players=100)  # player codes fit native categorical splits
+    fitted = {backend: test_parity(backend, *matrix) for backend in ('gbm', 'hist')}
+    for backend in ('gbm', 'hist'):
+        test_scoring_models(backend, *matrix)
+    if args.bench:
+        for backend, (regressor, flat_price) in fitted.items():
+            benchmark(regressor, flat_price, matrix[0], backend)
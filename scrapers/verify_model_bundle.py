@@ -0,0 +1,114 @@
+import sys
+import os
+import tempfile
+import time
+from datetime import datetime
+import joblib
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from train_model import engineer_features, prepare_ml_data, FEATURE_COLUMNS
+from model_backends import fit_dual
+import model_bundle
+from model_bundle import ModelBundle, BundleError, load_model_bundle, save_model_bundle
+from verify_feature_engine import make_synthetic_sales
+
+def _fitted(n_sales=20000):
+    raw = make_synthetic_sales(n_sales)
+    engineered, le_player, le_parallel = engineer_features(raw)
+    X, y_price, y_direction, _ = prepare_ml_data(engineered)
+    regressor, classifier, _ = fit_dual(X, y_price, y_direction, backend='hist')
+    return X, regressor, classifier, le_player, le_parallel
+
+def test_round_trip(fitted, path):
+    """A reloaded bundle predicts exactly what the in-memory models did."""
+    print("TEST: Bundle round trip...")
+    X, regressor, classifier, le_player, le_parallel = fitted
+    version = save_model_bundle(regressor, classifier, le_player, le_parallel, X.columns,
+                                metadata={'backend': 'hist'}, path=path)
+    bundle = ModelBundle(path)
+    assert bundle.version == version and bundle.metadata == {'backend': 'hist'}
+    assert bundle._estimators is None, "estimators loaded before first use"
+    np.testing.assert_array_equal(bundle.regressor.predict(X), regressor.predict(X))
+    np.testing.assert_array_equal(bundle.classifier.predict_proba(X), classifier.predict_proba(X))
+    assert list(bundle.le_player.classes_) == list(le_player.classes_)
+
+    nodes = ModelBundle(path, mmap=True).regressor._predictors[0][0].nodes
+    assert isinstance(nodes, np.memmap), "tree arrays not memory-mapped"
+    print("PASS")
+
+def test_feature_check(path):
+    """Scoring with other columns (or another order) fails at open."""
+    print("TEST: Feature schema check...")
+    assert load_model_bundle(path, FEATURE_COLUMNS) is load_model_bundle(path)
+    for columns in (FEATURE_COLUMNS[::-1], FEATURE_COLUMNS[:-1], FEATURE_COLUMNS + ['extra']):
+        try:
+            load_model_bundle(path, columns)
+        except BundleError:
+            continue
+        raise AssertionError(f"no error for {columns}")
+    print("PASS")
+
+def test_retrain_keeps_previous(fitted, path):
+    """A bundle opened before a retrain can still load its estimators; older files are dropped."""
+    print("TEST: Retrain under an open bundle...")
+    X, regressor, classifier, le_player, le_parallel = fitted
+    opened = [ModelBundle(path)]
+    for _ in range(2):
+        save_model_bundle(regressor, classifier, le_player, le_parallel, X.columns, path=path)
+        np.testing.assert_array_equal(opened[-1].regressor.predict(X), regressor.predict(X))
+        opened.append(ModelBundle(path))
+    kept = sorted(name for name in os.listdir(path) if name.startswith("estimators_"))
+    assert kept == sorted(b.manifest['estimators'] for b in opened[1:]), kept
+    print("PASS")
+
+def test_version_not_overwritten(fitted, path):
+    """A save that lands on an existing version fails and leaves the bundle as it was."""
+    print("TEST: Existing version is not overwritten...")
+    X, regressor, classifier, le_player, le_parallel = fitted
+    version = ModelBundle(path).version
+    stamp = datetime.strptime(version, "dual_%Y%m%d_%H%M%S_%f")
+
+    class FrozenClock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return stamp
+
+    model_bundle.datetime = FrozenClock
+    try:
+        save_model_bundle(regressor, classifier, le_player, le_parallel, X.columns, path=path)
+        raise AssertionError("a save with an existing version should fail")
+    except FileExistsError:
+        pass
+    finally:
+        model_bundle.datetime = datetime
+    assert ModelBundle(path).version == version
+    np.testing.assert_array_equal(ModelBundle(path).regressor.predict(X), regressor.predict(X))
+    print("PASS")
+
+def benchmark(fitted, path):
+    """Open + first predict: four loose pickles vs the bundle."""
+    X, regressor, classifier, le_player, le_parallel = fitted
+    legacy = {name: os.path.join(path, f"{name}.pkl") for name in ('price', 'direction', 'le_player', 'le_parallel')}
+    for name, obj in zip(legacy, (regressor, classifier, le_player, le_parallel)):
+        joblib.dump(obj, legacy[name])
+
+    row = X.iloc[:1]
+    start = time.perf_counter()
+    models = {name: joblib.load(p) for name, p in legacy.items()}
+    models['price'].predict(row)
+    legacy_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ModelBundle(path).regressor.predict(row)
+    bundle_s = time.perf_counter() - start
+    print(f"\nBENCHMARK: open + 1 predict: pickles {legacy_s * 1000:.1f}ms, bundle {bundle_s * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    fitted = _fitted()
+    with tempfile.TemporaryDirectory() as path:
+        test_round_trip(fitted, path)
+        test_feature_check(path)
+        test_retrain_keeps_previous(fitted, path)
+        test_version_not_overwritten(fitted, path)
+        benchmark(fitted, path)
@@ -1,5 +1,4 @@
 import pandas as pd
-import joblib
 import sys
 import os
 
@@ -7,9 +6,7 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from train_model import load_data, engineer_features, prepare_ml_data
-
-MODEL_PATH_PRICE = "backend/model.pkl"
-MODEL_PATH_DIRECTION = "backend/model_direction.pkl"
+from model_bundle import load_model_bundle
 
 def verify_jayden():
     print("Loading data...")
@@ -33,12 +30,12 @@ def verify_jayden():
     target_df = target_df.sort_values('sale_date')
     
     # Prepare X
-    X, y_actual, y_direction_actual = prepare_ml_data(target_df)
+    X, y_actual, y_direction_actual, _ = prepare_ml_data(target_df)
     
     # Load Models
     print("Loading models...")
-    regressor = joblib.load(MODEL_PATH_PRICE)
-    classifier = joblib.load(MODEL_PATH_DIRECTION)
+    bundle = load_model_bundle(feature_columns=X.columns)
+    regressor, classifier = bundle.regressor, bundle.classifier
     
     # Predict
     y_pred_price = regressor.predict(X)
@@ -0,0 +1,86 @@
+import argparse
+import sys
+import os
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from train_model import engineer_features, prepare_ml_data, _encoder_cardinalities, compare_backends
+from model_backends import BAND_QUANTILES, band_head, fit_dual, fit_heads, predict_band
+from score_forecasts import build_scoring_features, score_variants
+from verify_feature_engine import make_synthetic_sales
+
+def test_band(backend, n_sales=30000):
+    """Band heads cover about P90-P10 of held-out prices and cost < 2x the dual fit."""
+    print(f"TEST: Price band ({backend})...")
+    raw = make_synthetic_sales(n_sales)
+    engineered, le_player, le_parallel = engineer_features(raw)
+    X, y_price, y_direction, _ = prepare_ml_data(engineered)
+    split = int(len(X) * 0.8)
+    cardinalities = _encoder_cardinalities(le_player, le_parallel)
+
+    _, _, dual_timings = fit_dual(X.iloc[:split], y_price.iloc[:split], y_direction.iloc[:split],
+                                  backend=backend, cardinalities=cardinalities)
+    models, timings = fit_heads(X.iloc[:split], y_price.iloc[:split], y_direction.iloc[:split],
+                                backend=backend, cardinalities=cardinalities, quantiles=BAND_QUANTILES)
+    bands = {q: models[band_head(q)] for q in BAND_QUANTILES}
+    ratio = timings['total_s'] / dual_timings['total_s']
+    print(f"  Train: dual {dual_timings['total_s']:.1f}s, with band {timings['total_s']:.1f}s ({ratio:.2f}x)")
+    assert ratio < 2.0
+
+    low, high = predict_band(bands, X.iloc[split:])
+    assert (low <= high).all()
+    y_test = y_price.iloc[split:]
+    coverage = ((y_test >= low) & (y_test <= high)).mean()
+    print(f"  Holdout coverage: {coverage:.1%} (target {max(BAND_QUANTILES) - min(BAND_QUANTILES):.0%})")
+    assert 0.6 <= coverage <= 0.95
+
+    # Scoring: the band is two more predict calls on the same matrix
+    as_of = raw['sale_date'].max() + pd.Timedelta(days=1)
+    features = build_scoring_features(raw, as_of, le_player, le_parallel)
+    start = time.perf_counter()
+    score_variants(features, models['price'], models['direction'])
+    point_s = time.perf_counter() - start
+    start = time.perf_counter()
+    forecasts = score_variants(features, models['price'], models['direction'], bands)
+    band_s = time.perf_counter() - start
+    assert forecasts[['confidence_interval_lower', 'confidence_interval_upper']].notna().all().all()
+    n = len(forecasts)
+    print(f"  Scoring {n:,} variants: {point_s / n * 1e6:.1f} us/variant, "
+          f"with band {band_s / n * 1e6:.1f} us/variant")
+    print("PASS")
+
+def test_compare(n_sales=12000):
+    """compare mode: one row per backend, scored like a direct fit on the same 80/20 split."""
+    print("TEST: Backend comparison...")
+    raw = make_synthetic_sales(n_sales)
+    engineered, le_player, le_parallel = engineer_features(raw)
+    X, y_price, y_direction, _ = prepare_ml_data(engineered)
+    cardinalities = _encoder_cardinalities(le_player, le_parallel)
+
+    results = compare_backends(X, y_price, y_direction, cardinalities)
+    assert list(results['backend']) == ['gbm', 'hist']
+    assert results[['mae', 'r2', 'accuracy', 'price_s', 'direction_s', 'total_s']].notna().all().all()
+    assert results['accuracy'].between(0, 1).all()
+    # The heads are fitted concurrently: the wall time covers the slower head
+    assert (results['total_s'] >= results[['price_s', 'direction_s']].max(axis=1) * 0.9).all()
+
+    split = int(len(X) * 0.8)
+    for _, row in results.iterrows():
+        regressor, classifier, _ = fit_dual(X.iloc[:split], y_price.iloc[:split], y_direction.iloc[:split],
+                                            backend=row['backend'], cardinalities=cardinalities)
+        mae = np.abs(regressor.predict(X.iloc[split:]) - y_price.iloc[split:]).mean()
+        accuracy = (classifier.predict(X.iloc[split:]) == y_direction.iloc[split:]).mean()
+        np.testing.assert_allclose([row['mae'], row['accuracy']], [mae, accuracy])
+    print("PASS")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Price band heads: coverage, training and scoring cost")
+    parser.add_argument("--backend", choices=["gbm", "hist"], default=None, help="Only this backend")
+    args = parser.parse_args()
+
+    for backend in ([args.backend] if args.backend else ["gbm", "hist"]):
+        test_band(backend)
+    if not args.backend:
+        test_compare()
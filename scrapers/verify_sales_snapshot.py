@@ -0,0 +1,120 @@
+import sys
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from sales_snapshot import append_sales, read_sales, load_manifest, SALES_COLUMNS, MAX_PARTS
+
+def make_sales(first_id, n, seed=0):
+    """Synthetic rows of the snapshot's SALES_QUERY, sale_id first_id .. first_id + n - 1."""
+    rng = np.random.default_rng(seed + first_id)
+    sale_id = np.arange(first_id, first_id + n)
+    return pd.DataFrame({
+        'sale_id': sale_id,
+        'created_at': pd.Timestamp('2025-06-01') + pd.to_timedelta(sale_id, unit='min'),
+        'price': rng.uniform(5, 500, n).round(2),
+        # Ingestion order is not date order: scrapes bring in sales dated weeks back
+        'sale_date': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 180, n), unit='D'),
+        'grade': rng.choice(['10', '9', None], n),
+        'grader': rng.choice(['PSA', 'BGS', None], n),
+        'product_id': rng.integers(1, 200, n),
+        'player_name': rng.choice(['Jayden Daniels', 'Caleb Williams', 'Drake Maye'], n),
+        'year': rng.choice([2023, 2024, None], n),
+        'set_name': rng.choice(['Prizm', 'Optic'], n),
+        'parallel_type': rng.choice(['Base', 'Silver', None], n),
+        'is_rookie_card': rng.choice([True, False], n),
+    })
+
+def _read_all(path, **kwargs):
+    return read_sales(columns=SALES_COLUMNS + ['sale_id'], snapshot_dir=path, **kwargs)
+
+def test_watermark(path):
+    """Each append adds a part and moves the sale_id / created_at watermark to its newest sale."""
+    print("TEST: Manifest watermark...")
+    first, second = make_sales(1, 500), make_sales(501, 300)
+    append_sales(first, path)
+    manifest = append_sales([second.iloc[:100], second.iloc[100:]], path)  # chunks, as refresh_snapshot streams
+    assert manifest == load_manifest(path)
+    assert manifest['max_sale_id'] == 800 and manifest['rows'] == 800
+    assert pd.Timestamp(manifest['max_created_at']) == second['created_at'].max()
+    assert manifest['parts'] == ["part-000000000001-000000000500.arrow", "part-000000000501-000000000800.arrow"]
+    assert sorted(name for name in os.listdir(path) if name.endswith(".arrow")) == manifest['parts']
+    print("PASS")
+
+def test_dedupe(path):
+    """Sales at or below the watermark, and repeats within a batch, are not appended again."""
+    print("TEST: Dedupe on sale_id...")
+    before = load_manifest(path)
+    # A scrape overlapping the last one, with a sale listed twice
+    overlap = make_sales(701, 200)
+    batch = pd.concat([overlap, overlap.iloc[150:160]]).sample(frac=1, random_state=0)
+    manifest = append_sales(batch, path)
+    assert manifest['rows'] == before['rows'] + 100 and manifest['max_sale_id'] == 900
+    assert len(manifest['parts']) == len(before['parts']) + 1
+
+    # Nothing new: no part, unchanged manifest
+    assert append_sales(make_sales(1, 900), path) == manifest
+    assert len(os.listdir(path)) == len(manifest['parts']) + 1
+
+    sales = _read_all(path)
+    assert sales['sale_id'].is_unique and len(sales) == 900
+    # The snapshot kept the first copy of each sale
+    kept = sales.set_index('sale_id').sort_index().loc[701:800, 'price']
+    np.testing.assert_allclose(kept, make_sales(501, 300).set_index('sale_id').loc[701:800, 'price'], rtol=1e-6)
+    print("PASS")
+
+def test_compaction(path):
+    """Beyond MAX_PARTS the parts are merged into one, with the same rows and watermark."""
+    print("TEST: Compaction...")
+    before = _read_all(path)
+    manifest = load_manifest(path)
+    next_id = manifest['max_sale_id'] + 1
+    while len(manifest['parts']) < MAX_PARTS:
+        manifest = append_sales(make_sales(next_id, 10), path)
+        next_id += 10
+    assert len(manifest['parts']) == MAX_PARTS
+
+    manifest = append_sales(make_sales(next_id, 10), path)
+    assert manifest['parts'] == [f"part-000000000001-{next_id + 9:012d}.arrow"]
+    assert sorted(os.listdir(path)) == sorted(manifest['parts'] + ['manifest.json'])
+    assert manifest['max_sale_id'] == next_id + 9 and manifest['rows'] == next_id + 9
+
+    after = _read_all(path)
+    assert after['sale_id'].is_unique and len(after) == manifest['rows']
+    old = after[after['sale_id'].isin(before['sale_id'])].sort_values('sale_id').reset_index(drop=True)
+    pd.testing.assert_frame_equal(old, before.sort_values('sale_id').reset_index(drop=True))
+    print("PASS")
+
+def test_read_filters(path):
+    """read_sales: column subset, strict since, after_sale_id, sale_date order, categorical strings."""
+    print("TEST: Read filters...")
+    full = _read_all(path)
+    assert full['sale_date'].is_monotonic_increasing
+    assert isinstance(full['player_name'].dtype, pd.CategoricalDtype)
+
+    subset = read_sales(columns=['price', 'player_name'], snapshot_dir=path)
+    assert list(subset.columns) == ['price', 'player_name'] and len(subset) == len(full)
+
+    since = pd.Timestamp('2025-04-01')
+    recent = _read_all(path, since=since)
+    assert (recent['sale_date'] > since).all()
+    assert len(recent) == (full['sale_date'] > since).sum()
+
+    late = _read_all(path, after_sale_id=850)
+    assert sorted(late['sale_id']) == sorted(full.loc[full['sale_id'] > 850, 'sale_id'])
+    assert late['sale_date'].is_monotonic_increasing
+    assert (late['sale_date'] < since).any()  # ingestion order, whatever the date
+
+    both = read_sales(columns=['price'], since=since, after_sale_id=850, snapshot_dir=path)
+    assert list(both.columns) == ['price']
+    assert len(both) == ((full['sale_date'] > since) & (full['sale_id'] > 850)).sum()
+    print("PASS")
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as path:
+        test_watermark(path)
+        test_dedupe(path)
+        test_compaction(path)
+        test_read_filters(path)
@@ -0,0 +1,85 @@
+import sys
+import os
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from train_model import engineer_features, prepare_ml_data, _encoder_cardinalities
+from model_backends import fit_dual
+from sharded_model import segment_keys, train_shards, load_shard_router, _shard_file, MIN_SHARD_ROWS
+from verify_feature_engine import make_synthetic_sales
+
+SETS = np.array(['Prizm', 'Optic', 'Select', 'Mosaic', 'Tiny Set'])
+
+def _matrix(n_sales=30000):
+    """Synthetic sales spread over a few sets, one of them too small for a shard."""
+    raw = make_synthetic_sales(n_sales)
+    codes = raw['product_id'].to_numpy() % 40
+    raw['set_name'] = SETS[np.select([codes < 12, codes < 24, codes < 32, codes < 39], [0, 1, 2, 3], 4)]
+    engineered, le_player, le_parallel = engineer_features(raw)
+    X, y_price, y_direction, dates = prepare_ml_data(engineered)
+    split_idx = int(len(X) * 0.8)
+    fallback, _, _ = fit_dual(X.iloc[:split_idx], y_price.iloc[:split_idx], y_direction.iloc[:split_idx],
+                              backend='hist')
+    return engineered.loc[X.index], X, y_price, y_direction, dates, fallback, _encoder_cardinalities(le_player, le_parallel)
+
+def test_router_dispatch(data, path):
+    """Each row is priced by its own segment's shard; segments without one use the global model."""
+    print("TEST: Shard routing...")
+    frame, X, y_price, y_direction, dates, fallback, cardinalities = data
+    keys = segment_keys(frame, 'set')
+    report = train_shards(X, y_price, y_direction, dates, keys, 'set', fallback, backend='hist',
+                          workers=2, cardinalities=cardinalities, path=path)
+    print(report.to_string(index=False))
+    router = load_shard_router('set', fallback, list(X.columns), path=path)
+    assert 'Tiny Set' not in router.shards and len(router.shards) == 4
+
+    # Shuffled rows: routing must not depend on the batch being grouped
+    order = np.random.default_rng(0).permutation(len(X))
+    X_mixed, frame_mixed, keys_mixed = X.iloc[order], frame.iloc[order], keys[order]
+    routed = router.predict(X_mixed, frame_mixed)
+    for key in np.unique(keys_mixed):
+        mask = keys_mixed == key
+        model = router.shards.get(key, fallback)
+        np.testing.assert_array_equal(routed[mask], model.predict(X_mixed[mask]))
+    print(f"  Coverage: {router.coverage(frame):.1%} of rows have a shard")
+    print("PASS")
+    return router
+
+def test_partial_retrain(data, path, router):
+    """Retraining one set rewrites its shard and keeps the others as they were."""
+    print("TEST: Retrain one segment...")
+    frame, X, y_price, y_direction, dates, fallback, cardinalities = data
+    keys = segment_keys(frame, 'set')
+    shard_file = lambda key: os.path.join(path, 'set', _shard_file(key))
+    before = {key: os.stat(shard_file(key)).st_mtime_ns for key in router.shards}
+    report = train_shards(X, y_price, y_direction, dates, keys, 'set', fallback, backend='hist',
+                          only=['Optic'], workers=1, cardinalities=cardinalities, path=path)
+    assert list(report['segment']) == ['Optic']
+    reloaded = load_shard_router('set', fallback, list(X.columns), path=path)
+    assert set(reloaded.shards) == set(router.shards)
+    for key in ('Prizm', 'Select', 'Mosaic'):
+        np.testing.assert_array_equal(reloaded.shards[key].predict(X.iloc[:500]),
+                                      router.shards[key].predict(X.iloc[:500]))
+    for key in ('Prizm', 'Select', 'Mosaic'):
+        assert os.stat(shard_file(key)).st_mtime_ns == before[key], f"{key} shard rewritten"
+    assert os.stat(shard_file('Optic')).st_mtime_ns != before['Optic']
+    print("PASS")
+
+def test_segment_keys(frame):
+    """Grade and liquidity buckets cover every row."""
+    print("TEST: Segment keys...")
+    grades = segment_keys(frame, 'grade')
+    tiers = segment_keys(frame, 'liquidity')
+    assert set(grades) <= {'raw', '7', '8', '9', '10'}
+    assert set(tiers) <= {'none', 'low', 'mid', 'high'}
+    assert (tiers[frame['player_7d_vol'].to_numpy() >= 20] == 'high').all()
+    print("PASS")
+
+if __name__ == "__main__":
+    print(f"(shards need {MIN_SHARD_ROWS} training rows)")
+    data = _matrix()
+    with tempfile.TemporaryDirectory() as path:
+        router = test_router_dispatch(data, path)
+        test_partial_retrain(data, path, router)
+    test_segment_keys(data[0])
@@ -0,0 +1,128 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from train_model import engineer_features, prepare_ml_data, _encoder_cardinalities
+from feature_matrix import load_feature_matrix, save_feature_matrix
+from tune import (
+    successive_halving, prepare_search_matrix, matrix_fingerprint, validation_split, load_ledger,
+    params_key, _evaluate, HOLDOUT_FRACTION,
+)
+from verify_feature_engine import make_synthetic_sales
+
+N_CANDIDATES, ETA = 9, 3
+
+def _matrix(root, n_sales=12000):
+    raw = make_synthetic_sales(n_sales)
+    engineered, le_player, le_parallel = engineer_features(raw)
+    X, y_price, y_direction, dates = prepare_ml_data(engineered)
+    cardinalities = _encoder_cardinalities(le_player, le_parallel)
+    path = prepare_search_matrix(X, y_price, y_direction, dates, cardinalities, os.path.join(root, "matrix"))
+    return path, (X, y_price, y_direction, dates), cardinalities
+
+def _search(path, cardinalities, ledger_path):
+    return successive_halving('price', 'hist', path, n_candidates=N_CANDIDATES, eta=ETA, min_rows=100,
+                              workers=1, cardinalities=cardinalities, ledger_path=ledger_path)
+
+def test_rungs(path, cardinalities, ledger_path):
+    """Rungs grow by eta up to the full training window; the best 1/eta of each rung are promoted."""
+    print("TEST: Rung budgets and promotions...")
+    results = _search(path, cardinalities, ledger_path)
+    split_idx, _ = validation_split(len(load_feature_matrix(path)['X']))
+
+    ledger = load_ledger(ledger_path)
+    rungs = sorted({e['rung'] for e in ledger})
+    assert rungs == [0, 1, 2], rungs
+    by_rung = [[e for e in ledger if e['rung'] == r] for r in rungs]
+    assert [len(entries) for entries in by_rung] == [9, 3, 1]
+    budgets = [entries[0]['n_rows'] for entries in by_rung]
+    assert budgets == [split_idx // 9, split_idx // 3, split_idx], budgets
+    assert all(len({e['n_rows'] for e in entries}) == 1 for entries in by_rung)
+
+    for lower, upper in zip(by_rung, by_rung[1:]):
+        best = sorted(lower, key=lambda e: e['score'])[:len(lower) // ETA]
+        assert {params_key(e['params']) for e in best} == {params_key(e['params']) for e in upper}
+    assert [params_key(e['params']) for e in results] == [params_key(e['params']) for e in by_rung[-1]]
+    print(f"  rungs {budgets} rows, best MAE {results[0]['score']:.2f}")
+    print("PASS")
+
+def test_resume(path, cardinalities, ledger_path):
+    """A re-run takes every finished evaluation from the ledger; only missing ones are fitted again."""
+    print("TEST: Resume from the ledger...")
+    ledger = load_ledger(ledger_path)
+    first = _search(path, cardinalities, ledger_path)
+    assert load_ledger(ledger_path) == ledger, "a complete search was evaluated again"
+
+    # Interrupted during the last two rungs: only those are fitted on resume
+    kept = [e for e in ledger if e['rung'] == 0]
+    with open(ledger_path, 'w') as f:
+        for e in kept:
+            f.write(json.dumps(e) + "\n")
+    resumed = _search(path, cardinalities, ledger_path)
+    added = load_ledger(ledger_path)[len(kept):]
+    assert sorted(e['rung'] for e in added) == [1, 1, 1, 2]
+    assert [params_key(e['params']) for e in resumed] == [params_key(e['params']) for e in first]
+    print("PASS")
+
+def test_fingerprint(path, data, root):
+    """The fingerprint follows the matrix contents, not only its shape."""
+    print("TEST: Matrix fingerprint...")
+    fingerprint = matrix_fingerprint(load_feature_matrix(path))
+    assert matrix_fingerprint(load_feature_matrix(path, mmap=False)) == fingerprint
+
+    X, y_price, y_direction, dates = data
+    for name in ('X', 'y_price', 'y_direction'):
+        frames = {'X': X.copy(), 'y_price': y_price.copy(), 'y_direction': y_direction.copy()}
+        changed = frames[name]
+        if name == 'X':
+            changed.iloc[len(changed) // 2, 0] += 1
+        elif name == 'y_direction':
+            changed.iloc[len(changed) // 2] = 1 - changed.iloc[len(changed) // 2]
+        else:
+            changed.iloc[len(changed) // 2] += 0.01
+        other = save_feature_matrix(os.path.join(root, f"changed_{name}"),
+                                    frames['X'], frames['y_price'], frames['y_direction'], dates)
+        assert matrix_fingerprint(load_feature_matrix(other)) != fingerprint, name
+    print("PASS")
+
+def test_holdout_untouched(path, data, cardinalities, root):
+    """Validation ends where the holdout starts; scrambling the holdout leaves every score unchanged."""
+    print("TEST: Validation slice vs holdout...")
+    for n_rows in (10, 999, 1000, 12345, len(data[0])):
+        train_end, valid_end = validation_split(n_rows)
+        assert 0 <= train_end < valid_end <= int(n_rows * (1 - HOLDOUT_FRACTION))
+    assert validation_split(len(data[0]))[1] == int(len(data[0]) * 0.8)  # train_and_evaluate's split_idx
+
+    X, y_price, y_direction, dates = data
+    holdout = np.arange(len(X)) >= int(len(X) * (1 - HOLDOUT_FRACTION))
+    rng = np.random.default_rng(0)
+    X_scrambled, price_scrambled, direction_scrambled = X.copy(), y_price.copy(), y_direction.copy()
+    X_scrambled.iloc[holdout] = rng.permutation(X.iloc[holdout].to_numpy())
+    price_scrambled.iloc[holdout] = rng.uniform(0, 1e6, holdout.sum())
+    direction_scrambled.iloc[holdout] = 1 - direction_scrambled.iloc[holdout]
+    scrambled = save_feature_matrix(os.path.join(root, "scrambled"), X_scrambled, price_scrambled,
+                                    direction_scrambled, dates)
+
+    split_idx, valid_end = validation_split(len(X))
+    for head, params in (('price', {'max_iter': 50}), ('direction', {'max_iter': 50})):
+        task = {'split_idx': split_idx, 'valid_end': valid_end, 'n_rows': split_idx, 'head': head,
+                'backend': 'hist', 'params': params, 'cardinalities': cardinalities, 'threads': 1}
+        scores = [_evaluate(dict(task, matrix_path=p))['score'] for p in (path, scrambled)]
+        assert scores[0] == scores[1], (head, scores)
+    print("PASS")
+
+if __name__ == "__main__":
+    root = tempfile.mkdtemp()
+    try:
+        path, data, cardinalities = _matrix(root)
+        ledger_path = os.path.join(root, "ledger.jsonl")
+        test_rungs(path, cardinalities, ledger_path)
+        test_resume(path, cardinalities, ledger_path)
+        test_fingerprint(path, data, root)
+        test_holdout_untouched(path, data, cardinalities, root)
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,64 @@
+import sys
+import os
+import time
+import numpy as np
+from sklearn.metrics import mean_absolute_error, accuracy_score
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from train_model import engineer_features, prepare_ml_data
+from model_backends import fit_dual
+from warm_update import FullRetrainRequired, update_dual, ensemble_size, trees_to_add, split_holdout
+from verify_feature_engine import make_synthetic_sales
+
+def _fit_on_history(n_sales=30000, history_fraction=0.9):
+    """gbm heads fitted on the oldest rows (80/20 like train_and_evaluate); the rest are 'new sales'."""
+    raw = make_synthetic_sales(n_sales)
+    engineered, _, _ = engineer_features(raw)
+    X, y_price, y_direction, dates = prepare_ml_data(engineered)
+    cut = split_holdout(dates, 1 - history_fraction)
+    split_idx = int(cut * 0.8)
+    regressor, classifier, timings = fit_dual(X.iloc[:split_idx], y_price.iloc[:split_idx],
+                                              y_direction.iloc[:split_idx], backend='gbm')
+    X_test, yp_test, yd_test = X.iloc[split_idx:cut], y_price.iloc[split_idx:cut], y_direction.iloc[split_idx:cut]
+    metadata = {
+        'train_rows': split_idx,
+        'base_trees': ensemble_size(regressor),
+        'mae': mean_absolute_error(yp_test, regressor.predict(X_test)),
+        'accuracy': accuracy_score(yd_test, classifier.predict(X_test)),
+    }
+    new = slice(split_idx, None)
+    return (regressor, classifier, metadata, timings,
+            (X.iloc[new], y_price.iloc[new], y_direction.iloc[new], dates.iloc[new]))
+
+def test_update_appends_trees():
+    """An update adds trees in proportion to the new rows and stays within tolerance."""
+    print("TEST: Warm-start update...")
+    regressor, classifier, metadata, timings, new = _fit_on_history()
+    X, y_price, y_direction, dates = new
+    base = ensemble_size(regressor)
+    report = update_dual(regressor, classifier, X, y_price, y_direction, dates, metadata)
+
+    expected = trees_to_add(metadata['base_trees'], metadata['train_rows'], report['fit_rows'])
+    assert report['trees_added'] == expected
+    assert ensemble_size(regressor) == ensemble_size(classifier) == base + expected
+    assert report['watermark'] < dates.iloc[report['fit_rows']], "holdout must start after the watermark"
+    update_s = report['price_s'] + report['direction_s']
+    print(f"  +{expected} trees in {update_s:.1f}s (full fit of {base} trees: "
+          f"{timings['price_s'] + timings['direction_s']:.1f}s)")
+    print("PASS")
+
+def test_drift_requires_full_retrain():
+    """A holdout error far above the reference falls back to a full retrain."""
+    print("TEST: Drift fallback...")
+    regressor, classifier, metadata, _, new = _fit_on_history()
+    try:
+        update_dual(regressor, classifier, *new, {**metadata, 'mae': metadata['mae'] / 10})
+    except FullRetrainRequired as reason:
+        assert "drifted" in str(reason)
+        print("PASS")
+        return
+    raise AssertionError("drift not detected")
+
+if __name__ == "__main__":
+    test_update_appends_trees()
+    test_drift_requires_full_retrain()
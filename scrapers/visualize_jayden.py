@@ -1,5 +1,4 @@
 import pandas as pd
-import joblib
 import sys
 import os
 import matplotlib.pyplot as plt
@@ -9,8 +8,7 @@ import matplotlib.dates as mdates
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from train_model import load_data, engineer_features, prepare_ml_data
-
-MODEL_PATH = "backend/model.pkl"
+from model_bundle import load_model_bundle
 OUTPUT_PATH = "/Users/eastcoastlimited/.gemini/antigravity/brain/4a90b6ca-0bc0-4f7f-89e0-fef9d1ec5306/jayden_daniels_forecast.png"
 
 def visualize_jayden():
@@ -35,11 +33,11 @@ def visualize_jayden():
     target_df = target_df.sort_values('sale_date')
     
     # Prepare X
-    X, y_actual = prepare_ml_data(target_df)
+    X, y_actual, _, _ = prepare_ml_data(target_df)
     
     # Load Model
     print("Loading model...")
-    model = joblib.load(MODEL_PATH)
+    model = load_model_bundle(feature_columns=X.columns).regressor
     
     # Predict
     y_pred = model.predict(X)
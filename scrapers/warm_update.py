@@ -0,0 +1,129 @@
+"""Warm-start updates of the saved dual forecast models.
+
+A full retrain refits both heads on the whole history. An update instead
+takes the sales past the bundle's training watermark (and any ingested
+since it was trained, by sale_id, whatever their date), holds out the most
+recent HOLDOUT_FRACTION of them (by date), appends trees to both heads fitted
+on the rest (sklearn warm_start: the new trees boost from the current
+ensemble's predictions on the new rows) and re-validates on the holdout. The
+price band models, when the bundle has them, are extended the same way.
+
+The number of appended trees scales with the new rows relative to the rows
+the model was trained on, so a day of sales costs a few trees. A full retrain
+is required instead when:
+  - the holdout error drifts past DRIFT_TOLERANCE of the reference error
+    recorded at the last full train (or accuracy drops by ACCURACY_DROP)
+  - too many new rows are for players / parallels the encoders never saw
+  - the ensemble has grown past MAX_TREE_GROWTH x its full-train size
+  - the backend is 'hist': HistGradientBoosting rebins on every fit, so its
+    warm start is only valid on the data it was first fitted on
+"""
+
+import math
+import time
+import numpy as np
+from sklearn.metrics import mean_absolute_error, accuracy_score
+
+HOLDOUT_FRACTION = 0.2
+MIN_UPDATE_ROWS = 50       # fewer new rows than this: nothing to do yet
+MIN_UPDATE_TREES = 5
+DRIFT_TOLERANCE = 0.25     # holdout MAE may exceed the reference MAE by 25%
+ACCURACY_DROP = 0.05
+MAX_UNSEEN_FRACTION = 0.2  # of new rows with labels unknown to the encoders
+MAX_TREE_GROWTH = 2.0
+
+
+class FullRetrainRequired(Exception):
+    """The saved models cannot be updated in place; the reason is the message."""
+
+
+def split_holdout(dates, fraction=HOLDOUT_FRACTION):
+    """Row index of the first holdout row in date-sorted `dates` (a whole-day boundary)."""
+    dates = np.asarray(dates).astype('datetime64[D]')
+    cut = dates[min(len(dates) - 1, int(len(dates) * (1 - fraction)))]
+    return int(np.searchsorted(dates, cut, side='left'))
+
+
+def trees_to_add(base_trees, base_rows, new_rows):
+    """Trees for `new_rows` in proportion to what the full train spent on `base_rows`."""
+    return max(MIN_UPDATE_TREES, math.ceil(base_trees * new_rows / max(base_rows, 1)))
+
+
+def append_trees(model, X, y, n_trees):
+    """Fit `n_trees` more boosting stages on (X, y) in place. Returns fit seconds."""
+    start = time.perf_counter()
+    model.set_params(warm_start=True, n_estimators=model.n_estimators_ + n_trees)
+    model.fit(X, y)
+    model.set_params(warm_start=False)
+    return time.perf_counter() - start
+
+
+def ensemble_size(model):
+    """Boosting stages in a fitted gbm or hist model."""
+    return model.n_estimators_ if hasattr(model, 'n_estimators_') else model.n_iter_
+
+
+def check_updatable(backend, metadata):
+    """Raise FullRetrainRequired unless the bundle can be warm-started at all."""
+    if backend != 'gbm':
+        raise FullRetrainRequired(f"backend {backend!r} does not support warm-start updates")
+    missing = [key for key in ('train_watermark', 'train_rows', 'base_trees', 'mae', 'accuracy')
+               if key not in metadata]
+    if missing:
+        raise FullRetrainRequired(f"bundle metadata lacks {missing}")
+
+
+def check_new_rows(metadata, n_trees, n_unseen, n_new):
+    """Raise FullRetrainRequired if the new rows or the grown ensemble call for a full train."""
+    if n_new and n_unseen / n_new > MAX_UNSEEN_FRACTION:
+        raise FullRetrainRequired(f"{n_unseen}/{n_new} new rows have players/parallels unseen at training time")
+    if n_trees > MAX_TREE_GROWTH * metadata['base_trees']:
+        raise FullRetrainRequired(f"{n_trees} trees, past {MAX_TREE_GROWTH:g}x the full-train size")
+
+
+def update_dual(regressor, classifier, X, y_price, y_direction, dates, metadata, bands=None):
+    """
+    Warm-start both heads (and the {quantile: regressor} band models) on
+    date-sorted new rows and re-validate on their most recent slice. Raises
+    FullRetrainRequired on drift; otherwise returns a report dict (holdout
+    metrics before / after, trees added, timings).
+    """
+    split = split_holdout(dates)
+    if split == 0 or split == len(X):
+        raise FullRetrainRequired("new rows span a single day; nothing to hold out")
+    X_fit, X_hold = X.iloc[:split], X.iloc[split:]
+    if y_direction.iloc[:split].nunique() < 2:
+        raise FullRetrainRequired("new rows have a single direction class")
+
+    before_mae = mean_absolute_error(y_price.iloc[split:], regressor.predict(X_hold))
+    before_acc = accuracy_score(y_direction.iloc[split:], classifier.predict(X_hold))
+
+    n_trees = trees_to_add(metadata['base_trees'], metadata['train_rows'], len(X_fit))
+    price_size = ensemble_size(regressor)
+    price_s = append_trees(regressor, X_fit, y_price.iloc[:split], n_trees)
+    direction_s = append_trees(classifier, X_fit, y_direction.iloc[:split], n_trees)
+    # Band models are smaller than the price head; they grow in the same proportion
+    band_s = 0.0
+    for model in (bands or {}).values():
+        band_trees = max(MIN_UPDATE_TREES, math.ceil(n_trees * ensemble_size(model) / price_size))
+        band_s += append_trees(model, X_fit, y_price.iloc[:split], band_trees)
+
+    mae = mean_absolute_error(y_price.iloc[split:], regressor.predict(X_hold))
+    acc = accuracy_score(y_direction.iloc[split:], classifier.predict(X_hold))
+    print(f"  Holdout ({len(X_hold)} rows): MAE ${before_mae:.2f} -> ${mae:.2f}, "
+          f"accuracy {before_acc:.1%} -> {acc:.1%}")
+
+    if mae > metadata['mae'] * (1 + DRIFT_TOLERANCE):
+        raise FullRetrainRequired(f"holdout MAE ${mae:.2f} drifted past reference ${metadata['mae']:.2f}")
+    if acc < metadata['accuracy'] - ACCURACY_DROP:
+        raise FullRetrainRequired(f"holdout accuracy {acc:.1%} dropped from reference {metadata['accuracy']:.1%}")
+
+    return {
+        'trees_added': n_trees,
+        'fit_rows': split,
+        'holdout_rows': len(X_hold),
+        'holdout_mae_before': before_mae, 'holdout_mae': mae,
+        'holdout_accuracy_before': before_acc, 'holdout_accuracy': acc,
+        'price_s': price_s, 'direction_s': direction_s, 'band_s': band_s,
+        'watermark': dates.iloc[split - 1],
+    }